@@ -0,0 +1,3 @@
+from analytics.stats import GradeStatsStore, RunningStats
+
+__all__ = ['GradeStatsStore', 'RunningStats']
@@ -0,0 +1,290 @@
+"""
+Vectorized gradebook analytics for SnapGrade
+
+Loads grades.json into a columnar pandas DataFrame (categorical ids, numeric
+percentages) that is cached until the file changes, and computes class-wide
+analytics with groupby operations instead of per-record Python loops.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from scoring import score_to_percentage
+
+DEFAULT_OUTLIER_Z = 2.0
+
+ANALYTICS_SECTIONS = ('distributions', 'trends', 'outliers', 'criteria')
+
+
+def _raw_score(grade):
+    score = grade.get('score')
+    if isinstance(score, dict):
+        # Structured results are scored by their total, else their percentage
+        if score.get('total_score') is not None:
+            return score['total_score']
+        if score.get('percentage') is not None:
+            return f"{str(score['percentage']).strip().rstrip('%')}%"
+        return None
+    return score
+
+
+def normalize_score_column(scores):
+    """
+    Convert a column of raw stored scores into percentages.
+
+    Score columns have low cardinality ("7/10", "8/10", 85, ...), so the
+    column is factorized and only the distinct values are parsed.
+
+    Args:
+        scores (pd.Series): Raw scores (numbers, numeric strings, "7/10", "85%")
+
+    Returns:
+        pd.Series: float64 percentages, NaN where the score is unusable
+        (bare numbers included, since their total is unknown)
+    """
+    codes, uniques = pd.factorize(scores.astype(str).str.strip())
+    parsed = np.array([
+        np.nan if (value := score_to_percentage(text)) is None else value
+        for text in uniques
+    ], dtype=float)
+    percentages = np.where(codes >= 0, parsed[codes] if len(parsed) else np.nan, np.nan)
+    return pd.Series(percentages, index=scores.index, dtype=float)
+
+
+def build_grades_frame(grades):
+    """
+    Build the columnar grades frame from grade records.
+
+    The stored 'score_normalized' percentage is used directly; only legacy
+    records without one have their raw score parsed.
+
+    Returns:
+        pd.DataFrame: One row per grade with categorical class_id,
+        assignment_id and student_id, a float 'percentage' and 'graded_at'
+    """
+    frame = pd.DataFrame({
+        "grade_id": [g.get('id') for g in grades],
+        "class_id": pd.Categorical([g.get('class_id') for g in grades]),
+        "assignment_id": pd.Categorical([g.get('assignment_id') for g in grades]),
+        "student_id": pd.Categorical([g.get('student_id') for g in grades]),
+        "graded_at": pd.to_datetime(
+            [g.get('graded_at') or g.get('timestamp') for g in grades],
+            errors='coerce', format='ISO8601'
+        ),
+        "percentage": pd.Series(
+            [(g.get('score_normalized') or {}).get('percentage') for g in grades], dtype=float
+        )
+    })
+
+    # Grades written before normalization existed only carry the raw score
+    legacy = frame['percentage'].isna().to_numpy() & np.array(
+        ['score_normalized' not in g for g in grades], dtype=bool
+    )
+    if legacy.any():
+        raw_scores = pd.Series([_raw_score(g) for g, is_legacy in zip(grades, legacy) if is_legacy], dtype=object)
+        frame.loc[legacy, 'percentage'] = normalize_score_column(raw_scores).to_numpy()
+    return frame
+
+
+def build_criteria_frame(grades):
+    """
+    Build a frame of per-question rubric results from structured feedback.
+
+    Only grades whose feedback is a structured result with a 'questions' list
+    contribute rows.
+    """
+    rows = []
+    for g in grades:
+        feedback = g.get('feedback')
+        if not isinstance(feedback, dict):
+            continue
+        for q in feedback.get('questions') or []:
+            if not isinstance(q, dict):
+                continue
+            rows.append((
+                g.get('class_id'),
+                g.get('assignment_id'),
+                str(q.get('question_number', '?')),
+                q.get('points_earned'),
+                q.get('points_possible')
+            ))
+
+    frame = pd.DataFrame(rows, columns=[
+        'class_id', 'assignment_id', 'question_number', 'points_earned', 'points_possible'
+    ])
+    for column in ('class_id', 'assignment_id', 'question_number'):
+        frame[column] = frame[column].astype('category')
+    for column in ('points_earned', 'points_possible'):
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+def _records(frame):
+    """Convert a result frame to JSON-safe records (NaN becomes None)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+
+
+def assignment_distributions(frame):
+    """Per-assignment score distribution: count, mean, std, min, quartiles, max."""
+    scored = frame.dropna(subset=['percentage'])
+    if scored.empty:
+        return []
+    grouped = scored.groupby('assignment_id', observed=True)['percentage']
+    result = grouped.agg(['count', 'mean', 'std', 'min', 'max'])
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    quantiles.columns = ['p25', 'median', 'p75']
+    result = result.join(quantiles).round(2).reset_index()
+    return _records(result)
+
+
+def student_trends(frame):
+    """
+    Per-student trend across assignments, ordered by grading time.
+
+    The slope is the least-squares change in percentage per assignment,
+    computed for all students at once from grouped sums.
+    """
+    scored = frame.dropna(subset=['percentage']).sort_values('graded_at', kind='stable')
+    if scored.empty:
+        return []
+    x = scored.groupby('student_id', observed=True).cumcount().astype(float)
+    y = scored['percentage']
+    sums = pd.DataFrame({
+        'student_id': scored['student_id'],
+        'n': 1.0,
+        'x': x,
+        'y': y,
+        'xx': x * x,
+        'xy': x * y
+    }).groupby('student_id', observed=True).sum()
+
+    denominator = sums['n'] * sums['xx'] - sums['x'] ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (sums['n'] * sums['xy'] - sums['x'] * sums['y']) / denominator
+    last = scored.groupby('student_id', observed=True)['percentage'].last()
+
+    result = pd.DataFrame({
+        'assignments_graded': sums['n'].astype(int),
+        'mean': sums['y'] / sums['n'],
+        'latest': last,
+        'slope_per_assignment': slope.where(denominator > 0)
+    }).round(2).reset_index()
+    return _records(result)
+
+
+def outliers(frame, z_threshold=DEFAULT_OUTLIER_Z):
+    """Grades whose score is more than z_threshold standard deviations from their assignment mean."""
+    scored = frame.dropna(subset=['percentage'])
+    if scored.empty:
+        return []
+    grouped = scored.groupby('assignment_id', observed=True)['percentage']
+    mean = grouped.transform('mean')
+    std = grouped.transform('std')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (scored['percentage'] - mean) / std
+    flagged = scored.assign(z_score=z.round(2), assignment_mean=mean.round(2))
+    flagged = flagged[flagged['z_score'].abs() >= z_threshold]
+    result = flagged[['grade_id', 'student_id', 'assignment_id', 'percentage', 'assignment_mean', 'z_score']]
+    return _records(result.sort_values('z_score', key=lambda s: -s.abs()))
+
+
+def criteria_breakdown(criteria):
+    """Per-assignment, per-question average points earned and share of points possible."""
+    if criteria.empty:
+        return []
+    grouped = criteria.groupby(['assignment_id', 'question_number'], observed=True)
+    result = grouped.agg(
+        responses=('points_earned', 'count'),
+        mean_points_earned=('points_earned', 'mean'),
+        points_possible=('points_possible', 'max')
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['percent_of_possible'] = result['mean_points_earned'] / result['points_possible'] * 100
+    return _records(result.round(2).reset_index())
+
+
+class GradebookCache:
+    """
+    Caches the grades DataFrame and per-class row indices for a grades file.
+
+    The frame is rebuilt only when the file's modification time or size
+    changes, so repeated analytics requests reuse the same columnar data.
+    """
+
+    def __init__(self, grades_file):
+        self.grades_file = grades_file
+        self._lock = threading.Lock()
+        self._signature = None
+        self._frame = None
+        self._criteria = None
+        self._class_rows = {}
+        self._class_criteria_rows = {}
+
+    def _file_signature(self):
+        stat = os.stat(self.grades_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with open(self.grades_file, 'r') as f:
+            grades = json.load(f)
+        self._frame = build_grades_frame(grades)
+        self._criteria = build_criteria_frame(grades)
+        self._class_rows = self._frame.groupby('class_id', observed=True).indices
+        self._class_criteria_rows = self._criteria.groupby('class_id', observed=True).indices
+        self._signature = signature
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def class_frames(self, class_id):
+        """
+        Get the grades and criteria frames restricted to one class.
+
+        Returns:
+            tuple: (grades_frame, criteria_frame)
+        """
+        with self._lock:
+            self._refresh()
+            frame, criteria = self._frame, self._criteria
+            class_rows = self._class_rows.get(class_id, np.array([], dtype=int))
+            criteria_rows = self._class_criteria_rows.get(class_id, np.array([], dtype=int))
+        return frame.iloc[class_rows], criteria.iloc[criteria_rows]
+
+    def class_analytics(self, class_id, sections=None, z_threshold=DEFAULT_OUTLIER_Z):
+        """
+        Compute analytics for a class.
+
+        Args:
+            class_id (str): The class to analyze
+            sections (list, optional): Subset of ANALYTICS_SECTIONS;
+                defaults to all of them
+            z_threshold (float): Outlier cutoff in standard deviations
+
+        Returns:
+            dict: One entry per requested section
+        """
+        frame, criteria = self.class_frames(class_id)
+        builders = {
+            'distributions': lambda: assignment_distributions(frame),
+            'trends': lambda: student_trends(frame),
+            'outliers': lambda: outliers(frame, z_threshold),
+            'criteria': lambda: criteria_breakdown(criteria)
+        }
+        sections = sections or list(ANALYTICS_SECTIONS)
+        unknown = [s for s in sections if s not in builders]
+        if unknown:
+            raise ValueError(f"Unknown analytics section(s): {', '.join(unknown)}")
+
+        result = {"class_id": class_id, "grade_count": int(len(frame))}
+        for section in sections:
+            result[section] = builders[section]()
+        return result
+
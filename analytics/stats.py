@@ -0,0 +1,251 @@
+"""
+Running grade statistics for SnapGrade
+
+Keeps per-class and per-assignment aggregates (count, mean, variance, min/max,
+score histogram and percentiles) up to date as grades are written, so the
+statistics endpoints never have to rescan grades.json.
+"""
+
+import math
+import threading
+
+from scoring import grade_percentage
+
+# Resolution of the percentile sketch, in percentage points per bin
+SKETCH_BIN_WIDTH = 0.5
+SKETCH_BINS = int(100 / SKETCH_BIN_WIDTH) + 1
+
+# Width of the buckets reported in the histogram, in percentage points
+HISTOGRAM_BUCKET_WIDTH = 10
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90)
+
+
+class ScoreSketch:
+    """
+    Fixed-width streaming histogram over the 0-100 percentage range.
+
+    Memory and query cost are constant regardless of how many scores have been
+    added; percentiles are accurate to within SKETCH_BIN_WIDTH points. Scores
+    outside the range (e.g. extra credit) are clamped into the edge bins.
+    """
+
+    def __init__(self):
+        self.bins = [0] * SKETCH_BINS
+        self.count = 0
+
+    def add(self, percentage):
+        index = int(round(min(max(percentage, 0.0), 100.0) / SKETCH_BIN_WIDTH))
+        self.bins[index] += 1
+        self.count += 1
+
+    def percentile(self, q):
+        """Return the approximate nearest-rank q-th percentile, or None if empty."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(q / 100.0 * self.count) - 1, 0)
+        seen = 0
+        for index, bin_count in enumerate(self.bins):
+            if bin_count and seen + bin_count > rank:
+                return index * SKETCH_BIN_WIDTH
+            seen += bin_count
+        return 100.0
+
+    def histogram(self):
+        """Return bucket counts keyed by labels such as '80-89' and '90-100'."""
+        buckets = {}
+        bins_per_bucket = int(HISTOGRAM_BUCKET_WIDTH / SKETCH_BIN_WIDTH)
+        for start in range(0, 100, HISTOGRAM_BUCKET_WIDTH):
+            first = int(start / SKETCH_BIN_WIDTH)
+            if start + HISTOGRAM_BUCKET_WIDTH >= 100:
+                label = f"{start}-100"
+                buckets[label] = sum(self.bins[first:])
+            else:
+                label = f"{start}-{start + HISTOGRAM_BUCKET_WIDTH - 1}"
+                buckets[label] = sum(self.bins[first:first + bins_per_bucket])
+        return buckets
+
+
+class RunningStats:
+    """
+    Incrementally maintained statistics for one group of grades.
+
+    Uses Welford's algorithm for the mean and variance so each update is O(1)
+    and numerically stable.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.scored_count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = ScoreSketch()
+
+    def add(self, percentage):
+        """
+        Add one grade's score to the aggregates.
+
+        Args:
+            percentage (float or None): The grade's normalized percentage;
+                None (error or unscored) is counted but does not affect the
+                numeric aggregates
+        """
+        self.count += 1
+        if percentage is None:
+            return
+
+        self.scored_count += 1
+        delta = percentage - self.mean
+        self.mean += delta / self.scored_count
+        self._m2 += delta * (percentage - self.mean)
+        self.min = percentage if self.min is None else min(self.min, percentage)
+        self.max = percentage if self.max is None else max(self.max, percentage)
+        self.sketch.add(percentage)
+
+    @property
+    def variance(self):
+        if self.scored_count < 2:
+            return 0.0
+        return self._m2 / (self.scored_count - 1)
+
+    def to_dict(self, percentiles=DEFAULT_PERCENTILES):
+        has_scores = self.scored_count > 0
+        return {
+            "count": self.count,
+            "scored_count": self.scored_count,
+            "unscored_count": self.count - self.scored_count,
+            "mean": round(self.mean, 2) if has_scores else None,
+            "variance": round(self.variance, 2) if has_scores else None,
+            "std_dev": round(math.sqrt(self.variance), 2) if has_scores else None,
+            "min": round(self.min, 2) if has_scores else None,
+            "max": round(self.max, 2) if has_scores else None,
+            "percentiles": {
+                f"p{q}": self.sketch.percentile(q) for q in percentiles
+            },
+            "histogram": self.sketch.histogram()
+        }
+
+
+class GradeStatsStore:
+    """
+    In-memory registry of RunningStats keyed by class and by assignment.
+
+    The store is built from the full grade list once, on first use, and is then
+    updated on every grade write via record()/record_many(). Deletions are rare,
+    so they simply invalidate the store and the next read rebuilds it. With a
+    signature, reads also rebuild it when the grades changed elsewhere (e.g.
+    another worker process wrote the grades file).
+    """
+
+    def __init__(self, load_grades, signature=None):
+        """
+        Args:
+            load_grades (callable): Returns the current list of grade records;
+                only called when the store needs to be (re)built
+            signature (callable, optional): Returns a value that changes when
+                the stored grades change, e.g. the grades file's mtime and size
+        """
+        self._load_grades = load_grades
+        self._signature = signature or (lambda: None)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_signature = None
+        self._by_class = {}
+        self._by_assignment = {}
+        self._class_assignments = {}
+
+    def _reset(self):
+        self._by_class = {}
+        self._by_assignment = {}
+        self._class_assignments = {}
+
+    def _add(self, grade):
+        class_id = grade.get('class_id')
+        assignment_id = grade.get('assignment_id')
+        percentage = grade_percentage(grade)
+
+        if class_id:
+            self._by_class.setdefault(class_id, RunningStats()).add(percentage)
+        if assignment_id:
+            self._by_assignment.setdefault(assignment_id, RunningStats()).add(percentage)
+            if class_id:
+                self._class_assignments.setdefault(class_id, set()).add(assignment_id)
+
+    def _ensure_loaded(self):
+        signature = self._signature()
+        if self._loaded and signature == self._loaded_signature:
+            return
+        self._reset()
+        for grade in self._load_grades():
+            self._add(grade)
+        self._loaded = True
+        self._loaded_signature = signature
+
+    def record(self, grade, previous_signature=None):
+        """Update the aggregates with one newly written grade record."""
+        self.record_many([grade], previous_signature)
+
+    def record_many(self, grades, previous_signature=None):
+        """
+        Update the aggregates with newly written grade records.
+
+        Args:
+            grades (list): The grade records just written
+            previous_signature: The signature taken before the grades file was
+                read for the write; when it no longer matches the one the
+                aggregates were built from, someone else wrote in between and
+                the store is rebuilt instead of updated in place
+        """
+        with self._lock:
+            if not self._loaded:
+                # The rebuild reads the grades file, which already contains these records
+                self._ensure_loaded()
+                return
+            if previous_signature != self._loaded_signature:
+                self._loaded = False
+                self._reset()
+                return
+            for grade in grades:
+                self._add(grade)
+            # The grades file now holds exactly these records on top of what was loaded
+            self._loaded_signature = self._signature()
+
+    def invalidate(self):
+        """Drop all aggregates; they are rebuilt on the next read."""
+        with self._lock:
+            self._loaded = False
+            self._reset()
+
+    def class_stats(self, class_id):
+        """
+        Get the aggregates for a class and each of its assignments.
+
+        Returns:
+            dict: {'class': {...}, 'assignments': {assignment_id: {...}}}
+        """
+        with self._lock:
+            self._ensure_loaded()
+            class_stats = self._by_class.get(class_id, RunningStats())
+            assignment_ids = self._class_assignments.get(class_id, set())
+            return {
+                "class": class_stats.to_dict(),
+                "assignments": {
+                    assignment_id: self._by_assignment[assignment_id].to_dict()
+                    for assignment_id in assignment_ids
+                }
+            }
+
+    def assignment_stats(self, assignment_id):
+        """Get the aggregates for a single assignment."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_assignment.get(assignment_id, RunningStats()).to_dict()
+
+    def graded_count(self, class_id):
+        """Get the number of grade records written for a class."""
+        with self._lock:
+            self._ensure_loaded()
+            stats = self._by_class.get(class_id)
+            return stats.count if stats else 0
@@ -1,21 +1,47 @@
-from flask import Flask, request, jsonify, url_for, send_from_directory, render_template, session, redirect, send_file
+from flask import Flask, request, jsonify, url_for, send_from_directory, render_template, session, redirect, send_file, g
 from flask_cors import CORS
-from flask_mail import Mail, Message
 from grader import grade_assignment
 from grader.engine import grade_assignment_with_vision
+from grader.rubric_compiler import get_compiled_rubric
+from grader.page_groups import grade_pdf_page_groups, omr_page_result, _png_bytes
+from grader.token_budget import estimate_image_tokens
+from grader.answer_groups import grade_grouped, get_grouping_stats
+from grader.batch_jobs import (prepare_batch, merge_local_scores, to_jsonl, parse_batch_output, OpenAIBatchClient,
+                               FINAL_STATES)
+from backends import get_backend
+from metrics import span, observe_request, register_stats, render_prometheus
+from logs import get_logger, payload, set_request_id, get_request_id
+from singleflight import get_singleflight_stats
+from usage import (UsageLedger, set_ledger, set_usage_context, update_usage_context, record_usage,
+                   rollup, get_usage_stats, GROUP_BY_FIELDS)
 from image_processor import extract_text_from_image, get_file_from_dropbox
-from image_processor.ocr import extract_text_from_image, detect_diagrams_in_image, extract_text_with_metadata_from_image
+from image_processor.ocr import (extract_text_from_image, detect_diagrams_in_image, extract_text_with_metadata_from_image,
+                                 analyze_and_grade_mcq_diagrams_first)
+from image_processor.omr import parse_answer_key, grade_bubble_sheets, grade_bubble_sheet_if_possible, omr_grading_result
+from image_processor.page_filter import filter_pages
+from image_processor.tiered_ocr import get_ocr_stats
+from image_processor.local_extraction import get_extraction_stats
 from file_processor import extract_text_from_file
 from excel_export import create_excel_for_batch_results, save_excel_file
+from analytics import GradeStatsStore, RunningStats
+from analytics.gradebook import GradebookCache, DEFAULT_OUTLIER_Z
+from roster import StudentNameIndex, name_from_filename
+from scoring import normalize_grading_result, normalize_score, error_score
 from config import Config
-import traceback
 import os
 import uuid
 import base64
+import importlib.util
 import io
 import json
+import logging
+import socket
+import threading
+import time
 from datetime import datetime
 
+logger = get_logger('app')
+
 # Initialize Flask app
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
@@ -49,40 +75,209 @@ app.config['MAIL_USERNAME'] = Config.MAIL_USERNAME
 app.config['MAIL_PASSWORD'] = Config.MAIL_PASSWORD
 app.config['MAIL_DEFAULT_SENDER'] = Config.MAIL_DEFAULT_SENDER
 
-# Initialize Flask-Mail
-mail = Mail(app)
+# Flask-Mail is initialized on the first contact e-mail (see get_mail)
+mail = None
+
+def get_mail():
+    """Initialize Flask-Mail on first use; importing it slows every start."""
+    global mail
+    if mail is None:
+        from flask_mail import Mail
+        mail = Mail(app)
+    return mail
 
 # Configure upload folder
 app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
 
-# Create upload folder if it doesn't exist
-# This line is already Python 3 compatible
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Create rubrics folder if it doesn't exist
-RUBRICS_FOLDER = os.path.join(os.path.dirname(__file__), 'rubrics')
-os.makedirs(RUBRICS_FOLDER, exist_ok=True)
-RUBRICS_FILE = os.path.join(RUBRICS_FOLDER, 'rubrics.json')
-
-# Initialize rubrics file if it doesn't exist
-if not os.path.exists(RUBRICS_FILE):
-    with open(RUBRICS_FILE, 'w') as f:
-        json.dump([], f)
-
-# Create classes folder and files if they don't exist
-CLASSES_FOLDER = os.path.join(os.path.dirname(__file__), 'classes')
-os.makedirs(CLASSES_FOLDER, exist_ok=True)
-CLASSES_FILE = os.path.join(CLASSES_FOLDER, 'classes.json')
-STUDENTS_FILE = os.path.join(CLASSES_FOLDER, 'students.json')
-ASSIGNMENTS_FILE = os.path.join(CLASSES_FOLDER, 'assignments.json')
-GRADES_FILE = os.path.join(CLASSES_FOLDER, 'grades.json')
-
-# Initialize class management files if they don't exist
-for file_path in [CLASSES_FILE, STUDENTS_FILE, ASSIGNMENTS_FILE, GRADES_FILE]:
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
-            json.dump([], f)
+def _use_data_folder(data_folder):
+    """Point the rubric and class data files at rubrics/ and classes/ in a folder."""
+    global RUBRICS_FOLDER, RUBRICS_FILE, CLASSES_FOLDER, CLASSES_FILE, STUDENTS_FILE
+    global ASSIGNMENTS_FILE, GRADES_FILE, BATCH_JOBS_FILE, USAGE_FILE
+    RUBRICS_FOLDER = os.path.join(data_folder, 'rubrics')
+    RUBRICS_FILE = os.path.join(RUBRICS_FOLDER, 'rubrics.json')
+    CLASSES_FOLDER = os.path.join(data_folder, 'classes')
+    CLASSES_FILE = os.path.join(CLASSES_FOLDER, 'classes.json')
+    STUDENTS_FILE = os.path.join(CLASSES_FOLDER, 'students.json')
+    ASSIGNMENTS_FILE = os.path.join(CLASSES_FOLDER, 'assignments.json')
+    GRADES_FILE = os.path.join(CLASSES_FOLDER, 'grades.json')
+    BATCH_JOBS_FILE = os.path.join(CLASSES_FOLDER, 'batch_jobs.json')
+    USAGE_FILE = os.path.join(CLASSES_FOLDER, 'usage.jsonl')
+
+# Rubric and class data live next to app.py unless DATA_FOLDER is set;
+# the folders and files are created by init_storage() (see create_app)
+_use_data_folder(Config.DATA_FOLDER or os.path.dirname(os.path.abspath(__file__)))
+
+def _load_grades():
+    with open(GRADES_FILE, 'r') as f:
+        return json.load(f)
+
+def _file_signature(path):
+    """(mtime, size) of a data file, or None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Running per-class and per-assignment statistics, updated on every grade write
+# and rebuilt when grades.json is changed by another process
+grade_stats = GradeStatsStore(_load_grades, lambda: _file_signature(GRADES_FILE))
+
+# Token usage and cost of every provider call, appended to usage.jsonl in batches
+usage_ledger = UsageLedger(lambda: USAGE_FILE)
+set_ledger(usage_ledger)
+
+# Columnar grades frame for class analytics, rebuilt when grades.json changes
+gradebook = GradebookCache(GRADES_FILE)
+
+def _load_students():
+    with open(STUDENTS_FILE, 'r') as f:
+        return json.load(f)
+
+# Fuzzy name index over the roster, updated as students are added and deleted
+# and rebuilt when students.json is changed by another process
+student_index = StudentNameIndex(_load_students, lambda: _file_signature(STUDENTS_FILE))
+
+# Per-endpoint request timing and the module stats exposed at /metrics
+register_stats('ocr', get_ocr_stats)
+register_stats('extraction', get_extraction_stats)
+register_stats('grouping', get_grouping_stats)
+register_stats('backend', lambda: getattr(get_backend(), 'get_stats', dict)())
+register_stats('usage', get_usage_stats)
+register_stats('singleflight', get_singleflight_stats)
+
+def _request_field(name):
+    """A URL, JSON or form field of the current request, for usage attribution."""
+    value = (request.view_args or {}).get(name)
+    if value is None and request.is_json:
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+    if value is None and request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        value = request.form.get(name)
+    return value
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    set_request_id(request.headers.get('X-Request-ID'))
+    set_usage_context(endpoint=request.endpoint, teacher_id=session.get('teacher_id'),
+                      class_id=_request_field('class_id'), assignment_id=_request_field('assignment_id'))
+
+@app.after_request
+def record_request_time(response):
+    if 'request_start' in g and request.endpoint != 'metrics':
+        seconds = time.perf_counter() - g.request_start
+        observe_request(request.endpoint, request.method, response.status_code, seconds)
+        logger.info("Request handled", extra={
+            'endpoint': request.endpoint, 'method': request.method,
+            'status': response.status_code, 'duration_ms': round(seconds * 1000, 1)
+        })
+    response.headers['X-Request-ID'] = get_request_id() or ''
+    return response
+
+def _missing_field(data, required_fields):
+    """The error payload for the first missing required field, or None."""
+    for field in required_fields:
+        if field not in data:
+            return {
+                "error": "Missing required field: {}".format(field)
+            }
+    return None
+
+def _decode_image_field(image_data):
+    """
+    Decode a base64 image_file field.
+    
+    Returns:
+        tuple: (image bytes, None), or (None, error payload) for a 400 response
+    """
+    # Validate image data
+    if not image_data:
+        return None, {
+            "error": "Empty image data provided",
+            "details": "The image_file field contains no data"
+        }
+    
+    # Decode base64 image data
+    try:
+        # Handle potential padding issues in base64
+        padding = 4 - (len(image_data) % 4) if len(image_data) % 4 else 0
+        image_data = image_data + ('=' * padding)
+        
+        try:
+            with span('base64_decode'):
+                image_bytes = base64.b64decode(image_data)
+            logger.debug("Decoded image upload", extra={'bytes': len(image_bytes)})
+            
+            if len(image_bytes) < 100:  # Arbitrary small size check
+                return None, {
+                    "error": "Invalid image data",
+                    "details": "The decoded image is too small to be valid"
+                }
+                
+        except Exception as decode_error:
+            logger.warning("Base64 decoding error", extra={'error': str(decode_error)})
+            return None, {
+                "error": "Invalid base64 image data",
+                "details": str(decode_error)
+            }
+            
+    except Exception as e:
+        return None, {
+            "error": "Error processing image data",
+            "details": str(e)
+        }
+    return image_bytes, None
+
+def _log_image_metadata(extraction_result):
+    """
+    Log what metadata extraction found on an image.
+    
+    Returns:
+        tuple: (extracted_text, student_name, assignment_title)
+    """
+    extracted_text = extraction_result['extracted_text']
+    student_name_info = extraction_result['student_name_info']
+    student_name = student_name_info.get('student_name') if student_name_info else None
+    assignment_title_info = extraction_result.get('assignment_title_info', {})
+    assignment_title = assignment_title_info.get('assignment_title')
+    corner_text = extraction_result.get('corner_text', {})
+    
+    logger.info("Image metadata extracted", extra={
+        'name_found': bool(student_name),
+        'name_confidence': (student_name_info or {}).get('confidence'),
+        'title_found': bool(assignment_title),
+        'text_chars': len(extracted_text or "")
+    })
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Image metadata details", extra={
+            'student_name_info': payload(json.dumps(student_name_info)),
+            'assignment_title_info': payload(json.dumps(assignment_title_info)),
+            'corner_text': payload(json.dumps(corner_text))
+        })
+    return extracted_text, student_name, assignment_title
+
+def _add_image_metadata(result, extraction_result):
+    """Add the extracted text and metadata of an image to its grading result."""
+    student_name = (extraction_result['student_name_info'] or {}).get('student_name')
+    assignment_title = extraction_result.get('assignment_title_info', {}).get('assignment_title')
+    
+    result['extracted_text'] = extraction_result['extracted_text']
+    result['student_name_info'] = extraction_result['student_name_info']
+    result['assignment_title_info'] = extraction_result.get('assignment_title_info', {})
+    result['corner_text'] = extraction_result.get('corner_text', {})
+    result['processing_notes'] = extraction_result.get('processing_notes', 'No processing notes')
+    result['processing_method'] = 'Enhanced OCR + Corner Text Analysis + Gemini with Metadata Extraction'
+    
+    # Make sure student name is directly accessible in the result
+    if student_name:
+        result['student_name'] = student_name
+    
+    # Make sure assignment title is directly accessible in the result
+    if assignment_title:
+        result['assignment_title'] = assignment_title
+    return result
 
 @app.route('/grade', methods=['POST'])
 def grade():
@@ -107,12 +302,9 @@ def grade():
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['assignment_type', 'submission', 'rubric']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    "error": "Missing required field: {}".format(field)
-                }), 400
+        error = _missing_field(data, ['assignment_type', 'submission', 'rubric'])
+        if error:
+            return jsonify(error), 400
         
         # Extract data
         assignment_type = data['assignment_type']
@@ -127,8 +319,7 @@ def grade():
         
     except Exception as e:
         # Log the error
-        print(f"Error processing request: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing request")
         
         # Return error response
         return jsonify({
@@ -162,72 +353,22 @@ def grade_image():
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['assignment_type', 'image_file', 'rubric']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    "error": "Missing required field: {}".format(field)
-                }), 400
+        error = _missing_field(data, ['assignment_type', 'image_file', 'rubric'])
+        if error:
+            return jsonify(error), 400
         
         # Extract data
         assignment_type = data['assignment_type']
-        image_data = data['image_file']
         rubric = data['rubric']
         
-        # Validate image data
-        if not image_data:
-            return jsonify({
-                "error": "Empty image data provided",
-                "details": "The image_file field contains no data"
-            }), 400
-        
-        # Decode base64 image data
-        try:
-            # Handle potential padding issues in base64
-            padding = 4 - (len(image_data) % 4) if len(image_data) % 4 else 0
-            image_data = image_data + ('=' * padding)
-            
-            try:
-                image_bytes = base64.b64decode(image_data)
-                print(f"Successfully decoded image data, size: {len(image_bytes)} bytes")
-                
-                if len(image_bytes) < 100:  # Arbitrary small size check
-                    return jsonify({
-                        "error": "Invalid image data",
-                        "details": "The decoded image is too small to be valid"
-                    }), 400
-                    
-            except Exception as decode_error:
-                print(f"Base64 decoding error: {str(decode_error)}")
-                return jsonify({
-                    "error": "Invalid base64 image data",
-                    "details": str(decode_error)
-                }), 400
-                
-        except Exception as e:
-            return jsonify({
-                "error": "Error processing image data",
-                "details": str(e)
-            }), 400
+        # Validate and decode the base64 image data
+        image_bytes, error = _decode_image_field(data['image_file'])
+        if error:
+            return jsonify(error), 400
         
         # Extract text, student name, and assignment title using enhanced methods
-        print("Starting enhanced metadata extraction with corner text analysis...")
         extraction_result = extract_text_with_metadata_from_image(image_bytes, assignment_type)
-        extracted_text = extraction_result['extracted_text']
-        student_name_info = extraction_result['student_name_info']
-        student_name = student_name_info.get('student_name') if student_name_info else None
-        assignment_title_info = extraction_result.get('assignment_title_info', {})
-        assignment_title = assignment_title_info.get('assignment_title')
-        corner_text = extraction_result.get('corner_text', {})
-        
-        print(f"Extracted student name: {student_name}")
-        print(f"Extracted assignment title: {assignment_title}")
-        
-        # Enhanced debug logging for student name extraction
-        print(f"Student name info: {json.dumps(student_name_info)}")
-        print(f"Assignment title info: {json.dumps(assignment_title_info)}")
-        print(f"Corner text analysis: {json.dumps(corner_text)}")
-        print(f"Processing notes: {extraction_result.get('processing_notes', 'No processing notes')}")
+        extracted_text, student_name, assignment_title = _log_image_metadata(extraction_result)
         
         # Grade the assignment with student name and assignment title
         if hasattr(Config, 'GRADING_ENGINE') and Config.GRADING_ENGINE == 'gemini':
@@ -237,28 +378,14 @@ def grade_image():
             result = grade_assignment(assignment_type, extracted_text, rubric, student_name)
         
         # Add extracted text and metadata to the result
-        result['extracted_text'] = extracted_text
-        result['student_name_info'] = student_name_info
-        result['assignment_title_info'] = assignment_title_info
-        result['corner_text'] = corner_text
-        result['processing_notes'] = extraction_result.get('processing_notes', 'No processing notes')
-        result['processing_method'] = 'Enhanced OCR + Corner Text Analysis + Gemini with Metadata Extraction'
-        
-        # Make sure student name is directly accessible in the result
-        if student_name:
-            result['student_name'] = student_name
-        
-        # Make sure assignment title is directly accessible in the result
-        if assignment_title:
-            result['assignment_title'] = assignment_title
+        _add_image_metadata(result, extraction_result)
         
         # Return the grading result
         return jsonify(result), 200
         
     except Exception as e:
         # Log the error
-        print(f"Error processing image: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing image")
         
         # Return error response
         return jsonify({
@@ -303,8 +430,9 @@ def grade_image_legacy():
             image_data = image_data + ('=' * padding)
             
             try:
-                image_bytes = base64.b64decode(image_data)
-                print(f"Successfully decoded image data, size: {len(image_bytes)} bytes")
+                with span('base64_decode'):
+                    image_bytes = base64.b64decode(image_data)
+                logger.debug("Decoded image upload", extra={'bytes': len(image_bytes)})
                 
                 if len(image_bytes) < 100:  # Arbitrary small size check
                     return jsonify({
@@ -313,7 +441,7 @@ def grade_image_legacy():
                     }), 400
                     
             except Exception as decode_error:
-                print(f"Base64 decoding error: {str(decode_error)}")
+                logger.warning("Base64 decoding error", extra={'error': str(decode_error)})
                 return jsonify({
                     "error": "Invalid base64 image data",
                     "details": str(decode_error)
@@ -326,27 +454,25 @@ def grade_image_legacy():
             }), 400
         
         # Step 1: Detect if image contains diagrams (original approach)
-        print("Detecting diagrams in image...")
         diagram_info = detect_diagrams_in_image(image_bytes)
-        print(f"Diagram detection result: {diagram_info}")
+        logger.info("Diagram detection complete", extra={'has_diagrams': diagram_info.get('has_diagrams', False),
+                                                         'confidence': diagram_info.get('confidence')})
         
         # Step 2: Route to appropriate grading method (original logic)
         if diagram_info.get('has_diagrams', False) and diagram_info.get('confidence') in ['high', 'medium']:
-            print("Routing to GPT-4 Vision for diagram analysis...")
             try:
                 result = grade_assignment_with_vision(assignment_type, image_bytes, rubric, diagram_info)
                 result['processing_method'] = 'GPT-4 Vision (Legacy Diagram Detection)'
                 result['diagram_info'] = diagram_info
             except Exception as vision_error:
-                print(f"GPT-4 Vision grading failed: {str(vision_error)}")
-                print("Falling back to standard OCR + text grading...")
+                logger.warning("GPT-4 Vision grading failed, falling back to OCR and text grading",
+                               extra={'error': str(vision_error)})
                 # Fallback to standard process
                 extracted_text = extract_text_from_image(image_bytes, assignment_type)
                 result = grade_assignment(assignment_type, extracted_text, rubric)
                 result['processing_method'] = 'Standard OCR + Gemini (Vision Fallback)'
                 result['extracted_text'] = extracted_text
         else:
-            print("Using standard OCR + text grading process...")
             # Enhanced process: OCR with student name extraction
             ocr_result = extract_text_with_metadata_from_image(image_bytes, assignment_type)
             extracted_text = ocr_result['extracted_text']
@@ -363,8 +489,7 @@ def grade_image_legacy():
         
     except Exception as e:
         # Log the error
-        print(f"Error processing image: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing image")
         
         # Return error response
         return jsonify({
@@ -440,8 +565,7 @@ def grade_dropbox_alt():
         
     except Exception as e:
         # Log the error
-        print(f"Error processing Dropbox file: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing Dropbox file")
         
         # Return error response
         return jsonify({
@@ -496,8 +620,7 @@ def upload_file():
         
     except Exception as e:
         # Log the error
-        print("Error uploading file: {}".format(str(e)))
-        print(traceback.format_exc())
+        logger.exception("Error uploading file")
         
         # Return error response
         return jsonify({
@@ -590,8 +713,7 @@ def grade_uploaded_file():
         
     except Exception as e:
         # Log the error
-        print("Error processing uploaded file: {}".format(str(e)))
-        print(traceback.format_exc())
+        logger.exception("Error processing uploaded file")
         
         # Return error response
         return jsonify({
@@ -674,8 +796,7 @@ def grade_dropbox():
         
     except Exception as e:
         # Log the error
-        print(f"Error processing Dropbox file: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing Dropbox file")
         
         # Return error response
         return jsonify({
@@ -683,13 +804,6 @@ def grade_dropbox():
             "details": str(e)
         }), 500
 
-# Add this after your other imports
-import os
-
-# Add this after the upload folder creation
-# Create assignment folder if it doesn't exist
-os.makedirs(Config.ASSIGNMENT_FOLDER, exist_ok=True)
-
 # Add this new route to your app.py file
 @app.route('/grade-assignment', methods=['POST'])
 def grade_assignment_file():
@@ -754,8 +868,7 @@ def grade_assignment_file():
         
     except Exception as e:
         # Log the error
-        print("Error processing assignment file: {}".format(str(e)))
-        print(traceback.format_exc())
+        logger.exception("Error processing assignment file")
         
         # Return error response
         return jsonify({
@@ -815,8 +928,9 @@ def process_rubric():
             padding = 4 - (len(file_data) % 4) if len(file_data) % 4 else 0
             file_data = file_data + ('=' * padding)
             
-            file_bytes = base64.b64decode(file_data)
-            print(f"Successfully decoded file data, size: {len(file_bytes)} bytes")
+            with span('base64_decode'):
+                file_bytes = base64.b64decode(file_data)
+            logger.debug("Decoded rubric upload", extra={'bytes': len(file_bytes)})
             
             if len(file_bytes) < 10:  # Arbitrary small size check
                 return jsonify({
@@ -825,7 +939,7 @@ def process_rubric():
                 }), 400
                 
         except Exception as decode_error:
-            print(f"Base64 decoding error: {str(decode_error)}")
+            logger.warning("Base64 decoding error", extra={'error': str(decode_error)})
             return jsonify({
                 "error": "Invalid base64 file data",
                 "details": str(decode_error)
@@ -833,9 +947,8 @@ def process_rubric():
         
         # Extract text from the file
         try:
-            print(f"Extracting text from file: {filename}")
             rubric_content = extract_text_from_file(file_bytes, filename)
-            print(f"Text extraction complete. Extracted {len(rubric_content)} characters")
+            logger.info("Extracted rubric text", extra={'chars': len(rubric_content)})
             
             # Check for processing errors
             if rubric_content.startswith("[FILE PROCESSING ERROR:"):
@@ -851,22 +964,24 @@ def process_rubric():
                 }), 400
                 
         except Exception as processing_error:
-            print(f"File processing error: {str(processing_error)}")
-            print(traceback.format_exc())
+            logger.exception("File processing error")
             return jsonify({
                 "error": "File processing failed",
                 "details": str(processing_error)
             }), 500
         
+        # Compile once so every submission graded with it reuses the result
+        compiled_rubric = get_compiled_rubric(rubric_content)
+        
         # Return the extracted rubric content
         return jsonify({
-            "rubric_content": rubric_content
+            "rubric_content": rubric_content,
+            "compiled_rubric": compiled_rubric
         }), 200
         
     except Exception as e:
         # Log the error
-        print(f"Error processing rubric file: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing rubric file")
         
         # Return error response
         return jsonify({
@@ -890,12 +1005,12 @@ def grade_pdf_direct():
     Returns:
     {
         "score": "8/10",
-        "feedback": "Detailed feedback here"
+        "feedback": "Detailed feedback here",
+        "skipped_pages": [blank or duplicate pages that were not graded]
     }
     """
     try:
         from file_processor.document_processor import extract_text_from_file
-        from openai import OpenAI
         import base64
         import json
         import traceback
@@ -930,8 +1045,9 @@ def grade_pdf_direct():
         try:
             padding = 4 - (len(file_data) % 4) if len(file_data) % 4 else 0
             file_data = file_data + ('=' * padding)
-            file_bytes = base64.b64decode(file_data)
-            print(f"Successfully decoded PDF file data, size: {len(file_bytes)} bytes")
+            with span('base64_decode'):
+                file_bytes = base64.b64decode(file_data)
+            logger.debug("Decoded PDF upload", extra={'bytes': len(file_bytes)})
         except Exception as decode_error:
             return jsonify({
                 "error": "Invalid base64 file data",
@@ -940,8 +1056,8 @@ def grade_pdf_direct():
         
         # FORCE GPT-4 Vision processing - skip text extraction entirely
         try:
-            print("Converting PDF to images for GPT-4 Vision (FORCED MODE)...")
-            images = convert_from_bytes(file_bytes, dpi=300, fmt='PNG')  # Higher DPI
+            with span('pdf_rasterize'):
+                images = convert_from_bytes(file_bytes, dpi=300, fmt='PNG')  # Higher DPI
             
             if not images or len(images) == 0:
                 return jsonify({
@@ -949,26 +1065,29 @@ def grade_pdf_direct():
                     "details": "Could not convert PDF to images for GPT-4 Vision processing. Please ensure the PDF contains readable content."
                 }), 500
             
-            print(f"Successfully converted PDF to {len(images)} image(s) for GPT-4 Vision")
+            logger.info("Converted PDF for vision grading", extra={'pages': len(images)})
             
-            # Process with GPT-4 Vision directly
-            client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            # Blank backs and duplicate scans are never sent to the model
+            kept, skipped_pages = filter_pages(images)
+            page_numbers = [i + 1 for i in kept]
+            images = [images[i] for i in kept]
             
-            # Prepare images for GPT-4 Vision
-            image_contents = []
-            for i, img in enumerate(images):
-                # Convert PIL image to base64
+            # PDFs too large for one request are graded in concurrent page
+            # groups sized by image tokens
+            image_tokens = sum(estimate_image_tokens(*img.size) for img in images)
+            if len(images) > 1 and image_tokens > Config.VISION_GROUP_TOKEN_BUDGET:
+                result = grade_pdf_page_groups(images, assignment_type, rubric, page_numbers=page_numbers)
+                result['skipped_pages'] = skipped_pages
+                logger.info("Page-group grading complete",
+                            extra={'pages': len(images), 'seconds': result['total_seconds']})
+                return jsonify(result), 200
+            
+            # Process with GPT-4 Vision directly
+            page_images = []
+            for img in images:
                 img_byte_arr = io.BytesIO()
                 img.save(img_byte_arr, format='PNG')
-                img_bytes = img_byte_arr.getvalue()
-                base64_image = base64.b64encode(img_bytes).decode('utf-8')
-                
-                image_contents.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{base64_image}"
-                    }
-                })
+                page_images.append(img_byte_arr.getvalue())
             
             # Create comprehensive grading prompt
             vision_prompt = f"""Grade this {assignment_type} assignment using GPT-4 Vision with maximum accuracy.
@@ -997,44 +1116,15 @@ Respond in JSON format:
     "pages_processed": {len(images)}
 }}"""
             
-            # Prepare messages with text and all images
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": vision_prompt
-                        }
-                    ] + image_contents
-                }
-            ]
-            
             # Call GPT-4 Vision
-            response = client.chat.completions.create(
-                model=Config.OPENAI_VISION_MODEL,
-                messages=messages,
-                max_tokens=4000,
-                temperature=0.1
-            )
-            
-            # Parse response
-            content = response.choices[0].message.content.strip()
+            result = get_backend().vision_json(vision_prompt, page_images, max_tokens=4000)
+            result['skipped_pages'] = skipped_pages
             
-            # Clean JSON if needed
-            if content.startswith('```json'):
-                content = content[7:-3].strip()
-            elif content.startswith('```'):
-                content = content[3:-3].strip()
-            
-            result = json.loads(content)
-            
-            print(f"GPT-4 Vision grading completed successfully for {len(images)} pages")
+            logger.info("Vision grading complete", extra={'pages': len(images)})
             return jsonify(result), 200
             
         except Exception as e:
-            print(f"GPT-4 Vision PDF processing error: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception("Vision PDF grading failed")
             return jsonify({
                 "error": "GPT-4 Vision processing failed",
                 "details": f"Could not process PDF with GPT-4 Vision: {str(e)}"
@@ -1053,8 +1143,7 @@ Respond in JSON format:
             }), 500
     
     except Exception as e:
-        print(f"Error in direct PDF grading: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Direct PDF grading failed")
         return jsonify({
             "error": "An error occurred while grading the PDF",
             "details": str(e)
@@ -1078,12 +1167,12 @@ def grade_pdf_vision_only():
     {
         "score": "8/10",
         "feedback": "Detailed feedback here",
-        "individual_pages": [page results]
+        "individual_pages": [page results],
+        "skipped_pages": [blank or duplicate pages that were not graded]
     }
     """
     try:
         from file_processor.document_processor import extract_text_from_file
-        from openai import OpenAI
         import base64
         import json
         import traceback
@@ -1118,8 +1207,9 @@ def grade_pdf_vision_only():
         try:
             padding = 4 - (len(file_data) % 4) if len(file_data) % 4 else 0
             file_data = file_data + ('=' * padding)
-            file_bytes = base64.b64decode(file_data)
-            print(f"Successfully decoded PDF file data, size: {len(file_bytes)} bytes")
+            with span('base64_decode'):
+                file_bytes = base64.b64decode(file_data)
+            logger.debug("Decoded PDF upload", extra={'bytes': len(file_bytes)})
         except Exception as decode_error:
             return jsonify({
                 "error": "Invalid base64 file data",
@@ -1127,8 +1217,8 @@ def grade_pdf_vision_only():
             }), 400
         
         # FORCE Vision-only processing
-        print("VISION-ONLY MODE: Converting PDF to images...")
-        images = convert_from_bytes(file_bytes, dpi=300, fmt='PNG')
+        with span('pdf_rasterize'):
+            images = convert_from_bytes(file_bytes, dpi=300, fmt='PNG')
         
         if not images or len(images) == 0:
             return jsonify({
@@ -1136,30 +1226,34 @@ def grade_pdf_vision_only():
                 "details": "Could not convert PDF to images. Please try uploading as individual image files."
             }), 500
             
-        print(f"Successfully converted PDF to {len(images)} image(s) for Vision-only processing")
-        
-        # Use the enhanced vision grading from analyze_and_grade_mcq_diagrams_first
-        from image_processor.ocr import analyze_and_grade_mcq_diagrams_first
-        
-        # Process each page and combine results
-        all_results = []
-        for i, img in enumerate(images):
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_bytes = img_byte_arr.getvalue()
-            
-            page_result = analyze_and_grade_mcq_diagrams_first(img_bytes, assignment_type, rubric)
-            page_result['page_number'] = i + 1
-            all_results.append(page_result)
-        
-        # Combine results from all pages
-        combined_result = {
-            "score": "Combined from all pages",
-            "feedback": "\n\n".join([f"**Page {r['page_number']}:**\n{r.get('feedback', '')}" for r in all_results]),
-            "processing_method": "GPT-4 Vision Only (Multi-page PDF)",
-            "pages_processed": len(images),
-            "individual_pages": all_results
-        }
+        logger.info("Converted PDF for vision-only grading", extra={'pages': len(images)})
+        
+        # Drop blank and duplicate pages
+        kept, skipped_pages = filter_pages(images)
+        
+        if len(kept) == 1:
+            # One page keeps the per-page path: offline OMR for bubble sheets,
+            # then MCQ- and diagram-first vision grading
+            combined_result = analyze_and_grade_mcq_diagrams_first(_png_bytes(images[kept[0]]), assignment_type, rubric)
+            combined_result['pages_processed'] = 1
+            combined_result['individual_pages'] = [{
+                "page_number": kept[0] + 1,
+                "processing_method": combined_result.get('processing_method')
+            }]
+        else:
+            # Bubble sheets are graded offline; the other pages are graded in
+            # concurrent page groups and everything is merged into one score
+            graded_pages = {}
+            if parse_answer_key(rubric):
+                for i in kept:
+                    sheet = grade_bubble_sheet_if_possible(_png_bytes(images[i]), rubric)
+                    if sheet:
+                        graded_pages[i + 1] = omr_page_result(sheet, i + 1, rubric)
+            pending = [i for i in kept if i + 1 not in graded_pages]
+            combined_result = grade_pdf_page_groups([images[i] for i in pending], assignment_type, rubric,
+                                                    page_numbers=[i + 1 for i in pending],
+                                                    graded_pages=graded_pages)
+        combined_result['skipped_pages'] = skipped_pages
         
         return jsonify(combined_result), 200
         
@@ -1176,8 +1270,7 @@ def grade_pdf_vision_only():
             }), 500
     
     except Exception as e:
-        print(f"Vision-only PDF processing error: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Vision-only PDF grading failed")
         return jsonify({
             "error": "Vision-only processing failed",
             "details": str(e)
@@ -1212,16 +1305,12 @@ def grade_and_store_assignment():
         if grade_data.get('student_name_info', {}).get('student_name'):
             student_name = grade_data['student_name_info']['student_name']
             
-            # Load existing students
-            with open(STUDENTS_FILE, 'r') as f:
-                students = json.load(f)
-            
-            # Try to find matching student
-            matching_student = None
-            for student in students:
-                if student_name.lower() in student['name'].lower() or student['name'].lower() in student_name.lower():
-                    matching_student = student
-                    break
+            # Find the best fuzzy match, scoped to the class when one is given
+            matching_student, candidates = student_index.best_match(student_name, data.get('class_id'))
+            grade_data['name_match_candidates'] = [
+                {"student_id": c['student']['id'], "student_name": c['student']['name'], "score": c['score']}
+                for c in candidates
+            ]
             
             if matching_student:
                 # Store the grade with student association
@@ -1232,6 +1321,7 @@ def grade_and_store_assignment():
                     "detected_name": student_name,
                     "assignment_type": data.get('assignment_type'),
                     "score": grade_data.get('score'),
+                    "score_normalized": grade_data.get('score_normalized') or normalize_grading_result(grade_data),
                     "feedback": grade_data.get('feedback'),
                     "extracted_text": grade_data.get('extracted_text'),
                     "processing_method": grade_data.get('processing_method'),
@@ -1241,16 +1331,23 @@ def grade_and_store_assignment():
                 }
                 
                 # Load and update grades
+                previous_signature = _file_signature(GRADES_FILE)
                 with open(GRADES_FILE, 'r') as f:
                     grades = json.load(f)
                 
                 grades.append(grade_entry)
                 
-                with open(GRADES_FILE, 'w') as f:
+                with span('grades_write'), open(GRADES_FILE, 'w') as f:
                     json.dump(grades, f, indent=2)
                 
+                grade_stats.record(grade_entry, previous_signature)
+                
                 grade_data['stored_grade'] = True
                 grade_data['matched_student'] = matching_student['name']
+                grade_data['match_score'] = candidates[0]['score']
+            elif candidates:
+                grade_data['stored_grade'] = False
+                grade_data['reason'] = 'Detected name matches several students; choose one of the candidates'
             else:
                 grade_data['stored_grade'] = False
                 grade_data['reason'] = 'No matching student found in database'
@@ -1267,7 +1364,6 @@ def grade_and_store_assignment():
         }), 500
     try:
         from file_processor.document_processor import extract_text_from_file
-        from openai import OpenAI
         import base64
         import json
         import traceback
@@ -1302,8 +1398,9 @@ def grade_and_store_assignment():
         try:
             padding = 4 - (len(file_data) % 4) if len(file_data) % 4 else 0
             file_data = file_data + ('=' * padding)
-            file_bytes = base64.b64decode(file_data)
-            print(f"Successfully decoded PDF file data, size: {len(file_bytes)} bytes")
+            with span('base64_decode'):
+                file_bytes = base64.b64decode(file_data)
+            logger.debug("Decoded PDF upload", extra={'bytes': len(file_bytes)})
         except Exception as decode_error:
             return jsonify({
                 "error": "Invalid base64 file data",
@@ -1317,23 +1414,21 @@ def grade_and_store_assignment():
         
         # First attempt: Convert PDF to images for GPT-4 Vision
         try:
-            print("Converting PDF to images for GPT-4 Vision...")
-            images = convert_from_bytes(file_bytes, dpi=200, fmt='PNG')
+            with span('pdf_rasterize'):
+                images = convert_from_bytes(file_bytes, dpi=200, fmt='PNG')
             
             if images and len(images) > 0:
-                print(f"Successfully converted PDF to {len(images)} image(s)")
+                logger.info("Converted PDF for vision grading", extra={'pages': len(images)})
                 use_vision = True
             else:
-                print("PDF conversion produced no images, falling back to text extraction")
+                logger.warning("PDF conversion produced no images, falling back to text extraction")
         except Exception as image_error:
-            print(f"PDF to image conversion failed: {str(image_error)}")
-            print("Falling back to text extraction...")
+            logger.warning("PDF to image conversion failed, falling back to text extraction",
+                           extra={'error': str(image_error)})
         
         # Fallback: Extract text if image conversion failed
         if not use_vision:
             try:
-                print("Extracting text from PDF for grading...")
-                
                 # Save PDF bytes to temporary file for processing
                 with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
                     temp_file.write(file_bytes)
@@ -1351,35 +1446,17 @@ def grade_and_store_assignment():
                         "details": "PDF could not be converted to images or text. Please try uploading as an image file."
                     }), 500
                 
-                print(f"Successfully extracted {len(extracted_text)} characters from PDF")
+                logger.info("Extracted PDF text for grading", extra={'chars': len(extracted_text)})
             except Exception as extraction_error:
-                print(f"PDF text extraction error: {str(extraction_error)}")
-                print(traceback.format_exc())
+                logger.exception("PDF text extraction failed")
                 return jsonify({
                     "error": "PDF processing failed",
                     "details": str(extraction_error)
                 }), 500
         
-        # Initialize OpenAI client
-        client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Prepare content for GPT-4 based on processing method
+        # Prepare content for the model based on processing method
         if use_vision:
-            # Prepare images for GPT-4 Vision
-            image_contents = []
-            for i, img in enumerate(images):
-                # Convert PIL image to base64
-                import io
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG')
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                
-                image_contents.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{img_base64}"
-                    }
-                })
+            page_images = [_png_bytes(img) for img in images]
             
             # Create grading prompt for vision
             grading_prompt = f"""
@@ -1402,13 +1479,6 @@ Please respond in JSON format:
     "feedback": "detailed feedback explaining the grade"
 }}
 """
-            
-            # Prepare message content for vision
-            message_content = [{"type": "text", "text": grading_prompt}]
-            message_content.extend(image_contents)
-            
-            print("Sending PDF images to GPT-4 Vision for direct grading...")
-            print(f"Message content items: {len(message_content)}")
         else:
             # Create grading prompt for text
             grading_prompt = f"""
@@ -1434,87 +1504,39 @@ Please respond in JSON format:
     "feedback": "detailed feedback explaining the grade"
 }}
 """
-            
-            print("Sending PDF text to GPT-4 for direct grading...")
-            print(f"Message content length: {len(grading_prompt)} characters")
         
-        # Call GPT-4 for grading
+        # Grade through the backend: GPT-4o for page images, the text model
+        # otherwise
+        model_name = "GPT-4 Vision" if use_vision else "text model"
         try:
             if use_vision:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": message_content
-                        }
-                    ],
-                    max_tokens=1500,
-                    temperature=0.3
-                )
-                print("Successfully received response from GPT-4 Vision")
+                result = get_backend().vision_json(grading_prompt, page_images, max_tokens=1500, temperature=0.3)
             else:
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": grading_prompt
-                        }
-                    ],
-                    max_tokens=1500,
-                    temperature=0.3
-                )
-                print("Successfully received response from GPT-4")
+                result = get_backend().generate_json(grading_prompt, max_output_tokens=1500)
+        except ValueError as parse_error:
+            return jsonify({
+                "error": "Failed to parse GPT response",
+                "details": str(parse_error)
+            }), 500
         except Exception as gpt_error:
-            model_name = "GPT-4 Vision" if use_vision else "GPT-4"
-            print(f"{model_name} API error: {str(gpt_error)}")
-            print(traceback.format_exc())
+            logger.exception("PDF grading model call failed", extra={'model': model_name})
             return jsonify({
                 "error": f"{model_name} API failed",
                 "details": str(gpt_error)
             }), 500
+        logger.info("PDF grading model call returned", extra={'model': model_name})
         
-        # Extract and parse the response
-        gpt_response = response.choices[0].message.content.strip()
-        model_name = "GPT-4 Vision" if use_vision else "GPT-4"
-        print(f"{model_name} response: {gpt_response}")
-        
-        # Parse JSON response
-        try:
-            import json
-            import re
-            
-            # Clean up the response by removing markdown code blocks if present
-            cleaned_response = gpt_response
-            if cleaned_response.startswith("```json"):
-                cleaned_response = re.sub(r'^```json\s*', '', cleaned_response)
-                cleaned_response = re.sub(r'\s*```$', '', cleaned_response)
-            elif cleaned_response.startswith("```"):
-                cleaned_response = re.sub(r'^```\s*', '', cleaned_response)
-                cleaned_response = re.sub(r'\s*```$', '', cleaned_response)
-            
-            cleaned_response = cleaned_response.strip()
-            print(f"Cleaned response for parsing: {cleaned_response}")
-            
-            result = json.loads(cleaned_response)
-            
-            if 'score' not in result or 'feedback' not in result:
-                raise ValueError("Missing required fields in GPT response")
-            
-            return jsonify({
-                "score": result['score'],
-                "feedback": result['feedback']
-            }), 200
-            
-        except json.JSONDecodeError:
-            # Fallback parsing if JSON is malformed
+        if 'score' not in result or 'feedback' not in result:
             return jsonify({
                 "error": "Failed to parse GPT response",
-                "details": "GPT response was not valid JSON",
-                "raw_response": gpt_response
+                "details": "Missing required fields in GPT response"
             }), 500
         
+        return jsonify({
+            "score": result['score'],
+            "feedback": result['feedback']
+        }), 200
+        
     except ImportError as e:
         if "pdf2image" in str(e):
             return jsonify({
@@ -1528,8 +1550,7 @@ Please respond in JSON format:
             }), 500
     
     except Exception as e:
-        print(f"Error in direct PDF grading: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Direct PDF grading failed")
         return jsonify({
             "error": "An error occurred while grading the PDF",
             "details": str(e)
@@ -1631,8 +1652,7 @@ def grade_file_upload():
         
     except Exception as e:
         # Log the error
-        print("Error processing file upload: {}".format(str(e)))
-        print(traceback.format_exc())
+        logger.exception("Error processing file upload")
         
         # Return error response
         return jsonify({
@@ -1701,14 +1721,47 @@ def grade_batch_upload():
         total_files = len(files)
         processed = 0
         failed = 0
-        total_score = 0
-        
+        batch_stats = RunningStats()
+        
+        # Image uploads graded against an MCQ answer key are read as a stack
+        # of bubble sheets first; sheets OMR cannot read fall through to OCR
+        omr_results = {}
+        answer_key = parse_answer_key(rubric)
+        image_files = [f for f in files if os.path.splitext(f.filename.lower())[1] in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']]
+        if answer_key and image_files:
+            sheet_images = []
+            for f in image_files:
+                sheet_images.append(f.read())
+                f.seek(0)
+            for f, sheet in zip(image_files, grade_bubble_sheets(sheet_images, answer_key)):
+                if sheet and sheet.get('registered'):
+                    omr_results[id(f)] = omr_grading_result(sheet)
+            logger.info("OMR graded image uploads offline", extra={'graded': len(omr_results),
+                                                                   'images': len(image_files)})
+        
+        pending = []
         for file in files:
             if file.filename == '':
                 continue
                 
             try:
                 filename = file.filename
+                
+                if id(file) in omr_results:
+                    grading_result = omr_results[id(file)]
+                    results.append({
+                        "filename": filename,
+                        "score": grading_result['score'],
+                        "score_normalized": grading_result['score_normalized'],
+                        "feedback": grading_result['feedback'],
+                        "extracted_text": "",
+                        "grading_method": grading_result['grading_method'],
+                        "needs_review": grading_result['omr']['needs_review']
+                    })
+                    processed += 1
+                    batch_stats.add(grading_result['score_normalized']['percentage'])
+                    continue
+                
                 file_bytes = file.read()
                 
                 # Determine file type and extract text
@@ -1743,44 +1796,12 @@ def grade_batch_upload():
                     failed += 1
                     continue
                 
-                # Grade the assignment
-                grading_result = grade_assignment(assignment_type, extracted_text, rubric)
-                
-                # Add filename and extracted text to result
-                score_value = grading_result.get('score', 0)
-                
-                # Convert score to numeric value for calculation
-                numeric_score = 0
-                if isinstance(score_value, str) and '/' in score_value:
-                    # Handle fractional scores like "7/10"
-                    try:
-                        parts = score_value.split('/')
-                        if len(parts) == 2:
-                            earned = float(parts[0])
-                            total = float(parts[1])
-                            numeric_score = (earned / total) * 100  # Convert to percentage
-                    except (ValueError, ZeroDivisionError):
-                        numeric_score = 0
-                else:
-                    # Handle numeric scores
-                    try:
-                        numeric_score = float(score_value)
-                    except (ValueError, TypeError):
-                        numeric_score = 0
-                
-                result = {
-                    "filename": filename,
-                    "score": score_value,  # Keep original score format for display
-                    "feedback": grading_result.get('feedback', ''),
-                    "extracted_text": extracted_text
-                }
-                
-                results.append(result)
-                processed += 1
-                total_score += numeric_score  # Use numeric score for calculation
+                # Graded after extraction, once per group of identical answers
+                pending.append((len(results), filename, extracted_text))
+                results.append(None)
                 
             except Exception as file_error:
-                print(f"Error processing file {file.filename}: {str(file_error)}")
+                logger.exception("Error processing uploaded file in batch")
                 results.append({
                     "filename": file.filename,
                     "error": "File processing failed",
@@ -1788,15 +1809,46 @@ def grade_batch_upload():
                 })
                 failed += 1
         
-        # Calculate average score
-        average_score = total_score / processed if processed > 0 else 0
+        # Grade the extracted submissions, once per group of identical answers
+        grading_results, grouping = grade_grouped(
+            [text for _, _, text in pending],
+            lambda text: grade_assignment(assignment_type, text, rubric)
+        )
+        for (position, filename, extracted_text), grading_result in zip(pending, grading_results):
+            if isinstance(grading_result, Exception):
+                results[position] = {
+                    "filename": filename,
+                    "error": "File processing failed",
+                    "details": str(grading_result)
+                }
+                failed += 1
+                continue
+            
+            # Add filename and extracted text to result
+            score_normalized = grading_result.get('score_normalized') or normalize_grading_result(grading_result)
+            
+            result = {
+                "filename": filename,
+                "score": grading_result.get('score', 0),  # Keep original score format for display
+                "score_normalized": score_normalized,
+                "feedback": grading_result.get('feedback', ''),
+                "extracted_text": extracted_text
+            }
+            if 'answer_group' in grading_result:
+                result['answer_group'] = {**grading_result['answer_group'],
+                                          "representative": pending[grading_result['answer_group']['representative']][1]}
+            
+            results[position] = result
+            processed += 1
+            batch_stats.add(score_normalized['percentage'])
         
         # Prepare summary
         summary = {
             "total_files": total_files,
             "processed": processed,
             "failed": failed,
-            "average_score": round(average_score, 1)
+            "average_score": round(batch_stats.mean, 1),
+            "answer_grouping": grouping
         }
         
         # Generate Excel file
@@ -1827,9 +1879,7 @@ def grade_batch_upload():
                 }
             }), 200
         except Exception as excel_error:
-            print(f"Error generating Excel file: {str(excel_error)}")
-            import traceback as tb
-            print(tb.format_exc())
+            logger.exception("Error generating Excel file")
             # Return results without Excel if there's an error
             return jsonify({
                 "results": results,
@@ -1839,8 +1889,7 @@ def grade_batch_upload():
         
     except Exception as e:
         # Log the error
-        print(f"Error processing batch upload: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error processing batch upload")
         
         # Return error response
         return jsonify({
@@ -1893,6 +1942,7 @@ def contact():
         email_subject = f"SnapGrade Contact: {subject_map.get(data['subject'], 'Contact Form')}"
         
         # Create message
+        from flask_mail import Message
         msg = Message(
             subject=email_subject,
             recipients=[Config.CONTACT_EMAIL],
@@ -1915,7 +1965,7 @@ This message was sent from the SnapGrade contact form.
         """
         
         # Send email
-        mail.send(msg)
+        get_mail().send(msg)
         
         return jsonify({
             "success": True,
@@ -1923,8 +1973,7 @@ This message was sent from the SnapGrade contact form.
         })
         
     except Exception as e:
-        print(f"Error sending contact email: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error sending contact email")
         return jsonify({
             "success": False,
             "error": "Failed to send message. Please try again later.",
@@ -1941,7 +1990,7 @@ def get_rubrics():
             rubrics = json.load(f)
         return jsonify({"rubrics": rubrics}), 200
     except Exception as e:
-        print(f"Error getting rubrics: {str(e)}")
+        logger.error("Error getting rubrics", extra={'error': str(e)})
         return jsonify({"error": "Failed to retrieve rubrics"}), 500
 
 @app.route('/rubrics', methods=['POST'])
@@ -1973,13 +2022,16 @@ def create_rubric():
         with open(RUBRICS_FILE, 'r') as f:
             rubrics = json.load(f)
         
-        # Create new rubric
+        # Create new rubric, compiled once and stored with its content hash
+        compiled_rubric = get_compiled_rubric(data['content'].strip())
         new_rubric = {
             "id": str(uuid.uuid4()),
             "name": data['name'].strip(),
             "description": data['description'].strip(),
             "type": data['type'].strip(),
             "content": data['content'].strip(),
+            "content_hash": compiled_rubric['hash'],
+            "compiled": compiled_rubric,
             "created_date": datetime.now().strftime("%b %d, %Y"),
             "created_timestamp": datetime.now().isoformat()
         }
@@ -1998,8 +2050,7 @@ def create_rubric():
         }), 201
         
     except Exception as e:
-        print(f"Error creating rubric: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error creating rubric")
         return jsonify({
             "success": False,
             "error": "Failed to create rubric",
@@ -2029,7 +2080,7 @@ def delete_rubric(rubric_id):
         }), 200
         
     except Exception as e:
-        print(f"Error deleting rubric: {str(e)}")
+        logger.error("Error deleting rubric", extra={'error': str(e)})
         return jsonify({
             "success": False,
             "error": "Failed to delete rubric"
@@ -2052,7 +2103,7 @@ def get_classes():
         
         return jsonify(teacher_classes), 200
     except Exception as e:
-        print(f"Error loading classes: {str(e)}")
+        logger.error("Error loading classes", extra={'error': str(e)})
         return jsonify({"error": "Failed to load classes"}), 500
 
 @app.route('/classes', methods=['POST'])
@@ -2101,7 +2152,7 @@ def create_class():
         }), 201
         
     except Exception as e:
-        print(f"Error creating class: {str(e)}")
+        logger.error("Error creating class", extra={'error': str(e)})
         return jsonify({
             "success": False,
             "error": "Failed to create class"
@@ -2128,20 +2179,23 @@ def delete_class(class_id):
         students = [s for s in students if s['class_id'] != class_id]
         with open(STUDENTS_FILE, 'w') as f:
             json.dump(students, f, indent=2)
+        student_index.remove_class(class_id)
         
         with open(GRADES_FILE, 'r') as f:
             grades = json.load(f)
         grades = [g for g in grades if g['class_id'] != class_id]
-        with open(GRADES_FILE, 'w') as f:
+        with span('grades_write'), open(GRADES_FILE, 'w') as f:
             json.dump(grades, f, indent=2)
         
+        grade_stats.invalidate()
+        
         return jsonify({
             "success": True,
             "message": "Class deleted successfully"
         }), 200
         
     except Exception as e:
-        print(f"Error deleting class: {str(e)}")
+        logger.error("Error deleting class", extra={'error': str(e)})
         return jsonify({
             "success": False,
             "error": "Failed to delete class"
@@ -2170,7 +2224,7 @@ def get_students(class_id):
         class_students = [s for s in students if s['class_id'] == class_id]
         return jsonify(class_students), 200
     except Exception as e:
-        print(f"Error loading students: {str(e)}")
+        logger.error("Error loading students", extra={'error': str(e)})
         return jsonify({"error": "Failed to load students"}), 500
 
 @app.route('/classes/<class_id>/students', methods=['POST'])
@@ -2208,6 +2262,7 @@ def add_student(class_id):
         # Save back to file
         with open(STUDENTS_FILE, 'w') as f:
             json.dump(students, f, indent=2)
+        student_index.add(new_student)
         
         # Update class student count
         with open(CLASSES_FILE, 'r') as f:
@@ -2228,7 +2283,7 @@ def add_student(class_id):
         }), 201
         
     except Exception as e:
-        print(f"Error adding student: {str(e)}")
+        logger.error("Error adding student", extra={'error': str(e)})
         return jsonify({
             "success": False,
             "error": "Failed to add student"
@@ -2255,6 +2310,7 @@ def delete_student(student_id):
         # Save back to file
         with open(STUDENTS_FILE, 'w') as f:
             json.dump(students, f, indent=2)
+        student_index.remove(student_id, class_id)
         
         # Update class student count
         with open(CLASSES_FILE, 'r') as f:
@@ -2272,16 +2328,18 @@ def delete_student(student_id):
         with open(GRADES_FILE, 'r') as f:
             grades = json.load(f)
         grades = [g for g in grades if g['student_id'] != student_id]
-        with open(GRADES_FILE, 'w') as f:
+        with span('grades_write'), open(GRADES_FILE, 'w') as f:
             json.dump(grades, f, indent=2)
         
+        grade_stats.invalidate()
+        
         return jsonify({
             "success": True,
             "message": "Student deleted successfully"
         }), 200
         
     except Exception as e:
-        print(f"Error deleting student: {str(e)}")
+        logger.error("Error deleting student", extra={'error': str(e)})
         return jsonify({
             "success": False,
             "error": "Failed to delete student"
@@ -2332,6 +2390,7 @@ def submit_batch_assignment(class_id):
         
         # Create assignment record
         assignment_id = str(uuid.uuid4())
+        update_usage_context(assignment_id=assignment_id)
         assignment = {
             "id": assignment_id,
             "class_id": class_id,
@@ -2349,19 +2408,20 @@ def submit_batch_assignment(class_id):
         with open(ASSIGNMENTS_FILE, 'w') as f:
             json.dump(assignments, f, indent=2)
         
-        # Grade each submission
+        # Grade each submission, once per group of identical answers
         graded_results = []
+        grade_results, grouping = grade_grouped(
+            data['submissions'],
+            lambda text: grade_assignment(data['assignment_type'], text, data['rubric_content'])
+        )
         for i, submission in enumerate(data['submissions']):
             if i < len(class_students):
                 student = class_students[i]
+                grade_result = grade_results[i]
                 
-                # Grade the submission using the existing grading logic
                 try:
-                    grade_result = grade_assignment(
-                        data['assignment_type'],
-                        submission,
-                        data['rubric_content']
-                    )
+                    if isinstance(grade_result, Exception):
+                        raise grade_result
                     
                     # Create grade record
                     grade_record = {
@@ -2372,14 +2432,20 @@ def submit_batch_assignment(class_id):
                         "student_name": student['name'],
                         "submission": submission,
                         "score": grade_result.get('score', 0),
+                        "score_normalized": grade_result.get('score_normalized') or normalize_grading_result(grade_result),
                         "feedback": grade_result.get('feedback', ''),
                         "graded_at": datetime.now().isoformat()
                     }
+                    if 'answer_group' in grade_result:
+                        grade_record['answer_group'] = {
+                            **grade_result['answer_group'],
+                            "representative": class_students[grade_result['answer_group']['representative']]['name']
+                        }
                     
                     graded_results.append(grade_record)
                     
                 except Exception as e:
-                    print(f"Error grading submission for student {student['name']}: {str(e)}")
+                    logger.error("Error grading submission", extra={'student_id': student['id'], 'error': str(e)})
                     # Create a grade record with error
                     grade_record = {
                         "id": str(uuid.uuid4()),
@@ -2389,18 +2455,22 @@ def submit_batch_assignment(class_id):
                         "student_name": student['name'],
                         "submission": submission,
                         "score": 0,
+                        "score_normalized": error_score(),
                         "feedback": f"Error grading submission: {str(e)}",
                         "graded_at": datetime.now().isoformat()
                     }
                     graded_results.append(grade_record)
         
         # Save all grades
+        previous_signature = _file_signature(GRADES_FILE)
         with open(GRADES_FILE, 'r') as f:
             grades = json.load(f)
         grades.extend(graded_results)
-        with open(GRADES_FILE, 'w') as f:
+        with span('grades_write'), open(GRADES_FILE, 'w') as f:
             json.dump(grades, f, indent=2)
         
+        grade_stats.record_many(graded_results, previous_signature)
+        
         # Update class statistics
         with open(CLASSES_FILE, 'r') as f:
             classes = json.load(f)
@@ -2408,7 +2478,7 @@ def submit_batch_assignment(class_id):
         for class_obj in classes:
             if class_obj['id'] == class_id:
                 class_obj['assignment_count'] = len([a for a in assignments if a['class_id'] == class_id])
-                class_obj['graded_count'] = len([g for g in grades if g['class_id'] == class_id])
+                class_obj['graded_count'] = grade_stats.graded_count(class_id)
                 break
         
         with open(CLASSES_FILE, 'w') as f:
@@ -2417,12 +2487,16 @@ def submit_batch_assignment(class_id):
         # Generate Excel file
         try:
             # Prepare summary data
+            batch_stats = RunningStats()
+            for r in graded_results:
+                if "error" not in r:
+                    batch_stats.add(r['score_normalized']['percentage'])
+            
             summary = {
                 "total_files": len(graded_results),
                 "processed": len([r for r in graded_results if "error" not in r]),
                 "failed": len([r for r in graded_results if "error" in r]),
-                "average_score": sum(float(r.get('score', 0)) for r in graded_results if "error" not in r and r.get('score') is not None) / 
-                                max(1, len([r for r in graded_results if "error" not in r and r.get('score') is not None]))
+                "average_score": round(batch_stats.mean, 1)
             }
             
             # Use excel export module
@@ -2446,25 +2520,26 @@ def submit_batch_assignment(class_id):
                 "message": "Batch assignment graded successfully",
                 "assignment": assignment,
                 "results": graded_results,
+                "answer_grouping": grouping,
                 "excel_export": {
                     "filename": excel_filename,
                     "url": excel_url
                 }
             }), 201
         except Exception as excel_error:
-            print(f"Error generating Excel file: {str(excel_error)}")
+            logger.error("Error generating Excel file", extra={'error': str(excel_error)})
             # Return results without Excel if there's an error
             return jsonify({
                 "success": True,
                 "message": "Batch assignment graded successfully (Excel export failed)",
                 "assignment": assignment,
                 "results": graded_results,
+                "answer_grouping": grouping,
                 "excel_export_error": str(excel_error)
             }), 201
         
     except Exception as e:
-        print(f"Error processing batch assignment: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error processing batch assignment")
         return jsonify({
             "success": False,
             "error": "Failed to process batch assignment"
@@ -2495,6 +2570,9 @@ def submit_batch_assignment_with_files(class_id):
                 "error": "Rubric content is required"
             }), 400
         
+        # Compile the rubric once for every submission in the batch
+        compiled_rubric = get_compiled_rubric(rubric_content)
+        
         # Load students for this class
         with open(STUDENTS_FILE, 'r') as f:
             students = json.load(f)
@@ -2509,21 +2587,31 @@ def submit_batch_assignment_with_files(class_id):
         
         # Handle submissions - either files or text
         submissions = []
+        unmatched_files = []
         
         if 'student_files' in request.files:
             # File upload mode with student mapping
             student_files = request.files.getlist('student_files')
             student_ids = request.form.getlist('student_ids')
             
-            # Create submissions with student mapping
+            # Create submissions with student mapping; files without an
+            # explicit student id are matched to a student by file name
             for i, file in enumerate(student_files):
-                if file.filename and i < len(student_ids):
-                    # Extract text from file
-                    extracted_text = extract_text_from_file(file.read(), file.filename)
-                    submissions.append({
-                        'content': extracted_text,
-                        'student_id': student_ids[i]
-                    })
+                if not file.filename:
+                    continue
+                student_id = student_ids[i] if i < len(student_ids) else ''
+                if not student_id:
+                    matched_student, _ = student_index.best_match(name_from_filename(file.filename), class_id)
+                    if not matched_student:
+                        unmatched_files.append(file.filename)
+                        continue
+                    student_id = matched_student['id']
+                # Extract text from file
+                extracted_text = extract_text_from_file(file.read(), file.filename)
+                submissions.append({
+                    'content': extracted_text,
+                    'student_id': student_id
+                })
         else:
             # Manual entry mode
             submissions_json = request.form.get('submissions')
@@ -2545,12 +2633,14 @@ def submit_batch_assignment_with_files(class_id):
         
         # Create assignment record
         assignment_id = str(uuid.uuid4())
+        update_usage_context(assignment_id=assignment_id)
         assignment = {
             "id": assignment_id,
             "class_id": class_id,
             "name": assignment_name,
             "type": assignment_type,
             "rubric_content": rubric_content,
+            "rubric_hash": compiled_rubric['hash'],
             "created_at": datetime.now().isoformat(),
             "total_submissions": len(submissions)
         }
@@ -2574,9 +2664,12 @@ def submit_batch_assignment_with_files(class_id):
                     result = grade_assignment(
                         assignment_type=assignment_type,
                         submission=submission['content'],
-                        rubric=rubric_content
+                        rubric=rubric_content,
+                        compiled_rubric=compiled_rubric
                     )
                     
+                    score_normalized = result.get('score_normalized') or normalize_grading_result(result)
+                    
                     # Create grade record
                     grade_id = str(uuid.uuid4())
                     grade = {
@@ -2585,31 +2678,37 @@ def submit_batch_assignment_with_files(class_id):
                         "student_id": student['id'],
                         "class_id": class_id,
                         "score": result['score'],
+                        "score_normalized": score_normalized,
                         "feedback": result['feedback'],
                         "submission_text": submission['content'],
                         "graded_at": datetime.now().isoformat()
                     }
                     
                     # Save grade
+                    previous_signature = _file_signature(GRADES_FILE)
                     with open(GRADES_FILE, 'r') as f:
                         grades = json.load(f)
                     grades.append(grade)
-                    with open(GRADES_FILE, 'w') as f:
+                    with span('grades_write'), open(GRADES_FILE, 'w') as f:
                         json.dump(grades, f, indent=2)
                     
+                    grade_stats.record(grade, previous_signature)
+                    
                     graded_results.append({
                         "student_name": student['name'],
                         "student_id": student['id'],
                         "score": result['score'],
+                        "score_normalized": score_normalized,
                         "feedback": result['feedback']
                     })
                     
                 except Exception as e:
-                    print(f"Error grading submission for student {student['name']}: {str(e)}")
+                    logger.error("Error grading submission", extra={'student_id': student['id'], 'error': str(e)})
                     graded_results.append({
                         "student_name": student['name'],
                         "student_id": student['id'],
                         "score": 0,
+                        "score_normalized": error_score(),
                         "feedback": f"Error grading submission: {str(e)}"
                     })
         
@@ -2617,12 +2716,12 @@ def submit_batch_assignment_with_files(class_id):
             "success": True,
             "assignment_id": assignment_id,
             "results": graded_results,
-            "total_graded": len(graded_results)
+            "total_graded": len(graded_results),
+            "unmatched_files": unmatched_files
         }), 200
         
     except Exception as e:
-        print(f"Error in batch assignment: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error in batch assignment")
         return jsonify({
             "success": False,
             "error": "Failed to process batch assignment with files"
@@ -2671,6 +2770,7 @@ def get_student_details(student_id):
                 "assignment_name": assignment['name'] if assignment else "Unknown Assignment",
                 "assignment_type": assignment['type'] if assignment else "Unknown",
                 "score": grade['score'],
+                "score_normalized": grade.get('score_normalized') or normalize_score(grade['score']),
                 "feedback": grade['feedback'],
                 "graded_at": grade['graded_at']
             })
@@ -2682,7 +2782,7 @@ def get_student_details(student_id):
         })
         
     except Exception as e:
-        print(f"Error getting student details: {str(e)}")
+        logger.error("Error getting student details", extra={'error': str(e)})
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/assignments/<assignment_id>/details')
@@ -2716,6 +2816,7 @@ def get_assignment_details(assignment_id):
                 "student_name": student['name'] if student else "Unknown Student",
                 "student_id": grade['student_id'],
                 "score": grade['score'],
+                "score_normalized": grade.get('score_normalized') or normalize_score(grade['score']),
                 "feedback": grade['feedback'],
                 "submission_text": grade['submission_text'],
                 "graded_at": grade['graded_at']
@@ -2728,9 +2829,296 @@ def get_assignment_details(assignment_id):
         })
         
     except Exception as e:
-        print(f"Error getting assignment details: {str(e)}")
+        logger.error("Error getting assignment details", extra={'error': str(e)})
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Bulk grading through provider batch jobs
+def _load_batch_jobs():
+    with open(BATCH_JOBS_FILE, 'r') as f:
+        return json.load(f)
+
+def _save_batch_job(job):
+    jobs = _load_batch_jobs()
+    jobs = [j for j in jobs if j['id'] != job['id']] + [job]
+    with open(BATCH_JOBS_FILE, 'w') as f:
+        json.dump(jobs, f, indent=2)
+
+def _ingest_batch_results(job, results):
+    """
+    Turn batch results into grade records for the job's assignment.
+    
+    Results already ingested are skipped, so a job can be ingested in parts.
+    
+    Returns:
+        int: The number of grade records created
+    """
+    students = {s['id']: s for s in _load_students()}
+    ingested = set(job.get('ingested_ids', []))
+    
+    grade_records = []
+    for student_id, result in results.items():
+        if student_id in ingested or student_id not in job['submissions']:
+            continue
+        student = students.get(student_id, {"id": student_id, "name": student_id})
+        grade_record = {
+            "id": str(uuid.uuid4()),
+            "assignment_id": job['assignment_id'],
+            "class_id": job['class_id'],
+            "student_id": student['id'],
+            "student_name": student['name'],
+            "submission": job['submissions'][student_id],
+            "graded_at": datetime.now().isoformat(),
+            "batch_job_id": job['id']
+        }
+        if 'error' in result:
+            grade_record.update({
+                "score": 0,
+                "score_normalized": error_score(),
+                "feedback": f"Error grading submission: {result['error']}"
+            })
+        else:
+            grade_record.update({
+                "score": result.get('score', 0),
+                "score_normalized": result.get('score_normalized') or normalize_grading_result(result),
+                "feedback": result.get('feedback', ''),
+                "grading_method": result.get('grading_method')
+            })
+        grade_records.append(grade_record)
+        ingested.add(student_id)
+    
+    if grade_records:
+        previous_signature = _file_signature(GRADES_FILE)
+        with open(GRADES_FILE, 'r') as f:
+            grades = json.load(f)
+        grades.extend(grade_records)
+        with span('grades_write'), open(GRADES_FILE, 'w') as f:
+            json.dump(grades, f, indent=2)
+        grade_stats.record_many(grade_records, previous_signature)
+        
+        with open(CLASSES_FILE, 'r') as f:
+            classes = json.load(f)
+        for class_obj in classes:
+            if class_obj['id'] == job['class_id']:
+                class_obj['graded_count'] = grade_stats.graded_count(job['class_id'])
+                break
+        with open(CLASSES_FILE, 'w') as f:
+            json.dump(classes, f, indent=2)
+    
+    job['ingested_ids'] = sorted(ingested)
+    if len(ingested) >= len(job['submissions']):
+        job['status'] = "ingested"
+        job['ingested_at'] = datetime.now().isoformat()
+    logger.info("Batch job results ingested", extra={'job_id': job['id'], 'grades': len(grade_records),
+                                                     'ingested': len(ingested), 'submissions': len(job['submissions'])})
+    return len(grade_records)
+
+def _batch_job_for_teacher(job_id):
+    job = next((j for j in _load_batch_jobs() if j['id'] == job_id), None)
+    if not job or job.get('teacher_id') != session['teacher_id']:
+        return None
+    return job
+
+@app.route('/classes/<class_id>/batch-jobs', methods=['POST'])
+def create_batch_job(class_id):
+    """
+    Grade an assignment for a class as a provider batch job.
+    
+    Takes the same JSON as /classes/<class_id>/assignments. Submissions the
+    compiled rubric can score locally are graded right away; the rest are
+    submitted as one batch job (BATCH_PROVIDER=openai) or written as a batch
+    input file to download from /batch-jobs/<job_id>/input-file
+    (BATCH_PROVIDER=gemini). Poll /batch-jobs/<job_id> to ingest results.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        with open(CLASSES_FILE, 'r') as f:
+            classes = json.load(f)
+        
+        class_obj = next((c for c in classes if c['id'] == class_id), None)
+        if not class_obj or class_obj.get('teacher_id') != session['teacher_id']:
+            return jsonify({
+                "success": False,
+                "error": "Class not found or access denied"
+            }), 403
+        
+        data = request.get_json()
+        required_fields = ['assignment_name', 'assignment_type', 'rubric_content', 'submissions']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({
+                    "success": False,
+                    "error": f"Missing required field: {field}"
+                }), 400
+        
+        class_students = [s for s in _load_students() if s['class_id'] == class_id]
+        if len(data['submissions']) != len(class_students):
+            return jsonify({
+                "success": False,
+                "error": "Number of submissions must match number of students in class"
+            }), 400
+        
+        compiled = get_compiled_rubric(data['rubric_content'])
+        assignment = {
+            "id": str(uuid.uuid4()),
+            "class_id": class_id,
+            "name": data['assignment_name'],
+            "type": data['assignment_type'],
+            "rubric_content": data['rubric_content'],
+            "rubric_hash": compiled['hash'],
+            "created_at": datetime.now().isoformat(),
+            "total_submissions": len(data['submissions']),
+            "grading_mode": "batch"
+        }
+        
+        provider = Config.BATCH_PROVIDER
+        submissions = {student['id']: submission for student, submission in zip(class_students, data['submissions'])}
+        batch_requests, local_results = prepare_batch(
+            [{"custom_id": student_id, "text": text} for student_id, text in submissions.items()],
+            data['assignment_type'], data['rubric_content'], provider, compiled
+        )
+        
+        job = {
+            "id": str(uuid.uuid4()),
+            "class_id": class_id,
+            "teacher_id": session['teacher_id'],
+            "assignment_id": assignment['id'],
+            "assignment_type": data['assignment_type'],
+            "rubric_content": data['rubric_content'],
+            "provider": provider,
+            "batch_id": None,
+            "status": "awaiting_upload" if provider == 'gemini' else "submitted",
+            "request_count": len(batch_requests),
+            "request_counts": None,
+            "submissions": submissions,
+            "ingested_ids": [],
+            "created_at": datetime.now().isoformat()
+        }
+        if batch_requests and provider == 'openai':
+            status = OpenAIBatchClient().submit(batch_requests, metadata={"assignment_id": assignment['id']})
+            job['batch_id'] = status['batch_id']
+            job['status'] = status['status']
+            job['request_counts'] = status['request_counts']
+        
+        assignment['batch_job_id'] = job['id']
+        with open(ASSIGNMENTS_FILE, 'r') as f:
+            assignments = json.load(f)
+        assignments.append(assignment)
+        with open(ASSIGNMENTS_FILE, 'w') as f:
+            json.dump(assignments, f, indent=2)
+        
+        with open(CLASSES_FILE, 'r') as f:
+            classes = json.load(f)
+        for class_obj in classes:
+            if class_obj['id'] == class_id:
+                class_obj['assignment_count'] = len([a for a in assignments if a['class_id'] == class_id])
+                break
+        with open(CLASSES_FILE, 'w') as f:
+            json.dump(classes, f, indent=2)
+        
+        _ingest_batch_results(job, local_results)
+        _save_batch_job(job)
+        
+        return jsonify({
+            "success": True,
+            "assignment": assignment,
+            "batch_job": {k: v for k, v in job.items() if k not in ('submissions', 'rubric_content')}
+        }), 201
+    except Exception as e:
+        logger.exception("Error creating batch job")
+        return jsonify({
+            "success": False,
+            "error": "Failed to create batch job",
+            "details": str(e)
+        }), 500
+
+@app.route('/batch-jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """Refresh a batch job's status and ingest its results once it has finished"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        job = _batch_job_for_teacher(job_id)
+        if not job:
+            return jsonify({"error": "Batch job not found or access denied"}), 404
+        
+        if job['batch_id'] and job['status'] not in FINAL_STATES | {'ingested'}:
+            client = OpenAIBatchClient()
+            status = client.status(job['batch_id'])
+            job['status'] = status['status']
+            job['request_counts'] = status['request_counts']
+            if status['status'] == 'completed':
+                results = merge_local_scores(client.results(status), job['submissions'], job['rubric_content'])
+                _ingest_batch_results(job, results)
+            _save_batch_job(job)
+        
+        return jsonify({k: v for k, v in job.items() if k not in ('submissions', 'rubric_content')}), 200
+    except Exception as e:
+        logger.error("Error refreshing batch job", extra={'error': str(e)})
+        return jsonify({"error": "Failed to refresh batch job", "details": str(e)}), 500
+
+@app.route('/batch-jobs/<job_id>/input-file', methods=['GET'])
+def download_batch_input_file(job_id):
+    """Download a batch job's input file (JSONL), e.g. to submit it to Gemini batch prediction"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    job = _batch_job_for_teacher(job_id)
+    if not job:
+        return jsonify({"error": "Batch job not found or access denied"}), 404
+    
+    pending = [{"custom_id": student_id, "text": text} for student_id, text in job['submissions'].items()
+               if student_id not in job.get('ingested_ids', [])]
+    batch_requests, _ = prepare_batch(pending, job['assignment_type'], job['rubric_content'], job['provider'])
+    return send_file(io.BytesIO(to_jsonl(batch_requests)), download_name=f"batch_{job_id}.jsonl",
+                     as_attachment=True, mimetype='application/jsonl')
+
+@app.route('/batch-jobs/<job_id>/results', methods=['POST'])
+def upload_batch_results(job_id):
+    """Ingest a batch output file (OpenAI or Gemini JSONL) uploaded as 'file'"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        job = _batch_job_for_teacher(job_id)
+        if not job:
+            return jsonify({"error": "Batch job not found or access denied"}), 404
+        if 'file' not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+        
+        results = parse_batch_output(request.files['file'].read().decode('utf-8'), job['provider'])
+        results = merge_local_scores(results, job['submissions'], job['rubric_content'])
+        ingested = _ingest_batch_results(job, results)
+        _save_batch_job(job)
+        return jsonify({"ingested": ingested, "status": job['status']}), 200
+    except Exception as e:
+        logger.error("Error ingesting batch results", extra={'error': str(e)})
+        return jsonify({"error": "Failed to ingest batch results", "details": str(e)}), 500
+
+@app.route('/classes/<class_id>/batch-jobs', methods=['GET'])
+def list_batch_jobs(class_id):
+    """List the batch jobs of a class"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        jobs = [
+            {k: v for k, v in j.items() if k not in ('submissions', 'rubric_content')}
+            for j in _load_batch_jobs()
+            if j['class_id'] == class_id and j.get('teacher_id') == session['teacher_id']
+        ]
+        return jsonify(jobs), 200
+    except Exception as e:
+        logger.error("Error loading batch jobs", extra={'error': str(e)})
+        return jsonify({"error": "Failed to load batch jobs"}), 500
+
 @app.route('/classes/<class_id>/grades', methods=['GET'])
 def get_class_grades(class_id):
     """Get all grades for a class"""
@@ -2753,9 +3141,69 @@ def get_class_grades(class_id):
         class_grades = [g for g in grades if g['class_id'] == class_id]
         return jsonify(class_grades), 200
     except Exception as e:
-        print(f"Error loading grades: {str(e)}")
+        logger.error("Error loading grades", extra={'error': str(e)})
         return jsonify({"error": "Failed to load grades"}), 500
 
+@app.route('/classes/<class_id>/stats', methods=['GET'])
+def get_class_stats(class_id):
+    """Get running grade statistics for a class and each of its assignments"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    # Verify teacher owns this class
+    try:
+        with open(CLASSES_FILE, 'r') as f:
+            classes = json.load(f)
+        
+        class_obj = next((c for c in classes if c['id'] == class_id), None)
+        if not class_obj or class_obj.get('teacher_id') != session['teacher_id']:
+            return jsonify({"error": "Class not found or access denied"}), 403
+        
+        return jsonify(grade_stats.class_stats(class_id)), 200
+    except Exception as e:
+        logger.error("Error loading class statistics", extra={'error': str(e)})
+        return jsonify({"error": "Failed to load class statistics"}), 500
+
+@app.route('/classes/<class_id>/analytics', methods=['GET'])
+@app.route('/classes/<class_id>/analytics/<section>', methods=['GET'])
+def get_class_analytics(class_id, section=None):
+    """
+    Get class-wide gradebook analytics.
+    
+    Sections: distributions, trends, outliers, criteria. Select them with the
+    path (/analytics/trends) or a comma-separated ?sections= query parameter.
+    Outlier sensitivity can be tuned with ?z=2.5.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    # Verify teacher owns this class
+    try:
+        with open(CLASSES_FILE, 'r') as f:
+            classes = json.load(f)
+        
+        class_obj = next((c for c in classes if c['id'] == class_id), None)
+        if not class_obj or class_obj.get('teacher_id') != session['teacher_id']:
+            return jsonify({"error": "Class not found or access denied"}), 403
+        
+        if section:
+            sections = [section]
+        else:
+            sections = [s.strip() for s in request.args.get('sections', '').split(',') if s.strip()]
+        
+        try:
+            z_threshold = float(request.args.get('z', DEFAULT_OUTLIER_Z))
+            analytics = gradebook.class_analytics(class_id, sections, z_threshold)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(analytics), 200
+    except Exception as e:
+        logger.exception("Error computing class analytics")
+        return jsonify({"error": "Failed to compute class analytics"}), 500
+
 @app.route('/students/<student_id>/grades', methods=['GET'])
 def get_student_grades(student_id):
     """Get all grades for a specific student"""
@@ -2766,7 +3214,7 @@ def get_student_grades(student_id):
         student_grades = [g for g in grades if g['student_id'] == student_id]
         return jsonify(student_grades), 200
     except Exception as e:
-        print(f"Error loading student grades: {str(e)}")
+        logger.error("Error loading student grades", extra={'error': str(e)})
         return jsonify({"error": "Failed to load student grades"}), 500
 
 @app.route('/classes/students.json', methods=['GET'])
@@ -2777,7 +3225,7 @@ def get_all_students_json():
             students = json.load(f)
         return jsonify(students), 200
     except Exception as e:
-        print(f"Error loading students: {str(e)}")
+        logger.error("Error loading students", extra={'error': str(e)})
         return jsonify({"error": "Failed to load students"}), 500
 
 @app.route('/classes/assignments.json', methods=['GET'])
@@ -2788,7 +3236,7 @@ def get_all_assignments_json():
             assignments = json.load(f)
         return jsonify(assignments), 200
     except Exception as e:
-        print(f"Error loading assignments: {str(e)}")
+        logger.error("Error loading assignments", extra={'error': str(e)})
         return jsonify({"error": "Failed to load assignments"}), 500
 
 @app.route('/login', methods=['POST'])
@@ -2823,7 +3271,7 @@ def login_post():
         }), 200
         
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error("Login error", extra={'error': str(e)})
         return jsonify({
             'success': False,
             'error': 'Login failed'
@@ -2861,22 +3309,59 @@ def download_excel_export(filename):
     
     try:
         if not os.path.exists(file_path):
-            print(f"Excel file not found: {file_path}")
+            logger.warning("Excel file not found", extra={'filename': filename})
             return jsonify({"error": "Excel file not found"}), 404
         
         if os.path.getsize(file_path) == 0:
-            print(f"Excel file is empty: {file_path}")
+            logger.warning("Excel file is empty", extra={'filename': filename})
             return jsonify({"error": "Excel file is empty"}), 500
             
-        print(f"Sending Excel file: {file_path}")
         return send_file(file_path,
                         download_name=filename,
                         as_attachment=True,
                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     except Exception as e:
-        print(f"Error sending Excel file: {str(e)}")
+        logger.error("Error sending Excel file", extra={'error': str(e)})
         return jsonify({"error": f"Failed to download Excel file: {str(e)}"}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Stage latency histograms, call and error counters per stage and
+    provider, request timings and module stats in Prometheus text format.
+    """
+    if not Config.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return app.response_class(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/usage', methods=['GET'])
+def get_usage():
+    """
+    Token usage and cost of the logged-in teacher's provider calls.
+    
+    Query parameters:
+        group_by: endpoint (default), class_id, assignment_id, provider,
+            model, operation or day
+        since: ISO date or timestamp (optional)
+        class_id, assignment_id: only usage attributed to them (optional)
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    group_by = request.args.get('group_by', 'endpoint')
+    if group_by not in GROUP_BY_FIELDS or group_by == 'teacher_id':
+        return jsonify({"error": f"group_by must be one of: {', '.join(f for f in GROUP_BY_FIELDS if f != 'teacher_id')}"}), 400
+    
+    try:
+        entries = usage_ledger.entries(since=request.args.get('since'), teacher_id=session['teacher_id'],
+                                       class_id=request.args.get('class_id'),
+                                       assignment_id=request.args.get('assignment_id'))
+        return jsonify({"group_by": group_by, "since": request.args.get('since'), **rollup(entries, group_by)}), 200
+    except Exception as e:
+        logger.error("Error loading usage", extra={'error': str(e)})
+        return jsonify({"error": "Failed to load usage"}), 500
+
 @app.route('/')
 def login():
     """
@@ -2893,7 +3378,105 @@ def dashboard():
         return redirect(url_for('login'))
     return render_template('index.html')
 
+def init_storage(data_folder=None):
+    """
+    Create the upload, assignment, rubric and class folders and initialize
+    empty data files.
+    
+    Args:
+        data_folder (str, optional): Keep rubrics/ and classes/ in this
+            folder instead of the current data folder
+    """
+    if data_folder:
+        # Buffered usage records belong to the old folder's ledger
+        usage_ledger.flush()
+        _use_data_folder(data_folder)
+        gradebook.grades_file = GRADES_FILE
+        gradebook.invalidate()
+        grade_stats.invalidate()
+        student_index.invalidate()
+    
+    for folder in (app.config['UPLOAD_FOLDER'], Config.ASSIGNMENT_FOLDER, RUBRICS_FOLDER, CLASSES_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+    
+    for file_path in [RUBRICS_FILE, CLASSES_FILE, STUDENTS_FILE, ASSIGNMENTS_FILE, GRADES_FILE, BATCH_JOBS_FILE]:
+        if not os.path.exists(file_path):
+            with open(file_path, 'w') as f:
+                json.dump([], f)
+
+# Libraries the grading paths import lazily, loaded by the warm-up when installed
+WARM_UP_MODULES = ('openai', 'pytesseract', 'sympy')
+
+# Seconds the warm-up waits for the server to accept connections
+WARM_UP_WAIT_SECONDS = 30
+
+def _warm_up(wait_for=None):
+    if wait_for:
+        deadline = time.monotonic() + WARM_UP_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(wait_for, timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+    start = time.perf_counter()
+    try:
+        with span('warm_up'):
+            get_backend().warm_up()
+            for module in WARM_UP_MODULES:
+                if importlib.util.find_spec(module) is not None:
+                    importlib.import_module(module)
+    except Exception as e:
+        logger.warning("Warm-up failed", extra={'error': str(e)})
+        return
+    logger.info("Warm-up finished", extra={'backend': get_backend().name,
+                                           'seconds': round(time.perf_counter() - start, 3)})
+
+def start_warm_up(wait_for=None):
+    """
+    Load provider SDKs, clients and lazily imported libraries in a background
+    thread, so the first grading request does not pay for them.
+    
+    Args:
+        wait_for (tuple, optional): (host, port) to wait for before warming
+            up, so the server is accepting connections first
+        
+    Returns:
+        threading.Thread: The warm-up thread, or None when WARM_UP is off
+    """
+    if not Config.WARM_UP:
+        return None
+    thread = threading.Thread(target=_warm_up, args=(wait_for,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def create_app(data_folder=None, **config):
+    """
+    Application factory for the development server, WSGI servers (see
+    wsgi.py and gunicorn.conf.py) and tests.
+    
+    There is one app per process: every call configures and returns the
+    same module-level app, whose routes and caches use module globals. A
+    call with another data_folder moves that app (and any earlier caller's
+    reference to it) to the new folder.
+    
+    Args:
+        data_folder (str, optional): Overrides DATA_FOLDER
+        **config: Flask config overrides, e.g. TESTING=True
+        
+    Returns:
+        Flask: The app, with its data folders and files created
+    """
+    init_storage(data_folder)
+    app.config.update(config)
+    return app
+
 if __name__ == '__main__':
+    create_app()
+    # With the reloader, only the child process serves requests
+    if not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up(wait_for=('127.0.0.1' if Config.HOST in ('0.0.0.0', '') else Config.HOST, Config.PORT))
     print(f"Starting server on {Config.HOST}:{Config.PORT}")
     print(f"Debug mode: {Config.DEBUG}")
     try:
@@ -0,0 +1,172 @@
+"""
+ASGI entrypoint with native async grading:
+
+    uvicorn asgi:application
+
+POST /grade and POST /grade-image run on the event loop: OCR, name and title
+extraction and grading await the async OpenAI and Gemini clients instead of
+holding a thread each, so one worker keeps hundreds of requests in flight
+(run a single worker; see gunicorn.conf.py).
+Every other route is served by the Flask app through asgiref's WSGI adapter,
+which runs it in a thread pool exactly as under gunicorn.
+"""
+
+import json
+import time
+from http.cookies import SimpleCookie
+from asgiref.wsgi import WsgiToAsgi
+from app import (create_app, start_warm_up, _missing_field, _decode_image_field, _log_image_metadata,
+                 _add_image_metadata)
+from config import Config
+from grader.engine import grade_assignment_async
+from image_processor.ocr import extract_text_with_metadata_from_image_async
+from logs import get_logger, set_request_id
+from metrics import observe_request
+from usage import set_usage_context
+
+logger = get_logger('asgi')
+
+
+async def grade(data):
+    """Async /grade; see app.grade."""
+    try:
+        error = _missing_field(data, ['assignment_type', 'submission', 'rubric'])
+        if error:
+            return error, 400
+        result = await grade_assignment_async(data['assignment_type'], data['submission'], data['rubric'])
+        return result, 200
+    except Exception as e:
+        logger.error("Error processing request", extra={'error': str(e)}, exc_info=True)
+        return {
+            "error": "An error occurred while processing the request",
+            "details": str(e)
+        }, 500
+
+
+async def grade_image(data):
+    """Async /grade-image; see app.grade_image."""
+    try:
+        error = _missing_field(data, ['assignment_type', 'image_file', 'rubric'])
+        if error:
+            return error, 400
+        assignment_type = data['assignment_type']
+        rubric = data['rubric']
+
+        image_bytes, error = _decode_image_field(data['image_file'])
+        if error:
+            return error, 400
+
+        extraction_result = await extract_text_with_metadata_from_image_async(image_bytes, assignment_type)
+        extracted_text, student_name, assignment_title = _log_image_metadata(extraction_result)
+
+        if getattr(Config, 'GRADING_ENGINE', None) == 'gemini':
+            from grader.gemini_engine import grade_assignment_with_gemini_async
+            result = await grade_assignment_with_gemini_async(assignment_type, extracted_text, rubric, student_name,
+                                                              assignment_title)
+        else:
+            result = await grade_assignment_async(assignment_type, extracted_text, rubric, student_name)
+        return _add_image_metadata(result, extraction_result), 200
+    except Exception as e:
+        logger.error("Error processing image", extra={'error': str(e)}, exc_info=True)
+        return {
+            "error": "An error occurred while processing the image",
+            "details": str(e)
+        }, 500
+
+
+# (method, path) -> (endpoint name, handler) of the routes served natively
+ASYNC_ROUTES = {
+    ('POST', '/grade'): ('grade', grade),
+    ('POST', '/grade-image'): ('grade_image', grade_image),
+}
+
+
+class GradingApp:
+    """
+    ASGI app serving ASYNC_ROUTES natively and everything else from the Flask
+    app. Native routes get the same request ID, usage attribution, request
+    metrics, log record and CORS header as the Flask routes.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        route = ASYNC_ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        endpoint, handler = route
+        start = time.perf_counter()
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        request_id = set_request_id(headers.get('x-request-id'))
+        set_usage_context(endpoint=endpoint, teacher_id=self._teacher_id(headers))
+
+        body = await self._read_body(receive)
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            payload, status = {"error": "Invalid JSON body", "details": str(e)}, 400
+        else:
+            payload, status = await handler(data if isinstance(data, dict) else {})
+
+        content = json.dumps(payload).encode('utf-8')
+        response_headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(content)).encode('latin-1')),
+            (b'x-request-id', request_id.encode('latin-1')),
+            (b'access-control-allow-origin', headers.get('origin', '*').encode('latin-1')),
+        ]
+        if 'origin' in headers:
+            response_headers.append((b'vary', b'Origin'))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+        seconds = time.perf_counter() - start
+        observe_request(endpoint, 'POST', status, seconds)
+        logger.info("Request handled", extra={
+            'endpoint': endpoint, 'method': 'POST', 'status': status, 'duration_ms': round(seconds * 1000, 1)
+        })
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        """Start the background warm-up when the server starts (gunicorn does this in post_worker_init)."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    def _teacher_id(self, headers):
+        """The teacher_id in the Flask session cookie, if any."""
+        cookie = SimpleCookie(headers.get('cookie', '')).get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        if cookie is None or serializer is None:
+            return None
+        try:
+            return serializer.loads(cookie.value).get('teacher_id')
+        except Exception:
+            return None
+
+
+application = GradingApp(create_app())
@@ -0,0 +1,4 @@
+from backends.base import GradingBackend, parse_json_response
+from backends.registry import get_backend, set_backend
+
+__all__ = ['GradingBackend', 'parse_json_response', 'get_backend', 'set_backend']
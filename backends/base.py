@@ -0,0 +1,151 @@
+"""
+Grading backend interface
+
+Every model call SnapGrade makes goes through a backend, so the providers can
+be swapped - for the real Gemini/OpenAI clients (backends.providers) or for a
+deterministic fake with injected latency and failures (backends.fake) when
+load-testing. Local work (tiered OCR, the compiled rubric, map-reduce, page
+groups) stays outside the backend and runs the same with either.
+
+The async variants (grade_async, ...) serve the ASGI grading path. By default
+they run the blocking call in a worker thread; backends with async clients
+override them so a request waiting on a model holds no thread.
+"""
+
+import asyncio
+import json
+
+
+def parse_json_response(content):
+    """
+    Parse a model's JSON reply, removing Markdown code fences.
+
+    Raises:
+        ValueError: When the reply is not valid JSON
+    """
+    content = (content or "").strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return json.loads(content.strip())
+
+
+class GradingBackend:
+    """
+    The calls a grading backend provides. Subclasses implement all of them.
+    """
+
+    name = "base"
+
+    def grade(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        """
+        Grade a text submission.
+
+        Returns:
+            dict: At least 'score' and 'feedback'
+        """
+        raise NotImplementedError
+
+    def grade_with_vision(self, assignment_type, image_data, rubric, diagram_info=None, student_name=None):
+        """
+        Grade a submission image directly.
+
+        Returns:
+            dict: 'score', 'feedback' and 'grading_method'
+        """
+        raise NotImplementedError
+
+    def vision_extract(self, image_data, assignment_type=None):
+        """
+        Transcribe a full page image.
+
+        Returns:
+            str: The extracted text
+        """
+        raise NotImplementedError
+
+    def transcribe_region(self, region_data):
+        """
+        Transcribe a small cropped region of a page.
+
+        Returns:
+            str: The transcription
+        """
+        raise NotImplementedError
+
+    def extract_metadata(self, kind, extracted_text):
+        """
+        Find the student name ('name') or assignment title ('title') in OCR
+        text the local heuristics were not sure about.
+
+        Returns:
+            dict: 'student_name' or 'assignment_title' (or None), plus
+            'confidence' and 'location'
+        """
+        raise NotImplementedError
+
+    def detect(self, image_data):
+        """
+        Detect diagrams, charts and multiple-choice marks in an image.
+
+        Returns:
+            dict: 'has_diagrams', 'diagram_types', 'confidence' and
+            'description'
+        """
+        raise NotImplementedError
+
+    def generate_json(self, prompt, max_output_tokens=1500):
+        """
+        Send a text prompt asking for JSON and parse the reply.
+
+        Returns:
+            dict: The parsed reply
+        """
+        raise NotImplementedError
+
+    def vision_json(self, prompt, images, max_tokens=2000, temperature=0.1):
+        """
+        Send a prompt with one or more images asking for JSON and parse the
+        reply.
+
+        Args:
+            prompt (str): The prompt
+            images (list): Image bytes (PNG or JPEG)
+            max_tokens (int): Output token limit
+            temperature (float): Sampling temperature
+
+        Returns:
+            dict: The parsed reply
+        """
+        raise NotImplementedError
+
+    async def grade_async(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        """Async grade()."""
+        return await asyncio.to_thread(self.grade, assignment_type, submission, rubric, student_name,
+                                       assignment_title)
+
+    async def vision_extract_async(self, image_data, assignment_type=None):
+        """Async vision_extract()."""
+        return await asyncio.to_thread(self.vision_extract, image_data, assignment_type)
+
+    async def transcribe_region_async(self, region_data):
+        """Async transcribe_region()."""
+        return await asyncio.to_thread(self.transcribe_region, region_data)
+
+    async def extract_metadata_async(self, kind, extracted_text):
+        """Async extract_metadata()."""
+        return await asyncio.to_thread(self.extract_metadata, kind, extracted_text)
+
+    async def vision_json_async(self, prompt, images, max_tokens=2000, temperature=0.1):
+        """Async vision_json()."""
+        return await asyncio.to_thread(self.vision_json, prompt, images, max_tokens, temperature)
+
+    def warm_up(self):
+        """
+        Load SDKs and create clients ahead of the first request. Called in
+        the background once the server accepts connections; optional.
+        """
+        return None
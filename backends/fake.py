@@ -0,0 +1,314 @@
+"""
+Deterministic fake backend for load and stress testing
+
+Answers every backend call locally, so endpoints can be benchmarked without
+API keys, cost or quotas:
+
+- Responses are deterministic: the score and text depend only on the input,
+  and scores stay within the rubric's point total.
+- Latency is drawn from a configurable distribution (separately for text and
+  vision calls): 'fixed:MS', 'uniform:LOW,HIGH', 'normal:MEAN,STD' or
+  'lognormal:MEDIAN,SIGMA', all in milliseconds.
+- Errors, 429 rate limits and malformed JSON replies are injected at
+  configurable rates. Rate limits and errors raise like the provider
+  clients do; malformed replies fail JSON parsing. Injection is seeded, so a
+  run with the same call order fails the same calls.
+
+The async variants sleep on the event loop, so the ASGI path can be load
+tested with many requests in flight and few threads.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from config import Config
+from backends.base import GradingBackend, parse_json_response
+from metrics import observe
+from usage import record_usage
+from logs import get_logger
+
+logger = get_logger('backends.fake')
+
+VISION_METHODS = {'grade_with_vision', 'vision_extract', 'transcribe_region', 'detect', 'vision_json'}
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec.
+
+    Returns:
+        callable: Draws a delay in seconds from a random.Random
+    """
+    spec = (spec or '0').strip().lower()
+    kind, _, args = spec.partition(':')
+    try:
+        if not args:
+            value = float(kind) / 1000
+            return lambda rng: value
+        values = [float(a) for a in args.split(',')]
+        if kind == 'fixed':
+            value = values[0] / 1000
+            return lambda rng: value
+        if kind == 'uniform':
+            low, high = values[0] / 1000, values[1] / 1000
+            return lambda rng: rng.uniform(low, high)
+        if kind == 'normal':
+            mean, std = values[0] / 1000, values[1] / 1000
+            return lambda rng: max(0.0, rng.gauss(mean, std))
+        if kind == 'lognormal' and values[0] > 0:
+            mu, sigma = math.log(values[0] / 1000), values[1]
+            return lambda rng: rng.lognormvariate(mu, sigma)
+    except (ValueError, IndexError):
+        pass
+    logger.warning("Invalid fake backend latency, using no delay", extra={'spec': spec})
+    return lambda rng: 0.0
+
+
+def _prompt_rubric(prompt):
+    """The rubric section of a grading prompt, if it has one."""
+    match = re.search(r'RUBRIC:\s*\n(.*?)(?:\n\s*\n(?:\*\*|[A-Z][A-Z ]+:)|\Z)', prompt or "", re.S)
+    return match.group(1).strip() if match else None
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return int(h.hexdigest()[:12], 16)
+
+
+class FakeBackend(GradingBackend):
+    """
+    Local stand-in for the providers with injected latency and failures.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency='0', vision_latency=None, error_rate=0.0, rate_limit_rate=0.0,
+                 malformed_rate=0.0, seed=0):
+        self.latency = parse_latency(latency)
+        self.vision_latency = parse_latency(vision_latency) if vision_latency else self.latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._stats = {"calls": {}, "errors": 0, "rate_limited": 0, "malformed": 0, "delay_seconds": 0.0}
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            latency=Config.FAKE_BACKEND_LATENCY,
+            vision_latency=Config.FAKE_BACKEND_VISION_LATENCY,
+            error_rate=Config.FAKE_BACKEND_ERROR_RATE,
+            rate_limit_rate=Config.FAKE_BACKEND_RATE_LIMIT_RATE,
+            malformed_rate=Config.FAKE_BACKEND_MALFORMED_RATE,
+            seed=Config.FAKE_BACKEND_SEED
+        )
+
+    def get_stats(self):
+        """
+        Get counters of the fake backend.
+
+        Returns:
+            dict: Calls per method, injected errors, rate limits and
+            malformed replies, and the total injected delay in seconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['calls'] = dict(self._stats['calls'])
+        stats['delay_seconds'] = round(stats['delay_seconds'], 3)
+        return stats
+
+    def _call(self, method, text='', images=()):
+        """
+        Simulate one provider call: sleep, then maybe fail. Successful calls
+        are recorded in the usage ledger with estimated prompt tokens.
+
+        Returns:
+            bool: Whether the reply should be malformed
+        """
+        rng, delay = self._draw(method)
+        time.sleep(delay)
+        return self._settle(method, rng, delay, text, images)
+
+    async def _call_async(self, method, text='', images=()):
+        """_call(), sleeping on the event loop."""
+        rng, delay = self._draw(method)
+        await asyncio.sleep(delay)
+        return self._settle(method, rng, delay, text, images)
+
+    def _draw(self, method):
+        with self._lock:
+            self._calls += 1
+            rng = random.Random(f"{self.seed}:{self._calls}")
+            self._stats['calls'][method] = self._stats['calls'].get(method, 0) + 1
+        return rng, (self.vision_latency if method in VISION_METHODS else self.latency)(rng)
+
+    def _settle(self, method, rng, delay, text, images):
+        roll = rng.random()
+        with self._lock:
+            self._stats['delay_seconds'] += delay
+            if roll < self.rate_limit_rate:
+                self._stats['rate_limited'] += 1
+                failure = "429 Resource has been exhausted (e.g. check quota). [fake backend]"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                self._stats['errors'] += 1
+                failure = "503 The service is currently unavailable. [fake backend]"
+            else:
+                failure = None
+                malformed = roll < self.rate_limit_rate + self.error_rate + self.malformed_rate
+                if malformed:
+                    self._stats['malformed'] += 1
+        observe(method, delay, provider='fake', error=failure is not None)
+        if failure:
+            raise Exception(failure)
+        from grader.token_budget import estimate_tokens
+        record_usage('fake', method, 'fake', seconds=delay, images=images,
+                     prompt_tokens=estimate_tokens(text), completion_tokens=0)
+        return malformed
+
+    def _reply(self, payload, malformed):
+        """Serialize a reply and parse it back, as a provider call would."""
+        text = json.dumps(payload)
+        if malformed:
+            text = "```json\n" + text[:len(text) // 2]
+        try:
+            return parse_json_response(text)
+        except ValueError as e:
+            raise ValueError(f"Failed to parse fake backend response as JSON: {str(e)}")
+
+    def _score(self, rubric, *inputs):
+        from grader.rubric_compiler import get_compiled_rubric
+
+        total = get_compiled_rubric(rubric or "")['total_points'] or 100
+        fraction = 0.5 + 0.5 * (_digest(*inputs) % 1000) / 999
+        earned = round(total * fraction * 2) / 2
+        return f"{earned:g}/{total:g}"
+
+    def grade(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        malformed = self._call('grade', (submission or '') + (rubric or ''))
+        return self._grade_reply(malformed, assignment_type, submission, rubric)
+
+    async def grade_async(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        malformed = await self._call_async('grade', (submission or '') + (rubric or ''))
+        return self._grade_reply(malformed, assignment_type, submission, rubric)
+
+    def _grade_reply(self, malformed, assignment_type, submission, rubric):
+        result = self._reply({
+            "score": self._score(rubric, assignment_type, submission, rubric),
+            "feedback": f"Fake backend grade for a {len(submission or '')}-character {assignment_type} submission."
+        }, malformed)
+        result['grading_method'] = "Fake backend"
+        return result
+
+    def grade_with_vision(self, assignment_type, image_data, rubric, diagram_info=None, student_name=None):
+        malformed = self._call('grade_with_vision', rubric or '', [image_data])
+        result = self._reply({
+            "score": self._score(rubric, assignment_type, image_data, rubric),
+            "feedback": f"Fake backend vision grade for a {len(image_data or b'')}-byte image."
+        }, malformed)
+        result['grading_method'] = "Fake backend (vision)"
+        return result
+
+    def vision_extract(self, image_data, assignment_type=None):
+        self._call('vision_extract', images=[image_data])
+        return self._page_text(image_data)
+
+    async def vision_extract_async(self, image_data, assignment_type=None):
+        await self._call_async('vision_extract', images=[image_data])
+        return self._page_text(image_data)
+
+    def _page_text(self, image_data):
+        digest = _digest(image_data)
+        rng = random.Random(digest)
+        lines = [f"Name: Student {digest % 10000:04d}", ""]
+        for number in range(1, 6):
+            lines.append(f"{number}. {rng.choice('ABCD')}  x = {rng.randint(1, 20)}")
+        lines.append("")
+        lines.append(" ".join(rng.choice(["the", "cell", "energy", "because", "water", "light", "process"])
+                              for _ in range(60)))
+        return "\n".join(lines)
+
+    def transcribe_region(self, region_data):
+        self._call('transcribe_region', images=[region_data])
+        return f"answer {_digest(region_data) % 100}"
+
+    async def transcribe_region_async(self, region_data):
+        await self._call_async('transcribe_region', images=[region_data])
+        return f"answer {_digest(region_data) % 100}"
+
+    def extract_metadata(self, kind, extracted_text):
+        malformed = self._call('extract_metadata', extracted_text)
+        return self._metadata_reply(malformed, kind, extracted_text)
+
+    async def extract_metadata_async(self, kind, extracted_text):
+        malformed = await self._call_async('extract_metadata', extracted_text)
+        return self._metadata_reply(malformed, kind, extracted_text)
+
+    def _metadata_reply(self, malformed, kind, extracted_text):
+        digest = _digest(kind, extracted_text)
+        field, value = (("student_name", f"Student {digest % 10000:04d}") if kind == 'name'
+                        else ("assignment_title", f"Assignment {digest % 100}"))
+        return self._reply({field: value, "confidence": "medium", "location": "Fake backend"}, malformed)
+
+    def detect(self, image_data):
+        try:
+            malformed = self._call('detect', images=[image_data])
+            return self._reply({
+                'has_diagrams': False,
+                'diagram_types': [],
+                'confidence': 'high',
+                'description': 'Fake backend detection'
+            }, malformed)
+        except Exception as e:
+            # Same fallback as the provider's vision detection
+            logger.warning("Fake diagram detection failed", extra={'error': str(e)})
+            return {'has_diagrams': False, 'diagram_types': [], 'confidence': 'low', 'description': 'Error in detection'}
+
+    def generate_json(self, prompt, max_output_tokens=1500):
+        malformed = self._call('generate_json', prompt)
+        return self._reply({
+            "score": self._score(_prompt_rubric(prompt), prompt),
+            "feedback": "Fake backend merged feedback."
+        }, malformed)
+
+    def vision_json(self, prompt, images, max_tokens=2000, temperature=0.1):
+        malformed = self._call('vision_json', prompt, images)
+        return self._vision_json_reply(malformed, prompt, images)
+
+    async def vision_json_async(self, prompt, images, max_tokens=2000, temperature=0.1):
+        malformed = await self._call_async('vision_json', prompt, images)
+        return self._vision_json_reply(malformed, prompt, images)
+
+    def _vision_json_reply(self, malformed, prompt, images):
+        from grader.rubric_compiler import get_compiled_rubric
+
+        rubric = _prompt_rubric(prompt)
+        questions = []
+        for question in get_compiled_rubric(rubric or "")['questions']:
+            if question['points'] is None:
+                continue
+            fraction = 0.5 + 0.5 * (_digest(prompt, question['number'], *images) % 1000) / 999
+            questions.append({
+                "question_number": question['number'],
+                "points_earned": round(question['points'] * fraction * 2) / 2,
+                "points_possible": question['points'],
+                "feedback": "Fake backend question feedback."
+            })
+        if questions:
+            score = f"{sum(q['points_earned'] for q in questions):g}/{sum(q['points_possible'] for q in questions):g}"
+        else:
+            score = self._score(rubric, prompt, *images)
+        return self._reply({
+            "score": score,
+            "feedback": f"Fake backend vision reply for {len(images)} image(s).",
+            "questions": questions
+        }, malformed)
@@ -0,0 +1,135 @@
+"""
+Provider backend: Gemini for text grading with an OpenAI fallback, and
+OpenAI GPT-4o for everything that looks at an image.
+
+The provider implementations live next to their prompts in grader.engine,
+grader.gemini_engine and image_processor.ocr; this class routes the backend
+calls to them. The async variants use AsyncOpenAI and Gemini's async
+generation.
+"""
+
+import asyncio
+import base64
+import time
+import weakref
+from config import Config
+from backends.base import GradingBackend, parse_json_response
+from metrics import span
+from usage import record_usage
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+
+def _image_url(image_data):
+    mime = "image/png" if image_data[:8] == b'\x89PNG\r\n\x1a\n' else "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(image_data).decode('utf-8')}"
+
+
+def _vision_messages(prompt, images):
+    content = [{"type": "text", "text": prompt}] + [
+        {"type": "image_url", "image_url": {"url": _image_url(image)}} for image in images
+    ]
+    return [{"role": "user", "content": content}]
+
+
+def async_openai_client():
+    """
+    Get the AsyncOpenAI client of the running event loop, created on first
+    use. The loop's requests share its connection pool; a client cannot be
+    shared between event loops.
+
+    Returns:
+        openai.AsyncOpenAI: The client
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = _async_clients[loop] = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+    return client
+
+
+class ProviderBackend(GradingBackend):
+    """Real Gemini and OpenAI calls."""
+
+    name = "providers"
+
+    def grade(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        from grader.engine import _grade_with_fallback
+        return _grade_with_fallback(assignment_type, submission, rubric, student_name, assignment_title)
+
+    def grade_with_vision(self, assignment_type, image_data, rubric, diagram_info=None, student_name=None):
+        from grader.engine import grade_assignment_with_gpt4_vision
+        return grade_assignment_with_gpt4_vision(assignment_type, image_data, rubric, diagram_info, student_name)
+
+    def vision_extract(self, image_data, assignment_type=None):
+        from image_processor.ocr import extract_text_with_vision
+        return extract_text_with_vision(image_data, assignment_type)
+
+    def transcribe_region(self, region_data):
+        from image_processor.ocr import transcribe_image_region
+        return transcribe_image_region(region_data)
+
+    def extract_metadata(self, kind, extracted_text):
+        from image_processor.ocr import extract_metadata_with_openai
+        return extract_metadata_with_openai(kind, extracted_text)
+
+    def detect(self, image_data):
+        from image_processor.ocr import detect_diagrams_with_vision
+        return detect_diagrams_with_vision(image_data)
+
+    def generate_json(self, prompt, max_output_tokens=1500):
+        from grader.gemini_engine import generate_json_with_gemini
+        return generate_json_with_gemini(prompt, max_output_tokens)
+
+    def warm_up(self):
+        import openai
+        from grader.gemini_engine import load_genai
+
+        load_genai()
+        if Config.OPENAI_API_KEY:
+            # Touching a resource imports it; the SDK loads them on first access
+            openai.OpenAI(api_key=Config.OPENAI_API_KEY).chat.completions
+
+    @span('vision_json', provider='openai')
+    def vision_json(self, prompt, images, max_tokens=2000, temperature=0.1):
+        from openai import OpenAI
+
+        client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        start = time.perf_counter()
+        response = client.chat.completions.create(
+            model=Config.OPENAI_VISION_MODEL,
+            messages=_vision_messages(prompt, images),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        record_usage('openai', 'vision_json', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=images)
+        return parse_json_response(response.choices[0].message.content)
+
+    async def grade_async(self, assignment_type, submission, rubric, student_name=None, assignment_title=None):
+        from grader.engine import _grade_with_fallback_async
+        return await _grade_with_fallback_async(assignment_type, submission, rubric, student_name, assignment_title)
+
+    async def vision_extract_async(self, image_data, assignment_type=None):
+        from image_processor.ocr import extract_text_with_vision_async
+        return await extract_text_with_vision_async(image_data, assignment_type)
+
+    async def transcribe_region_async(self, region_data):
+        from image_processor.ocr import transcribe_image_region_async
+        return await transcribe_image_region_async(region_data)
+
+    async def extract_metadata_async(self, kind, extracted_text):
+        from image_processor.ocr import extract_metadata_with_openai_async
+        return await extract_metadata_with_openai_async(kind, extracted_text)
+
+    @span('vision_json', provider='openai')
+    async def vision_json_async(self, prompt, images, max_tokens=2000, temperature=0.1):
+        start = time.perf_counter()
+        response = await async_openai_client().chat.completions.create(
+            model=Config.OPENAI_VISION_MODEL,
+            messages=_vision_messages(prompt, images),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        record_usage('openai', 'vision_json', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=images)
+        return parse_json_response(response.choices[0].message.content)
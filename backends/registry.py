@@ -0,0 +1,60 @@
+"""
+Backend selection
+
+Config.GRADING_BACKEND picks the backend: 'providers' (Gemini and OpenAI,
+the default) or 'fake' (see backends.fake). set_backend() overrides it, e.g.
+in benchmarks.
+"""
+
+import threading
+from config import Config
+from logs import get_logger
+
+logger = get_logger('backends')
+
+_lock = threading.Lock()
+_backend = None
+
+
+def _create(name):
+    if name == 'fake':
+        from backends.fake import FakeBackend
+        return FakeBackend.from_config()
+    if name != 'providers':
+        logger.warning("Unknown grading backend, using the provider backend", extra={'backend': name})
+    from backends.providers import ProviderBackend
+    return ProviderBackend()
+
+
+def get_backend():
+    """
+    Get the active grading backend, creating it from Config on first use.
+
+    Returns:
+        GradingBackend: The backend
+    """
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = _create(Config.GRADING_BACKEND)
+                logger.info("Grading backend selected", extra={'backend': _backend.name})
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Replace the active grading backend.
+
+    Args:
+        backend (GradingBackend or str): A backend, or a name to create
+            ('providers' or 'fake'); None goes back to Config
+
+    Returns:
+        GradingBackend: The previous backend
+    """
+    global _backend
+    with _lock:
+        previous = _backend
+        _backend = _create(backend) if isinstance(backend, str) else backend
+    return previous
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI Batch API, for testing bulk grading offline.
+
+Implements the endpoints the batch pipeline uses - file upload and download
+(/v1/files) and batch create, retrieve and cancel (/v1/batches) - with the
+standard library only. Every request in a batch is "graded" with a fixed
+score; requests whose prompt contains "[STUB FAIL]" fail, to exercise the
+error file. Batches stay in_progress for --delay seconds.
+
+Usage:
+    python batch_stub_server.py --port 8089 --delay 5
+    BATCH_API_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+"""
+
+import argparse
+import email.parser
+import email.policy
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAIL_MARKER = "[STUB FAIL]"
+
+
+class BatchStubServer:
+    """
+    The stub server. start() runs it in a background thread; base_url is
+    what to pass as the OpenAI client's base_url.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, score="8/10"):
+        self.delay = delay
+        self.score = score
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _add_file(self, filename, content, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "content": content
+        }
+        return self.files[file_id]
+
+    def _grade(self, line):
+        request = json.loads(line)
+        prompt = " ".join(str(m.get('content', '')) for m in request['body'].get('messages', []))
+        if FAIL_MARKER in prompt:
+            return None, {
+                "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+                "custom_id": request['custom_id'],
+                "response": None,
+                "error": {"code": "stub_failure", "message": "Request failed in the batch stub server"}
+            }
+        content = json.dumps({"score": self.score, "feedback": f"Stub grade for {request['custom_id']}."})
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+            "custom_id": request['custom_id'],
+            "response": {
+                "status_code": 200,
+                "request_id": uuid.uuid4().hex,
+                "body": {
+                    "object": "chat.completion",
+                    "model": request['body'].get('model'),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}]
+                }
+            },
+            "error": None
+        }, None
+
+    def _complete(self, batch):
+        """Grade every request of a batch and write its output files."""
+        lines = [line for line in self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines() if line.strip()]
+        outputs, errors = [], []
+        for line in lines:
+            output, error = self._grade(line)
+            (outputs if output else errors).append(json.dumps(output or error))
+        if outputs:
+            batch['output_file_id'] = self._add_file(f"{batch['id']}_output.jsonl",
+                                                     ("\n".join(outputs) + "\n").encode('utf-8'), "batch_output")['id']
+        if errors:
+            batch['error_file_id'] = self._add_file(f"{batch['id']}_errors.jsonl",
+                                                    ("\n".join(errors) + "\n").encode('utf-8'), "batch_output")['id']
+        batch['status'] = "completed"
+        batch['completed_at'] = int(time.time())
+        batch['request_counts'] = {"total": len(lines), "completed": len(outputs), "failed": len(errors)}
+
+    def _batch_view(self, batch_id):
+        batch = self.batches[batch_id]
+        if batch['status'] == "in_progress" and time.time() - batch['created_at'] >= self.delay:
+            self._complete(batch)
+        return batch
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload=None, raw=None):
+                body = raw if raw is not None else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/octet-stream' if raw is not None else 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _not_found(self):
+                self._send(404, {"error": {"message": f"No route for {self.path}", "type": "invalid_request_error"}})
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                with stub.lock:
+                    match = re.fullmatch(r'/v1/files/([\w-]+)(/content)?', path)
+                    if match and match.group(1) in stub.files:
+                        entry = stub.files[match.group(1)]
+                        if match.group(2):
+                            return self._send(200, raw=entry['content'])
+                        return self._send(200, {k: v for k, v in entry.items() if k != 'content'})
+                    match = re.fullmatch(r'/v1/batches/([\w-]+)', path)
+                    if match and match.group(1) in stub.batches:
+                        return self._send(200, stub._batch_view(match.group(1)))
+                self._not_found()
+
+            def do_POST(self):
+                path = self.path.split('?')[0]
+                body = self._body()
+                with stub.lock:
+                    if path == '/v1/files':
+                        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(
+                            b"Content-Type: " + self.headers['Content-Type'].encode('utf-8') + b"\r\n\r\n" + body)
+                        fields, content, filename = {}, None, "upload.jsonl"
+                        for part in message.iter_parts():
+                            name = part.get_param('name', header='content-disposition')
+                            if name == 'file':
+                                content = part.get_payload(decode=True)
+                                filename = part.get_filename() or filename
+                            else:
+                                fields[name] = part.get_content().strip()
+                        if content is None:
+                            return self._send(400, {"error": {"message": "Missing file", "type": "invalid_request_error"}})
+                        entry = stub._add_file(filename, content, fields.get('purpose', 'batch'))
+                        return self._send(200, {k: v for k, v in entry.items() if k != 'content'})
+
+                    if path == '/v1/batches':
+                        request = json.loads(body or b'{}')
+                        if request.get('input_file_id') not in stub.files:
+                            return self._send(400, {"error": {"message": "Unknown input_file_id", "type": "invalid_request_error"}})
+                        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+                        stub.batches[batch_id] = {
+                            "id": batch_id,
+                            "object": "batch",
+                            "endpoint": request.get('endpoint'),
+                            "input_file_id": request['input_file_id'],
+                            "completion_window": request.get('completion_window', '24h'),
+                            "status": "in_progress",
+                            "output_file_id": None,
+                            "error_file_id": None,
+                            "created_at": int(time.time()),
+                            "completed_at": None,
+                            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                            "metadata": request.get('metadata')
+                        }
+                        return self._send(200, stub._batch_view(batch_id))
+
+                    match = re.fullmatch(r'/v1/batches/([\w-]+)/cancel', path)
+                    if match and match.group(1) in stub.batches:
+                        batch = stub.batches[match.group(1)]
+                        if batch['status'] == "in_progress":
+                            batch['status'] = "cancelled"
+                        return self._send(200, batch)
+                self._not_found()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay', type=float, default=5.0, help="Seconds before a batch completes")
+    parser.add_argument('--score', default="8/10", help="Score given to every request")
+    args = parser.parse_args()
+
+    server = BatchStubServer(args.host, args.port, args.delay, args.score)
+    print(f"Batch stub server listening on {server.base_url} (batches complete after {args.delay}s)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the grading endpoints.
+
+Drives /grade, /grade-image, /grade-batch-upload,
+/classes/<id>/batch-assignment, /grade-pdf-direct and /grade-pdf-vision-only
+through the Flask test client. Model calls are answered by the fake grading
+backend (backends.fake), so a run needs no API keys and measures the app's
+own work plus the configured fake latency. The fixtures - worksheet images,
+typed and scanned multi-page PDFs and DOCX files - are generated, and class
+data and exports are written to a temporary directory instead of classes/.
+
+Reported per scenario: p50/p95/p99 latency, throughput, LLM calls per
+request (backend calls plus LLM name/title fallbacks), bytes uploaded per
+request and the process's peak RSS. Results are checked against
+benchmarks/baselines.json: a scenario regresses when its p95 latency or LLM
+calls per request grow, or its throughput drops, by more than --threshold.
+
+Usage:
+    python benchmarks/bench_endpoints.py [--requests 20] [--concurrency 4]
+        [--latency fixed:0] [--vision-latency fixed:0] [--scenario grade ...]
+        [--threshold 0.5] [--update-baselines]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the repository root to the Python path
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+# Never reach a real provider: an empty key keeps .env from supplying one
+os.environ['OPENAI_API_KEY'] = ''
+os.environ['GRADING_BACKEND'] = 'fake'
+
+from PIL import Image, ImageDraw, ImageFont
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+PAGE_SIZE = (1275, 1650)  # Letter at 150 dpi
+NOISE_FLOOR_MS = 10  # Latency changes smaller than this never count as regressions
+RUBRIC = """Unit 4 Quiz (10 points total)
+1. Identifies the function of the cell membrane (2 points)
+2. Explains photosynthesis inputs and outputs (4 points)
+3. Solves for x: 3x + 4 = 19 (2 points)
+4. Multiple choice: B (2 points)"""
+WORDS = ("the cell membrane controls what enters and leaves energy is stored in bonds "
+         "photosynthesis converts light into chemical energy the answer follows from "
+         "the equation because both sides are equal therefore we conclude that").split()
+STUDENTS = ["Alice Moreno", "Ben Carter", "Chloe Nguyen", "David Osei", "Emma Lindqvist", "Farah Haddad"]
+
+
+# Fixtures
+
+def answer_lines(rng, student):
+    lines = [f"Name: {student}", "Unit 4 Quiz", ""]
+    for number in range(1, 5):
+        answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40)))
+        lines.append(f"{number}. {answer}")
+    return lines
+
+
+def worksheet_image(rng, student):
+    """A typed worksheet page as PNG bytes."""
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    y = 90
+    for line in answer_lines(rng, student):
+        while line:
+            draw.text((90, y), line[:150], fill=0, font=font)
+            line, y = line[150:], y + 22
+        y += 14
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def scanned_pdf(rng, student, pages=3):
+    """A multi-page PDF of page images, like a phone or copier scan."""
+    images = [Image.open(io.BytesIO(worksheet_image(rng, student))).convert('RGB') for _ in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
+
+
+def typed_pdf(rng, student, pages=3):
+    """A multi-page PDF with a text layer."""
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        text = "BT /F1 11 Tf 72 740 Td 14 TL " + " ".join(
+            f"({escape(line[:95])}) '" for line in answer_lines(rng, student)) + " ET"
+        stream = zlib.compress(text.encode('latin-1'))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+
+    pdf, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def docx_file(rng, student):
+    from docx import Document
+
+    document = Document()
+    for line in answer_lines(rng, student):
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_fixtures(seed=7):
+    rng = random.Random(seed)
+    fixtures = {
+        'text': "\n".join(answer_lines(rng, STUDENTS[0])),
+        'image': worksheet_image(rng, STUDENTS[0]),
+        'scanned_pdf': scanned_pdf(rng, STUDENTS[0]),
+        'files': []
+    }
+    for i, student in enumerate(STUDENTS):
+        kind = ('png', 'pdf', 'docx')[i % 3]
+        data = {'png': worksheet_image, 'pdf': typed_pdf, 'docx': docx_file}[kind](rng, student)
+        fixtures['files'].append((f"{student.replace(' ', '_')}.{kind}", data))
+    return fixtures
+
+
+# Scenarios
+
+def _files(fixtures, field='files'):
+    return {field: [(io.BytesIO(data), name) for name, data in fixtures['files']]}
+
+
+def scenario_requests(fixtures, class_id=None, student_ids=()):
+    """Build each scenario's request as (path, kwargs for the test client)."""
+    pdf = base64.b64encode(fixtures['scanned_pdf']).decode('ascii')
+    return {
+        'grade': lambda: ('/grade', {'json': {
+            'assignment_type': 'Quiz', 'submission': fixtures['text'], 'rubric': RUBRIC}}),
+        'grade_image': lambda: ('/grade-image', {'json': {
+            'assignment_type': 'Quiz', 'image_file': base64.b64encode(fixtures['image']).decode('ascii'),
+            'rubric': RUBRIC}}),
+        'grade_batch_upload': lambda: ('/grade-batch-upload', {
+            'data': {'assignment_type': 'Quiz', 'rubric': RUBRIC, **_files(fixtures)},
+            'content_type': 'multipart/form-data'}),
+        'batch_assignment': lambda: (f'/classes/{class_id}/batch-assignment', {
+            'data': {'assignment_name': 'Unit 4 Quiz', 'assignment_type': 'Quiz', 'rubric_content': RUBRIC,
+                     'student_ids': list(student_ids), **_files(fixtures, 'student_files')},
+            'content_type': 'multipart/form-data'}),
+        'grade_pdf_direct': lambda: ('/grade-pdf-direct', {'json': {
+            'assignment_type': 'Quiz', 'file_data': pdf, 'filename': 'scan.pdf', 'rubric': RUBRIC}}),
+        'grade_pdf_vision_only': lambda: ('/grade-pdf-vision-only', {'json': {
+            'assignment_type': 'Quiz', 'file_data': pdf, 'filename': 'scan.pdf', 'rubric': RUBRIC}}),
+    }
+
+
+def isolate_data(app_module, directory):
+    """Point the app's class data files and exports at a scratch directory."""
+    os.chdir(directory)  # temp_excel/ is relative to the working directory
+    app_module.create_app(data_folder=directory)
+    app_module.app.root_path = directory
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/login', json={'teacher_id': 'TEACHER001'})
+    return client
+
+
+def setup_class(app):
+    client = logged_in_client(app)
+    class_id = client.post('/classes', json={'name': 'Benchmark Biology'}).get_json()['class']['id']
+    student_ids = []
+    for student in STUDENTS:
+        response = client.post(f'/classes/{class_id}/students', json={
+            'name': student, 'email': f"{student.split()[0].lower()}@example.edu"})
+        student_ids.append(response.get_json()['student']['id'])
+    return class_id, student_ids
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the app's logging (prints and tracebacks) while requests run."""
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+        yield
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = fraction * (len(ordered) - 1)
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def llm_calls(backend):
+    from image_processor.local_extraction import get_extraction_stats
+
+    extraction = get_extraction_stats()
+    return sum(backend.get_stats()['calls'].values()) + extraction['name_llm'] + extraction['title_llm']
+
+
+def run_scenario(app, make_request, backend, uploaded, requests, concurrency):
+    """Send the scenario's requests and measure them."""
+    local = threading.local()
+
+    def send(_):
+        if not hasattr(local, 'client'):
+            local.client = logged_in_client(app)
+        path, kwargs = make_request()
+        start = time.perf_counter()
+        response = local.client.post(path, **kwargs)
+        return time.perf_counter() - start, response.status_code
+
+    calls_before, bytes_before = llm_calls(backend), uploaded['bytes']
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in outcomes]
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, status in outcomes if status >= 400),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'throughput_rps': round(requests / elapsed, 2),
+        'llm_calls_per_request': round((llm_calls(backend) - calls_before) / requests, 2),
+        'bytes_per_request': round((uploaded['bytes'] - bytes_before) / requests),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def check_regressions(results, baselines, threshold):
+    """
+    Compare results with the stored baselines.
+
+    Returns:
+        list: Messages describing each regression
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        error_rate = result['errors'] / result['requests']
+        baseline_error_rate = baseline.get('errors', 0) / baseline.get('requests', result['requests'])
+        if error_rate - baseline_error_rate > threshold:
+            regressions.append(f"{name}: {error_rate:.0%} of requests failed (baseline {baseline_error_rate:.0%})")
+        for metric, worse_when_higher in (('p95_ms', True), ('llm_calls_per_request', True), ('throughput_rps', False)):
+            old, new = baseline.get(metric), result.get(metric)
+            if not old or not new:
+                continue
+            change = (new - old) / old
+            if not ((change > threshold) if worse_when_higher else (change < -threshold)):
+                continue
+            # Milliseconds of jitter on a fast endpoint are not a regression
+            if metric == 'p95_ms' and new - old < NOISE_FLOOR_MS:
+                continue
+            if metric == 'throughput_rps' and (1000 / new - 1000 / old) * result['concurrency'] < NOISE_FLOOR_MS:
+                continue
+            regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading endpoints end to end")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', default='fixed:0', help="Fake backend text-call latency (see backends.fake)")
+    parser.add_argument('--vision-latency', default='fixed:0', help="Fake backend vision-call latency")
+    parser.add_argument('--scenario', action='append', help="Run only these scenarios (repeatable)")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Allowed relative regression")
+    parser.add_argument('--update-baselines', action='store_true', help="Store this run as the baselines")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's log output")
+    args = parser.parse_args()
+
+    import app as app_module
+    from config import Config
+    from backends import set_backend
+    from backends.fake import FakeBackend
+
+    Config.OPENAI_API_KEY = None
+    os.environ.pop('OPENAI_API_KEY', None)
+    backend = FakeBackend(latency=args.latency, vision_latency=args.vision_latency)
+    set_backend(backend)
+
+    app = app_module.app
+    app.config['TESTING'] = True
+    uploaded = {'bytes': 0}
+    uploaded_lock = threading.Lock()
+
+    @app.before_request
+    def count_upload():
+        from flask import request
+
+        with uploaded_lock:
+            uploaded['bytes'] += request.content_length or 0
+
+    fixtures = build_fixtures()
+    scratch = tempfile.TemporaryDirectory(prefix='snapgrade-bench-')
+    isolate_data(app_module, scratch.name)
+    quiet = contextlib.nullcontext if args.verbose else _quiet
+    with quiet():
+        class_id, student_ids = setup_class(app)
+        # Load the lazily imported libraries first, as a served worker does
+        warm_up = app_module.start_warm_up()
+        if warm_up:
+            warm_up.join()
+    scenarios = scenario_requests(fixtures, class_id, student_ids)
+    names = args.scenario or list(scenarios)
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(scenarios)}")
+
+    print(f"{'scenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'LLM/req':>9}"
+          f"{'KB/req':>9}{'RSS MB':>8}{'errors':>8}")
+    results = {}
+    for name in names:
+        with quiet():
+            result = run_scenario(app, scenarios[name], backend, uploaded, args.requests, args.concurrency)
+        results[name] = result
+        print(f"{name:<24}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+              f"{result['throughput_rps']:>8}{result['llm_calls_per_request']:>9}"
+              f"{result['bytes_per_request'] / 1024:>9.1f}{str(result['peak_rss_mb']):>8}{result['errors']:>8}")
+    app_module.usage_ledger.flush()
+    os.chdir(REPO_ROOT)
+    scratch.cleanup()
+
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE, 'r') as f:
+            baselines = json.load(f)
+
+    if args.update_baselines:
+        failed = [name for name, result in results.items() if result['errors'] == result['requests']]
+        if failed:
+            print(f"\nNot storing baselines for scenarios where every request failed: {', '.join(failed)}")
+        baselines.update({name: result for name, result in results.items() if name not in failed})
+        with open(BASELINES_FILE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaselines updated for {len(results) - len(failed)} scenario(s)")
+        return
+
+    regressions = check_regressions(results, baselines, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {os.path.basename(BASELINES_FILE)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized gradebook analytics.
+
+Generates synthetic grade records (1,000,000 by default), builds the columnar
+frame and times each analytics section for one class.
+
+Usage:
+    python benchmarks/bench_gradebook.py [--rows 1000000] [--classes 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.gradebook import (
+    build_grades_frame, build_criteria_frame, assignment_distributions,
+    student_trends, outliers, criteria_breakdown
+)
+
+
+def generate_grades(rows, classes, students_per_class=30, assignments_per_class=40, seed=42):
+    """Generate grade records shaped like grades.json, with mixed score formats."""
+    rng = random.Random(seed)
+    start = datetime(2025, 8, 1)
+    grades = []
+    for i in range(rows):
+        class_index = rng.randrange(classes)
+        assignment_index = rng.randrange(assignments_per_class)
+        student_index = rng.randrange(students_per_class)
+        earned = max(0, min(10, round(rng.gauss(7.5, 1.5))))
+
+        score_format = i % 4
+        if score_format == 0:
+            score = f"{earned}/10"
+        elif score_format == 1:
+            score = f"{earned * 10}/100"
+        elif score_format == 2:
+            score = f"{earned * 10}%"
+        else:
+            score = {
+                "total_score": f"{earned}/10",
+                "questions": [
+                    {"question_number": q, "points_earned": min(earned, 5) if q == 1 else max(earned - 5, 0),
+                     "points_possible": 5}
+                    for q in (1, 2)
+                ]
+            }
+
+        grade = {
+            "id": f"g{i}",
+            "class_id": f"class-{class_index}",
+            "assignment_id": f"class-{class_index}-a{assignment_index}",
+            "student_id": f"class-{class_index}-s{student_index}",
+            "score": score if not isinstance(score, dict) else score["total_score"],
+            "feedback": score if isinstance(score, dict) else "Synthetic feedback",
+            "graded_at": (start + timedelta(days=assignment_index, seconds=i % 86400)).isoformat()
+        }
+        grades.append(grade)
+    return grades
+
+
+def timed(label, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{label:<32} {elapsed:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gradebook analytics")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--classes', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} synthetic grades across {args.classes} classes...")
+    grades = generate_grades(args.rows, args.classes)
+
+    print("\n=== Gradebook Analytics Benchmark ===\n")
+    frame = timed("build_grades_frame", build_grades_frame, grades)
+    criteria = timed("build_criteria_frame", build_criteria_frame, grades)
+    class_rows = timed("index rows by class", lambda: frame.groupby('class_id', observed=True).indices)
+    print(f"{'frame memory':<32} {frame.memory_usage(deep=True).sum() / 1e6:10.1f} MB")
+
+    print("\nWhole gradebook:")
+    timed("assignment_distributions", assignment_distributions, frame)
+    timed("student_trends", student_trends, frame)
+    timed("outliers", outliers, frame)
+    timed("criteria_breakdown", criteria_breakdown, criteria)
+
+    class_frame = frame.iloc[class_rows['class-0']]
+    class_criteria = criteria[criteria['class_id'] == 'class-0']
+    print(f"\nSingle class ({len(class_frame):,} grades):")
+    timed("assignment_distributions", assignment_distributions, class_frame)
+    timed("student_trends", student_trends, class_frame)
+    timed("outliers", outliers, class_frame)
+    timed("criteria_breakdown", criteria_breakdown, class_criteria)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the offline OMR engine.
+
+Renders a class's stack of synthetic bubble sheets (corner markers, two
+columns of questions, random marks including blanks and double marks),
+distorts them like phone photos (rotation, perspective, blur,
+noise), grades them with image_processor.omr and reports accuracy and
+per-page time.
+
+Usage:
+    python benchmarks/bench_omr.py [--sheets 30] [--questions 40] [--options 4]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from image_processor.omr import grade_bubble_sheets, OPTION_LETTERS
+
+PAGE = (1275, 1650)  # Letter at 150 dpi
+MARKER = 40
+RADIUS = 14
+
+
+def render_sheet(rng, questions, options, marks):
+    """Draw an answer sheet with the given marks ({question: [(letter, darkness)]})."""
+    image = Image.new('L', PAGE, 255)
+    draw = ImageDraw.Draw(image)
+    for x, y in ((50, 50), (PAGE[0] - 50 - MARKER, 50), (50, PAGE[1] - 50 - MARKER),
+                 (PAGE[0] - 50 - MARKER, PAGE[1] - 50 - MARKER)):
+        draw.rectangle((x, y, x + MARKER, y + MARKER), fill=0)
+
+    font = ImageFont.load_default()
+    draw.text((200, 120), "ANSWER SHEET    Name: ____________________", fill=0, font=font)
+    per_column = (questions + 1) // 2
+    for q in range(questions):
+        column, row = divmod(q, per_column)
+        base_x, y = 220 + column * 520, 220 + row * 60
+        draw.text((base_x - 70, y - 6), f"{q + 1}.", fill=0, font=font)
+        for o in range(options):
+            x = base_x + o * 70
+            draw.ellipse((x - RADIUS, y - RADIUS, x + RADIUS, y + RADIUS), outline=0, width=2)
+            draw.text((x - 3, y - 5), OPTION_LETTERS[o], fill=0, font=font)
+        for letter, darkness in marks.get(q + 1, []):
+            x = base_x + OPTION_LETTERS.index(letter) * 70
+            r = RADIUS - rng.randint(0, 3)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=darkness)
+    return image
+
+
+def photograph(image, rng):
+    """Rotate, add perspective, blur and sensor noise like a phone photo."""
+    image = image.rotate(rng.uniform(-4, 4), expand=True, fillcolor=235, resample=Image.BILINEAR)
+    w, h = image.size
+    jitter = lambda: rng.uniform(-0.03, 0.03)
+    quad = (w * jitter(), h * jitter(), w * jitter(), h * (1 + jitter()),
+            w * (1 + jitter()), h * (1 + jitter()), w * (1 + jitter()), h * jitter())
+    image = image.transform((w, h), Image.QUAD, quad, Image.BILINEAR, fillcolor=235)
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.4, 1.2)))
+    pixels = np.asarray(image, dtype=np.float32) * rng.uniform(0.8, 0.95)
+    pixels += np.random.default_rng(rng.randrange(1 << 30)).normal(0, 8, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline bubble-sheet grading")
+    parser.add_argument('--sheets', type=int, default=30)
+    parser.add_argument('--questions', type=int, default=40)
+    parser.add_argument('--options', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    letters = OPTION_LETTERS[:args.options]
+    answer_key = {q: rng.choice(letters) for q in range(1, args.questions + 1)}
+
+    images, truths = [], []
+    for _ in range(args.sheets):
+        marks, truth = {}, {}
+        for q in answer_key:
+            roll = rng.random()
+            if roll < 0.04:
+                truth[q] = 'blank'
+            elif roll < 0.07:
+                a, b = rng.sample(letters, 2)
+                marks[q] = [(a, rng.randint(20, 80)), (b, rng.randint(20, 80))]
+                truth[q] = 'multiple'
+            else:
+                choice = answer_key[q] if rng.random() < 0.75 else rng.choice(letters)
+                marks[q] = [(choice, rng.randint(10, 90))]
+                truth[q] = choice
+        images.append(photograph(render_sheet(rng, args.questions, args.options, marks), rng))
+        truths.append(truth)
+
+    start = time.perf_counter()
+    results = grade_bubble_sheets(images, answer_key)
+    elapsed = time.perf_counter() - start
+
+    read, exact, total = 0, 0, 0
+    for result, truth in zip(results, truths):
+        if not result['registered']:
+            print(f"  not registered: {result['error']}")
+            continue
+        read += 1
+        for question in result['questions']:
+            expected = truth[question['question']]
+            if expected == 'blank':
+                got = 'blank' if question['flag'] == 'blank' else question['selected']
+            elif expected == 'multiple':
+                got = 'multiple' if question['flag'] == 'multiple' else question['selected']
+            else:
+                got = question['selected'][0] if question['selected'] == [expected] else question['selected']
+            exact += got == expected
+            total += 1
+
+    print(f"Sheets registered: {read}/{args.sheets}")
+    print(f"Question-level accuracy: {exact}/{total} ({exact / max(total, 1):.2%})")
+    print(f"Stack time {elapsed:.2f}s, {elapsed / args.sheets * 1000:.0f} ms per sheet")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Serving load test: the Flask development server against gunicorn and uvicorn workers.
+
+Starts each server as a subprocess on a free port, with the fake grading
+backend (no API keys, fixed model latency) and class data in a temporary
+directory, then sends concurrent HTTP requests to one endpoint and reports
+latency percentiles and throughput per server:
+
+- dev:     python app.py (one process, a thread per request)
+- gthread: gunicorn -c gunicorn.conf.py wsgi:application, thread workers
+- gevent:  the same with gevent workers (skipped when gevent is missing)
+- asgi:    uvicorn asgi:application, /grade and /grade-image on the event
+           loop with async provider clients (skipped when uvicorn is missing)
+
+With slow model calls the development server and the workers all overlap
+the waiting; the difference shows when requests also do CPU work
+(--endpoint grade_image runs local OCR and image checks), which one process
+serializes on the GIL and several workers run in parallel.
+
+Usage:
+    python benchmarks/bench_serving.py [--requests 200] [--concurrency 32]
+        [--endpoint grade|grade_image] [--latency fixed:500]
+        [--servers dev gthread gevent asgi] [--workers 4] [--threads 16]
+"""
+
+import argparse
+import base64
+import http.client
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the repository root and this directory to the Python path
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import RUBRIC, STUDENTS, answer_lines, worksheet_image, percentile
+
+HOST = '127.0.0.1'
+STARTUP_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def request_body(endpoint, seed=7):
+    rng = random.Random(seed)
+    if endpoint == 'grade_image':
+        image = base64.b64encode(worksheet_image(rng, STUDENTS[0])).decode('ascii')
+        return '/grade-image', {'assignment_type': 'Quiz', 'image_file': image, 'rubric': RUBRIC}
+    return '/grade', {'assignment_type': 'Quiz', 'submission': "\n".join(answer_lines(rng, STUDENTS[0])),
+                      'rubric': RUBRIC}
+
+
+def server_command(server, config_file, port, workers):
+    if server == 'dev':
+        return [sys.executable, os.path.join(REPO_ROOT, 'app.py')]
+    if server == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', HOST, '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning']
+    return [sys.executable, '-m', 'gunicorn', '-c', config_file, 'wsgi:application']
+
+
+def start_server(server, args, directory):
+    """Start a server and wait until it answers."""
+    port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=REPO_ROOT, HOST=HOST, PORT=str(port), DEBUG='False',
+               DATA_FOLDER=directory, OPENAI_API_KEY='', GRADING_BACKEND='fake',
+               FAKE_BACKEND_LATENCY=args.latency, FAKE_BACKEND_VISION_LATENCY=args.latency,
+               LOG_LEVEL='WARNING', WEB_WORKER_CLASS=server, WEB_WORKERS=str(args.workers),
+               WEB_THREADS=str(args.threads))
+    process = subprocess.Popen(server_command(server, os.path.join(REPO_ROOT, 'gunicorn.conf.py'), port, args.workers),
+                               cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(HOST, port, timeout=2)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} server did not start within {STARTUP_TIMEOUT}s")
+
+
+def stop_server(process):
+    """SIGTERM, so gunicorn and uvicorn drain in-flight requests, then wait."""
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_load(port, path, body, requests, concurrency):
+    payload = json.dumps(body)
+
+    def send(_):
+        connection = http.client.HTTPConnection(HOST, port, timeout=120)
+        start = time.perf_counter()
+        try:
+            connection.request('POST', path, body=payload, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = 599
+        finally:
+            connection.close()
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in outcomes]
+    return {
+        'errors': sum(1 for _, status in outcomes if status >= 400),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'throughput_rps': round(requests / elapsed, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the development server with gunicorn and uvicorn workers")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per server")
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent clients")
+    parser.add_argument('--endpoint', choices=['grade', 'grade_image'], default='grade')
+    parser.add_argument('--latency', default='fixed:500', help="Fake backend latency per model call")
+    parser.add_argument('--servers', nargs='+', choices=['dev', 'gthread', 'gevent', 'asgi'],
+                        default=['dev', 'gthread', 'gevent', 'asgi'])
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn and uvicorn worker processes")
+    parser.add_argument('--threads', type=int, default=16, help="Threads per gthread worker")
+    args = parser.parse_args()
+
+    if 'gevent' in args.servers and importlib.util.find_spec('gevent') is None:
+        print("gevent is not installed; skipping the gevent server")
+        args.servers = [server for server in args.servers if server != 'gevent']
+    if 'asgi' in args.servers and importlib.util.find_spec('uvicorn') is None:
+        print("uvicorn is not installed; skipping the asgi server")
+        args.servers = [server for server in args.servers if server != 'asgi']
+
+    path, body = request_body(args.endpoint)
+    print(f"{args.requests} x POST {path}, concurrency {args.concurrency}, model latency {args.latency}")
+    print(f"{'server':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+    for server in args.servers:
+        with tempfile.TemporaryDirectory(prefix='snapgrade-serve-') as directory:
+            process, port = start_server(server, args, directory)
+            try:
+                run_load(port, path, body, min(args.concurrency, args.requests), args.concurrency)  # warm-up
+                result = run_load(port, path, body, args.requests, args.concurrency)
+            finally:
+                stop_server(process)
+        print(f"{server:<10}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+              f"{result['throughput_rps']:>9}{result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Agreement check for the local diagram/MCQ detector.
+
+Runs image_processor.diagram_detector over a labeled fixture set and reports
+has_diagrams agreement, per-type recall and latency. The fixture directory
+holds page images plus a labels.json:
+
+    {"page1.png": {"has_diagrams": true, "diagram_types": ["Multiple Choice Questions (MCQ)"]},
+     "page2.png": {"has_diagrams": false, "diagram_types": [], "text": "optional OCR text"}}
+
+Labels should come from people looking at real scans; only those pages count
+towards agreement. With --generate a synthetic set (text pages, bubble
+sheets, charts, tables, drawings, with scan noise) is written to the
+directory first. Its pages are labeled "source": "synthetic" and reported
+separately as a self-check: they are drawn to the same shapes the detector
+looks for, so they catch regressions but say nothing about real scans. With
+--vision the GPT-4o detector is run too and reported alongside.
+
+Usage:
+    python benchmarks/diagram_agreement.py --fixtures /tmp/diagram_fixtures --generate [--per-kind 10]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+import numpy as np
+
+from image_processor.diagram_detector import (
+    detect_diagrams_locally, MCQ_TYPE, TABLE_TYPE, CHART_TYPE, FIGURE_TYPE
+)
+
+PAGE_SIZE = (1275, 1650)  # Letter at 150 dpi
+WORDS = ("the cell membrane controls what enters and leaves energy is stored in bonds "
+         "photosynthesis converts light into chemical energy the answer follows from "
+         "the equation because both sides are equal therefore we conclude that").split()
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _paragraphs(draw, rng, top, bottom, font, left=100, right=1175):
+    y = top
+    while y < bottom:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 13)))
+        draw.text((left, y), line, fill=rng.randint(0, 60), font=font)
+        y += rng.randint(34, 40)
+
+
+def _text_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((100, 80), "Name: Jane Doe", fill=0, font=_font(26))
+    _paragraphs(draw, rng, 160, rng.randint(900, 1500), _font(24))
+    return image, {"has_diagrams": False, "diagram_types": []}
+
+
+def _bubble_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    font = _font(24)
+    draw.text((100, 80), "Answer Sheet", fill=0, font=font)
+    radius = rng.randint(13, 17)
+    for question in range(rng.randint(8, 20)):
+        y = 170 + question * 64
+        draw.text((100, y - 12), f"{question + 1}.", fill=0, font=font)
+        chosen = rng.randrange(4)
+        for option in range(4):
+            x = 200 + option * 80
+            box = (x - radius, y - radius, x + radius, y + radius)
+            if option == chosen:
+                draw.ellipse(box, fill=20)
+            else:
+                draw.ellipse(box, outline=0, width=3)
+                draw.text((x - 6, y - 10), "ABCD"[option], fill=0, font=_font(18))
+    return image, {"has_diagrams": True, "diagram_types": [MCQ_TYPE]}
+
+
+def _chart_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    _paragraphs(draw, rng, 100, 400, _font(24))
+    origin_x, origin_y = 200, 1200
+    draw.line((origin_x, origin_y, origin_x, 600), fill=0, width=4)
+    draw.line((origin_x, origin_y, 1000, origin_y), fill=0, width=4)
+    if rng.random() < 0.5:
+        for i in range(rng.randint(4, 7)):
+            left = origin_x + 40 + i * 110
+            draw.rectangle((left, origin_y - rng.randint(100, 550), left + 70, origin_y), fill=rng.randint(60, 160))
+    else:
+        points = [(origin_x + i * 80, origin_y - rng.randint(50, 550)) for i in range(1, 10)]
+        draw.line(points, fill=0, width=4)
+    return image, {"has_diagrams": True, "diagram_types": [CHART_TYPE]}
+
+
+def _table_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    font = _font(22)
+    rows, columns = rng.randint(4, 10), rng.randint(3, 5)
+    left, top, cell_w, cell_h = 120, 250, 1000 // columns, 60
+    for r in range(rows + 1):
+        draw.line((left, top + r * cell_h, left + columns * cell_w, top + r * cell_h), fill=0, width=2)
+    for c in range(columns + 1):
+        draw.line((left + c * cell_w, top, left + c * cell_w, top + rows * cell_h), fill=0, width=2)
+    for r in range(rows):
+        for c in range(columns):
+            draw.text((left + c * cell_w + 15, top + r * cell_h + 18), rng.choice(WORDS), fill=0, font=font)
+    return image, {"has_diagrams": True, "diagram_types": [TABLE_TYPE]}
+
+
+def _figure_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    _paragraphs(draw, rng, 100, 300, _font(24))
+    cx, cy = rng.randint(450, 800), rng.randint(800, 1100)
+    draw.ellipse((cx - 300, cy - 220, cx + 300, cy + 220), outline=0, width=5)
+    draw.ellipse((cx - 90, cy - 70, cx + 90, cy + 70), fill=90, outline=0, width=4)
+    for _ in range(rng.randint(3, 6)):
+        x, y = cx + rng.randint(-250, 250), cy + rng.randint(-180, 180)
+        draw.polygon([(x, y), (x + 40, y + 60), (x - 40, y + 60)], outline=0, width=3)
+        draw.line((x, y, x + rng.randint(150, 300), y - rng.randint(50, 120)), fill=0, width=2)
+    return image, {"has_diagrams": True, "diagram_types": [FIGURE_TYPE]}
+
+
+def _text_mcq_page(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    font = _font(24)
+    lines = []
+    y = 120
+    for question in range(5):
+        lines.append(f"{question + 1}. Which statement about {rng.choice(WORDS)} is true?")
+        lines.extend(f"{letter}) {' '.join(rng.choice(WORDS) for _ in range(4))}" for letter in "ABCD")
+    for line in lines:
+        draw.text((100, y), line, fill=0, font=font)
+        y += 38
+    return image, {"has_diagrams": True, "diagram_types": [MCQ_TYPE], "text": "\n".join(lines)}
+
+
+KINDS = {
+    "text": _text_page,
+    "bubbles": _bubble_page,
+    "chart": _chart_page,
+    "table": _table_page,
+    "figure": _figure_page,
+    "text_mcq": _text_mcq_page,
+}
+
+
+def _scan_noise(image, rng):
+    """Gray paper, slight skew, blur and sensor noise."""
+    image = image.rotate(rng.uniform(-1.5, 1.5), fillcolor=255, resample=Image.BILINEAR)
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 1.0)))
+    pixels = np.asarray(image, dtype=np.float32) * rng.uniform(0.85, 0.97)
+    pixels += np.random.default_rng(rng.randrange(1 << 30)).normal(0, 6, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def generate_fixtures(directory, per_kind=10, seed=7):
+    """Write synthetic labeled pages and labels.json into a directory."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    labels = {}
+    for kind, make_page in KINDS.items():
+        for i in range(per_kind):
+            image, label = make_page(rng)
+            filename = f"{kind}_{i:02d}.png"
+            _scan_noise(image, rng).save(os.path.join(directory, filename))
+            labels[filename] = dict(label, source="synthetic")
+    with open(os.path.join(directory, 'labels.json'), 'w') as f:
+        json.dump(labels, f, indent=2)
+    return labels
+
+
+def evaluate(directory, detector, name):
+    """Run a detector over the fixtures and print agreement and latency."""
+    with open(os.path.join(directory, 'labels.json'), 'r') as f:
+        labels = json.load(f)
+
+    synthetic = {k: v for k, v in labels.items() if v.get('source') == 'synthetic'}
+    labeled = {k: v for k, v in labels.items() if k not in synthetic}
+    latencies = []
+    print(f"\n{name}:")
+    if labeled:
+        _report(directory, detector, labeled, "has_diagrams agreement with labeled pages", latencies)
+    else:
+        print("  no labeled pages: agreement not measured")
+    if synthetic:
+        _report(directory, detector, synthetic, "synthetic self-check (not an agreement measurement)", latencies)
+
+    latencies.sort()
+    print(f"  latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms")
+
+
+def _report(directory, detector, labels, title, latencies):
+    agree = 0
+    type_hits = {}
+    disagreements = []
+    for filename, label in sorted(labels.items()):
+        with open(os.path.join(directory, filename), 'rb') as f:
+            image_data = f.read()
+        start = time.perf_counter()
+        result = detector(image_data, label.get('text'))
+        latencies.append(time.perf_counter() - start)
+
+        if result['has_diagrams'] == label['has_diagrams']:
+            agree += 1
+        else:
+            disagreements.append((filename, result['diagram_types'], result['confidence']))
+        for diagram_type in label['diagram_types']:
+            hits, total = type_hits.get(diagram_type, (0, 0))
+            type_hits[diagram_type] = (hits + (diagram_type in result['diagram_types']), total + 1)
+
+    print(f"  {title}: {agree}/{len(labels)} ({agree / len(labels):.1%})")
+    for diagram_type, (hits, total) in sorted(type_hits.items()):
+        print(f"    {diagram_type:<35} recall {hits}/{total}")
+    for filename, types, confidence in disagreements:
+        print(f"    disagree: {filename} -> {types or 'no diagrams'} ({confidence})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure local diagram detector agreement")
+    parser.add_argument('--fixtures', required=True, help="Directory with page images and labels.json")
+    parser.add_argument('--generate', action='store_true', help="Write a synthetic fixture set first")
+    parser.add_argument('--per-kind', type=int, default=10, help="Synthetic pages per kind")
+    parser.add_argument('--vision', action='store_true', help="Also evaluate the GPT-4o detector")
+    args = parser.parse_args()
+
+    if args.generate:
+        labels = generate_fixtures(args.fixtures, args.per_kind)
+        print(f"Wrote {len(labels)} fixtures to {args.fixtures}")
+
+    evaluate(args.fixtures, detect_diagrams_locally, "Local detector")
+
+    if args.vision:
+        from image_processor.ocr import detect_diagrams_with_vision
+        evaluate(args.fixtures, lambda image_data, text: detect_diagrams_with_vision(image_data), "GPT-4o detector")
+
+
+if __name__ == '__main__':
+    main()
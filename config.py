@@ -22,14 +22,69 @@ class Config:
     
     # Tesseract configuration (for OCR)
     TESSERACT_PATH = os.getenv('TESSERACT_PATH')
+    OCR_TIERED = os.getenv('OCR_TIERED', 'True').lower() in ('true', '1', 't')  # Tesseract first, vision on low confidence
+    OCR_CONFIDENCE_THRESHOLD = float(os.getenv('OCR_CONFIDENCE_THRESHOLD', '80'))  # Mean word confidence (0-100)
+    DIAGRAM_VISION_TIEBREAKER = os.getenv('DIAGRAM_VISION_TIEBREAKER', 'False').lower() in ('true', '1', 't')  # Ask GPT-4 Vision when local diagram detection is unsure
+    
+    # Prompt token budgets; longer submissions are graded in sections and merged
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '24000'))  # Default input tokens per grading prompt
+    MODEL_TOKEN_BUDGETS = os.getenv('MODEL_TOKEN_BUDGETS', '')  # Per-model overrides, e.g. "gemini-2.5-flash-lite=24000,gpt-4o=16000"
+    MAP_REDUCE_MAX_WORKERS = int(os.getenv('MAP_REDUCE_MAX_WORKERS', '4'))  # Sections/page groups graded in parallel
+    VISION_GROUP_TOKEN_BUDGET = int(os.getenv('VISION_GROUP_TOKEN_BUDGET', '4000'))  # Image tokens per vision request for multi-page PDFs
+    
+    # Batch answer grouping; identical submissions in a batch are graded once
+    ANSWER_GROUPING = os.getenv('ANSWER_GROUPING', 'off').lower()  # 'off', 'exact' or 'near' (near-identical text, same numbers and choices)
+    ANSWER_GROUPING_SIMILARITY = float(os.getenv('ANSWER_GROUPING_SIMILARITY', '0.9'))  # Min MinHash similarity (0-1) for 'near'
+    
+    # Concurrent identical OCR and grading calls (double-clicks, retries) share one in-flight model call
+    SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', 'True').lower() in ('true', '1', 't')
+    
+    # Provider batch jobs for bulk, non-interactive grading
+    BATCH_PROVIDER = os.getenv('BATCH_PROVIDER', 'openai').lower()  # 'openai' (submitted and tracked) or 'gemini' (input file only)
+    BATCH_API_BASE_URL = os.getenv('BATCH_API_BASE_URL', '')  # OpenAI-compatible batch server, e.g. http://127.0.0.1:8089/v1 for batch_stub_server.py
+    BATCH_COMPLETION_WINDOW = os.getenv('BATCH_COMPLETION_WINDOW', '24h')
+    
+    # Grading backend: 'providers' (Gemini/OpenAI) or 'fake' for load testing without API calls
+    GRADING_BACKEND = os.getenv('GRADING_BACKEND', 'providers').lower()
+    FAKE_BACKEND_LATENCY = os.getenv('FAKE_BACKEND_LATENCY', 'lognormal:800,0.5')  # Text call latency in ms: fixed:MS, uniform:LO,HI, normal:MEAN,STD or lognormal:MEDIAN,SIGMA
+    FAKE_BACKEND_VISION_LATENCY = os.getenv('FAKE_BACKEND_VISION_LATENCY', 'lognormal:2500,0.4')  # Vision call latency, same format
+    FAKE_BACKEND_ERROR_RATE = float(os.getenv('FAKE_BACKEND_ERROR_RATE', '0'))  # Fraction of calls failing with a 503
+    FAKE_BACKEND_RATE_LIMIT_RATE = float(os.getenv('FAKE_BACKEND_RATE_LIMIT_RATE', '0'))  # Fraction of calls failing with a 429
+    FAKE_BACKEND_MALFORMED_RATE = float(os.getenv('FAKE_BACKEND_MALFORMED_RATE', '0'))  # Fraction of JSON replies that are truncated
+    FAKE_BACKEND_SEED = int(os.getenv('FAKE_BACKEND_SEED', '0'))
+    
+    # Prometheus metrics at /metrics (stage timings, provider calls and errors)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    
+    # Structured logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' (one object per line) or 'text'
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))  # Fraction of DEBUG records written
+    LOG_PAYLOAD_CHARS = int(os.getenv('LOG_PAYLOAD_CHARS', '300'))  # Model output/student text kept per record
+    LOG_REDACT = os.getenv('LOG_REDACT', 'True').lower() in ('true', '1', 't')  # Mask names, e-mails and phone numbers in payloads
+    
+    # Token and cost accounting (ledger at classes/usage.jsonl, rollups at /usage)
+    MODEL_PRICES = os.getenv('MODEL_PRICES', '')  # USD per 1M input/output tokens, e.g. "gpt-4o=2.50/10.00"; adds to or overrides built-in prices
+    USAGE_FLUSH_RECORDS = int(os.getenv('USAGE_FLUSH_RECORDS', '50'))  # Buffered usage records per ledger write
+    USAGE_FLUSH_SECONDS = float(os.getenv('USAGE_FLUSH_SECONDS', '10'))  # Max age of a buffered usage record
     
     # Flask configuration
     DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
     HOST = os.getenv('HOST', '127.0.0.1')
     PORT = int(os.getenv('PORT', '8080'))
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    DATA_FOLDER = os.getenv('DATA_FOLDER', '')  # Folder holding rubrics/ and classes/ (default: next to app.py)
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB by default
     
+    # Production serving (gunicorn -c gunicorn.conf.py wsgi:application)
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))  # Worker processes (0 = one per CPU core); keep 1, the JSON data files are not locked across processes
+    WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')  # 'gthread' or 'gevent' (pip install gevent)
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '16'))  # Concurrent requests per gthread worker
+    WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', '200'))  # Concurrent requests per gevent worker
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '300'))  # Seconds before a silent worker is restarted; model calls are slow
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '120'))  # Seconds in-flight grading gets to finish on shutdown
+    WARM_UP = os.getenv('WARM_UP', 'True').lower() in ('true', '1', 't')  # Load provider SDKs in the background once the server is up
+    
     # Assignment folder configuration
     ASSIGNMENT_FOLDER = os.getenv('ASSIGNMENT_FOLDER', 'assignment')
     
@@ -6,9 +6,12 @@ This module provides functionality to export student grading data to Excel forma
 
 import os
 import json
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from datetime import datetime
+from scoring import normalize_score
+from metrics import span
+
+# Columns holding long free text; their widths are capped when auto-sizing
+LONG_TEXT_COLUMNS = ("Feedback", "Extracted Text")
 
 def convert_complex_to_str(value):
     """
@@ -142,6 +145,25 @@ def format_structured_grading_result(grading_data):
         except:
             return str(grading_data)
 
+def result_percentage(result):
+    """
+    Get the numeric percentage for a grading result
+    
+    Uses the canonical 'score_normalized' record attached at grading time and
+    only parses the raw score for results that do not carry one.
+    
+    Args:
+        result (dict): A grading result or grade record
+        
+    Returns:
+        float or None: The percentage rounded to 2 decimals, or None if the
+        result has no usable score
+    """
+    normalized = result.get("score_normalized") or normalize_score(result.get("score"))
+    percentage = normalized.get("percentage")
+    return round(percentage, 2) if percentage is not None else None
+
+@span('excel_export')
 def create_excel_for_batch_results(results, summary, assignment_name=None):
     """
     Create an Excel file from batch grading results using openpyxl
@@ -154,6 +176,9 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
     Returns:
         tuple: (file_path, filename) - Path to the saved Excel file and the filename
     """
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment
+
     # Create a timestamp for the filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
@@ -179,7 +204,7 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
     summary_sheet.title = "Summary"
     
     # Add headers
-    headers = ["Student Name", "Filename", "Score", "Status", "Feedback"]
+    headers = ["Student Name", "Filename", "Score", "Percentage", "Status", "Feedback"]
     for col, header in enumerate(headers, 1):
         cell = summary_sheet.cell(row=1, column=col)
         cell.value = header
@@ -197,14 +222,15 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
             summary_sheet.cell(row=row, column=1).value = student_name
             summary_sheet.cell(row=row, column=2).value = result_filename
             summary_sheet.cell(row=row, column=3).value = convert_complex_to_str(result.get("score", "N/A"))
+            summary_sheet.cell(row=row, column=4).value = result_percentage(result)
             
             if "error" in result:
-                summary_sheet.cell(row=row, column=4).value = "Failed"
-                summary_sheet.cell(row=row, column=5).value = convert_complex_to_str(result.get("error", "Unknown error"))
+                summary_sheet.cell(row=row, column=5).value = "Failed"
+                summary_sheet.cell(row=row, column=6).value = convert_complex_to_str(result.get("error", "Unknown error"))
             else:
-                summary_sheet.cell(row=row, column=4).value = "Processed"
+                summary_sheet.cell(row=row, column=5).value = "Processed"
                 # Safely convert feedback to string
-                summary_sheet.cell(row=row, column=5).value = convert_complex_to_str(result.get("feedback", ""))
+                summary_sheet.cell(row=row, column=6).value = convert_complex_to_str(result.get("feedback", ""))
             
             row += 1
         except Exception as e:
@@ -238,7 +264,7 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
         details_sheet = wb.create_sheet(title="Details")
         
         # Add headers for details sheet
-        detail_headers = ["Student Name", "Filename", "Score", "Feedback", "Extracted Text"]
+        detail_headers = ["Student Name", "Filename", "Score", "Percentage", "Feedback", "Extracted Text"]
         for col, header in enumerate(detail_headers, 1):
             cell = details_sheet.cell(row=1, column=col)
             cell.value = header
@@ -257,15 +283,16 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
                     details_sheet.cell(row=row, column=1).value = student_name
                     details_sheet.cell(row=row, column=2).value = result_filename
                     details_sheet.cell(row=row, column=3).value = convert_complex_to_str(result.get("score", "N/A"))
+                    details_sheet.cell(row=row, column=4).value = result_percentage(result)
                     
                     # Safely convert feedback and extracted text to strings
-                    details_sheet.cell(row=row, column=4).value = convert_complex_to_str(result.get("feedback", ""))
+                    details_sheet.cell(row=row, column=5).value = convert_complex_to_str(result.get("feedback", ""))
                     
                     # Get extracted text, limited to avoid Excel cell size limits
                     extracted_text = convert_complex_to_str(result.get("extracted_text", ""))
                     if len(extracted_text) > 32000:  # Excel has a limit around 32,767 characters per cell
                         extracted_text = extracted_text[:32000] + "... (truncated)"
-                    details_sheet.cell(row=row, column=5).value = extracted_text
+                    details_sheet.cell(row=row, column=6).value = extracted_text
                     
                     row += 1
                 except Exception as e:
@@ -292,7 +319,7 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
                 
                 adjusted_width = max_length + 2
                 # Set a maximum width for text columns
-                if column in ['E', 'D']:
+                if col[0].value in LONG_TEXT_COLUMNS:
                     adjusted_width = min(adjusted_width, 60)
                 
                 sheet.column_dimensions[column].width = adjusted_width
@@ -317,6 +344,7 @@ def create_excel_for_batch_results(results, summary, assignment_name=None):
             raise
 
 
+@span('excel_save')
 def save_excel_file(file_path, filename, directory="exports"):
     """
     Copy an Excel file to the specified directory if needed
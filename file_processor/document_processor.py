@@ -4,6 +4,11 @@ import platform
 import shutil
 from typing import Union
 import io
+import logging
+from metrics import span
+from logs import get_logger, payload
+
+logger = get_logger('file_processor.documents')
 
 def _get_poppler_path():
     """
@@ -15,7 +20,7 @@ def _get_poppler_path():
         from poppler_config import get_manual_poppler_path
         manual_path = get_manual_poppler_path()
         if manual_path:
-            print(f"Using manually configured Poppler at: {manual_path}")
+            logger.debug("Using manually configured Poppler", extra={'poppler_path': manual_path})
             return manual_path
     except ImportError:
         pass  # poppler_config.py not found, continue with auto-detection
@@ -58,7 +63,7 @@ def _get_poppler_path():
         if path and os.path.exists(path):
             binary_path = os.path.join(path, binary_name)
             if os.path.exists(binary_path):
-                print(f"Found Poppler at: {path}")
+                logger.debug("Found Poppler", extra={'poppler_path': path})
                 return path
     
     return None
@@ -87,6 +92,7 @@ Linux Installation:
 1. Ubuntu/Debian: sudo apt-get install poppler-utils
 2. Using conda: conda install -c conda-forge poppler"""
 
+@span('file_extraction')
 def extract_text_from_file(file_content: bytes, filename: str) -> str:
     """
     Extract text from various file formats including TXT, PDF, DOC, DOCX, and image files.
@@ -132,6 +138,7 @@ def _extract_text_from_txt(file_content: bytes) -> str:
     except Exception as e:
         raise Exception(f"Failed to extract text from TXT file: {str(e)}")
 
+@span('pdf_ocr')
 def _extract_text_from_pdf_with_ocr(file_content: bytes) -> str:
     """
     Extract text from a PDF file using OCR (pdf2image + GPT-4 Vision) as fallback.
@@ -141,34 +148,28 @@ def _extract_text_from_pdf_with_ocr(file_content: bytes) -> str:
         from pdf2image import convert_from_bytes
         from image_processor.ocr import extract_text_from_image
         
-        print("Converting PDF to images for OCR processing...")
-        
         # Get cross-platform Poppler path
         poppler_path = _get_poppler_path()
         
         # Try to convert PDF pages to images
         try:
             if poppler_path:
-                print(f"Using Poppler at: {poppler_path}")
                 images = convert_from_bytes(file_content, dpi=200, fmt='PNG', poppler_path=poppler_path)
             else:
-                print("Using Poppler from system PATH")
                 images = convert_from_bytes(file_content, dpi=200, fmt='PNG')
         except Exception as poppler_error:
-            print(f"Failed to convert PDF to images: {poppler_error}")
+            logger.error("Failed to convert PDF to images", extra={'error': str(poppler_error)})
             install_instructions = _get_platform_install_instructions()
             return f"[OCR PROCESSING ERROR: Could not convert PDF pages to images. {poppler_error}. Please install Poppler:{install_instructions}]"
         
         if not images:
             return "[OCR PROCESSING ERROR: Could not convert PDF pages to images]"
         
-        print(f"Converted PDF to {len(images)} image(s)")
+        logger.info("Converted PDF for OCR", extra={'pages': len(images)})
         
         # Extract text from each page using OCR
         all_text = []
         for i, image in enumerate(images):
-            print(f"Processing page {i + 1} with OCR...")
-            
             # Convert PIL image to bytes
             img_byte_arr = io.BytesIO()
             image.save(img_byte_arr, format='PNG')
@@ -177,22 +178,23 @@ def _extract_text_from_pdf_with_ocr(file_content: bytes) -> str:
             # Extract text using GPT-4 Vision OCR
             try:
                 page_text = extract_text_from_image(img_bytes)
-                print(f"Page {i + 1} OCR result: {page_text[:100]}..." if len(page_text) > 100 else f"Page {i + 1} OCR result: {page_text}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Page OCR result", extra={'page': i + 1, 'text': payload(page_text, 100)})
                 
                 if page_text and not page_text.startswith('[No text detected') and not page_text.startswith('Error'):
                     all_text.append(f"--- Page {i + 1} ---\n{page_text}")
-                    print(f"Page {i + 1}: Extracted {len(page_text)} characters via OCR")
                 else:
-                    print(f"Page {i + 1}: No text detected via OCR - {page_text}")
+                    logger.warning("No text detected on page", extra={'page': i + 1, 'text': payload(page_text, 100)})
             except Exception as ocr_error:
-                print(f"Page {i + 1}: OCR failed with error: {ocr_error}")
+                logger.error("Page OCR failed", extra={'page': i + 1, 'error': str(ocr_error)})
                 continue
         
         if not all_text:
             return "[OCR PROCESSING WARNING: No text could be extracted from any page of the PDF using OCR. The document may not contain readable text.]"
         
         combined_text = "\n\n".join(all_text)
-        print(f"Total OCR text extracted: {len(combined_text)} characters")
+        logger.info("PDF OCR complete", extra={'pages': len(images), 'pages_with_text': len(all_text),
+                                               'chars': len(combined_text)})
         
         return combined_text
         
@@ -205,7 +207,7 @@ def _extract_text_from_pdf_with_ocr(file_content: bytes) -> str:
             return f"[OCR PROCESSING ERROR: Missing dependency - {str(e)}]"
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in PDF OCR processing: {error_msg}")
+        logger.error("PDF OCR processing failed", extra={'error': error_msg})
         
         # Check for specific Poppler error
         if "poppler" in error_msg.lower() or "unable to get page count" in error_msg.lower():
@@ -214,6 +216,7 @@ def _extract_text_from_pdf_with_ocr(file_content: bytes) -> str:
         
         return f"[OCR PROCESSING ERROR: {error_msg}]"
 
+@span('pdf_vision_first')
 def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
     """
     Extract text from a PDF file using GPT-4 Vision as the PRIMARY method,
@@ -222,8 +225,7 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
     try:
         from pdf2image import convert_from_bytes
         from image_processor.ocr import extract_text_from_image
-        
-        print("Using GPT-4 Vision as PRIMARY PDF processing method...")
+        from image_processor.page_filter import filter_pages
         
         # Get cross-platform Poppler path
         poppler_path = _get_poppler_path()
@@ -231,26 +233,24 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
         # Convert PDF pages to images
         try:
             if poppler_path:
-                print(f"Using Poppler at: {poppler_path}")
                 images = convert_from_bytes(file_content, dpi=300, fmt='PNG', poppler_path=poppler_path)  # Higher DPI for better quality
             else:
-                print("Using Poppler from system PATH")
                 images = convert_from_bytes(file_content, dpi=300, fmt='PNG')
         except Exception as poppler_error:
-            print(f"Failed to convert PDF to images: {poppler_error}")
+            logger.error("Failed to convert PDF to images", extra={'error': str(poppler_error)})
             install_instructions = _get_platform_install_instructions()
             return f"[PDF PROCESSING ERROR: Could not convert PDF pages to images. {poppler_error}. Please install Poppler:{install_instructions}]"
         
         if not images:
             return "[PDF PROCESSING ERROR: Could not convert PDF pages to images]"
         
-        print(f"Successfully converted PDF to {len(images)} image(s) for GPT-4 Vision processing")
+        # Skip blank backs and duplicate scans before any vision call
+        kept, skipped = filter_pages(images)
         
-        # Process each page with GPT-4 Vision
+        # Process each remaining page with GPT-4 Vision
         all_text = []
-        for i, image in enumerate(images):
-            print(f"Processing page {i + 1} with GPT-4 Vision...")
-            
+        for i in kept:
+            image = images[i]
             # Convert PIL image to bytes
             img_byte_arr = io.BytesIO()
             image.save(img_byte_arr, format='PNG')
@@ -259,15 +259,14 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
             # Extract text using GPT-4 Vision with enhanced prompt
             try:
                 page_text = extract_text_from_image(img_bytes, assignment_type="document")
-                print(f"Page {i + 1} GPT-4 Vision result: {len(page_text)} characters extracted")
+                logger.debug("Page vision result", extra={'page': i + 1, 'chars': len(page_text)})
                 
                 if page_text and not page_text.startswith('[No text detected') and not page_text.startswith('Error'):
                     all_text.append(f"--- Page {i + 1} ---\n{page_text}")
-                    print(f"Page {i + 1}: Successfully processed with GPT-4 Vision")
                 else:
-                    print(f"Page {i + 1}: No meaningful text detected - {page_text[:100]}...")
+                    logger.warning("No meaningful text on page", extra={'page': i + 1, 'text': payload(page_text, 100)})
             except Exception as vision_error:
-                print(f"Page {i + 1}: GPT-4 Vision failed with error: {vision_error}")
+                logger.error("Page vision extraction failed", extra={'page': i + 1, 'error': str(vision_error)})
                 all_text.append(f"--- Page {i + 1} ---\n[GPT-4 Vision processing failed: {str(vision_error)}]")
                 continue
         
@@ -275,7 +274,8 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
             return "[PDF PROCESSING ERROR: GPT-4 Vision could not extract text from any page of the PDF. The document may not contain readable content.]"
         
         combined_text = "\n\n".join(all_text)
-        print(f"Total GPT-4 Vision text extracted: {len(combined_text)} characters")
+        logger.info("PDF vision extraction complete", extra={'pages': len(images), 'pages_sent': len(kept),
+                                                             'chars': len(combined_text)})
         
         return combined_text
         
@@ -288,7 +288,7 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
             return f"[PDF PROCESSING ERROR: Missing dependency - {str(e)}]"
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in GPT-4 Vision PDF processing: {error_msg}")
+        logger.error("PDF vision processing failed", extra={'error': error_msg})
         
         # Check for specific Poppler error
         if "poppler" in error_msg.lower() or "unable to get page count" in error_msg.lower():
@@ -297,53 +297,193 @@ def _extract_text_from_pdf_vision_first(file_content: bytes) -> str:
         
         return f"[PDF PROCESSING ERROR: {error_msg}]"
 
-def _extract_text_from_pdf(file_content: bytes) -> str:
+# A page's text layer is trusted when it has at least this many characters...
+MIN_TEXT_LAYER_CHARS = 200
+
+# ...or, on pages without embedded images, at least this many
+MIN_SPARSE_TEXT_LAYER_CHARS = 20
+
+# Minimum fraction of text-layer characters that are real glyphs; lower means
+# a broken font encoding and the page is read visually instead
+MIN_GLYPH_COVERAGE = 0.9
+
+def _count_page_images(page) -> int:
     """
-    Extract text from a PDF file using GPT-4 Vision as PRIMARY method,
-    with PyPDF2 as fallback only if Vision fails.
+    Count the image XObjects a PDF page draws, without decoding them.
     """
-    # Try GPT-4 Vision first
-    print("Attempting GPT-4 Vision processing for PDF...")
-    vision_result = _extract_text_from_pdf_vision_first(file_content)
-    
-    # If Vision was successful, return the result
-    if not vision_result.startswith('[PDF PROCESSING ERROR'):
-        print("GPT-4 Vision PDF processing successful!")
-        return vision_result
-    
-    # Only fall back to PyPDF2 if Vision completely failed
-    print("GPT-4 Vision failed, attempting PyPDF2 fallback...")
+    try:
+        resources = page.get('/Resources')
+        resources = resources.get_object() if resources is not None else {}
+        xobjects = resources.get('/XObject')
+        if xobjects is None:
+            return 0
+        xobjects = xobjects.get_object()
+        return sum(1 for name in xobjects if xobjects[name].get_object().get('/Subtype') == '/Image')
+    except Exception:
+        return 0
+
+def _glyph_coverage(text: str) -> float:
+    """
+    Fraction of non-whitespace characters that are printable glyphs rather than
+    replacement, control or private-use characters.
+    """
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    good = sum(1 for c in chars if c.isprintable() and c != '\ufffd' and not ('\ue000' <= c <= '\uf8ff'))
+    return good / len(chars)
+
+def _classify_pdf_page(page) -> dict:
+    """
+    Decide whether a PDF page can be read from its text layer or needs vision.
     
+    Returns:
+        dict: 'text', 'char_count', 'glyph_coverage', 'image_count' and
+        'use_text_layer' (bool)
+    """
     try:
-        import PyPDF2
-        import io
-        
-        # Create a file-like object from bytes
-        pdf_file = io.BytesIO(file_content)
-        
-        # Create PDF reader
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        # Extract text from all pages
+        text = page.extract_text() or ""
+    except Exception as e:
+        logger.warning("Text layer extraction failed", extra={'error': str(e)})
         text = ""
-        for page_num, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            print(f"Page {page_num + 1}: Extracted {len(page_text)} characters")
-            text += page_text + "\n"
-        
-        print(f"Total PyPDF2 text extracted: {len(text)} characters")
-        
-        # Check if we extracted meaningful content
-        if len(text.strip()) < 50:
-            print("PyPDF2 also extracted insufficient text...")
-            return f"[PDF PROCESSING WARNING: Both GPT-4 Vision and PyPDF2 failed to extract meaningful content. Vision error: {vision_result}. PyPDF2 extracted only {len(text.strip())} characters: {text.strip()}]"
-        
-        return text.strip()
+    
+    char_count = sum(1 for c in text if not c.isspace())
+    coverage = _glyph_coverage(text)
+    image_count = _count_page_images(page)
+    
+    if coverage < MIN_GLYPH_COVERAGE:
+        use_text_layer = False
+    elif image_count:
+        # Scans and photographed work are images; a short text layer on top
+        # of them (headers, form labels) does not contain the student's work
+        use_text_layer = char_count >= MIN_TEXT_LAYER_CHARS
+    else:
+        # No images: born-digital text, unless it is (nearly) empty, which is
+        # the case for pages of vector ink from tablet apps
+        use_text_layer = char_count >= MIN_SPARSE_TEXT_LAYER_CHARS
+    
+    return {
+        "text": text,
+        "char_count": char_count,
+        "glyph_coverage": round(coverage, 3),
+        "image_count": image_count,
+        "use_text_layer": use_text_layer
+    }
+
+@span('pdf_rasterize')
+def _rasterize_pdf_page(file_content: bytes, page_number: int, dpi: int = 300):
+    """
+    Render a single PDF page (1-based) to a PIL image.
+    """
+    from pdf2image import convert_from_bytes
+    
+    poppler_path = _get_poppler_path()
+    kwargs = {"dpi": dpi, "fmt": 'PNG', "first_page": page_number, "last_page": page_number}
+    if poppler_path:
+        kwargs["poppler_path"] = poppler_path
+    images = convert_from_bytes(file_content, **kwargs)
+    if not images:
+        raise Exception(f"Could not render page {page_number}")
+    return images[0]
+
+@span('pdf_pages')
+def extract_pdf_pages(file_content: bytes) -> list:
+    """
+    Extract text from each page of a PDF, reading the text layer where it is
+    usable and rasterizing only the scanned or handwritten pages for vision OCR.
+    
+    Args:
+        file_content (bytes): The PDF file content as bytes
         
+    Returns:
+        list: One dict per page in page order with 'page' (1-based), 'text'
+        and 'method' ('text_layer', 'vision', 'skipped' or 'failed'); skipped
+        pages (blank or a duplicate scan) also carry 'skip_reason' and
+        'duplicate_of', and failed pages have empty text and an 'error'
+    """
+    import PyPDF2
+    from image_processor.page_filter import PageFilter
+    
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    
+    pages = []
+    vision_pages = []
+    for i, page in enumerate(pdf_reader.pages):
+        info = _classify_pdf_page(page)
+        logger.debug("Classified PDF page", extra={
+            'page': i + 1, 'chars': info['char_count'], 'images': info['image_count'],
+            'glyph_coverage': info['glyph_coverage'], 'method': 'text_layer' if info['use_text_layer'] else 'vision'
+        })
+        if info['use_text_layer']:
+            pages.append({"page": i + 1, "text": info['text'].strip(), "method": "text_layer"})
+        else:
+            pages.append({"page": i + 1, "text": "", "method": "vision"})
+            vision_pages.append(pages[-1])
+    
+    page_filter = PageFilter()
+    for page in vision_pages:
+        try:
+            from image_processor.ocr import extract_text_from_image
+            
+            image = _rasterize_pdf_page(file_content, page['page'])
+            skip = page_filter.check(image, page['page'])
+            if skip:
+                logger.info("Skipped PDF page", extra={
+                    'page': page['page'], 'reason': skip['reason'], 'duplicate_of': skip['duplicate_of']
+                })
+                page.update({"method": "skipped", "skip_reason": skip['reason'], "duplicate_of": skip['duplicate_of']})
+                continue
+            img_byte_arr = io.BytesIO()
+            image.save(img_byte_arr, format='PNG')
+            page['text'] = extract_text_from_image(img_byte_arr.getvalue(), assignment_type="document")
+        except Exception as e:
+            logger.error("Page vision extraction failed", extra={'page': page['page'], 'error': str(e)})
+            page.update({"method": "failed", "text": "", "error": str(e)})
+    
+    skipped_count = sum(1 for page in vision_pages if page['method'] == "skipped")
+    logger.info("PDF pages extracted", extra={
+        'text_layer': len(pages) - len(vision_pages), 'vision': len(vision_pages) - skipped_count, 'skipped': skipped_count
+    })
+    return pages
+
+@span('pdf_text')
+def _extract_text_from_pdf(file_content: bytes) -> str:
+    """
+    Extract text from a PDF file, page by page: born-digital pages are read
+    from the text layer with PyPDF2 and only scanned/handwritten pages are
+    rasterized and sent to vision OCR. Falls back to full-document vision
+    processing when the PDF cannot be parsed.
+    """
+    try:
+        pages = extract_pdf_pages(file_content)
     except ImportError:
-        return f"[PDF PROCESSING ERROR: Both GPT-4 Vision and PyPDF2 failed. Vision error: {vision_result}. PyPDF2 not available.]"
+        logger.warning("PyPDF2 not available, using vision for every page")
+        return _extract_text_from_pdf_vision_first(file_content)
     except Exception as e:
-        return f"[PDF PROCESSING ERROR: Both GPT-4 Vision and PyPDF2 failed. Vision error: {vision_result}. PyPDF2 error: {str(e)}]"
+        logger.warning("Could not parse PDF text layer, using vision for every page", extra={'error': str(e)})
+        return _extract_text_from_pdf_vision_first(file_content)
+    
+    all_text = []
+    for page in pages:
+        text = page['text']
+        if text and not text.startswith('[No text detected') and not text.startswith('Error'):
+            all_text.append(f"--- Page {page['page']} ---\n{text}")
+    
+    # Failed pages are left out of the text rather than graded as content
+    failed = [page for page in pages if page['method'] == "failed"]
+    if failed:
+        logger.warning("PDF pages could not be processed", extra={
+            'pages': [page['page'] for page in failed], 'error': failed[0]['error']
+        })
+    
+    if not all_text:
+        if failed:
+            return f"[PDF PROCESSING ERROR: Could not extract text from any page of the PDF. {failed[0]['error']}]"
+        return "[PDF PROCESSING ERROR: Could not extract text from any page of the PDF. The document may not contain readable content.]"
+    
+    combined_text = "\n\n".join(all_text)
+    logger.info("PDF text extracted", extra={'chars': len(combined_text)})
+    return combined_text
 
 def _extract_text_from_word(file_content: bytes, file_ext: str) -> str:
     """
@@ -362,6 +502,7 @@ def _extract_text_from_word(file_content: bytes, file_ext: str) -> str:
     except Exception as e:
         raise Exception(f"Failed to extract text from Word file: {str(e)}")
 
+@span('docx_text')
 def _extract_text_from_docx(file_content: bytes) -> str:
     """
     Extract text from a DOCX file using python-docx.
@@ -388,6 +529,7 @@ def _extract_text_from_docx(file_content: bytes) -> str:
     except Exception as e:
         raise Exception(f"Failed to extract text from DOCX file: {str(e)}")
 
+@span('image_file_text')
 def _extract_text_from_image_file(file_content: bytes) -> str:
     """
     Extract text from image files using OCR.
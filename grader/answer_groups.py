@@ -0,0 +1,258 @@
+"""
+Answer-signature grouping for batch grading
+
+In multiple-choice and short-answer batches many students submit the same
+answers. Each submission is reduced to an answer signature - its text with
+the name/date header removed and case, spacing and punctuation normalized -
+and only one representative per group of identical signatures is graded.
+The result is copied to the other members with a note.
+
+Strictness (Config.ANSWER_GROUPING):
+- 'off': every submission is graded on its own
+- 'exact': only identical normalized answers are grouped
+- 'near': also groups near-identical text (MinHash estimate of word-shingle
+  similarity), but only when the numbers and choice letters match exactly
+"""
+
+import copy
+import hashlib
+import re
+import threading
+import zlib
+import numpy as np
+from config import Config
+from metrics import span
+from logs import get_logger
+
+logger = get_logger('grader.answer_groups')
+
+STRICTNESS_LEVELS = ('off', 'exact', 'near')
+
+# Only the first lines of a submission are checked for a header
+HEADER_LINES = 6
+
+# MinHash permutations and words per shingle for 'near' grouping
+NUM_PERMUTATIONS = 64
+SHINGLE_WORDS = 3
+
+_HEADER = re.compile(r'^\W*(name|student|date|class|period|teacher|section|id)\b\s*[:#\-]', re.IGNORECASE)
+_PAGE_MARKER = re.compile(r'^\s*--- Page \d+ ---\s*$', re.MULTILINE)
+_QUESTION_LABEL = re.compile(r'\b(?:q|question)\s*(\d+)', re.IGNORECASE)
+_LIST_MARKER = re.compile(r'^\s*\(?(\d{1,3})\s*[\.\):](?=\s|$)', re.MULTILINE)
+_ANSWER_TOKEN = re.compile(r'\d+(?:\.\d+)?|\b[a-e]\b')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240611)
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, NUM_PERMUTATIONS, dtype=np.uint64)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "batches": 0,
+    "submissions": 0,
+    "groups": 0,
+    "calls_saved": 0,
+}
+
+
+def submission_body(text):
+    """
+    Remove the name/date/class header lines from a submission.
+
+    Grouped submissions are graded on their body so that the shared
+    feedback does not name the representative student.
+    """
+    lines = text.splitlines() if isinstance(text, str) else []
+    head = [line for line in lines[:HEADER_LINES] if not _HEADER.match(line)]
+    return "\n".join(head + lines[HEADER_LINES:]).strip()
+
+
+def normalize_answers(text):
+    """
+    Normalize a submission body for comparison.
+
+    Lowercases, drops page markers, turns question labels ("Q3", "Question
+    3") and list markers at the start of a line ("3.", "3)") into "q3" so
+    they stay apart from the answers ("1. 3/4" is not "1 3/4"), replaces
+    punctuation other than math symbols and decimal points with spaces and
+    drops spaces around operators.
+    """
+    text = _PAGE_MARKER.sub(' ', submission_body(text).lower())
+    text = _QUESTION_LABEL.sub(r'q\1', text)
+    text = _LIST_MARKER.sub(r'q\1', text)
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    text = re.sub(r'[^\w\s=+\-*/^<>.%]', ' ', text)
+    text = re.sub(r'\s*([=+\-*/^<>])\s*', r'\1', text)
+    return " ".join(text.split())
+
+
+def answer_signature(text):
+    """Hash of the normalized answers; equal for identical submissions."""
+    return hashlib.sha1(normalize_answers(text).encode('utf-8')).hexdigest()
+
+
+def answer_tokens(normalized):
+    """The numbers and single choice letters of a normalized submission."""
+    return tuple(_ANSWER_TOKEN.findall(normalized))
+
+
+def minhash(normalized):
+    """
+    MinHash of a normalized submission's word shingles.
+
+    Returns:
+        numpy.ndarray: NUM_PERMUTATIONS minimum hash values
+    """
+    words = normalized.split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.array([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64)
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def estimated_similarity(signature, other):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(signature == other))
+
+
+@span('answer_grouping')
+def group_submissions(texts, strictness=None, similarity=None):
+    """
+    Group submissions whose answers are the same.
+
+    Empty submissions are never grouped.
+
+    Args:
+        texts (list): Extracted submission texts
+        strictness (str, optional): 'off', 'exact' or 'near'; defaults to
+            Config.ANSWER_GROUPING
+        similarity (float, optional): Minimum estimated similarity for
+            'near'; defaults to Config.ANSWER_GROUPING_SIMILARITY
+
+    Returns:
+        list: Groups of indexes into texts, in order of first appearance;
+        the first index of each group is its representative
+    """
+    strictness = strictness or Config.ANSWER_GROUPING
+    if strictness not in STRICTNESS_LEVELS:
+        logger.warning("Unknown answer grouping strictness, grouping exact answers only",
+                       extra={'strictness': strictness})
+        strictness = 'exact'
+    similarity = Config.ANSWER_GROUPING_SIMILARITY if similarity is None else similarity
+
+    groups = []
+    by_signature = {}
+    normalized = {}
+    for index, text in enumerate(texts):
+        body = normalize_answers(text)
+        if strictness == 'off' or not body:
+            groups.append([index])
+            continue
+        key = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        if key in by_signature:
+            by_signature[key].append(index)
+        else:
+            by_signature[key] = [index]
+            groups.append(by_signature[key])
+            normalized[index] = body
+
+    if strictness != 'near':
+        return groups
+
+    # Merge exact groups into the first earlier group with the same answer
+    # tokens and a similar enough MinHash
+    merged = []
+    candidates = {}
+    for group in groups:
+        body = normalized.get(group[0])
+        if body is None:
+            merged.append(group)
+            continue
+        signature = minhash(body)
+        bucket = candidates.setdefault(answer_tokens(body), [])
+        match = next((g for g, s in bucket if estimated_similarity(signature, s) >= similarity), None)
+        if match is None:
+            bucket.append((group, signature))
+            merged.append(group)
+        else:
+            match.extend(group)
+    return merged
+
+
+def _member_note(size):
+    others = size - 1
+    return (f"*Note: the answers in this submission matched {others} other submission{'s' if others != 1 else ''} "
+            f"in this batch, so they were graded once together.*")
+
+
+def grade_grouped(texts, grade_one, strictness=None, similarity=None):
+    """
+    Grade one representative per answer group and fan the result out.
+
+    Args:
+        texts (list): Extracted submission texts
+        grade_one (callable): Grades a submission, called as
+            grade_one(text) with the submission body, returning a grading
+            result with 'score' and 'feedback'
+        strictness (str, optional): See group_submissions
+        similarity (float, optional): See group_submissions
+
+    Returns:
+        tuple: (results aligned with texts, batch stats). Grouped results
+        carry 'answer_group' ({'representative', 'size'}) and members get a
+        note prepended to their feedback. When grading a representative
+        raises, every member's result is the exception, for the caller to
+        record per submission.
+    """
+    groups = group_submissions(texts, strictness, similarity)
+    results = [None] * len(texts)
+    for group in groups:
+        representative = group[0]
+        try:
+            text = submission_body(texts[representative]) if len(group) > 1 else texts[representative]
+            result = grade_one(text)
+        except Exception as e:
+            logger.error("Error grading submission", extra={'submission': representative + 1, 'error': str(e)})
+            for index in group:
+                results[index] = e
+            continue
+
+        results[representative] = result
+        if len(group) == 1:
+            continue
+        result['answer_group'] = {"representative": representative, "size": len(group)}
+        for index in group[1:]:
+            member = copy.deepcopy(result)
+            member['feedback'] = f"{_member_note(len(group))}\n\n{member.get('feedback', '')}"
+            results[index] = member
+
+    stats = {
+        "strictness": strictness or Config.ANSWER_GROUPING,
+        "submissions": len(texts),
+        "groups": len(groups),
+        "grading_calls": len(groups),
+        "calls_saved": len(texts) - len(groups)
+    }
+    with _stats_lock:
+        _stats['batches'] += 1
+        _stats['submissions'] += stats['submissions']
+        _stats['groups'] += stats['groups']
+        _stats['calls_saved'] += stats['calls_saved']
+    if stats['calls_saved']:
+        logger.info("Answer grouping", extra={'submissions': len(texts), 'grading_calls': len(groups),
+                                              'calls_saved': stats['calls_saved']})
+    return results, stats
+
+
+def get_grouping_stats():
+    """
+    Get answer-grouping counters since startup.
+
+    Returns:
+        dict: Batches, submissions, groups and grading calls saved, plus the
+        fraction of calls saved
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['calls_saved_rate'] = round(stats['calls_saved'] / stats['submissions'], 4) if stats['submissions'] else 0.0
+    return stats
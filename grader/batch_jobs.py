@@ -0,0 +1,278 @@
+"""
+Provider batch-API grading for bulk, non-interactive regrades
+
+Instead of one synchronous call per submission, grading requests are written
+into a provider batch input file (JSONL), submitted as one batch job and
+ingested when the job completes - typically within hours, at the provider's
+batch discount.
+
+- OpenAI Batch API: requests are submitted and tracked with OpenAIBatchClient.
+  Config.BATCH_API_BASE_URL points it at any OpenAI-compatible batch server,
+  e.g. batch_stub_server.py for offline testing.
+- Gemini batch prediction: input files are written in Gemini's
+  {"key", "request"} format and output files of that format are parsed, but
+  submission is left to Google's tooling (google-generativeai has no batch
+  support).
+
+Questions the compiled rubric can score from exact answers are scored
+locally, as in synchronous grading: submissions with no other questions are
+graded right away, the rest go into the batch with the rubric scoped to the
+remaining questions, and merge_local_scores adds the local scores back when
+the batch results come in.
+
+TODO: batch responses are not recorded in the usage ledger; the provider
+bills them per job, at the batch discount.
+"""
+
+import json
+from config import Config
+from scoring import normalize_grading_result
+from grader.prompts import create_grading_prompt
+from grader.engine import _plan_grading, _exact_answer_result, _finish_grading
+from metrics import span
+from logs import get_logger
+
+logger = get_logger('grader.batch_jobs')
+
+PROVIDERS = ('openai', 'gemini')
+
+SYSTEM_PROMPT = "You are an expert grading assistant that evaluates student work based on provided rubrics."
+
+# Provider job states that will not change any more
+FINAL_STATES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def build_batch_request(custom_id, prompt, provider='openai'):
+    """
+    Build one line of a batch input file.
+
+    Args:
+        custom_id (str): Identifies the submission in the output file
+        prompt (str): The grading prompt
+        provider (str): 'openai' or 'gemini'
+
+    Returns:
+        dict: The request in the provider's batch format
+    """
+    if provider == 'gemini':
+        return {
+            "key": custom_id,
+            "request": {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "generationConfig": {"temperature": 0.3, "maxOutputTokens": 4000}
+            }
+        }
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": Config.OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "max_completion_tokens": 4000
+        }
+    }
+
+
+@span('batch_prepare')
+def prepare_batch(submissions, assignment_type, rubric, provider='openai', compiled_rubric=None):
+    """
+    Turn submissions into batch requests, grading locally where possible.
+
+    Args:
+        submissions (list): Dicts with 'custom_id' and 'text'
+        assignment_type (str): The type of assignment
+        rubric (str): The grading rubric
+        provider (str): 'openai' or 'gemini'
+        compiled_rubric (dict, optional): A stored compiled rubric
+
+    Returns:
+        tuple: (batch requests, {custom_id: result} for submissions graded
+        locally from the compiled rubric's exact answers)
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown batch provider: {provider}")
+
+    requests, local_results = [], {}
+    for submission in submissions:
+        compiled, exact, model_rubric = _plan_grading(submission['text'], rubric, compiled_rubric)
+        if model_rubric is None:
+            result = _exact_answer_result(exact, compiled['total_points'])
+            local_results[submission['custom_id']] = _finish_grading(result, compiled, exact, model_rubric)
+            continue
+        prompt = create_grading_prompt(assignment_type, submission['text'], model_rubric)
+        requests.append(build_batch_request(submission['custom_id'], prompt, provider))
+    logger.info("Batch prepared", extra={'requests': len(requests), 'graded_locally': len(local_results)})
+    return requests, local_results
+
+
+def merge_local_scores(results, submissions, rubric, compiled_rubric=None):
+    """
+    Add the locally scored exact answers back into batch results, the same
+    way synchronous grading does.
+
+    Args:
+        results (dict): {custom_id: result} from parse_batch_output
+        submissions (dict): {custom_id: submission text}
+        rubric (str): The grading rubric
+        compiled_rubric (dict, optional): A stored compiled rubric
+
+    Returns:
+        dict: The results, each scored over the whole rubric
+    """
+    for custom_id, result in results.items():
+        if 'error' in result or custom_id not in submissions:
+            continue
+        compiled, exact, model_rubric = _plan_grading(submissions[custom_id], rubric, compiled_rubric)
+        results[custom_id] = _finish_grading(result, compiled, exact, model_rubric)
+    return results
+
+
+def to_jsonl(requests):
+    """Serialize batch requests as a JSONL input file."""
+    return "".join(json.dumps(request) + "\n" for request in requests).encode('utf-8')
+
+
+def _clean_json(content):
+    content = (content or "").strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return content.strip()
+
+
+def _output_line(line):
+    """Extract (custom_id, response text, error) from one output line."""
+    record = json.loads(line)
+    if 'custom_id' in record:
+        if record.get('error'):
+            return record['custom_id'], None, record['error'].get('message', str(record['error']))
+        response = record.get('response') or {}
+        if response.get('status_code', 200) != 200:
+            return record['custom_id'], None, f"HTTP {response.get('status_code')}"
+        return record['custom_id'], response['body']['choices'][0]['message']['content'], None
+
+    key = record.get('key')
+    if record.get('error') or 'response' not in record:
+        return key, None, str(record.get('error', 'No response'))
+    parts = record['response']['candidates'][0]['content']['parts']
+    return key, "".join(part.get('text', '') for part in parts), None
+
+
+def parse_batch_output(content, provider='openai'):
+    """
+    Parse a batch output file into grading results.
+
+    Args:
+        content (str): The output file (JSONL, OpenAI or Gemini format)
+        provider (str): 'openai' or 'gemini', recorded in grading_method
+
+    Returns:
+        dict: {custom_id: result}; each result has 'score', 'feedback',
+        'grading_method' and 'score_normalized', or 'error' when the request
+        failed or its response could not be parsed
+    """
+    method = "Gemini batch prediction" if provider == 'gemini' else "OpenAI Batch API"
+    results = {}
+    for line in (content or "").splitlines():
+        if not line.strip():
+            continue
+        try:
+            custom_id, text, error = _output_line(line)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.warning("Skipping unreadable batch output line", extra={'error': str(e)})
+            continue
+        if error:
+            results[custom_id] = {"error": error}
+            continue
+        try:
+            result = json.loads(_clean_json(text))
+            if 'score' not in result or 'feedback' not in result:
+                raise ValueError("Response missing required fields")
+        except ValueError as e:
+            results[custom_id] = {"error": f"Could not parse grading response: {str(e)}"}
+            continue
+        result['grading_method'] = method
+        result['score_normalized'] = normalize_grading_result(result)
+        results[custom_id] = result
+    return results
+
+
+class OpenAIBatchClient:
+    """
+    Submit and track grading batches on the OpenAI Batch API (or any
+    server that mimics its /files and /batches endpoints).
+    """
+
+    def __init__(self, api_key=None, base_url=None):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key or Config.OPENAI_API_KEY or "batch-stub",
+                             base_url=base_url or Config.BATCH_API_BASE_URL or None)
+
+    def submit(self, requests, metadata=None):
+        """
+        Upload a batch input file and create the batch job.
+
+        Returns:
+            dict: The job status (see status)
+        """
+        input_file = self.client.files.create(file=("grading_batch.jsonl", to_jsonl(requests)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=Config.BATCH_COMPLETION_WINDOW,
+            metadata=metadata
+        )
+        logger.info("Submitted batch", extra={'batch_id': batch.id, 'requests': len(requests)})
+        return self._status(batch)
+
+    def status(self, batch_id):
+        """
+        Get a batch job's status.
+
+        Returns:
+            dict: 'batch_id', 'status', 'output_file_id', 'error_file_id'
+            and 'request_counts' (total, completed, failed)
+        """
+        return self._status(self.client.batches.retrieve(batch_id))
+
+    def _status(self, batch):
+        counts = batch.request_counts
+        return {
+            "batch_id": batch.id,
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+            "request_counts": {
+                "total": counts.total if counts else 0,
+                "completed": counts.completed if counts else 0,
+                "failed": counts.failed if counts else 0
+            }
+        }
+
+    def download(self, file_id):
+        """Download an output or error file as text."""
+        return self.client.files.content(file_id).text
+
+    def results(self, status):
+        """
+        Download and parse the results of a finished batch.
+
+        Args:
+            status (dict): The job status from status()
+
+        Returns:
+            dict: {custom_id: result}, see parse_batch_output
+        """
+        results = {}
+        for file_id in (status.get('error_file_id'), status.get('output_file_id')):
+            if file_id:
+                results.update(parse_batch_output(self.download(file_id)))
+        return results
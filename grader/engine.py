@@ -1,11 +1,43 @@
+import asyncio
 import json
+import logging
+import time
 import base64
-from openai import OpenAI
 from config import Config
+from scoring import normalize_grading_result
 from grader.prompts import create_grading_prompt
-from grader.gemini_engine import grade_assignment_with_gemini
+from grader.gemini_engine import grade_assignment_with_gemini, grade_assignment_with_gemini_async
+from grader.rubric_compiler import get_compiled_rubric, score_exact_answers, remaining_rubric, rubric_hash
+from grader.token_budget import estimate_tokens, get_token_budget, section_budget, split_into_sections
+from grader.map_reduce import grade_in_sections
+from backends import get_backend
+from backends.providers import async_openai_client
+from metrics import span
+from singleflight import SingleFlight, flight_key, normalize_submission
+from usage import record_usage
+from logs import get_logger, payload
+
+logger = get_logger('grader.engine')
+
+_grade_flight = SingleFlight('grade')
 
 def grade_assignment_with_vision(assignment_type, image_data, rubric, diagram_info=None, student_name=None):
+    """
+    Grades assignments with diagrams through the active grading backend.
+    
+    Args:
+        assignment_type (str): The type of assignment
+        image_data (bytes): The image data containing diagrams
+        rubric (str): The grading rubric
+        diagram_info (dict): Information about detected diagrams
+        
+    Returns:
+        dict: A dictionary containing the score and feedback
+    """
+    return get_backend().grade_with_vision(assignment_type, image_data, rubric, diagram_info, student_name)
+
+@span('vision_grade', provider='openai')
+def grade_assignment_with_gpt4_vision(assignment_type, image_data, rubric, diagram_info=None, student_name=None):
     """
     Grades assignments with diagrams using GPT-4 Vision for direct visual analysis.
     
@@ -20,6 +52,7 @@ def grade_assignment_with_vision(assignment_type, image_data, rubric, diagram_in
     """
     try:
         # Initialize OpenAI client
+        from openai import OpenAI
         client = OpenAI(api_key=Config.OPENAI_API_KEY)
         
         # Convert image data to base64
@@ -68,6 +101,7 @@ Please respond in JSON format:
 }}"""
         
         # Call GPT-4 Vision
+        start = time.perf_counter()
         response = client.chat.completions.create(
             model=Config.OPENAI_VISION_MODEL,
             messages=[
@@ -90,6 +124,7 @@ Please respond in JSON format:
             max_tokens=2000,
             temperature=0.3
         )
+        record_usage('openai', 'vision_grade', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[image_data])
         
         # Extract and parse the response
         content = response.choices[0].message.content.strip()
@@ -106,175 +141,368 @@ Please respond in JSON format:
         if 'score' not in result or 'feedback' not in result:
             raise ValueError("Response missing required fields")
             
-        return {
+        graded = {
             "score": result['score'],
             "feedback": result['feedback'],
             "grading_method": "GPT-4 Vision (Diagram Analysis)"
         }
+        # The prompt asks for a fraction, or a 0-100 number when the rubric
+        # has no other total
+        graded['score_normalized'] = normalize_grading_result(graded, 100)
+        return graded
         
     except Exception as e:
-        print(f"Error in GPT-4 Vision grading: {str(e)}")
+        logger.error("GPT-4 Vision grading failed", extra={'error': str(e)})
         raise Exception(f"Error during vision-based grading: {str(e)}")
 
-def grade_assignment(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+@span('grade')
+def grade_assignment(assignment_type, submission, rubric, student_name=None, assignment_title=None, compiled_rubric=None):
     """
     Grades an assignment using Google Gemini model with OpenAI fallback.
     
+    Exact-answer questions of the compiled rubric are scored locally; only
+    the remaining questions are sent to the model. Submissions too long for
+    the model's prompt token budget are graded in sections and merged.
+    Identical submissions graded concurrently share one grading call (see
+    singleflight.py).
+    
     Args:
         assignment_type (str): The type of assignment
         submission (str): The text submission to grade
         rubric (str): The grading rubric
         student_name (str, optional): The name of the student
         assignment_title (str, optional): The title of the assignment
+        compiled_rubric (dict, optional): A stored compiled rubric (see
+            grader.rubric_compiler); compiled from the rubric when omitted
         
     Returns:
-        dict: A dictionary containing the score and feedback
+        dict: A dictionary containing the score and feedback, plus the
+        canonical 'score_normalized' record (see scoring.normalize_score)
+    """
+    key = _grading_key(assignment_type, submission, rubric, student_name, assignment_title)
+    return _grade_flight.do(key, _grade, assignment_type, submission, rubric, student_name, assignment_title,
+                            compiled_rubric)
+
+@span('grade')
+async def grade_assignment_async(assignment_type, submission, rubric, student_name=None, assignment_title=None,
+                                 compiled_rubric=None):
+    """
+    Async grade_assignment(), for the ASGI grading path.
+    
+    Returns:
+        dict: The same result as grade_assignment()
+    """
+    key = _grading_key(assignment_type, submission, rubric, student_name, assignment_title)
+    return await _grade_flight.do_async(key, _grade_async, assignment_type, submission, rubric, student_name,
+                                        assignment_title, compiled_rubric)
+
+def _grading_key(assignment_type, submission, rubric, student_name, assignment_title):
+    # Whitespace differences in the submission or rubric do not change the grade
+    return flight_key(assignment_type, normalize_submission(submission), rubric_hash(rubric), student_name,
+                      assignment_title, get_backend().name, Config.GEMINI_MODEL, Config.OPENAI_MODEL)
+
+def _grade(assignment_type, submission, rubric, student_name, assignment_title, compiled_rubric):
+    compiled, exact, model_rubric = _plan_grading(submission, rubric, compiled_rubric)
+    if model_rubric is None:
+        result = _exact_answer_result(exact, compiled['total_points'])
+    else:
+        result = _grade_within_budget(assignment_type, submission, model_rubric, student_name, assignment_title)
+    return _finish_grading(result, compiled, exact, model_rubric)
+
+async def _grade_async(assignment_type, submission, rubric, student_name, assignment_title, compiled_rubric):
+    compiled, exact, model_rubric = _plan_grading(submission, rubric, compiled_rubric)
+    if model_rubric is None:
+        result = _exact_answer_result(exact, compiled['total_points'])
+    else:
+        result = await _grade_within_budget_async(assignment_type, submission, model_rubric, student_name,
+                                                  assignment_title)
+    return _finish_grading(result, compiled, exact, model_rubric)
+
+def _plan_grading(submission, rubric, compiled_rubric=None):
+    """
+    Score the compiled rubric's exact-answer questions locally.
+    
+    Returns:
+        tuple: (compiled, exact, model_rubric) - the compiled rubric, the
+        local scores when they are used (else None), and the rubric to send
+        to the model (None when every question was scored locally)
+    """
+    compiled = get_compiled_rubric(rubric, compiled_rubric)
+    exact = score_exact_answers(compiled, submission) if compiled['exact_answer_count'] else None
+    
+    if exact and exact['scored'] and compiled['total_points']:
+        remaining_points = compiled['total_points'] - exact['possible']
+        if not exact['remaining']:
+            return compiled, exact, None
+        if remaining_points > 0 and all(
+                q['points'] is not None for q in compiled['questions'] if q['number'] in exact['remaining']):
+            logger.info("Compiled rubric scored questions locally",
+                        extra={'scored_locally': len(exact['scored']), 'sent_to_model': len(exact['remaining'])})
+            return compiled, exact, remaining_rubric(rubric, compiled, exact['remaining'])
+    return compiled, None, rubric
+
+def _finish_grading(result, compiled, exact, model_rubric):
+    if exact and model_rubric is not None:
+        result = _merge_exact_answers(result, exact, compiled['total_points'] - exact['possible'],
+                                      compiled['total_points'])
+    result['rubric_hash'] = compiled['hash']
+    result['score_normalized'] = normalize_grading_result(result, compiled['total_points'])
+    return result
+
+def _grade_within_budget(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+    """
+    Grade in one call when the prompt fits the model's token budget,
+    otherwise map-reduce over sections of the submission.
+    """
+    backend = get_backend()
+    prompt_tokens = estimate_tokens(create_grading_prompt(assignment_type, submission, rubric))
+    budget = get_token_budget()
+    if prompt_tokens <= budget:
+        return backend.grade(assignment_type, submission, rubric, student_name, assignment_title)
+    
+    overhead = estimate_tokens(create_grading_prompt(assignment_type, "", rubric))
+    sections = split_into_sections(submission, section_budget(overhead))
+    logger.info("Prompt exceeds token budget; grading in sections",
+                extra={'prompt_tokens': prompt_tokens, 'budget': budget, 'sections': len(sections)})
+    if len(sections) < 2:
+        return backend.grade(assignment_type, submission, rubric, student_name, assignment_title)
+    
+    result = grade_in_sections(assignment_type, sections, rubric, backend.grade,
+                               backend.generate_json, student_name, assignment_title)
+    result['prompt_tokens_estimate'] = prompt_tokens
+    return result
+
+async def _grade_within_budget_async(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+    if estimate_tokens(create_grading_prompt(assignment_type, submission, rubric)) <= get_token_budget():
+        return await get_backend().grade_async(assignment_type, submission, rubric, student_name, assignment_title)
+    # Long submissions are map-reduced over sections, concurrently on threads
+    return await asyncio.to_thread(_grade_within_budget, assignment_type, submission, rubric, student_name,
+                                   assignment_title)
+
+def _exact_answer_lines(exact):
+    lines = ["**Automatically scored questions:**"]
+    for item in exact['scored']:
+        mark = "correct" if item['is_correct'] else f"incorrect (answer: {item['correct_answer']})"
+        lines.append(f"Question {item['number']}: {item['points_earned']:g}/{item['points_possible']:g} points - "
+                     f"{item['student_answer']} - {mark}")
+    return "\n".join(lines)
+
+def _exact_answer_result(exact, total_points):
+    """
+    Build a grading result for a submission whose questions were all scored
+    from the compiled rubric's exact answers.
+    """
+    return {
+        "score": f"{exact['earned']:g}/{total_points:g}",
+        "feedback": _exact_answer_lines(exact),
+        "grading_method": "Compiled rubric (exact answers)",
+        "exact_answers": exact['scored']
+    }
+
+def _merge_exact_answers(result, exact, remaining_points, total_points):
+    """
+    Combine a model result for the remaining questions with the locally
+    scored exact answers into one score over the whole rubric.
+    """
+    model_score = normalize_grading_result(result, remaining_points)
+    if model_score['percentage'] is None:
+        return result  # Keep the model's error or unscored result as is
+    
+    earned = exact['earned'] + model_score['percentage'] / 100 * remaining_points
+    summary = _exact_answer_lines(exact)
+    if isinstance(result.get('feedback'), str):
+        result['feedback'] = f"{summary}\n\n{result['feedback']}"
+    elif result.get('formatted_feedback'):
+        result['formatted_feedback'] = f"{summary}\n\n{result['formatted_feedback']}"
+    
+    result['score'] = f"{round(earned, 2):g}/{total_points:g}"
+    result['exact_answers'] = exact['scored']
+    return result
+
+def _grade_with_fallback(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+    """
+    Grade with Gemini, falling back to OpenAI GPT-4 when Gemini fails.
     """
     try:
         # Try Gemini first
         return grade_assignment_with_gemini(assignment_type, submission, rubric, student_name, assignment_title)
     except Exception as e:
-        error_str = str(e)
-        if "quota" in error_str.lower() or "429" in error_str or "exceeded" in error_str.lower():
-            print(f"Gemini quota exceeded, falling back to OpenAI: {e}")
-            try:
-                result = grade_assignment_with_gpt4(assignment_type, submission, rubric)
-                result["grading_method"] = "OpenAI GPT-4 (Gemini quota exceeded)"
-                return result
-            except Exception as openai_error:
-                print(f"OpenAI fallback also failed: {openai_error}")
-                raise Exception(f"Both Gemini and OpenAI failed. Gemini: {e}, OpenAI: {openai_error}")
-        else:
-            print(f"Non-quota Gemini error, falling back to OpenAI: {e}")
-            try:
-                result = grade_assignment_with_gpt4(assignment_type, submission, rubric)
-                result["grading_method"] = "OpenAI GPT-4 (Gemini fallback)"
-                return result
-            except Exception as openai_error:
-                print(f"OpenAI fallback failed: {openai_error}")
-                raise Exception(f"Both Gemini and OpenAI failed. Gemini: {e}, OpenAI: {openai_error}")
+        grading_method = _fallback_method(e)
+        try:
+            result = grade_assignment_with_gpt4(assignment_type, submission, rubric)
+            result["grading_method"] = grading_method
+            return result
+        except Exception as openai_error:
+            logger.error("OpenAI fallback failed", extra={'error': str(openai_error)})
+            raise Exception(f"Both Gemini and OpenAI failed. Gemini: {e}, OpenAI: {openai_error}")
+
+async def _grade_with_fallback_async(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+    """
+    Async _grade_with_fallback().
+    """
+    try:
+        return await grade_assignment_with_gemini_async(assignment_type, submission, rubric, student_name,
+                                                        assignment_title)
+    except Exception as e:
+        grading_method = _fallback_method(e)
+        try:
+            result = await grade_assignment_with_gpt4_async(assignment_type, submission, rubric)
+            result["grading_method"] = grading_method
+            return result
+        except Exception as openai_error:
+            logger.error("OpenAI fallback failed", extra={'error': str(openai_error)})
+            raise Exception(f"Both Gemini and OpenAI failed. Gemini: {e}, OpenAI: {openai_error}")
+
+def _fallback_method(error):
+    """Log a Gemini failure and name the OpenAI fallback it leads to."""
+    error_str = str(error)
+    if "quota" in error_str.lower() or "429" in error_str or "exceeded" in error_str.lower():
+        logger.warning("Gemini quota exceeded, falling back to OpenAI", extra={'error': error_str})
+        return "OpenAI GPT-4 (Gemini quota exceeded)"
+    logger.warning("Gemini error, falling back to OpenAI", extra={'error': error_str})
+    return "OpenAI GPT-4 (Gemini fallback)"
 
 # Keep the original GPT-4 function for fallback if needed
+@span('text_grade', provider='openai')
 def grade_assignment_with_gpt4(assignment_type, submission, rubric):
     """
     Original GPT-4 grading function - kept for fallback purposes.
     """
     # Initialize OpenAI client
+    from openai import OpenAI
     client = OpenAI(api_key=Config.OPENAI_API_KEY)
     
+    try:
+        # Call the OpenAI API with timeout
+        start = time.perf_counter()
+        response = client.chat.completions.create(**_gpt4_request(assignment_type, submission, rubric))
+        record_usage('openai', 'text_grade', Config.OPENAI_MODEL, response, time.perf_counter() - start)
+        return _parse_gpt4_response(response)
+    except Exception as e:
+        return _gpt4_error(e)
+
+@span('text_grade', provider='openai')
+async def grade_assignment_with_gpt4_async(assignment_type, submission, rubric):
+    """
+    Async grade_assignment_with_gpt4().
+    """
+    client = async_openai_client()
+    
+    try:
+        start = time.perf_counter()
+        response = await client.chat.completions.create(**_gpt4_request(assignment_type, submission, rubric))
+        record_usage('openai', 'text_grade', Config.OPENAI_MODEL, response, time.perf_counter() - start)
+        return _parse_gpt4_response(response)
+    except Exception as e:
+        return _gpt4_error(e)
+
+def _gpt4_request(assignment_type, submission, rubric):
     # Create the prompt for the GPT-4 model
     prompt = create_grading_prompt(assignment_type, submission, rubric)
+    return {
+        'model': Config.OPENAI_MODEL,
+        'messages': [
+            {"role": "system", "content": "You are an expert grading assistant that evaluates student work based on provided rubrics."},
+            {"role": "user", "content": prompt}
+        ],
+        # 'temperature': 0.3,  # GPT-5 models only support default temperature of 1
+        'max_completion_tokens': 4000,  # Increased from 2000 to 4000
+        'timeout': 30  # Add 30 second timeout
+    }
+
+def _parse_gpt4_response(response):
+    """
+    Parse and validate a GPT-4 grading response.
+    
+    Raises:
+        ValueError: When the response is not a valid grading result
+    """
+    # Extract the response content
+    content = response.choices[0].message.content
+    logger.info("OpenAI grading call returned", extra={
+        'model': Config.OPENAI_MODEL,
+        'finish_reason': response.choices[0].finish_reason,
+        'content_chars': len(content or "")
+    })
     
+    if content is None:
+        logger.error("OpenAI response has no content", extra={'model': Config.OPENAI_MODEL})
+        content = ""
+    else:
+        content = content.strip()
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenAI raw response", extra={'content': payload(content)})
+    
+    # Clean the response - remove markdown code blocks if present
+    if content.startswith('```json'):
+        # Remove ```json from start and ``` from end
+        content = content[7:]  # Remove '```json'
+        if content.endswith('```'):
+            content = content[:-3]  # Remove '```'
+        content = content.strip()
+    elif content.startswith('```'):
+        # Remove generic ``` blocks
+        content = content[3:]  # Remove '```'
+        if content.endswith('```'):
+            content = content[:-3]  # Remove '```'
+        content = content.strip()
+    
+    # Parse the JSON response
     try:
-        # Debug: Print the model being used
-        print(f"Using OpenAI model: {Config.OPENAI_MODEL}")
-        print(f"API Key present: {bool(Config.OPENAI_API_KEY)}")
-        
-        # Call the OpenAI API with timeout
-        response = client.chat.completions.create(
-            model=Config.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert grading assistant that evaluates student work based on provided rubrics."},
-                {"role": "user", "content": prompt}
-            ],
-            # temperature=0.3,  # GPT-5 models only support default temperature of 1
-            max_completion_tokens=4000,  # Increased from 2000 to 4000
-            timeout=30  # Add 30 second timeout
-        )
-        # Around line 40-50, add more debugging
-        print(f"OpenAI API call successful. Response received.")
-        print(f"Full response object: {response}")
-        print(f"Response choices: {response.choices}")
-        print(f"Message content: {response.choices[0].message.content}")
-        
-        # Extract the response content
-        content = response.choices[0].message.content
-        print(f"Raw content before processing: '{content}'")
-        
-        if content is None:
-            print("ERROR: Content is None!")
-            content = ""
-        else:
-            content = content.strip()
-        
-        # Debug: Print the raw response
-        print(f"Raw GPT response: {content}")
-        
-        # Clean the response - remove markdown code blocks if present
-        if content.startswith('```json'):
-            # Remove ```json from start and ``` from end
-            content = content[7:]  # Remove '```json'
-            if content.endswith('```'):
-                content = content[:-3]  # Remove '```'
-            content = content.strip()
-        elif content.startswith('```'):
-            # Remove generic ``` blocks
-            content = content[3:]  # Remove '```'
-            if content.endswith('```'):
-                content = content[:-3]  # Remove '```'
-            content = content.strip()
-        
-        print(f"Cleaned content for parsing: {content}")
+        result = json.loads(content)
         
-        # Parse the JSON response
-        try:
-            result = json.loads(content)
-            
-            # Validate the result structure
-            if 'score' not in result or 'feedback' not in result:
-                raise ValueError("Response missing required fields")
-                
-            # Handle both numeric and fractional scores
-            score_value = result['score']
+        # Validate the result structure
+        if 'score' not in result or 'feedback' not in result:
+            raise ValueError("Response missing required fields")
             
-            # If score is a string (fractional format), keep it as is
-            if isinstance(score_value, str):
-                # Validate fractional format (e.g., "7/10")
-                if '/' in score_value:
-                    try:
-                        parts = score_value.split('/')
-                        if len(parts) == 2:
-                            earned = float(parts[0])
-                            total = float(parts[1])
-                            if earned < 0 or earned > total or total <= 0:
-                                raise ValueError("Invalid fractional score format")
-                        else:
+        # Handle both numeric and fractional scores
+        score_value = result['score']
+        
+        # If score is a string (fractional format), keep it as is
+        if isinstance(score_value, str):
+            # Validate fractional format (e.g., "7/10")
+            if '/' in score_value:
+                try:
+                    parts = score_value.split('/')
+                    if len(parts) == 2:
+                        earned = float(parts[0])
+                        total = float(parts[1])
+                        if earned < 0 or earned > total or total <= 0:
                             raise ValueError("Invalid fractional score format")
-                    except (ValueError, IndexError):
+                    else:
                         raise ValueError("Invalid fractional score format")
-                else:
-                    # Try to convert string to numeric
-                    try:
-                        score_value = float(score_value)
-                        if score_value < 0 or score_value > 100:
-                            raise ValueError("Score must be between 0 and 100")
-                    except ValueError:
-                        raise ValueError("Invalid score format")
+                except (ValueError, IndexError):
+                    raise ValueError("Invalid fractional score format")
             else:
-                # Numeric score validation
-                score_value = float(score_value)
-                if score_value < 0 or score_value > 100:
-                    raise ValueError("Score must be between 0 and 100")
-                
-            return {
-                "score": score_value,
-                "feedback": result['feedback']
-            }
-            
-        except json.JSONDecodeError:
-            raise ValueError("Failed to parse GPT-4 response as JSON")
+                # Try to convert string to numeric
+                try:
+                    score_value = float(score_value)
+                    if score_value < 0 or score_value > 100:
+                        raise ValueError("Score must be between 0 and 100")
+                except ValueError:
+                    raise ValueError("Invalid score format")
+        else:
+            # Numeric score validation
+            score_value = float(score_value)
+            if score_value < 0 or score_value > 100:
+                raise ValueError("Score must be between 0 and 100")
             
-    except Exception as e:
-        # Enhanced error logging
-        print(f"Error during grading: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        
-        # Return error information instead of raising exception
         return {
-            "score": "Error",
-            "feedback": f"""**GRADING ERROR**\n\nAn error occurred during grading: {str(e)}
+            "score": score_value,
+            "feedback": result['feedback']
+        }
+        
+    except json.JSONDecodeError:
+        raise ValueError("Failed to parse GPT-4 response as JSON")
+
+def _gpt4_error(e):
+    logger.exception("OpenAI grading failed", extra={'error_type': type(e).__name__})
+    
+    # Return error information instead of raising exception
+    return {
+        "score": "Error",
+        "feedback": f"""**GRADING ERROR**\n\nAn error occurred during grading: {str(e)}
             
 Please try again. If the issue persists, contact support."""
-        }
\ No newline at end of file
+    }
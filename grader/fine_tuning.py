@@ -1,6 +1,5 @@
 import json
 import os
-from openai import OpenAI
 from config import Config
 from datetime import datetime
 import time
@@ -11,6 +10,7 @@ class GPTFineTuner:
     """
     
     def __init__(self):
+        from openai import OpenAI
         self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
         self.training_data_folder = os.path.join(os.path.dirname(__file__), '..', 'training_data')
         os.makedirs(self.training_data_folder, exist_ok=True)
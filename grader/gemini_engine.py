@@ -1,11 +1,38 @@
 import json
+import logging
 import re
-import google.generativeai as genai
+import threading
+import time
 from config import Config
 from grader.prompts import create_grading_prompt
+from image_processor.local_extraction import extract_student_name_locally
+from metrics import span, observe
+from usage import record_usage
+from logs import get_logger, payload
 
-# Configure Gemini API
-genai.configure(api_key=Config.GEMINI_API_KEY)
+logger = get_logger('grader.gemini')
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def load_genai():
+    """
+    Import and configure the Gemini SDK on first use.
+
+    Importing google.generativeai takes most of a second, so it is deferred
+    until a Gemini call is made (or the backend is warmed up).
+
+    Returns:
+        module: The configured google.generativeai module
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=Config.GEMINI_API_KEY)
+                _genai = genai
+    return _genai
 
 def preprocess_submission_for_ocr_errors(submission, assignment_type):
     """
@@ -50,9 +77,44 @@ def extract_final_answers(submission):
         return answer_note
     return ""
 
+@span('json_call', provider='gemini')
+def generate_json_with_gemini(prompt, max_output_tokens=1500):
+    """
+    Send a short prompt to Gemini and parse its JSON reply.
+    
+    Used for cheap follow-up calls such as merging section grades.
+    
+    Args:
+        prompt (str): The prompt, asking for a JSON response
+        max_output_tokens (int): Output token limit
+        
+    Returns:
+        dict: The parsed JSON response
+    """
+    genai = load_genai()
+    model = genai.GenerativeModel(Config.GEMINI_MODEL)
+    start = time.perf_counter()
+    response = model.generate_content(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.1,
+            max_output_tokens=max_output_tokens,
+        )
+    )
+    record_usage('gemini', 'json_call', Config.GEMINI_MODEL, response, time.perf_counter() - start)
+    content = (response.text or "").strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    elif content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return json.loads(content.strip())
+
 # Add MCQ-specific instructions to the Gemini grading prompt
 # This ensures consistency when MCQs are processed through OCR
 
+@span('text_grade', provider='gemini')
 def grade_assignment_with_gemini(assignment_type, submission, rubric, student_name=None, assignment_title=None):
     """
     Enhanced Gemini grading with student name and assignment title in feedback header
@@ -68,326 +130,346 @@ def grade_assignment_with_gemini(assignment_type, submission, rubric, student_na
         dict: Contains grading results including score and feedback
     """
     try:
-        # Preprocess submission for OCR error handling
-        processed_submission = preprocess_submission_for_ocr_errors(submission, assignment_type)
-        
-        # Add final answer extraction for math assignments
-        if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
-            answer_hints = extract_final_answers(submission)
-            processed_submission += answer_hints
-        
-        # Extract student name from submission if not provided
-        if not student_name:
-            # Look for student name in the submission text
-            import re
-            name_patterns = [
-                r'\*\*STUDENT:\s*([^\*\n]+)\*\*',  # **STUDENT: Name**
-                r'Name:\s*([^\n]+)',
-                r'Student:\s*([^\n]+)',
-                r'By:\s*([^\n]+)'
-            ]
-            
-            for pattern in name_patterns:
-                match = re.search(pattern, processed_submission, re.IGNORECASE)
-                if match:
-                    student_name = match.group(1).strip()
-                    if student_name and student_name != "[Name not detected]" and student_name != "[Error extracting name]":
-                        break
-        
-        # Add OCR leniency note for all math-related assignments
-        if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
-            ocr_leniency_note = "\n\n[GRADING INSTRUCTION: Apply maximum leniency. If final answers are correct, award high scores regardless of work clarity. Assume OCR missed some student work.]\n\n"
-            processed_submission += ocr_leniency_note
-        
-        # Initialize Gemini model - try different approaches for compatibility
-        try:
-            # Try the newer API first
-            model = genai.GenerativeModel(Config.GEMINI_MODEL)
-        except AttributeError:
-            # Fallback for older versions
-            model = genai.GenerativeModel(model_name=Config.GEMINI_MODEL)
-        
-        # Create the prompt for the Gemini model (reusing existing prompt structure)
-        prompt = create_grading_prompt(assignment_type, processed_submission, rubric)
-        
-        # Debug: Print the model being used
-        print(f"Using Gemini model: {Config.GEMINI_MODEL}")
-        print(f"Gemini API Key present: {bool(Config.GEMINI_API_KEY)}")
-        print(f"OCR preprocessing applied: {assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']}")
-        
-        # Configure generation parameters specifically for math grading
-        if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
-            generation_config = genai.types.GenerationConfig(
-                temperature=0.1,  # Even lower temperature for more consistent math grading with OCR tolerance
-                top_p=0.95,  # Higher top_p for more comprehensive consideration
-                top_k=30,
-                max_output_tokens=5000,  # More tokens for detailed question-by-question feedback
-            )
-            print("Using math-optimized grading parameters with OCR tolerance")
-        else:
-            generation_config = genai.types.GenerationConfig(
-                temperature=0.3,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=4000,
-            )
+        model, prompt, generation_config, student_name = _gemini_grading_request(
+            assignment_type, submission, rubric, student_name)
         
         # Call the Gemini API
+        start = time.perf_counter()
         response = model.generate_content(
             prompt,
             generation_config=generation_config
         )
+        record_usage('gemini', 'text_grade', Config.GEMINI_MODEL, response, time.perf_counter() - start)
+        return _parse_gemini_grading(response, assignment_type, student_name, assignment_title)
+    except Exception as e:
+        return _gemini_grading_error(e)
+
+@span('text_grade', provider='gemini')
+async def grade_assignment_with_gemini_async(assignment_type, submission, rubric, student_name=None, assignment_title=None):
+    """
+    Async grade_assignment_with_gemini(), using Gemini's async generation.
+    """
+    try:
+        model, prompt, generation_config, student_name = _gemini_grading_request(
+            assignment_type, submission, rubric, student_name)
         
-        print(f"Gemini API call successful. Response received.")
-        
-        # Extract the response content
-        content = response.text
-        print(f"Raw content before processing: '{content}'")
-        
-        if content is None:
-            print("ERROR: Content is None!")
-            content = ""
-        else:
-            content = content.strip()
-        
-        # Debug: Print the raw response
-        print(f"Raw Gemini response: {content}")
+        start = time.perf_counter()
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=generation_config
+        )
+        record_usage('gemini', 'text_grade', Config.GEMINI_MODEL, response, time.perf_counter() - start)
+        return _parse_gemini_grading(response, assignment_type, student_name, assignment_title)
+    except Exception as e:
+        return _gemini_grading_error(e)
+
+def _gemini_grading_request(assignment_type, submission, rubric, student_name=None):
+    """
+    Build the Gemini grading call.
+    
+    Returns:
+        tuple: (model, prompt, generation_config, student_name), with the
+        student name read from the submission header when not given
+    """
+    # Preprocess submission for OCR error handling
+    processed_submission = preprocess_submission_for_ocr_errors(submission, assignment_type)
+    
+    # Add final answer extraction for math assignments
+    if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
+        answer_hints = extract_final_answers(submission)
+        processed_submission += answer_hints
+    
+    # Extract student name from submission if not provided
+    if not student_name:
+        # Look for student name in the submission header
+        student_name = extract_student_name_locally(processed_submission)['student_name']
+    
+    # Add OCR leniency note for all math-related assignments
+    if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
+        ocr_leniency_note = "\n\n[GRADING INSTRUCTION: Apply maximum leniency. If final answers are correct, award high scores regardless of work clarity. Assume OCR missed some student work.]\n\n"
+        processed_submission += ocr_leniency_note
+    
+    # Initialize Gemini model - try different approaches for compatibility
+    genai = load_genai()
+    try:
+        # Try the newer API first
+        model = genai.GenerativeModel(Config.GEMINI_MODEL)
+    except AttributeError:
+        # Fallback for older versions
+        model = genai.GenerativeModel(model_name=Config.GEMINI_MODEL)
+    
+    # Create the prompt for the Gemini model (reusing existing prompt structure)
+    prompt = create_grading_prompt(assignment_type, processed_submission, rubric)
+    
+    # Configure generation parameters specifically for math grading
+    if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
+        generation_config = genai.types.GenerationConfig(
+            temperature=0.1,  # Even lower temperature for more consistent math grading with OCR tolerance
+            top_p=0.95,  # Higher top_p for more comprehensive consideration
+            top_k=30,
+            max_output_tokens=5000,  # More tokens for detailed question-by-question feedback
+        )
+    else:
+        generation_config = genai.types.GenerationConfig(
+            temperature=0.3,
+            top_p=0.8,
+            top_k=40,
+            max_output_tokens=4000,
+        )
+    
+    return model, prompt, generation_config, student_name
+
+def _parse_gemini_grading(response, assignment_type, student_name=None, assignment_title=None):
+    """
+    Parse a Gemini grading response into a score and feedback, repairing
+    invalid JSON where possible.
+    """
+    # Extract the response content
+    content = response.text
+    logger.info("Gemini grading call returned", extra={
+        'model': Config.GEMINI_MODEL,
+        'math_profile': assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set'],
+        'content_chars': len(content or "")
+    })
+    
+    if content is None:
+        logger.error("Gemini response has no content", extra={'model': Config.GEMINI_MODEL})
+        content = ""
+    else:
+        content = content.strip()
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Gemini raw response", extra={'content': payload(content)})
+    
+    # Clean the response - remove markdown code blocks if present
+    if content.startswith('```json'):
+        # Remove ```json from start and ``` from end
+        content = content[7:]  # Remove '```json'
+        if content.endswith('```'):
+            content = content[:-3]  # Remove '```'
+        content = content.strip()
+    elif content.startswith('```'):
+        # Remove generic ``` blocks
+        content = content[3:]  # Remove '```'
+        if content.endswith('```'):
+            content = content[:-3]  # Remove '```'
+        content = content.strip()
+    
+    # Parse the JSON response
+    try:
+        # Fix common escape sequence issues before parsing
+        # Replace invalid escape sequences that might break JSON parsing
+        sanitized_content = content
         
-        # Clean the response - remove markdown code blocks if present
-        if content.startswith('```json'):
-            # Remove ```json from start and ``` from end
-            content = content[7:]  # Remove '```json'
-            if content.endswith('```'):
-                content = content[:-3]  # Remove '```'
-            content = content.strip()
-        elif content.startswith('```'):
-            # Remove generic ``` blocks
-            content = content[3:]  # Remove '```'
-            if content.endswith('```'):
-                content = content[:-3]  # Remove '```'
-            content = content.strip()
+        # Look for escaped backslashes that aren't valid JSON escape sequences
+        import re
+        # Fix common invalid escape sequences
+        sanitized_content = re.sub(r'\\([^"\\/bfnrtu])', r'\\\\\1', sanitized_content)
         
-        print(f"Cleaned content for parsing: {content}")
+        # Additional safety measure: replace any remaining problematic backslashes
+        sanitized_content = sanitized_content.replace('\\', '\\\\')
+        # But preserve valid JSON escape sequences
+        for valid_escape in ['\\"', '\\/', '\\b', '\\f', '\\n', '\\r', '\\t']:
+            sanitized_content = sanitized_content.replace('\\\\' + valid_escape[1:], valid_escape)
         
-        # Parse the JSON response
         try:
-            # Fix common escape sequence issues before parsing
-            # Replace invalid escape sequences that might break JSON parsing
-            sanitized_content = content
-            
-            # Look for escaped backslashes that aren't valid JSON escape sequences
-            import re
-            # Fix common invalid escape sequences
-            sanitized_content = re.sub(r'\\([^"\\/bfnrtu])', r'\\\\\1', sanitized_content)
-            
-            # Additional safety measure: replace any remaining problematic backslashes
-            sanitized_content = sanitized_content.replace('\\', '\\\\')
-            # But preserve valid JSON escape sequences
-            for valid_escape in ['\\"', '\\/', '\\b', '\\f', '\\n', '\\r', '\\t']:
-                sanitized_content = sanitized_content.replace('\\\\' + valid_escape[1:], valid_escape)
-            
-            print(f"Sanitized content for parsing: {sanitized_content[:100]}...")
+            # Try to parse the sanitized content
+            result = json.loads(sanitized_content)
+        except json.JSONDecodeError:
+            # If that fails, try with a more aggressive approach: replace all backslashes
+            logger.warning("Gemini response is not valid JSON; repairing it",
+                           extra={'content_chars': len(content)})
+            repair_start = time.perf_counter()
+            # Manual JSON object construction as a fallback
+            if '{' in content and '}' in content:
+                # Extract the content between curly braces
+                content_between_braces = content[content.find('{')+1:content.rfind('}')]
+                # Split by commas and construct a simple JSON structure
+                pairs = content_between_braces.split(',')
+                result = {}
+                for pair in pairs:
+                    if ':' in pair:
+                        key, value = pair.split(':', 1)
+                        # Clean up key and value
+                        key = key.strip().strip('"\'')
+                        value = value.strip().strip('"\'')
+                        result[key] = value
+                
+                # Default values if missing
+                if 'score' not in result and 'total_score' not in result:
+                    result['score'] = "N/A"
+                if 'feedback' not in result:
+                    result['feedback'] = "Error parsing the grading response. Please try again."
+            else:
+                # If all parsing fails, create a generic response
+                result = {
+                    "score": "N/A",
+                    "feedback": f"Unable to parse grading result. Raw response: {content[:500]}..."
+                }
+            observe('json_repair', time.perf_counter() - repair_start, provider='gemini')
+        
+        # Handle new detailed JSON structure
+        if 'total_score' in result:
+            # New detailed format
+            score_value = result['total_score']
             
-            try:
-                # Try to parse the sanitized content
-                result = json.loads(sanitized_content)
-            except json.JSONDecodeError:
-                # If that fails, try with a more aggressive approach: replace all backslashes
-                print("First JSON parsing attempt failed, trying with additional sanitization")
-                # Manual JSON object construction as a fallback
-                if '{' in content and '}' in content:
-                    # Extract the content between curly braces
-                    content_between_braces = content[content.find('{')+1:content.rfind('}')]
-                    # Split by commas and construct a simple JSON structure
-                    pairs = content_between_braces.split(',')
-                    result = {}
-                    for pair in pairs:
-                        if ':' in pair:
-                            key, value = pair.split(':', 1)
-                            # Clean up key and value
-                            key = key.strip().strip('"\'')
-                            value = value.strip().strip('"\'')
-                            result[key] = value
-                    
-                    # Default values if missing
-                    if 'score' not in result and 'total_score' not in result:
-                        result['score'] = "N/A"
-                    if 'feedback' not in result:
-                        result['feedback'] = "Error parsing the grading response. Please try again."
-                else:
-                    # If all parsing fails, create a generic response
-                    result = {
-                        "score": "N/A",
-                        "feedback": f"Unable to parse grading result. Raw response: {content[:500]}..."
-                    }
+            # Create comprehensive feedback with student name header
+            feedback_parts = []
             
-            # Handle new detailed JSON structure
-            if 'total_score' in result:
-                # New detailed format
-                score_value = result['total_score']
+            # Add student name and assignment title header
+            if student_name and student_name.strip():
+                feedback_parts.append(f"**STUDENT: {student_name.upper()}**")
                 
-                # Create comprehensive feedback with student name header
-                feedback_parts = []
+                if assignment_title and assignment_title.strip():
+                    feedback_parts.append(f"**ASSIGNMENT: {assignment_title}**")
                 
-                # Add student name and assignment title header
-                if student_name and student_name.strip():
-                    feedback_parts.append(f"**STUDENT: {student_name.upper()}**")
-                    
-                    if assignment_title and assignment_title.strip():
-                        feedback_parts.append(f"**ASSIGNMENT: {assignment_title}**")
-                    
-                    feedback_parts.append("=" * 60)
+                feedback_parts.append("=" * 60)
+            else:
+                if assignment_title and assignment_title.strip():
+                    feedback_parts.append(f"**ASSIGNMENT: {assignment_title}**")
+                    feedback_parts.append("=" * 30)
                 else:
-                    if assignment_title and assignment_title.strip():
-                        feedback_parts.append(f"**ASSIGNMENT: {assignment_title}**")
-                        feedback_parts.append("=" * 30)
-                    else:
-                        feedback_parts.append("**GRADING REPORT**")
-                        feedback_parts.append("=" * 30)
-                
-                # Add overall summary
-                if 'percentage' in result:
-                    feedback_parts.append(f"\n**Overall Score: {result['percentage']}**")
-                
-                # Add question-by-question breakdown
-                if 'questions' in result and result['questions']:
-                    feedback_parts.append("\n**Question-by-Question Analysis:**")
-                    for q in result['questions']:
-                        q_feedback = f"\nQuestion {q.get('question_number', '?')}: {q.get('points_earned', 0)}/{q.get('points_possible', 0)} points"
-                        if q.get('mistakes_identified'):
-                            q_feedback += f"\n- Issues: {', '.join(q['mistakes_identified'])}"
-                        if q.get('partial_credit_given_for'):
-                            q_feedback += f"\n- Credit given for: {', '.join(q['partial_credit_given_for'])}"
-                        if q.get('teacher_comment'):
-                            q_feedback += f"\n- Note: {q['teacher_comment']}"
-                        feedback_parts.append(q_feedback)
-                
-                # Add overall feedback
-                if 'overall_feedback' in result:
-                    of = result['overall_feedback']
-                    if of.get('strengths'):
-                        feedback_parts.append(f"\n**Strengths:**\n- {chr(10).join(of['strengths'])}")
-                    if of.get('areas_for_improvement'):
-                        feedback_parts.append(f"\n**Areas for Improvement:**\n- {chr(10).join(of['areas_for_improvement'])}")
-                    if of.get('next_steps'):
-                        feedback_parts.append(f"\n**Next Steps:** {of['next_steps']}")
-                
-                # Add grading notes if present
-                if 'grading_notes' in result:
-                    feedback_parts.append(f"\n**Grading Notes:** {result['grading_notes']}")
-                
-                feedback_value = "\n".join(feedback_parts)
-                
-            elif 'score' in result and 'feedback' in result:
-                # Legacy format - add student name and assignment title header
-                score_value = result['score']
-                
-                if student_name and student_name.strip():
-                    if assignment_title and assignment_title.strip():
-                        feedback_value = f"**STUDENT: {student_name.upper()}**\n**ASSIGNMENT: {assignment_title}**\n{'=' * 60}\n\n{result['feedback']}"
-                    else:
-                        feedback_value = f"**STUDENT: {student_name.upper()}**\n{'=' * 60}\n\n{result['feedback']}"
+                    feedback_parts.append("**GRADING REPORT**")
+                    feedback_parts.append("=" * 30)
+            
+            # Add overall summary
+            if 'percentage' in result:
+                feedback_parts.append(f"\n**Overall Score: {result['percentage']}**")
+            
+            # Add question-by-question breakdown
+            if 'questions' in result and result['questions']:
+                feedback_parts.append("\n**Question-by-Question Analysis:**")
+                for q in result['questions']:
+                    q_feedback = f"\nQuestion {q.get('question_number', '?')}: {q.get('points_earned', 0)}/{q.get('points_possible', 0)} points"
+                    if q.get('mistakes_identified'):
+                        q_feedback += f"\n- Issues: {', '.join(q['mistakes_identified'])}"
+                    if q.get('partial_credit_given_for'):
+                        q_feedback += f"\n- Credit given for: {', '.join(q['partial_credit_given_for'])}"
+                    if q.get('teacher_comment'):
+                        q_feedback += f"\n- Note: {q['teacher_comment']}"
+                    feedback_parts.append(q_feedback)
+            
+            # Add overall feedback
+            if 'overall_feedback' in result:
+                of = result['overall_feedback']
+                if of.get('strengths'):
+                    feedback_parts.append(f"\n**Strengths:**\n- {chr(10).join(of['strengths'])}")
+                if of.get('areas_for_improvement'):
+                    feedback_parts.append(f"\n**Areas for Improvement:**\n- {chr(10).join(of['areas_for_improvement'])}")
+                if of.get('next_steps'):
+                    feedback_parts.append(f"\n**Next Steps:** {of['next_steps']}")
+            
+            # Add grading notes if present
+            if 'grading_notes' in result:
+                feedback_parts.append(f"\n**Grading Notes:** {result['grading_notes']}")
+            
+            feedback_value = "\n".join(feedback_parts)
+            
+        elif 'score' in result and 'feedback' in result:
+            # Legacy format - add student name and assignment title header
+            score_value = result['score']
+            
+            if student_name and student_name.strip():
+                if assignment_title and assignment_title.strip():
+                    feedback_value = f"**STUDENT: {student_name.upper()}**\n**ASSIGNMENT: {assignment_title}**\n{'=' * 60}\n\n{result['feedback']}"
                 else:
-                    if assignment_title and assignment_title.strip():
-                        feedback_value = f"**ASSIGNMENT: {assignment_title}**\n{'=' * 30}\n\n{result['feedback']}"
-                    else:
-                        feedback_value = f"**GRADING REPORT**\n{'=' * 30}\n\n{result['feedback']}"
+                    feedback_value = f"**STUDENT: {student_name.upper()}**\n{'=' * 60}\n\n{result['feedback']}"
             else:
-                raise ValueError("Response missing required fields (expected 'total_score' or 'score'/'feedback')")
-                
-            # REMOVE THE OLD VALIDATION - it's redundant now
-            # The validation logic should continue from here with score_value and feedback_value
+                if assignment_title and assignment_title.strip():
+                    feedback_value = f"**ASSIGNMENT: {assignment_title}**\n{'=' * 30}\n\n{result['feedback']}"
+                else:
+                    feedback_value = f"**GRADING REPORT**\n{'=' * 30}\n\n{result['feedback']}"
+        else:
+            raise ValueError("Response missing required fields (expected 'total_score' or 'score'/'feedback')")
             
-            # Handle both numeric and fractional scores (same logic as original)
-            # If score is a string (fractional format), keep it as is
-            if isinstance(score_value, str):
-                # Validate fractional format (e.g., "7/10")
-                if '/' in score_value:
-                    try:
-                        parts = score_value.split('/')
-                        if len(parts) == 2:
-                            earned = float(parts[0])
-                            total = float(parts[1])
-                            if earned < 0 or earned > total or total <= 0:
-                                raise ValueError("Invalid fractional score format")
-                        else:
+        # REMOVE THE OLD VALIDATION - it's redundant now
+        # The validation logic should continue from here with score_value and feedback_value
+        
+        # Handle both numeric and fractional scores (same logic as original)
+        # If score is a string (fractional format), keep it as is
+        if isinstance(score_value, str):
+            # Validate fractional format (e.g., "7/10")
+            if '/' in score_value:
+                try:
+                    parts = score_value.split('/')
+                    if len(parts) == 2:
+                        earned = float(parts[0])
+                        total = float(parts[1])
+                        if earned < 0 or earned > total or total <= 0:
                             raise ValueError("Invalid fractional score format")
-                    except (ValueError, IndexError):
+                    else:
                         raise ValueError("Invalid fractional score format")
-                else:
-                    # Try to convert string to numeric
-                    try:
-                        score_value = float(score_value)
-                        if score_value < 0 or score_value > 100:
-                            raise ValueError("Score must be between 0 and 100")
-                    except ValueError:
-                        raise ValueError("Invalid score format")
+                except (ValueError, IndexError):
+                    raise ValueError("Invalid fractional score format")
             else:
-                # Numeric score validation
-                score_value = float(score_value)
-                if score_value < 0 or score_value > 100:
-                    raise ValueError("Score must be between 0 and 100")
-                
-            # Enhanced math score validation with OCR bonus
-            if isinstance(score_value, str) and '/' in score_value:
-                parts = score_value.split('/')
-                earned = float(parts[0])
-                total = float(parts[1])
-                
-                # Math-specific OCR leniency bonus
-                if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
-                    # Round to nearest whole number for math assignments
-                    earned = round(earned)
-                    
-                    # Apply generous OCR-friendly bonus
-                    if earned >= total * 0.85 and earned < total:  # Lowered threshold from 0.95 to 0.85
-                        print(f"OCR leniency bonus applied: rounding {earned}/{total} up to {total}/{total}")
-                        earned = total
-                    elif earned >= total * 0.75 and earned < total * 0.85:  # Additional tier
-                        bonus_points = min(2, total - earned)  # Add up to 2 bonus points
-                        earned += bonus_points
-                        print(f"OCR partial bonus applied: added {bonus_points} points")
-                    
-                    score_value = f"{earned}/{total}"
-                    print(f"Math assignment score with OCR leniency: {score_value}")
-            
-            # For structured JSON format, return both a formatted feedback string AND the original structured object
-            if 'total_score' in result:
-                return {
-                    "score": score_value,
-                    "feedback": result,  # Return the entire structured JSON object
-                    "formatted_feedback": feedback_value  # Add formatted string version
-                }
-            else:
-                return {
-                    "score": score_value,
-                    "feedback": feedback_value
-                }
+                # Try to convert string to numeric
+                try:
+                    score_value = float(score_value)
+                    if score_value < 0 or score_value > 100:
+                        raise ValueError("Score must be between 0 and 100")
+                except ValueError:
+                    raise ValueError("Invalid score format")
+        else:
+            # Numeric score validation
+            score_value = float(score_value)
+            if score_value < 0 or score_value > 100:
+                raise ValueError("Score must be between 0 and 100")
             
-        except json.JSONDecodeError as json_err:
-            print(f"JSON parsing error: {str(json_err)}")
-            print(f"Problematic content: {content[:200]}...")
+        # Enhanced math score validation with OCR bonus
+        if isinstance(score_value, str) and '/' in score_value:
+            parts = score_value.split('/')
+            earned = float(parts[0])
+            total = float(parts[1])
             
-            # Create a fallback response
-            return {
-                "score": "N/A",
-                "feedback": f"""**GRADING ERROR**\n\nWe encountered an issue while processing the grading response. 
+            # Math-specific OCR leniency bonus
+            if assignment_type.lower() in ['math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics', 'problem set']:
+                # Round to nearest whole number for math assignments
+                earned = round(earned)
                 
-Here is what we could extract:\n\n{content[:1000]}...\n\n
-Please try submitting again. If the issue persists, try uploading a clearer image or providing more text context."""
+                # Apply generous OCR-friendly bonus
+                if earned >= total * 0.85 and earned < total:  # Lowered threshold from 0.95 to 0.85
+                    logger.info("OCR leniency bonus applied", extra={'earned': earned, 'total': total})
+                    earned = total
+                elif earned >= total * 0.75 and earned < total * 0.85:  # Additional tier
+                    bonus_points = min(2, total - earned)  # Add up to 2 bonus points
+                    earned += bonus_points
+                    logger.info("OCR partial bonus applied", extra={'bonus_points': bonus_points})
+                
+                score_value = f"{earned}/{total}"
+        
+        # For structured JSON format, return both a formatted feedback string AND the original structured object
+        if 'total_score' in result:
+            return {
+                "score": score_value,
+                "feedback": result,  # Return the entire structured JSON object
+                "formatted_feedback": feedback_value  # Add formatted string version
             }
-            
-    except Exception as e:
-        # Enhanced error logging
-        print(f"Error during Gemini grading: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        else:
+            return {
+                "score": score_value,
+                "feedback": feedback_value
+            }
+        
+    except json.JSONDecodeError as json_err:
+        logger.error("Gemini JSON parsing failed",
+                     extra={'error': str(json_err), 'content': payload(content, 200)})
         
-        # Return a user-friendly error message instead of raising an exception
+        # Create a fallback response
         return {
-            "score": "Error",
-            "feedback": f"""**GRADING ERROR**\n\nWe encountered an issue while processing your submission: {str(e)}
+            "score": "N/A",
+            "feedback": f"""**GRADING ERROR**\n\nWe encountered an issue while processing the grading response. 
+                
+Here is what we could extract:\n\n{content[:1000]}...\n\n
+Please try submitting again. If the issue persists, try uploading a clearer image or providing more text context."""
+        }
+
+def _gemini_grading_error(e):
+    logger.exception("Gemini grading failed", extra={'error_type': type(e).__name__})
+    
+    # Return a user-friendly error message instead of raising an exception
+    return {
+        "score": "Error",
+        "feedback": f"""**GRADING ERROR**\n\nWe encountered an issue while processing your submission: {str(e)}
             
 Please try submitting again. If the issue persists, you might try:
 1. Uploading a clearer image
@@ -396,4 +478,4 @@ Please try submitting again. If the issue persists, you might try:
 4. Selecting a different assignment type
 
 Technical Details: {type(e).__name__}"""
-        }
\ No newline at end of file
+    }
\ No newline at end of file
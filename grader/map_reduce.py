@@ -0,0 +1,153 @@
+"""
+Map-reduce grading for long submissions
+
+A submission whose grading prompt exceeds the model's token budget is split
+into sections (grader.token_budget). Each section is graded in parallel
+against the full rubric, then one short reduction call merges the section
+scores and feedback into a single grade. When the reduction call fails, the
+section scores are merged locally.
+"""
+
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from scoring import normalize_grading_result
+from metrics import span
+from logs import get_logger
+
+logger = get_logger('grader.map_reduce')
+
+# Feedback characters per section passed to the reduction call
+MAX_SECTION_FEEDBACK_CHARS = 1500
+
+
+def section_note(index, count):
+    """Instruction prepended to each section of a split submission."""
+    return (f"[SECTION {index} OF {count} of a long submission. Grade only the work that appears in "
+            f"this section; the other sections are graded separately and merged afterwards. Note "
+            f"which rubric criteria this section addresses.]\n\n")
+
+
+def _feedback_text(result):
+    feedback = result.get('formatted_feedback') or result.get('feedback', '')
+    if not isinstance(feedback, str):
+        feedback = json.dumps(feedback)
+    return feedback[:MAX_SECTION_FEEDBACK_CHARS]
+
+
+def create_reduce_prompt(assignment_type, rubric, section_results):
+    """
+    Build the reduction prompt from the section grades.
+
+    Args:
+        assignment_type (str): The type of assignment
+        rubric (str): The grading rubric
+        section_results (list): Grading results, one per section
+
+    Returns:
+        str: The prompt
+    """
+    sections = "\n\n".join(
+        f"SECTION {i} SCORE: {result.get('score')}\nSECTION {i} FEEDBACK:\n{_feedback_text(result)}"
+        for i, result in enumerate(section_results, 1)
+    )
+    return f"""You are merging the grades of a long {assignment_type} submission that was graded in {len(section_results)} sections.
+Each section was graded on its own against the full rubric, so a criterion may be met in one section and missing in another.
+
+RUBRIC:
+{rubric}
+
+SECTION GRADES:
+{sections}
+
+Combine them into one grade for the whole submission: credit each rubric criterion once, where it is best met,
+and do not penalize a section for criteria covered elsewhere. Keep the rubric's scale (a fraction such as "8/10"
+when the rubric has a point total, otherwise a percentage such as "85%").
+
+Respond in JSON format:
+{{
+    "score": "the combined score",
+    "feedback": "combined feedback for the whole submission"
+}}"""
+
+
+def merge_locally(section_results, section_sizes):
+    """
+    Merge section grades without a model: the size-weighted mean percentage.
+
+    Returns:
+        dict: 'score' (a percentage string, e.g. "82.5%") and 'feedback'
+    """
+    total_weight = 0
+    weighted = 0.0
+    for result, size in zip(section_results, section_sizes):
+        percentage = normalize_grading_result(result)['percentage']
+        if percentage is None:
+            continue
+        weighted += percentage * size
+        total_weight += size
+    if not total_weight:
+        return {"score": "Error", "feedback": "**GRADING ERROR**\n\nNo section of the submission could be graded."}
+
+    feedback = "\n\n".join(
+        f"**Section {i}** ({result.get('score')}):\n{_feedback_text(result)}"
+        for i, result in enumerate(section_results, 1)
+    )
+    return {"score": f"{round(weighted / total_weight, 1):g}%", "feedback": feedback}
+
+
+@span('map_reduce')
+def grade_in_sections(assignment_type, sections, rubric, grade_section, reduce_call, student_name=None, assignment_title=None):
+    """
+    Grade a long submission section by section and merge the results.
+
+    Args:
+        assignment_type (str): The type of assignment
+        sections (list): Section texts (see token_budget.split_into_sections)
+        rubric (str): The grading rubric
+        grade_section (callable): Grades one section, called as
+            grade_section(assignment_type, text, rubric, student_name,
+            assignment_title) and returning a result with 'score'/'feedback'
+        reduce_call (callable): Sends the reduction prompt to a model and
+            returns the parsed JSON dict with 'score' and 'feedback'
+        student_name (str, optional): The name of the student
+        assignment_title (str, optional): The title of the assignment
+
+    Returns:
+        dict: 'score', 'feedback', 'grading_method' and per-section 'sections'
+    """
+    count = len(sections)
+    logger.info("Map-reduce grading", extra={'sections': count, 'max_workers': Config.MAP_REDUCE_MAX_WORKERS})
+
+    def grade(indexed_section):
+        index, text = indexed_section
+        try:
+            return grade_section(assignment_type, section_note(index, count) + text, rubric, student_name, assignment_title)
+        except Exception as e:
+            logger.error("Error grading section", extra={'section': index, 'error': str(e)})
+            return {"score": "Error", "feedback": f"Section {index} could not be graded: {str(e)}"}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(Config.MAP_REDUCE_MAX_WORKERS, count))) as executor:
+        # Sections run in copies of the request's context, so their model
+        # calls keep its request ID and usage attribution
+        futures = [executor.submit(contextvars.copy_context().run, grade, indexed)
+                   for indexed in enumerate(sections, 1)]
+        section_results = [future.result() for future in futures]
+
+    try:
+        merged = reduce_call(create_reduce_prompt(assignment_type, rubric, section_results))
+        if 'score' not in merged or 'feedback' not in merged:
+            raise ValueError("Reduction response missing required fields")
+        method = f"Map-reduce ({count} sections)"
+    except Exception as e:
+        logger.warning("Reduction call failed, merging sections locally", extra={'error': str(e)})
+        merged = merge_locally(section_results, [len(text) for text in sections])
+        method = f"Map-reduce ({count} sections, merged locally)"
+
+    return {
+        "score": merged['score'],
+        "feedback": merged['feedback'],
+        "grading_method": method,
+        "sections": [{"section": i, "score": result.get('score')} for i, result in enumerate(section_results, 1)]
+    }
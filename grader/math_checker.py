@@ -0,0 +1,370 @@
+"""
+Local final-answer checker for math assignments
+
+Parses expected answers from a rubric and candidate final answers from a
+student's work - numbers, fractions, mixed numbers, percentages, scientific
+notation, units and simple algebraic expressions or equations - and decides
+whether they are equivalent without a model call.
+
+Expressions are compared symbolically with sympy when it is installed (it is
+imported on the first expression comparison, not with this module), and
+otherwise by evaluating both sides at random points.
+"""
+
+import ast
+import importlib.util
+import math
+import operator
+import random
+import re
+
+SYMPY_AVAILABLE = importlib.util.find_spec('sympy') is not None
+
+# Numbers closer than this (relative) are the same answer
+RELATIVE_TOLERANCE = 1e-6
+
+# Random evaluation points used to compare expressions without sympy
+SAMPLE_POINTS = 6
+
+# Largest constant exponent accepted in an expression; nested powers such as
+# (x^3)^4 may not multiply to more than this either
+MAX_EXPONENT = 12
+
+# A key written with at least this many decimals ("3.14") is read as rounded
+# and accepts more precise work ("3.14159"); shorter keys ("0.5") are exact
+ROUNDED_KEY_MIN_DECIMALS = 2
+
+FUNCTIONS = {
+    'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'log': math.log, 'ln': math.log, 'exp': math.exp, 'abs': abs
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.Pow: operator.pow,
+    ast.USub: operator.neg, ast.UAdd: operator.pos
+}
+
+_SUPERSCRIPTS = {'²': '^2', '³': '^3'}
+_SYMBOLS = {'×': '*', '·': '*', '÷': '/', '−': '-', '–': '-', '^': '**', '√': 'sqrt', 'π': 'pi'}
+_TOKEN = re.compile(r'\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|[A-Za-z]+|\*\*|[-+*/()=]|\S')
+_NUMBER_WITH_UNIT = re.compile(
+    r'^(-?\d[\d,]*(?:\.\d+)?(?:\s+\d+/\d+|/\d+)?(?:\s*[x×]\s*10\^?\s*-?\d+|[eE][-+]?\d+)?)\s*(%|°\s*\w*|[A-Za-z][A-Za-z/\^\d\s]*)?$'
+)
+_ANSWER_LINE = re.compile(r'(?:final answer|answer|ans\.?|result|solution)\s*(?:is|[:=])\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+_BOXED = re.compile(r'\\boxed\{([^{}]+)\}')
+
+
+def _parse_number(text):
+    """Parse '1,200', '-3.5', '3/4', '1 1/2', '6.02e23' or '3 x 10^8' to a float, or None."""
+    text = text.replace(',', '').strip()
+    scientific = re.fullmatch(r'(-?\d+(?:\.\d+)?)\s*[x×]\s*10\^?\s*(-?\d+)', text)
+    if scientific:
+        return float(scientific.group(1)) * 10 ** int(scientific.group(2))
+    mixed = re.fullmatch(r'(-?)(\d+)\s+(\d+)/(\d+)', text)
+    if mixed:
+        sign = -1 if mixed.group(1) else 1
+        denominator = int(mixed.group(4))
+        return sign * (int(mixed.group(2)) + int(mixed.group(3)) / denominator) if denominator else None
+    fraction = re.fullmatch(r'(-?\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)', text)
+    if fraction:
+        denominator = float(fraction.group(2))
+        return float(fraction.group(1)) / denominator if denominator else None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _decimal_places(text):
+    """Decimal places written in a plain decimal like '3.14' or '1,200.5', else None."""
+    plain = re.fullmatch(r'-?\d[\d,]*(?:\.(\d+))?', text.strip())
+    if not plain:
+        return None
+    return len(plain.group(1) or '')
+
+
+def _normalize_unit(unit):
+    unit = re.sub(r'\s+', '', unit or '').lower()
+    return re.sub(r'(?<=[a-z])s$', '', unit) if len(unit) > 2 else unit
+
+
+def normalize_expression(text):
+    """
+    Rewrite math as a Python-style expression with explicit operators.
+
+    '2x^2 + 3x', '3(x+1)', 'xy' and '2√x' become '2*x**2+3*x', '3*(x+1)',
+    'x*y' and '2*sqrt(x)' respectively; multi-letter names other than known
+    functions and constants are split into single-letter variables.
+    """
+    text = re.sub(r'√\s*(\d+(?:\.\d+)?|[A-Za-z])', r'sqrt(\1)', text)
+    for symbol, replacement in _SYMBOLS.items():
+        text = text.replace(symbol, replacement)
+
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token.isalpha() and token not in FUNCTIONS and token not in CONSTANTS:
+            tokens.extend(token)
+        else:
+            tokens.append(token)
+
+    output = []
+    for token in tokens:
+        if output:
+            previous = output[-1]
+            ends_value = (previous[0].isdigit() or previous == ')'
+                          or (previous.isalpha() and previous not in FUNCTIONS))
+            starts_value = token[0].isdigit() or token == '(' or token.isalpha()
+            if ends_value and starts_value:
+                output.append('*')
+        output.append(token)
+    return "".join(output)
+
+
+def _evaluate(node, values):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, values)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+        return values[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.left, values), _evaluate(node.right, values))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.operand, values))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCTIONS and len(node.args) == 1):
+        return FUNCTIONS[node.func.id](_evaluate(node.args[0], values))
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+
+def _is_safe(tree):
+    """
+    Check that a parsed expression only uses arithmetic, known functions and
+    small constant exponents, so it is safe to hand to sympy or evaluate.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.Load, ast.Name)) or type(node) in _OPERATORS:
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            continue
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            exponent = node.right.operand if isinstance(node.right, ast.UnaryOp) else node.right
+            if isinstance(node.op, ast.Pow) and not (
+                    isinstance(exponent, ast.Constant) and abs(exponent.value) <= MAX_EXPONENT):
+                return False
+            continue
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+            continue
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in FUNCTIONS and len(node.args) == 1 and not node.keywords):
+            continue
+        return False
+    # ((9^12)^12)^12 has small exponents but an enormous value
+    return _power_product(tree) <= MAX_EXPONENT
+
+
+def _power_product(node):
+    """Product of the constant exponents along the deepest chain of nested powers."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        exponent = node.right.operand if isinstance(node.right, ast.UnaryOp) else node.right
+        return max(1, abs(exponent.value)) * _power_product(node.left)
+    return max((_power_product(child) for child in ast.iter_child_nodes(node)), default=1)
+
+
+def _variables(tree):
+    return sorted({
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS
+    })
+
+
+def parse_answer(text):
+    """
+    Parse an answer into a comparable form.
+
+    Args:
+        text (str): An answer such as "42", "3/4", "45%", "9.8 m/s^2",
+            "x = 5", "2x + 3" or "y = 2x + 1"
+
+    Returns:
+        dict or None: {'kind': 'number', 'value', 'unit', 'decimals', 'lhs'}
+        or {'kind': 'expression', 'expression', 'variables', 'lhs'} (lhs is
+        the variable name for answers like "x = 5" or "y = 2x + 1", else
+        None; decimals is the number of decimal places written, None unless
+        the answer is a plain decimal), or None when the text is not a math
+        answer
+    """
+    text = _BOXED.sub(r'\1', (text or '')).strip().strip('$').strip()
+    for superscript, replacement in _SUPERSCRIPTS.items():
+        text = text.replace(superscript, replacement)
+    text = text.rstrip('.').strip()
+    if not text:
+        return None
+
+    # "x = 5" and "y = 2x + 1": keep the right-hand side
+    lhs = None
+    assignment = re.fullmatch(r'([A-Za-z])\s*=\s*(.+)', text)
+    if assignment:
+        lhs, text = assignment.group(1), assignment.group(2).strip()
+
+    number = _NUMBER_WITH_UNIT.match(text)
+    if number:
+        value = _parse_number(number.group(1))
+        unit = (number.group(2) or '').strip()
+        # "2 x" style units are really expressions; only accept a unit after a space or as a symbol
+        if value is not None and (not unit or unit.startswith(('%', '°')) or text[number.end(1)].isspace()):
+            decimals = _decimal_places(number.group(1))
+            if unit == '%':
+                value, unit = value / 100, ''
+                decimals = decimals + 2 if decimals is not None else None
+            return {"kind": "number", "value": value, "unit": _normalize_unit(unit), "decimals": decimals,
+                    "lhs": lhs}
+
+    # Plain words and sentences are not math answers
+    if not re.search(r'[\d+\-*/^=()√π]', text):
+        return None
+    if any(len(word) > 3 and word not in FUNCTIONS and word not in CONSTANTS
+           for word in re.findall(r'[A-Za-z]+', text)):
+        return None
+    expression = normalize_expression(text)
+    if '=' in expression:
+        return None
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        return None
+    if not _is_safe(tree):
+        return None
+    variables = _variables(tree)
+    if not variables:
+        try:
+            return {"kind": "number", "value": float(_evaluate(tree, {})), "unit": '', "decimals": None,
+                    "lhs": lhs}
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError, KeyError):
+            return None
+    return {"kind": "expression", "expression": expression, "variables": variables, "lhs": lhs}
+
+
+def _numbers_equal(expected, given):
+    if math.isclose(expected['value'], given['value'], rel_tol=RELATIVE_TOLERANCE, abs_tol=1e-9):
+        return True
+    # A rounded key ("3.14") accepts more precise work ("3.14159") that rounds
+    # to it; the student's value is rounded to the key's precision
+    decimals = expected['decimals']
+    if decimals is None or decimals < ROUNDED_KEY_MIN_DECIMALS:
+        return False
+    if given['decimals'] is None or given['decimals'] <= decimals:
+        return False
+    return math.isclose(round(given['value'], decimals), expected['value'], rel_tol=0, abs_tol=1e-12)
+
+
+def _expressions_equal(expected, given):
+    if SYMPY_AVAILABLE:
+        import sympy
+        try:
+            difference = sympy.simplify(sympy.sympify(expected['expression']) - sympy.sympify(given['expression']))
+            return difference == 0
+        except (sympy.SympifyError, TypeError, ValueError, AttributeError):
+            pass
+
+    variables = sorted(set(expected['variables']) | set(given['variables']))
+    expected_tree = ast.parse(expected['expression'], mode='eval')
+    given_tree = ast.parse(given['expression'], mode='eval')
+    rng = random.Random(0)
+    compared = 0
+    for _ in range(SAMPLE_POINTS * 3):
+        values = {name: rng.uniform(0.5, 3.0) for name in variables}
+        try:
+            a, b = _evaluate(expected_tree, values), _evaluate(given_tree, values)
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            continue
+        if isinstance(a, complex) or isinstance(b, complex):
+            continue
+        if not math.isclose(a, b, rel_tol=RELATIVE_TOLERANCE, abs_tol=1e-9):
+            return False
+        compared += 1
+        if compared >= SAMPLE_POINTS:
+            return True
+    return False
+
+
+def answers_equivalent(expected, given):
+    """
+    Decide whether two answers are mathematically the same.
+
+    Units must agree when both answers have one; a missing unit on either
+    side is accepted. Equations ("x = 5") must solve for the same variable.
+
+    Args:
+        expected (str): The rubric's answer
+        given (str): The student's answer
+
+    Returns:
+        bool: True when equivalent; False when different or unparseable
+    """
+    expected_answer, given_answer = parse_answer(expected), parse_answer(given)
+    if not expected_answer or not given_answer:
+        return False
+
+    if expected_answer['lhs'] and given_answer['lhs'] and expected_answer['lhs'] != given_answer['lhs']:
+        return False
+
+    if expected_answer['kind'] == 'number' and given_answer['kind'] == 'number':
+        if expected_answer['unit'] and given_answer['unit'] and expected_answer['unit'] != given_answer['unit']:
+            return False
+        return _numbers_equal(expected_answer, given_answer)
+
+    if expected_answer['kind'] == 'expression' and given_answer['kind'] == 'expression':
+        return _expressions_equal(expected_answer, given_answer)
+    return False
+
+
+def final_answer_candidates(work):
+    """
+    Find a student's final answer in their work, most likely first.
+
+    An explicit "Answer: ..." line or a \\boxed{} value wins; otherwise the
+    right-hand side of the last equation and the last line are candidates.
+
+    Args:
+        work (str): The student's work for one question
+
+    Returns:
+        list: Candidate answer strings
+    """
+    explicit = _BOXED.findall(work or '') + [m.strip() for m in _ANSWER_LINE.findall(work or '')]
+    if explicit:
+        return explicit[-1:]
+
+    lines = [line.strip() for line in (work or '').splitlines() if line.strip()]
+    if not lines:
+        return []
+    candidates = []
+    last = lines[-1]
+    if '=' in last:
+        candidates.append(last.rsplit('=', 1)[1].strip())
+    candidates.append(last)
+    return candidates
+
+
+def check_final_answer(expected, work):
+    """
+    Check a student's work for one question against the expected answer.
+
+    Returns:
+        dict: 'is_correct' (True/False), 'student_answer' (the candidate that
+        was compared, or None when no answer was found) and 'parsed' (whether
+        the expected answer is a math answer this checker understands)
+    """
+    if parse_answer(expected) is None:
+        return {"is_correct": False, "student_answer": None, "parsed": False}
+
+    candidates = final_answer_candidates(work)
+    for candidate in candidates:
+        if answers_equivalent(expected, candidate):
+            return {"is_correct": True, "student_answer": candidate, "parsed": True}
+    return {"is_correct": False, "student_answer": candidates[0] if candidates else None, "parsed": True}
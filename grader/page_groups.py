@@ -0,0 +1,287 @@
+"""
+Page-group grading for multi-page PDFs
+
+Instead of packing every page of a PDF into one vision request, pages are
+split into consecutive groups sized by an image-token budget. The groups are
+graded concurrently - each against the rubric questions that appear on its
+pages - and the per-group results are merged into one score and feedback.
+"""
+
+import io
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from scoring import normalize_score
+from grader.token_budget import estimate_image_tokens
+from grader.rubric_compiler import get_compiled_rubric
+from backends import get_backend
+from metrics import span
+from logs import get_logger
+
+logger = get_logger('grader.page_groups')
+
+
+def group_pages(page_tokens, budget):
+    """
+    Split pages into consecutive groups whose image tokens fit a budget.
+
+    Args:
+        page_tokens (list): Estimated image tokens per page
+        budget (int): Image tokens per group; a page larger than the budget
+            gets a group of its own
+
+    Returns:
+        list: Groups of 0-based page indexes
+    """
+    groups = []
+    current, current_tokens = [], 0
+    for index, tokens in enumerate(page_tokens):
+        if current and current_tokens + tokens > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def create_group_prompt(assignment_type, rubric, page_numbers, page_count):
+    """Build the vision prompt for one group of pages."""
+    first, last = page_numbers[0], page_numbers[-1]
+    pages = f"page {first}" if first == last else f"pages {first}-{last}"
+    return f"""Grade {pages} of a {page_count}-page {assignment_type} assignment. The other pages are graded separately.
+
+ASSIGNMENT TYPE: {assignment_type}
+
+RUBRIC:
+{rubric}
+
+**GRADING INSTRUCTIONS:**
+1. Grade ONLY the questions or rubric criteria whose work appears on these pages
+2. Do not deduct points for questions that are not on these pages
+3. For multiple choice: Award full credit if correct answer is selected
+4. For mathematical work: Focus on final answers and recognizable methods
+5. For written responses: Evaluate content quality and completeness
+6. Be generous with partial credit for unclear handwriting
+
+Respond in JSON format:
+{{
+    "questions": [
+        {{
+            "question_number": 1,
+            "page_number": {first},
+            "points_earned": 0,
+            "points_possible": 0,
+            "feedback": "feedback for this question"
+        }}
+    ],
+    "score": "earned_points/possible_points for the questions on these pages",
+    "feedback": "feedback for the work on these pages"
+}}"""
+
+
+def _png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def grade_group_with_vision(prompt, images):
+    """
+    Send one page group to the vision model of the grading backend.
+
+    Args:
+        prompt (str): The group prompt
+        images (list): PIL images of the group's pages
+
+    Returns:
+        dict: The parsed JSON response
+    """
+    return get_backend().vision_json(prompt, [_png_bytes(image) for image in images], max_tokens=2000)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_group_results(group_results, rubric):
+    """
+    Merge per-group grades into one score over the whole rubric.
+
+    When the compiled rubric lists questions with point values, each
+    question's points come from the group that graded it (the highest award
+    if several did) and the total is the rubric's total. Otherwise the
+    groups' earned and possible points are summed.
+
+    Args:
+        group_results (list): Group results with 'result' (the parsed
+            response, or None when the group failed) and 'pages'
+        rubric (str): The grading rubric
+
+    Returns:
+        tuple: (score, feedback)
+    """
+    compiled = get_compiled_rubric(rubric)
+    points = {q['number']: q['points'] for q in compiled['questions'] if q['points'] is not None}
+
+    feedback_parts = []
+    for group in group_results:
+        pages = ", ".join(str(p) for p in group['pages'])
+        if group['result'] is None:
+            feedback_parts.append(f"**Pages {pages}:** could not be graded ({group['error']})")
+        else:
+            feedback_parts.append(f"**Pages {pages}:**\n{group['result'].get('feedback', '')}")
+    feedback = "\n\n".join(feedback_parts)
+
+    if points and compiled['total_points']:
+        awarded = {}
+        for group in group_results:
+            for question in (group['result'] or {}).get('questions', []):
+                number = _number(question.get('question_number'))
+                earned = _number(question.get('points_earned'))
+                if number is None or earned is None or int(number) not in points:
+                    continue
+                earned = min(max(earned, 0.0), points[int(number)])
+                awarded[int(number)] = max(awarded.get(int(number), 0.0), earned)
+        missing = [n for n in points if n not in awarded]
+        if missing:
+            feedback += f"\n\nNot found on any page: question(s) {', '.join(str(n) for n in missing)}"
+        return f"{round(sum(awarded.values()), 2):g}/{compiled['total_points']:g}", feedback
+
+    earned, possible = 0.0, 0.0
+    for group in group_results:
+        if group['result'] is None:
+            continue
+        normalized = normalize_score(group['result'].get('score'))
+        if normalized['status'] == 'graded' and normalized['possible']:
+            earned += normalized['earned']
+            possible += normalized['possible']
+    if not possible:
+        return "Error", feedback
+    return f"{round(earned, 2):g}/{possible:g}", feedback
+
+
+def omr_page_result(result, page_number, rubric):
+    """
+    Express an offline OMR result for one page like a page group's response,
+    so it merges with the groups question by question.
+
+    Args:
+        result (dict): The OMR grading result (see image_processor.omr)
+        page_number (int): The PDF page it came from
+        rubric (str): The grading rubric; its point values are used, one
+            point per question otherwise
+
+    Returns:
+        dict: 'questions', 'score' and 'feedback'
+    """
+    compiled = get_compiled_rubric(rubric)
+    points = {q['number']: q['points'] for q in compiled['questions'] if q['points'] is not None}
+    questions = []
+    for question in result['omr']['questions']:
+        if question['correct_answer'] is None:
+            continue
+        possible = points.get(question['question'], 1.0)
+        questions.append({
+            "question_number": question['question'],
+            "page_number": page_number,
+            "points_earned": possible if question['is_correct'] else 0.0,
+            "points_possible": possible,
+            "feedback": "Correct" if question['is_correct'] else f"Incorrect (answer: {question['correct_answer']})"
+        })
+    earned = sum(q['points_earned'] for q in questions)
+    possible = sum(q['points_possible'] for q in questions)
+    return {"questions": questions, "score": f"{earned:g}/{possible:g}", "feedback": result['feedback']}
+
+
+@span('page_groups')
+def grade_pdf_page_groups(images, assignment_type, rubric, grade_group=None, token_budget=None, page_numbers=None,
+                          graded_pages=None):
+    """
+    Grade a multi-page PDF in concurrent page groups.
+
+    Args:
+        images (list): PIL images of the pages, in order
+        assignment_type (str): The type of assignment
+        rubric (str): The grading rubric
+        grade_group (callable, optional): Grades one group, called as
+            grade_group(prompt, images); defaults to grade_group_with_vision
+        token_budget (int, optional): Image tokens per group; defaults to
+            Config.VISION_GROUP_TOKEN_BUDGET
+        page_numbers (list, optional): PDF page numbers of the images when
+            some pages were skipped; 1..n by default
+        graded_pages (dict, optional): {page number: response} for pages
+            already graded another way (e.g. omr_page_result), merged in as
+            single-page groups
+
+    Returns:
+        dict: 'score', 'feedback', 'processing_method', 'pages_processed',
+        'individual_pages' (questions found on each page) and 'page_groups'
+        (pages, score, image tokens and seconds per group)
+    """
+    grade_group = grade_group or grade_group_with_vision
+    budget = token_budget or Config.VISION_GROUP_TOKEN_BUDGET
+    numbers = page_numbers or list(range(1, len(images) + 1))
+    page_count = max(list(numbers) + list(graded_pages or ()), default=0)
+    page_tokens = [estimate_image_tokens(*image.size) for image in images]
+    groups = group_pages(page_tokens, budget)
+    logger.info("Grading pages in page groups", extra={'pages': len(images), 'groups': len(groups),
+                                                       'image_tokens': sum(page_tokens), 'budget': budget})
+
+    def grade(indexes):
+        group_numbers = [numbers[i] for i in indexes]
+        start = time.perf_counter()
+        entry = {"pages": group_numbers, "image_tokens": sum(page_tokens[i] for i in indexes)}
+        try:
+            prompt = create_group_prompt(assignment_type, rubric, group_numbers, page_count)
+            entry['result'] = grade_group(prompt, [images[i] for i in indexes])
+        except Exception as e:
+            logger.error("Error grading page group", extra={'pages': group_numbers, 'error': str(e)})
+            entry['result'] = None
+            entry['error'] = str(e)
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        return entry
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(Config.MAP_REDUCE_MAX_WORKERS, len(groups)))) as executor:
+        # Groups run in copies of the request's context, so their model
+        # calls keep its request ID and usage attribution
+        futures = [executor.submit(contextvars.copy_context().run, grade, group) for group in groups]
+        group_results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    if graded_pages:
+        group_results.extend({"pages": [number], "image_tokens": 0, "seconds": 0.0, "result": result}
+                             for number, result in graded_pages.items())
+        group_results.sort(key=lambda group: group['pages'][0])
+
+    score, feedback = merge_group_results(group_results, rubric)
+
+    individual_pages = []
+    for group in group_results:
+        questions = (group['result'] or {}).get('questions', [])
+        for page_number in group['pages']:
+            individual_pages.append({
+                "page_number": page_number,
+                "questions": [q for q in questions if _number(q.get('page_number')) == page_number
+                              or (len(group['pages']) == 1 and q.get('page_number') is None)]
+            })
+
+    return {
+        "score": score,
+        "feedback": feedback,
+        "processing_method": f"GPT-4 Vision page groups ({len(groups)} groups, multi-page PDF)"
+                             + (f" + {len(graded_pages)} page(s) graded separately" if graded_pages else ""),
+        "pages_processed": len(images) + len(graded_pages or {}),
+        "individual_pages": individual_pages,
+        "page_groups": [
+            {"pages": g['pages'], "score": (g['result'] or {}).get('score'), "image_tokens": g['image_tokens'],
+             "seconds": g['seconds'], **({"error": g['error']} if g['result'] is None else {})}
+            for g in group_results
+        ],
+        "total_seconds": round(elapsed, 3)
+    }
@@ -0,0 +1,361 @@
+"""
+Rubric compiler for SnapGrade
+
+Turns free-text rubric content into a structured rubric once - questions,
+point values, exact answers and criteria - keyed by a hash of the content.
+The compiled form is stored with saved rubrics and cached in memory, so every
+student in a batch reuses it:
+
+- Exact-answer items (multiple choice letters, numbers, expressions, short
+  answers) are scored deterministically from the submission.
+- The LLM gets the teacher's rubric with a note naming the questions that
+  still need judgment and the points they are worth.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from grader.math_checker import parse_answer, check_final_answer
+from metrics import span
+
+# Bump when the compiled format or parsing rules change, so stale compiled
+# rubrics are recompiled
+COMPILER_VERSION = 4
+
+# Compiled rubrics kept in memory
+CACHE_SIZE = 256
+
+# Short answers longer than this many words are criteria, not exact answers
+MAX_EXACT_TEXT_WORDS = 4
+
+ANSWER_CHOICE = 'choice'
+ANSWER_NUMERIC = 'numeric'
+ANSWER_EXPRESSION = 'expression'
+ANSWER_TEXT = 'text'
+
+_QUESTION_START = re.compile(
+    r'^(\s*)(?:\*\*)?(Q(?:uestion)?\s*#?\s*|Problem\s*#?\s*)?(\d{1,3})\s*([\.\):])\s*(?:\*\*)?\s*(.*)$',
+    re.IGNORECASE
+)
+_POINTS = re.compile(r'(\d+(?:\.\d+)?)\s*(?:points?|pts?\.?|marks?)\b', re.IGNORECASE)
+_TOTAL = re.compile(
+    r'^\W*total\s*(?:points?|score|marks?)?\s*(?:possible|available)?\s*[:=\-]?\s*(\d+(?:\.\d+)?)',
+    re.IGNORECASE | re.MULTILINE
+)
+_ANSWER = re.compile(
+    r'(?:correct answer|answer key|answer|ans\.?|key|solution)\s*(?:is|[:=\-])\s*(.+)$',
+    re.IGNORECASE
+)
+_CHOICE = re.compile(r'^\(?([A-Ha-h])\)?[\.\)]?$')
+_PARENTHESIZED_POINTS = re.compile(
+    r'[\(\[]\s*\d+(?:\.\d+)?\s*(?:points?|pts?\.?|marks?)\s*[\)\]]', re.IGNORECASE
+)
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def rubric_hash(rubric):
+    """
+    Hash rubric content, ignoring whitespace differences.
+
+    Returns:
+        str: Hex SHA-256 of the normalized content and compiler version
+    """
+    normalized = " ".join((rubric or '').split())
+    return hashlib.sha256(f"{COMPILER_VERSION}:{normalized}".encode('utf-8')).hexdigest()
+
+
+def _normalize_text(text):
+    words = re.sub(r'[^\w\s]', ' ', (text or '').lower()).split()
+    while words and words[0] in ('the', 'a', 'an'):
+        words = words[1:]
+    return " ".join(words)
+
+
+def _classify_answer(answer):
+    """Return (answer, answer_type) for an answer string, or (None, None)."""
+    answer = answer.strip().strip('*_`').strip()
+    answer = re.sub(r'\s*[\(\[]\s*\d+(?:\.\d+)?\s*(?:points?|pts?\.?|marks?)\s*[\)\]]\s*$', '', answer, flags=re.IGNORECASE)
+    answer = answer.rstrip('.').strip()
+    if not answer:
+        return None, None
+    choice = _CHOICE.match(answer)
+    if choice:
+        return choice.group(1).upper(), ANSWER_CHOICE
+    math_answer = parse_answer(answer)
+    if math_answer:
+        return answer, ANSWER_NUMERIC if math_answer['kind'] == 'number' else ANSWER_EXPRESSION
+    if len(answer.split()) <= MAX_EXACT_TEXT_WORDS:
+        return answer, ANSWER_TEXT
+    return None, None
+
+
+def _marker_style(match):
+    """The question marker's prefix and delimiter, e.g. ('q', ':') for "Q2:"."""
+    prefix = re.sub(r'[\s#]', '', match.group(2) or '').lower()
+    return {'question': 'q'}.get(prefix, prefix), match.group(4)
+
+
+def _split_blocks(text, question_numbers=None):
+    """
+    Split text into (preamble_lines, {question_number: lines}).
+
+    A question starts at a numbered line ("1.", "Q2:", "Question 3)") whose
+    number comes later in the sequence than the current question's and that
+    is marked and indented like the first question. Other numbered lines,
+    such as the numbered steps of a worked answer, stay in the current block.
+
+    Args:
+        text (str): Rubric or submission text
+        question_numbers (iterable, optional): The rubric's question numbers;
+            when given, only these numbers start a question
+    """
+    allowed = set(question_numbers) if question_numbers is not None else None
+    preamble = []
+    blocks = OrderedDict()
+    current = None
+    first_style, first_indent = None, None
+    for line in (text or '').splitlines():
+        match = _QUESTION_START.match(line)
+        starts_question = False
+        if match and (allowed is None or int(match.group(3)) in allowed):
+            indent = len(match.group(1).expandtabs(4))
+            if current is None:
+                starts_question = True
+                first_style, first_indent = _marker_style(match), indent
+            else:
+                starts_question = (int(match.group(3)) > current and _marker_style(match) == first_style
+                                   and indent <= first_indent)
+        if starts_question:
+            current = int(match.group(3))
+            blocks[current] = [match.group(5).strip()]
+        elif current is None:
+            preamble.append(line.strip())
+        else:
+            blocks[current].append(line.strip())
+    return preamble, blocks
+
+
+@span('rubric_compile')
+def compile_rubric(rubric):
+    """
+    Compile rubric text into a structured rubric.
+
+    Args:
+        rubric (str): The rubric content
+
+    Returns:
+        dict: 'hash', 'version', 'questions' (each with 'number', 'prompt',
+        'points', 'answer', 'answer_type' and 'criteria'), 'general_criteria',
+        'total_points' (None when the rubric does not say) and
+        'exact_answer_count'
+    """
+    preamble, blocks = _split_blocks(rubric)
+
+    questions = []
+    for number, lines in blocks.items():
+        lines = [line for line in lines if line and not _TOTAL.match(line)]
+        prompt = lines[0] if lines else ''
+        block_text = "\n".join(lines)
+
+        points_match = _POINTS.search(block_text)
+        points = float(points_match.group(1)) if points_match else None
+
+        answer, answer_type = None, None
+        criteria = []
+        for i, line in enumerate(lines):
+            answer_match = _ANSWER.search(line)
+            if answer_match and answer is None:
+                answer, answer_type = _classify_answer(answer_match.group(1))
+                if answer is not None:
+                    if i == 0:
+                        prompt = line[:answer_match.start()]
+                    continue
+            if i > 0:
+                criteria.append(line.lstrip('-*• ').strip())
+
+        # Answer-key lines such as "1. B" or "2) 42"
+        if answer is None and len(lines) == 1:
+            key_answer, key_type = _classify_answer(_PARENTHESIZED_POINTS.sub('', prompt))
+            if key_type in (ANSWER_CHOICE, ANSWER_NUMERIC):
+                answer, answer_type, prompt = key_answer, key_type, ''
+        prompt = _PARENTHESIZED_POINTS.sub('', prompt).strip()
+
+        questions.append({
+            "number": number,
+            "prompt": prompt,
+            "points": points,
+            "answer": answer,
+            "answer_type": answer_type,
+            "criteria": [c for c in criteria if c]
+        })
+
+    # Plain answer keys give each question one point; numbered essay
+    # criteria without points leave the total unknown
+    if questions and all(q['points'] is None and q['answer_type'] for q in questions):
+        for question in questions:
+            question['points'] = 1.0
+
+    total_points = None
+    total_match = _TOTAL.search(rubric or '')
+    if total_match:
+        total_points = float(total_match.group(1))
+    elif questions and all(q['points'] is not None for q in questions):
+        total_points = sum(q['points'] for q in questions)
+
+    return {
+        "hash": rubric_hash(rubric),
+        "version": COMPILER_VERSION,
+        "questions": questions,
+        "general_criteria": "\n".join(line for line in preamble if line),
+        "total_points": total_points,
+        "exact_answer_count": sum(1 for q in questions if q['answer_type'])
+    }
+
+
+def get_compiled_rubric(rubric, compiled=None):
+    """
+    Get the compiled form of a rubric, compiling it at most once per content.
+
+    Args:
+        rubric (str): The rubric content
+        compiled (dict, optional): A previously stored compiled rubric; used
+            when it matches the content hash and compiler version
+
+    Returns:
+        dict: The compiled rubric (see compile_rubric)
+    """
+    key = rubric_hash(rubric)
+    if compiled and compiled.get('hash') == key and compiled.get('version') == COMPILER_VERSION:
+        result = compiled
+    else:
+        with _cache_lock:
+            result = _cache.get(key)
+            if result is not None:
+                _cache.move_to_end(key)
+                return result
+        result = compile_rubric(rubric)
+
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _student_answer(lines):
+    """The student's answer in a question block: an 'Answer:' line or the last line."""
+    lines = [line for line in lines if line]
+    for line in lines:
+        match = _ANSWER.search(line)
+        if match:
+            return match.group(1).strip()
+    return lines[-1] if lines else None
+
+
+def _check_answer(question, lines):
+    """Return (is_correct, student_answer) for one question's block of student work."""
+    if question['answer_type'] in (ANSWER_NUMERIC, ANSWER_EXPRESSION):
+        check = check_final_answer(question['answer'], "\n".join(lines))
+        return check['is_correct'], check['student_answer']
+
+    student_answer = _student_answer(lines)
+    if not student_answer:
+        return False, None
+    if question['answer_type'] == ANSWER_CHOICE:
+        match = re.match(r'^\(?([A-Ha-h])\)?(?:[\.\)]|\s|$)', student_answer.strip())
+        return bool(match) and match.group(1).upper() == question['answer'], student_answer
+    return _normalize_text(student_answer) == _normalize_text(question['answer']), student_answer
+
+
+@span('exact_answers')
+def score_exact_answers(compiled, submission):
+    """
+    Score the exact-answer questions of a compiled rubric without the LLM.
+
+    Numeric and algebraic answers are compared with grader.math_checker, so
+    "0.75" matches "3/4" and "x^2+2x+1" matches "(x+1)^2". Correct answers
+    get full credit. A wrong multiple-choice letter gets zero; wrong math
+    and short answers are left for the LLM, which can
+    still give partial credit for work shown. Questions the submission does
+    not visibly answer are left for the LLM as well (OCR may have missed
+    them).
+
+    Args:
+        compiled (dict): A compiled rubric
+        submission (str): The student's submission text
+
+    Returns:
+        dict: 'scored' (list of {'number', 'points_earned', 'points_possible',
+        'student_answer', 'correct_answer', 'is_correct'}), 'earned',
+        'possible' and 'remaining' (question numbers still to grade)
+    """
+    _, student_blocks = _split_blocks(submission, [q['number'] for q in compiled['questions']])
+    scored = []
+    remaining = []
+    for question in compiled['questions']:
+        lines = student_blocks.get(question['number'])
+        if not question['answer_type'] or question['points'] is None or not lines:
+            remaining.append(question['number'])
+            continue
+
+        is_correct, student_answer = _check_answer(question, lines)
+        if not student_answer or (not is_correct and question['answer_type'] != ANSWER_CHOICE):
+            remaining.append(question['number'])
+            continue
+
+        scored.append({
+            "number": question['number'],
+            "points_earned": question['points'] if is_correct else 0.0,
+            "points_possible": question['points'],
+            "student_answer": student_answer,
+            "correct_answer": question['answer'],
+            "is_correct": is_correct
+        })
+
+    return {
+        "scored": scored,
+        "earned": sum(item['points_earned'] for item in scored),
+        "possible": sum(item['points_possible'] for item in scored),
+        "remaining": remaining
+    }
+
+
+def remaining_rubric(rubric, compiled, question_numbers):
+    """
+    Scope the teacher's rubric to the questions the LLM still has to grade.
+
+    Args:
+        rubric (str): The rubric content, sent as written
+        compiled (dict): Its compiled form
+        question_numbers (list): The questions left to grade; every one
+            must have a point value
+
+    Returns:
+        str: The rubric followed by a note naming the questions to grade and
+        the points they are worth, which the score must be out of
+    """
+    wanted = set(question_numbers)
+    remaining = [q for q in compiled['questions'] if q['number'] in wanted]
+    scored = [q['number'] for q in compiled['questions'] if q['number'] not in wanted]
+    points = sum(q['points'] for q in remaining)
+    return "\n".join([
+        rubric.rstrip(),
+        "",
+        f"Grading note: {_question_list(scored)} {'was' if len(scored) == 1 else 'were'} scored automatically "
+        "from the answer key.",
+        f"Grade only {_question_list([q['number'] for q in remaining])}, worth {points:g} points in total, "
+        f"and give the score out of {points:g}."
+    ])
+
+
+def _question_list(numbers):
+    """"question 3" or "questions 1, 2 and 4"."""
+    names = [str(number) for number in numbers]
+    if len(names) == 1:
+        return f"question {names[0]}"
+    return f"questions {', '.join(names[:-1])} and {names[-1]}"
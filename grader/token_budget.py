@@ -0,0 +1,179 @@
+"""
+Prompt token budgeting for SnapGrade
+
+Estimates prompt sizes and holds per-model input budgets, so long
+submissions (essays, OCR text of many-page PDFs) can be split into sections
+instead of being sent whole. Page images are estimated with the vision
+model's tiling rule, so multi-page PDFs can be sent in page groups.
+"""
+
+import re
+from config import Config
+from logs import get_logger
+
+logger = get_logger('grader.token_budget')
+
+# Rough characters per token for English prose and OCR text
+CHARS_PER_TOKEN = 4
+
+# Tokens kept free in every prompt for instructions added after budgeting
+SAFETY_MARGIN = 500
+
+# Sections are never made smaller than this, even with a large rubric
+MIN_SECTION_TOKENS = 1000
+
+# Vision image cost: a fixed base plus a charge per 512px tile after the
+# image is scaled to fit 2048x2048 and its short side to 768px
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+
+# Blank lines and page headers ("--- Page n ---") separate paragraphs
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n|\n(?=--- Page \d+ ---)')
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text.
+
+    Uses the larger of a character-based and a word-based estimate, which
+    stays conservative for both prose and symbol-heavy math/OCR text.
+
+    Args:
+        text (str): Prompt or submission text
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    by_chars = len(text) / CHARS_PER_TOKEN
+    by_words = len(text.split()) * 4 / 3
+    return int(max(by_chars, by_words)) + 1
+
+
+def estimate_image_tokens(width, height):
+    """
+    Estimate the input tokens of one image sent at high detail.
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+
+    Returns:
+        int: Estimated token count
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = -(-int(width) // 512) * -(-int(height) // 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def _parse_budgets(spec):
+    """Parse "model=tokens,model=tokens" into a dict."""
+    budgets = {}
+    for entry in (spec or '').split(','):
+        if '=' not in entry:
+            continue
+        model, tokens = entry.split('=', 1)
+        try:
+            budgets[model.strip()] = int(tokens.strip())
+        except ValueError:
+            logger.warning("Ignoring invalid token budget entry", extra={'entry': entry})
+    return budgets
+
+
+def get_token_budget(model=None):
+    """
+    Get the prompt token budget for a model.
+
+    Args:
+        model (str, optional): Model name; defaults to Config.GEMINI_MODEL
+
+    Returns:
+        int: The model's budget from MODEL_TOKEN_BUDGETS, or
+        PROMPT_TOKEN_BUDGET when it has none
+    """
+    budgets = _parse_budgets(Config.MODEL_TOKEN_BUDGETS)
+    return budgets.get(model or Config.GEMINI_MODEL, Config.PROMPT_TOKEN_BUDGET)
+
+
+def _split_long_paragraph(paragraph, max_tokens):
+    """Split one paragraph at sentence boundaries, then at words."""
+    pieces = []
+    current = ""
+    for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+        while estimate_tokens(sentence) > max_tokens:
+            words = sentence.split()
+            take = max(1, int((max_tokens - 1) * 3 / 4))
+            head, sentence = " ".join(words[:take]), " ".join(words[take:])
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(head)
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_sections(text, max_tokens):
+    """
+    Split a submission into sections that each fit a token budget.
+
+    Sections follow the submission's own structure: page breaks
+    ("--- Page n ---") and paragraphs are kept together where they fit, and
+    only oversized paragraphs are split at sentences.
+
+    Args:
+        text (str): The submission text
+        max_tokens (int): Budget per section
+
+    Returns:
+        list: Section texts, in order
+    """
+    paragraphs = []
+    for block in _PARAGRAPH_BREAK.split(text or ''):
+        block = block.strip()
+        if not block:
+            continue
+        if estimate_tokens(block) > max_tokens:
+            paragraphs.extend(_split_long_paragraph(block, max_tokens))
+        else:
+            paragraphs.append(block)
+
+    sections = []
+    current = []
+    current_tokens = 0
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph)
+        if current and current_tokens + tokens > max_tokens:
+            sections.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def section_budget(prompt_overhead_tokens, model=None):
+    """
+    Tokens of submission text that fit in one prompt next to the rubric
+    and instructions.
+
+    Args:
+        prompt_overhead_tokens (int): Estimated tokens of the prompt without
+            the submission
+        model (str, optional): Model name
+
+    Returns:
+        int: Section size in tokens
+    """
+    return max(MIN_SECTION_TOKENS, get_token_budget(model) - prompt_overhead_tokens - SAFETY_MARGIN)
@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration for SnapGrade
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Grading requests spend most of their time waiting on OpenAI and Gemini, so
+workers are sized for I/O rather than CPU:
+
+- gthread (default): WEB_WORKERS processes with WEB_THREADS threads each.
+  The threads share the waiting.
+- gevent: WEB_WORKERS processes with up to WEB_WORKER_CONNECTIONS
+  concurrent requests each, for very many slow requests per worker.
+
+WEB_WORKERS defaults to 1. The data lives in JSON files that each request
+reads, changes and rewrites without a cross-process lock, so two workers
+can lose each other's writes; concurrency comes from threads (or gevent)
+instead. The in-memory grade statistics and roster name index reload when
+grades.json or students.json changes on disk, but that does not make
+concurrent writes safe.
+
+Each worker loads the provider SDKs in the background after it starts
+accepting requests (WARM_UP). On SIGTERM the workers stop accepting connections and in-flight grading gets
+WEB_GRACEFUL_TIMEOUT seconds to finish; buffered usage records are flushed
+as each worker exits.
+"""
+
+import multiprocessing
+from config import Config
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count()
+worker_class = Config.WEB_WORKER_CLASS
+threads = Config.WEB_THREADS
+worker_connections = Config.WEB_WORKER_CONNECTIONS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Restart workers now and then, so memory held after large PDF uploads is returned
+max_requests = 1000
+max_requests_jitter = 100
+
+# Requests are logged by the app (see logs.py)
+accesslog = None
+
+
+def post_worker_init(worker):
+    # The listening socket is already bound; the worker accepts as soon as this returns
+    from app import start_warm_up
+    start_warm_up()
+
+
+def worker_exit(server, worker):
+    from app import usage_ledger
+    usage_ledger.flush()
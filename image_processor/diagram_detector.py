@@ -0,0 +1,359 @@
+"""
+Local diagram and MCQ detection for SnapGrade
+
+Decides whether a page needs vision-based grading (bubbles, charts, tables,
+drawings) from the page image alone, using Pillow and NumPy:
+
+- ink coverage and edge density
+- long horizontal/vertical strokes (axes, tables, boxes)
+- connected components: bubble-sized rings and discs arranged in a grid
+- text density: how much of the ink sits in character-sized components
+
+Returns the same dict as the vision-based detector in ocr.py in a few tens of
+milliseconds; a confidence of 'low' tells the caller a tiebreaker may help.
+
+Agreement with the vision detector on real scanned pages has not been
+measured: benchmarks/diagram_agreement.py has only been run on its synthetic
+pages, which are drawn to the shapes this module looks for. Until a labeled
+set of real pages has been checked, low-confidence results are used as they
+are unless DIAGRAM_VISION_TIEBREAKER is turned on.
+"""
+
+import io
+import re
+import numpy as np
+from PIL import Image
+
+# Pages are analyzed at this width
+ANALYSIS_WIDTH = 800
+
+# Rows (or columns) pooled together when looking for long strokes, so lines on
+# slightly skewed scans still form long runs
+LINE_POOL = 8
+
+# A stroke at least this fraction of the page width is a "long line"
+LONG_LINE_FRACTION = 0.15
+
+# A component covering at least this fraction of the page is a figure
+FIGURE_AREA_FRACTION = 0.015
+
+# Minimum bubbles per row/rows per grid for an answer-bubble grid
+MIN_BUBBLES_PER_ROW = 3
+MIN_BUBBLE_ROWS = 2
+
+MCQ_TYPE = "Multiple Choice Questions (MCQ)"
+TABLE_TYPE = "Table or grid"
+CHART_TYPE = "Graph or chart"
+FIGURE_TYPE = "Diagram or illustration"
+
+_OPTION_LINE = re.compile(r'^\s*\(?([A-Ea-e])[\)\.:]\s+\S', re.MULTILINE)
+
+
+def _load_grayscale(image_data):
+    image = Image.open(io.BytesIO(image_data))
+    # JPEG photos can be decoded directly at reduced size
+    image.draft('L', (ANALYSIS_WIDTH, ANALYSIS_WIDTH * 2))
+    image = image.convert('L')
+    if image.width > ANALYSIS_WIDTH:
+        height = max(1, round(image.height * ANALYSIS_WIDTH / image.width))
+        image = image.resize((ANALYSIS_WIDTH, height), Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def _otsu_threshold(gray):
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    background = weights
+    foreground = total - weights
+    valid = (background > 0) & (foreground > 0)
+    between = np.zeros(256)
+    between[valid] = (means[-1] * background[valid] / total - means[valid]) ** 2 / (
+        background[valid] * foreground[valid])
+    return int(np.argmax(between))
+
+
+def binarize(gray):
+    # Clean scans are mostly paper; cap the threshold so gray paper texture is
+    # not counted as ink
+    threshold = min(_otsu_threshold(gray), 170)
+    return gray < threshold
+
+
+def _row_runs(binary):
+    """Return (rows, starts, ends) of horizontal ink runs; ends are exclusive."""
+    padded = np.zeros((binary.shape[0], binary.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = binary
+    changes = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(changes == 1)
+    _, ends = np.nonzero(changes == -1)
+    return start_rows, starts, ends
+
+
+def _long_lines(binary, min_length):
+    """
+    Count separate long horizontal strokes.
+
+    Rows are max-pooled in bands of LINE_POOL so a skewed line, which steps
+    down a row every few dozen pixels, still forms one long run; adjacent
+    bands with long runs are counted as one stroke.
+    """
+    bands = binary.shape[0] // LINE_POOL
+    if bands == 0:
+        return 0
+    pooled = binary[:bands * LINE_POOL].reshape(bands, LINE_POOL, binary.shape[1]).any(axis=1)
+    rows, starts, ends = _row_runs(pooled)
+    long_rows = np.unique(rows[(ends - starts) >= min_length])
+    if long_rows.size == 0:
+        return 0
+    return int(1 + np.count_nonzero(np.diff(long_rows) > 1))
+
+
+def connected_components(binary):
+    """
+    Label 8-connected components from row runs.
+
+    Runs in adjacent rows that overlap (or touch diagonally) are linked, then
+    labels are propagated over the links with pointer jumping, all in NumPy.
+
+    Returns:
+        dict: Arrays 'area', 'left', 'top', 'right', 'bottom' per component
+    """
+    rows, starts, ends = _row_runs(binary)
+    count = len(rows)
+    if count == 0:
+        return {key: np.array([], dtype=np.int64) for key in ('area', 'left', 'top', 'right', 'bottom')}
+
+    # Global sort keys; runs are already ordered by (row, start)
+    stride = binary.shape[1] + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+
+    # Runs of the previous row overlapping each run form a contiguous range
+    first = np.searchsorted(end_keys, (rows - 1) * stride + starts, 'left')
+    last = np.searchsorted(start_keys, (rows - 1) * stride + ends, 'right')
+    links = np.maximum(last - first, 0)
+    source = np.repeat(np.arange(count), links)
+    offsets = np.arange(links.sum()) - np.repeat(np.cumsum(links) - links, links)
+    target = np.repeat(first, links) + offsets
+
+    labels = np.arange(count)
+    while True:
+        linked = np.minimum(labels[source], labels[target])
+        updated = labels.copy()
+        np.minimum.at(updated, source, linked)
+        np.minimum.at(updated, target, linked)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    _, labels = np.unique(labels, return_inverse=True)
+    components = labels.max() + 1
+
+    area = np.bincount(labels, weights=ends - starts, minlength=components).astype(np.int64)
+    left = np.full(components, binary.shape[1], dtype=np.int64)
+    right = np.zeros(components, dtype=np.int64)
+    top = np.full(components, binary.shape[0], dtype=np.int64)
+    bottom = np.zeros(components, dtype=np.int64)
+    np.minimum.at(left, labels, starts)
+    np.maximum.at(right, labels, ends)
+    np.minimum.at(top, labels, rows)
+    np.maximum.at(bottom, labels, rows + 1)
+    return {"area": area, "left": left, "top": top, "right": right, "bottom": bottom}
+
+
+def _bubble_grid(components, text_height):
+    """
+    Find answer bubbles: near-square rings or discs about one to three text
+    heights across, repeated at aligned positions in at least two rows.
+
+    Returns:
+        int: Number of bubbles that belong to a grid
+    """
+    width = components['right'] - components['left']
+    height = components['bottom'] - components['top']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect = width / np.maximum(height, 1)
+        fill = components['area'] / np.maximum(width * height, 1)
+
+    shape_ok = (aspect > 0.75) & (aspect < 1.33) & (height >= 8)
+    ring_or_disc = ((fill > 0.15) & (fill < 0.6)) | ((fill > 0.65) & (fill < 0.9))
+    round_shapes = shape_ok & ring_or_disc
+
+    # Bubbles are drawn larger than the letters around them; on a bubble sheet
+    # the bubbles dominate the page, so measure letters without them
+    letters = (height >= 3) & ~round_shapes
+    if letters.any():
+        text_height = float(np.median(height[letters]))
+    size_ok = (height >= max(8, 1.4 * text_height)) & (height <= max(40, 4 * text_height))
+    candidates = np.nonzero(size_ok & round_shapes)[0]
+    if len(candidates) < MIN_BUBBLES_PER_ROW * MIN_BUBBLE_ROWS:
+        return 0
+
+    center_x = (components['left'][candidates] + components['right'][candidates]) / 2
+    center_y = (components['top'][candidates] + components['bottom'][candidates]) / 2
+    size = float(np.median(height[candidates]))
+
+    # Group candidates into rows of similar height on the page
+    order = np.argsort(center_y)
+    rows = []
+    for index in order:
+        if rows and abs(center_y[index] - center_y[rows[-1][-1]]) < size * 0.5:
+            rows[-1].append(index)
+        else:
+            rows.append([index])
+
+    # Rows with several evenly spaced bubbles
+    bubble_rows = []
+    for row in rows:
+        if len(row) < MIN_BUBBLES_PER_ROW:
+            continue
+        xs = np.sort(center_x[row])
+        gaps = np.diff(xs)
+        regular = gaps[(gaps > size * 1.5) & (gaps < size * 6)]
+        if len(regular) >= MIN_BUBBLES_PER_ROW - 1 and np.std(regular) < 0.35 * np.mean(regular):
+            bubble_rows.append(xs)
+
+    if len(bubble_rows) < MIN_BUBBLE_ROWS:
+        return 0
+
+    # Columns of a real answer grid line up from row to row
+    reference = bubble_rows[0]
+    aligned_rows = [
+        xs for xs in bubble_rows
+        if np.mean(np.min(np.abs(xs[:, None] - reference[None, :]), axis=1) < size) > 0.6
+    ]
+    if len(aligned_rows) < MIN_BUBBLE_ROWS:
+        return 0
+    return int(sum(len(xs) for xs in aligned_rows))
+
+
+def analyze_page_image(image_data):
+    """
+    Compute the layout features used for diagram/MCQ detection.
+
+    Args:
+        image_data (bytes): The image data as bytes
+
+    Returns:
+        dict: Feature values (ink ratio, edge density, long line counts,
+        bubble count, figure count, text ink ratio)
+    """
+    gray = _load_grayscale(image_data)
+    binary = binarize(gray)
+    height, width = binary.shape
+
+    ink_ratio = float(binary.mean())
+
+    # Edge density: strong gray-level steps per pixel
+    gray16 = gray.astype(np.int16)
+    edges = (np.abs(np.diff(gray16, axis=1))[:-1, :] + np.abs(np.diff(gray16, axis=0))[:, :-1]) > 60
+    edge_density = float(edges.mean())
+
+    horizontal_lines = _long_lines(binary, LONG_LINE_FRACTION * width)
+    vertical_lines = _long_lines(binary.T, LONG_LINE_FRACTION * width)
+
+    components = connected_components(binary)
+    comp_height = components['bottom'] - components['top']
+    comp_width = components['right'] - components['left']
+    visible = comp_height >= 3
+    text_height = float(np.median(comp_height[visible])) if visible.any() else 0.0
+
+    page_area = width * height
+    bbox_area = comp_height * comp_width
+    is_text = visible & (comp_height <= 2.5 * max(text_height, 1)) & (comp_width <= 6 * max(text_height, 1))
+    is_figure = bbox_area >= FIGURE_AREA_FRACTION * page_area
+
+    total_ink = float(components['area'].sum())
+    text_ink_ratio = float(components['area'][is_text].sum()) / total_ink if total_ink else 1.0
+
+    return {
+        "ink_ratio": round(ink_ratio, 4),
+        "edge_density": round(edge_density, 4),
+        "horizontal_lines": horizontal_lines,
+        "vertical_lines": vertical_lines,
+        "components": int(len(components['area'])),
+        "text_height": text_height,
+        "bubbles": _bubble_grid(components, text_height),
+        "figures": int(np.count_nonzero(is_figure)),
+        "text_ink_ratio": round(text_ink_ratio, 4)
+    }
+
+
+def classify_features(features, text=None):
+    """
+    Turn layout features (and optional OCR text) into a detection result.
+
+    Returns:
+        dict: 'has_diagrams', 'diagram_types', 'confidence', 'description'
+    """
+    types = []
+    evidence = []
+    strong = False
+
+    if features['bubbles'] >= MIN_BUBBLES_PER_ROW * MIN_BUBBLE_ROWS:
+        types.append(MCQ_TYPE)
+        evidence.append(f"{features['bubbles']} answer bubbles in a grid")
+        strong = strong or features['bubbles'] >= 9
+    elif text and len(_OPTION_LINE.findall(text)) >= 3:
+        types.append(MCQ_TYPE)
+        evidence.append("lettered answer options in the text")
+        strong = True
+
+    if features['horizontal_lines'] >= 3 and features['vertical_lines'] >= 3:
+        types.append(TABLE_TYPE)
+        evidence.append(f"{features['horizontal_lines']}x{features['vertical_lines']} ruled lines")
+        strong = True
+    elif features['horizontal_lines'] >= 1 and features['vertical_lines'] >= 1:
+        types.append(CHART_TYPE)
+        evidence.append("crossing horizontal and vertical strokes (axes or frame)")
+
+    if features['figures'] and features['text_ink_ratio'] < 0.6:
+        types.append(FIGURE_TYPE)
+        evidence.append(f"{features['figures']} large non-text figure(s)")
+        strong = strong or features['text_ink_ratio'] < 0.35
+
+    has_diagrams = bool(types)
+    if has_diagrams:
+        confidence = 'high' if strong else 'medium' if len(types) > 1 or features['figures'] else 'low'
+        description = "Detected " + "; ".join(evidence)
+    else:
+        # Clear text pages: most ink is in character-sized components and
+        # there are no long strokes or large figures
+        if features['text_ink_ratio'] > 0.8 and features['ink_ratio'] < 0.2:
+            confidence = 'high'
+        elif features['text_ink_ratio'] > 0.6:
+            confidence = 'medium'
+        else:
+            confidence = 'low'
+        description = "Plain text layout"
+
+    return {
+        'has_diagrams': has_diagrams,
+        'diagram_types': types,
+        'confidence': confidence,
+        'description': description
+    }
+
+
+def detect_diagrams_locally(image_data, text=None):
+    """
+    Detect diagrams, charts, tables and MCQ bubbles without a model call.
+
+    Args:
+        image_data (bytes): The image data as bytes
+        text (str, optional): OCR text of the page, if already available;
+            used to recognize text-only multiple choice questions
+
+    Returns:
+        dict: Contains 'has_diagrams' (bool), 'diagram_types' (list),
+        'confidence' ('high'/'medium'/'low'), 'description', plus
+        'method': 'local' and the raw 'features'
+    """
+    features = analyze_page_image(image_data)
+    result = classify_features(features, text)
+    result['method'] = 'local'
+    result['features'] = features
+    return result
@@ -1,5 +1,3 @@
-import dropbox
-import requests
 from config import Config
 
 def get_file_from_dropbox(file_path):
@@ -14,6 +12,7 @@ def get_file_from_dropbox(file_path):
     """
     try:
         # Initialize Dropbox client
+        import dropbox
         dbx = dropbox.Dropbox(Config.DROPBOX_ACCESS_TOKEN)
         
         # Download the file
@@ -37,6 +36,7 @@ def get_file_from_shared_link(shared_link):
     """
     try:
         # Initialize Dropbox client
+        import dropbox
         dbx = dropbox.Dropbox(Config.DROPBOX_ACCESS_TOKEN)
         
         # Get the shared link metadata
@@ -52,6 +52,7 @@ def get_file_from_shared_link(shared_link):
         try:
             # Convert shared link to direct download link
             dl_link = shared_link.replace('www.dropbox.com', 'dl.dropboxusercontent.com')
+            import requests
             response = requests.get(dl_link)
             response.raise_for_status()
             return response.content
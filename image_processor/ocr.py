@@ -1,12 +1,60 @@
-from openai import OpenAI
+import asyncio
 import base64
 import json
 import re
+import time
 from config import Config
-
-def detect_diagrams_in_image(image_data):
+from image_processor.local_extraction import (
+    LOCAL_CONFIDENCE_THRESHOLD,
+    extract_student_name_locally,
+    extract_assignment_title_locally,
+    record_extraction
+)
+from image_processor.tiered_ocr import extract_text_tiered, extract_text_tiered_async
+from image_processor.diagram_detector import detect_diagrams_locally
+from backends import get_backend
+from backends.providers import async_openai_client
+from metrics import span
+from singleflight import SingleFlight, flight_key
+from usage import record_usage
+from logs import get_logger, payload
+
+logger = get_logger('image_processor.ocr')
+
+_ocr_flight = SingleFlight('ocr')
+
+@span('diagram_detection')
+def detect_diagrams_in_image(image_data, text=None):
     """
     Detect if an image contains diagrams, charts, MCQ, or visual elements that require GPT-4 Vision.
+    Uses the local image-based detector; GPT-4 Vision is only consulted as a
+    tiebreaker for low-confidence results when DIAGRAM_VISION_TIEBREAKER is on.
+    
+    Args:
+        image_data (bytes): The image data as bytes
+        text (str, optional): OCR text of the page, if already extracted
+        
+    Returns:
+        dict: Contains 'has_diagrams' (bool) and 'diagram_types' (list)
+    """
+    try:
+        result = detect_diagrams_locally(image_data, text)
+    except Exception as e:
+        logger.warning("Local diagram detection failed, using vision", extra={'error': str(e)})
+        return get_backend().detect(image_data)
+    
+    logger.debug("Local diagram detection", extra={'diagram_types': result['diagram_types'], 'confidence': result['confidence']})
+    if result['confidence'] == 'low' and Config.DIAGRAM_VISION_TIEBREAKER:
+        vision_result = get_backend().detect(image_data)
+        if vision_result.get('description') != 'Error in detection':
+            vision_result['method'] = 'vision_tiebreaker'
+            return vision_result
+    return result
+
+@span('vision_diagram_detection', provider='openai')
+def detect_diagrams_with_vision(image_data):
+    """
+    Detect if an image contains diagrams, charts, MCQ, or visual elements using GPT-4 Vision.
     
     Args:
         image_data (bytes): The image data as bytes
@@ -16,6 +64,7 @@ def detect_diagrams_in_image(image_data):
     """
     try:
         # Initialize OpenAI client
+        from openai import OpenAI
         client = OpenAI(api_key=Config.OPENAI_API_KEY)
         
         # Convert image data to base64
@@ -56,6 +105,7 @@ Respond in JSON format:
 }"""
         
         # Call the OpenAI API
+        start = time.perf_counter()
         response = client.chat.completions.create(
             model=Config.OPENAI_VISION_MODEL,
             messages=[
@@ -78,6 +128,7 @@ Respond in JSON format:
             max_tokens=500,
             temperature=0.1
         )
+        record_usage('openai', 'diagram_detection', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[image_data])
         
         # Parse the response
         result_text = response.choices[0].message.content.strip()
@@ -98,7 +149,7 @@ Respond in JSON format:
         }
         
     except Exception as e:
-        print(f"Error in diagram detection: {str(e)}")
+        logger.error("Diagram detection failed", extra={'error': str(e)})
         # Default to no diagrams on error to maintain standard flow
         return {
             'has_diagrams': False,
@@ -107,32 +158,144 @@ Respond in JSON format:
             'description': 'Error in detection'
         }
 
+@span('ocr')
 def extract_text_from_image(image_data, assignment_type=None):
+    """
+    Extract text from an image, trying local Tesseract OCR first and using
+    GPT-4 Vision only for pages or regions Tesseract is not confident about.
+    
+    Args:
+        image_data (bytes): The image data as bytes
+        assignment_type (str, optional): The type of assignment
+        
+    Returns:
+        str: The extracted text
+    """
+    if not image_data or len(image_data) == 0:
+        raise Exception("Error extracting text from image: Empty image data provided")
+    backend = get_backend()
+    return _ocr_flight.do(_ocr_key(image_data, assignment_type, backend), extract_text_tiered,
+                          image_data, backend.vision_extract, backend.transcribe_region, assignment_type)
+
+@span('ocr')
+async def extract_text_from_image_async(image_data, assignment_type=None):
+    """
+    Async extract_text_from_image().
+    """
+    if not image_data or len(image_data) == 0:
+        raise Exception("Error extracting text from image: Empty image data provided")
+    backend = get_backend()
+    return await _ocr_flight.do_async(_ocr_key(image_data, assignment_type, backend), extract_text_tiered_async,
+                                      image_data, backend.vision_extract_async, backend.transcribe_region_async,
+                                      assignment_type)
+
+def _ocr_key(image_data, assignment_type, backend):
+    # The same page, prompt and model give the same text
+    return flight_key(image_data, assignment_type, backend.name, Config.OPENAI_VISION_MODEL)
+
+@span('vision_region_ocr', provider='openai')
+def transcribe_image_region(region_data):
+    """
+    Transcribe a small cropped region of a page using GPT-4 Vision.
+    
+    Args:
+        region_data (bytes): The cropped region as PNG bytes
+        
+    Returns:
+        str: The transcribed text, without commentary
+    """
+    from openai import OpenAI
+    client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    
+    start = time.perf_counter()
+    response = client.chat.completions.create(**_region_request(region_data))
+    record_usage('openai', 'region_transcription', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[region_data])
+    
+    return (response.choices[0].message.content or "").strip()
+
+@span('vision_region_ocr', provider='openai')
+async def transcribe_image_region_async(region_data):
+    """
+    Async transcribe_image_region().
+    """
+    start = time.perf_counter()
+    response = await async_openai_client().chat.completions.create(**_region_request(region_data))
+    record_usage('openai', 'region_transcription', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[region_data])
+    
+    return (response.choices[0].message.content or "").strip()
+
+def _region_request(region_data):
+    base64_image = base64.b64encode(region_data).decode('utf-8')
+    return {
+        'model': Config.OPENAI_VISION_MODEL,
+        'messages': [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Transcribe the text in this cropped region of a student assignment exactly as written, including math. Respond with the transcription only. For unclear handwriting give your best interpretation in [brackets]."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/png;base64,{base64_image}"
+                        }
+                    }
+                ]
+            }
+        ],
+        'max_tokens': 500,
+        'temperature': 0.1
+    }
+
+@span('vision_ocr', provider='openai')
+def extract_text_with_vision(image_data, assignment_type=None):
     """
     Extract text from an image using OpenAI's GPT-4 Vision API.
     Enhanced for document processing and assignment grading.
     Optimized to carefully identify student information at the top of pages.
     """
     try:
-        # Print debug information
-        print("Starting GPT-4 Vision OCR process...")
-        
         # Check if image_data is valid
         if not image_data or len(image_data) == 0:
             raise ValueError("Empty image data provided")
             
-        print(f"Image data size: {len(image_data)} bytes")
-        print(f"Assignment type: {assignment_type}")
-        
         # Initialize OpenAI client
+        from openai import OpenAI
         client = OpenAI(api_key=Config.OPENAI_API_KEY)
         
-        # Convert image data to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
+        # Call the OpenAI API with vision capabilities
+        start = time.perf_counter()
+        response = client.chat.completions.create(**_vision_ocr_request(image_data, assignment_type))
+        record_usage('openai', 'vision_ocr', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[image_data])
+        return _vision_ocr_text(response, image_data)
+    except Exception as e:
+        return _vision_ocr_error(e)
+
+@span('vision_ocr', provider='openai')
+async def extract_text_with_vision_async(image_data, assignment_type=None):
+    """
+    Async extract_text_with_vision().
+    """
+    try:
+        if not image_data or len(image_data) == 0:
+            raise ValueError("Empty image data provided")
         
-        # Create enhanced prompts for document processing
-        if assignment_type == "document":
-            prompt = """Please analyze this document image and extract ALL text content with maximum accuracy, with special attention to the top of the page where student information appears.
+        start = time.perf_counter()
+        response = await async_openai_client().chat.completions.create(**_vision_ocr_request(image_data, assignment_type))
+        record_usage('openai', 'vision_ocr', Config.OPENAI_VISION_MODEL, response, time.perf_counter() - start, images=[image_data])
+        return _vision_ocr_text(response, image_data)
+    except Exception as e:
+        return _vision_ocr_error(e)
+
+def _vision_ocr_request(image_data, assignment_type=None):
+    # Convert image data to base64
+    base64_image = base64.b64encode(image_data).decode('utf-8')
+    
+    # Create enhanced prompts for document processing
+    if assignment_type == "document":
+        prompt = """Please analyze this document image and extract ALL text content with maximum accuracy, with special attention to the top of the page where student information appears.
 
 **STUDENT IDENTIFICATION - HIGHEST PRIORITY:**
 1. Examine the TOP of the document FIRST, especially top corners, headers and margins
@@ -159,9 +322,9 @@ def extract_text_from_image(image_data, assignment_type=None):
 - Indicate any unclear or ambiguous text with [unclear: best guess]
 
 Extract ALL visible text from this document image:"""
-        elif assignment_type and assignment_type.lower() in ['multiple choice', 'problem set', 'math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics']:
-            # Use existing enhanced prompt for assignments
-            prompt = """Please analyze this image and extract all text content with special attention to OCR accuracy, student identification, and student work.
+    elif assignment_type and assignment_type.lower() in ['multiple choice', 'problem set', 'math', 'mathematics', 'calculus', 'algebra', 'geometry', 'statistics']:
+        # Use existing enhanced prompt for assignments
+        prompt = """Please analyze this image and extract all text content with special attention to OCR accuracy, student identification, and student work.
 
 **STUDENT IDENTIFICATION - HIGHEST PRIORITY:**
 1. Look CAREFULLY at the top of the page for the student's name, especially in corners
@@ -209,9 +372,9 @@ Student Selected: [letter(s) that appear to be marked]
 ...
 
 If no text is found, respond with '[No text detected in the image]'."""
-        else:
-            # Use existing general prompt
-            prompt = """Please extract all text from this image with MAXIMUM OCR error tolerance, focusing on student identification and content.
+    else:
+        # Use existing general prompt
+        prompt = """Please extract all text from this image with MAXIMUM OCR error tolerance, focusing on student identification and content.
 
 **STUDENT IDENTIFICATION - HIGHEST PRIORITY:**
 1. Carefully inspect the TOP of the document, especially CORNERS, for the student name
@@ -239,72 +402,54 @@ Assignment: [Title or topic if identifiable]
 - [any identifiable final answers or main points]
 
 [OCR CONFIDENCE NOTE: This extraction uses maximum leniency for unclear text.]"""
-        
-        print("Sending request to GPT-4 Vision...")
-        
-        # Call the OpenAI API with vision capabilities
-        response = client.chat.completions.create(
-            model=Config.OPENAI_VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
+    
+    return {
+        'model': Config.OPENAI_VISION_MODEL,
+        'messages': [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{base64_image}"
                         }
-                    ]
-                }
-            ],
-            max_tokens=2500,  # Increased for detailed analysis
-            temperature=0.1  # Low temperature for consistent extraction
-        )
-        
-        # Extract the response content
-        extracted_text = response.choices[0].message.content.strip()
-        
-        print("Text extraction complete using GPT-4 Vision")
-        
-        # If no text was extracted, return a message
-        if not extracted_text or extracted_text.lower() == "[no text detected in the image]":
-            return "[No text detected in the image. Please ensure the image contains clear, readable text.]"
-            
-        return extracted_text
+                    }
+                ]
+            }
+        ],
+        'max_tokens': 2500,  # Increased for detailed analysis
+        'temperature': 0.1  # Low temperature for consistent extraction
+    }
+
+def _vision_ocr_text(response, image_data):
+    # Extract the response content
+    extracted_text = response.choices[0].message.content.strip()
+    
+    logger.info("Vision OCR complete", extra={
+        'model': Config.OPENAI_VISION_MODEL, 'image_bytes': len(image_data), 'chars': len(extracted_text)
+    })
+    
+    # If no text was extracted, return a message
+    if not extracted_text or extracted_text.lower() == "[no text detected in the image]":
+        return "[No text detected in the image. Please ensure the image contains clear, readable text.]"
         
-    except Exception as e:
-        print(f"Error in GPT-4 Vision OCR: {str(e)}")
-        # Fallback error message
-        if "model" in str(e).lower() and "vision" in str(e).lower():
-            return "GPT-4 Vision model is not available. Please check your OpenAI API access."
-        raise Exception(f"Error extracting text from image using GPT-4 Vision: {str(e)}")
+    return extracted_text
 
+def _vision_ocr_error(e):
+    logger.error("Vision OCR failed", extra={'error': str(e)})
+    # Fallback error message
+    if "model" in str(e).lower() and "vision" in str(e).lower():
+        return "GPT-4 Vision model is not available. Please check your OpenAI API access."
+    raise Exception(f"Error extracting text from image using GPT-4 Vision: {str(e)}")
 
-def extract_corner_text(image_data):
-    """
-    Specialized function to extract text specifically from the corners of an image,
-    which is where student names are typically found.
-    
-    Args:
-        image_data (bytes): The image data as bytes
-        
-    Returns:
-        dict: Contains text extracted from each corner
-    """
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Convert image data to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Create a specialized prompt focusing only on corner text
-        prompt = """Focus ONLY on the FOUR CORNERS of this image and extract any text found there.
+
+# Asks the vision model for the text in each corner of a page, where names usually are
+CORNER_TEXT_PROMPT = """Focus ONLY on the FOUR CORNERS of this image and extract any text found there.
 
 CRITICAL INSTRUCTIONS:
 1. ONLY look at the four corner regions (top-left, top-right, bottom-left, bottom-right)
@@ -321,53 +466,89 @@ Format your response in this exact JSON structure:
     "bottom_left": "text found in bottom left corner or null if none",
     "bottom_right": "text found in bottom right corner or null if none"
 }"""
+
+
+@span('corner_text')
+def extract_corner_text(image_data):
+    """
+    Specialized function to extract text specifically from the corners of an image,
+    which is where student names are typically found.
+    
+    Args:
+        image_data (bytes): The image data as bytes
         
+    Returns:
+        dict: Contains text extracted from each corner
+    """
+    try:
         # Call GPT-4 Vision for corner analysis only
-        response = client.chat.completions.create(
-            model=Config.OPENAI_VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=500,
-            temperature=0.1
-        )
-        
-        # Parse response
-        content = response.choices[0].message.content.strip() if response.choices[0].message.content else "{}"
-        
-        # Clean JSON response if needed
-        if content.startswith('```json'):
-            content = content[7:-3].strip()
-        elif content.startswith('```'):
-            content = content[3:-3].strip()
-            
-        result = json.loads(content)
-        return result
-        
+        return get_backend().vision_json(CORNER_TEXT_PROMPT, [image_data], max_tokens=500, temperature=0.1)
     except Exception as e:
-        print(f"Error extracting corner text: {str(e)}")
-        return {
-            "top_left": None,
-            "top_right": None,
-            "bottom_left": None,
-            "bottom_right": None,
-            "error": str(e)
-        }
+        return _corner_text_error(e)
+
+@span('corner_text')
+async def extract_corner_text_async(image_data):
+    """
+    Async extract_corner_text().
+    """
+    try:
+        return await get_backend().vision_json_async(CORNER_TEXT_PROMPT, [image_data], max_tokens=500, temperature=0.1)
+    except Exception as e:
+        return _corner_text_error(e)
+
+def _corner_text_error(e):
+    logger.error("Corner text extraction failed", extra={'error': str(e)})
+    return {
+        "top_left": None,
+        "top_right": None,
+        "bottom_left": None,
+        "bottom_right": None,
+        "error": str(e)
+    }
+
+
+def _metadata_request(kind, extracted_text):
+    """Keyword arguments for the gpt-3.5-turbo call behind name and title extraction."""
+    prompt = _student_name_prompt(extracted_text) if kind == 'name' else _assignment_title_prompt(extracted_text)
+    return dict(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=200,
+        temperature=0.1
+    )
+
+
+@span('text_metadata', provider='openai')
+def extract_metadata_with_openai(kind, extracted_text):
+    """
+    Ask gpt-3.5-turbo for the student name ('name') or assignment title
+    ('title') of OCR text.
+    
+    Returns:
+        dict: The parsed reply
+    """
+    from openai import OpenAI
+    client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    
+    start = time.perf_counter()
+    response = client.chat.completions.create(**_metadata_request(kind, extracted_text))
+    record_usage('openai', f'{kind}_extraction', "gpt-3.5-turbo", response, time.perf_counter() - start)
+    return json.loads(response.choices[0].message.content.strip())
+
+@span('text_metadata', provider='openai')
+async def extract_metadata_with_openai_async(kind, extracted_text):
+    """
+    Async extract_metadata_with_openai().
+    """
+    start = time.perf_counter()
+    response = await async_openai_client().chat.completions.create(**_metadata_request(kind, extracted_text))
+    record_usage('openai', f'{kind}_extraction', "gpt-3.5-turbo", response, time.perf_counter() - start)
+    return json.loads(response.choices[0].message.content.strip())
+
 
+@span('name_extraction')
 def extract_student_name_from_text(extracted_text):
     """
     Extract student name from OCR text using pattern matching and AI assistance.
@@ -379,12 +560,37 @@ def extract_student_name_from_text(extracted_text):
     Returns:
         dict: Contains 'student_name' (str or None) and 'confidence' (str)
     """
+    # Answer locally when the header clearly states the name
+    local_result = extract_student_name_locally(extracted_text)
+    if local_result['confidence_score'] >= LOCAL_CONFIDENCE_THRESHOLD:
+        record_extraction('name', local=True)
+        return local_result
+    record_extraction('name', local=False)
+    
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Use AI to extract student name from the text
-        prompt = f"""Analyze the following text extracted from a student assignment and identify the student's name.
+        return get_backend().extract_metadata('name', extracted_text)
+    except Exception as e:
+        return _student_name_error(e, local_result)
+
+@span('name_extraction')
+async def extract_student_name_from_text_async(extracted_text):
+    """
+    Async extract_student_name_from_text().
+    """
+    local_result = extract_student_name_locally(extracted_text)
+    if local_result['confidence_score'] >= LOCAL_CONFIDENCE_THRESHOLD:
+        record_extraction('name', local=True)
+        return local_result
+    record_extraction('name', local=False)
+    
+    try:
+        return await get_backend().extract_metadata_async('name', extracted_text)
+    except Exception as e:
+        return _student_name_error(e, local_result)
+
+def _student_name_prompt(extracted_text):
+    # Use AI to extract student name from the text
+    return f"""Analyze the following text extracted from a student assignment and identify the student's name.
 
 CRITICAL INSTRUCTIONS:
 1. Student names are MOST OFTEN found in these locations:
@@ -422,27 +628,19 @@ Respond in JSON format:
 }}
 
 If no clear student name is found, return null for student_name."""
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200,
-            temperature=0.1
-        )
-        
-        result = json.loads(response.choices[0].message.content.strip())
-        return result
-        
-    except Exception as e:
-        print(f"Error extracting student name: {str(e)}")
-        return {
-            "student_name": None,
-            "confidence": "low",
-            "location": "Error occurred during name extraction"
-        }
 
+def _student_name_error(e, local_result):
+    logger.error("Student name extraction failed", extra={'error': str(e)})
+    if local_result.get('student_name'):
+        return local_result
+    return {
+        "student_name": None,
+        "confidence": "low",
+        "location": "Error occurred during name extraction"
+    }
+
+
+@span('title_extraction')
 def extract_assignment_title_from_text(extracted_text):
     """
     Extract assignment title from OCR text using pattern matching and AI assistance.
@@ -453,12 +651,37 @@ def extract_assignment_title_from_text(extracted_text):
     Returns:
         dict: Contains 'assignment_title' (str or None) and 'confidence' (str)
     """
+    # Answer locally when the header clearly states the title
+    local_result = extract_assignment_title_locally(extracted_text)
+    if local_result['confidence_score'] >= LOCAL_CONFIDENCE_THRESHOLD:
+        record_extraction('title', local=True)
+        return local_result
+    record_extraction('title', local=False)
+    
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Use AI to extract assignment title from the text
-        prompt = f"""Analyze the following text extracted from a student assignment and identify the assignment title.
+        return get_backend().extract_metadata('title', extracted_text)
+    except Exception as e:
+        return _assignment_title_error(e, local_result)
+
+@span('title_extraction')
+async def extract_assignment_title_from_text_async(extracted_text):
+    """
+    Async extract_assignment_title_from_text().
+    """
+    local_result = extract_assignment_title_locally(extracted_text)
+    if local_result['confidence_score'] >= LOCAL_CONFIDENCE_THRESHOLD:
+        record_extraction('title', local=True)
+        return local_result
+    record_extraction('title', local=False)
+    
+    try:
+        return await get_backend().extract_metadata_async('title', extracted_text)
+    except Exception as e:
+        return _assignment_title_error(e, local_result)
+
+def _assignment_title_prompt(extracted_text):
+    # Use AI to extract assignment title from the text
+    return f"""Analyze the following text extracted from a student assignment and identify the assignment title.
 
 Look for patterns like:
 - "Assignment: [Title]"
@@ -482,27 +705,19 @@ Respond in JSON format:
 }}
 
 If no clear assignment title is found, return null for assignment_title."""
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200,
-            temperature=0.1
-        )
-        
-        result = json.loads(response.choices[0].message.content.strip())
-        return result
-        
-    except Exception as e:
-        print(f"Error extracting assignment title: {str(e)}")
-        return {
-            "assignment_title": None,
-            "confidence": "low",
-            "location": "Error occurred during title extraction"
-        }
 
+def _assignment_title_error(e, local_result):
+    logger.error("Assignment title extraction failed", extra={'error': str(e)})
+    if local_result.get('assignment_title'):
+        return local_result
+    return {
+        "assignment_title": None,
+        "confidence": "low",
+        "location": "Error occurred during title extraction"
+    }
+
+
+@span('metadata_extraction')
 def extract_text_with_metadata_from_image(image_data, assignment_type=None):
     """
     Enhanced function that extracts text, student name, and assignment title from an image,
@@ -520,118 +735,150 @@ def extract_text_with_metadata_from_image(image_data, assignment_type=None):
         # First extract the text using existing function
         extracted_text = extract_text_from_image(image_data, assignment_type)
         
-        # Get specialized corner text extraction - often has student names
-        corner_text = extract_corner_text(image_data)
-        
         # Then extract student name from the text
         student_name_info = extract_student_name_from_text(extracted_text)
         
         # If no student name found in main text, check corner text
+        corner_text = {}
         if not student_name_info.get('student_name'):
-            print("No student name found in main text, checking corners...")
-            
-            # Check top corners first (most common location for student names)
-            potential_name = None
-            
-            if corner_text.get('top_right'):
-                top_right = corner_text['top_right']
-                # Look for name patterns in top right
-                if ":" in top_right:
-                    # Might be "Name: John Smith" format
-                    parts = top_right.split(":", 1)
-                    if len(parts) > 1 and ("name" in parts[0].lower() or "student" in parts[0].lower()):
-                        potential_name = parts[1].strip()
-                        location = "top right corner (labeled)"
-                # If no labeled format, just use the text if it looks like a name (not too long)
-                elif len(top_right.split()) <= 4 and len(top_right) < 30:
-                    potential_name = top_right.strip()
-                    location = "top right corner (unlabeled)"
-            
-            if not potential_name and corner_text.get('top_left'):
-                top_left = corner_text['top_left']
-                # Look for name patterns in top left
-                if ":" in top_left:
-                    # Might be "Name: John Smith" format
-                    parts = top_left.split(":", 1)
-                    if len(parts) > 1 and ("name" in parts[0].lower() or "student" in parts[0].lower()):
-                        potential_name = parts[1].strip()
-                        location = "top left corner (labeled)"
-                # If no labeled format, just use the text if it looks like a name (not too long)
-                elif len(top_left.split()) <= 4 and len(top_left) < 30:
-                    potential_name = top_left.strip()
-                    location = "top left corner (unlabeled)"
-            
-            if potential_name:
-                print(f"Found potential student name in corner text: {potential_name}")
-                student_name_info = {
-                    "student_name": potential_name,
-                    "confidence": "medium",
-                    "location": location
-                }
+            # Get specialized corner text extraction - often has student names
+            corner_text = extract_corner_text(image_data)
+            student_name_info = _name_from_corners(corner_text) or student_name_info
         
         # Extract assignment title from the text
         assignment_title_info = extract_assignment_title_from_text(extracted_text)
         
-        # Format the extracted text with metadata at the top
-        formatted_text = ""
-        
-        # Add student name
-        if student_name_info and student_name_info.get('student_name'):
-            formatted_text = f"**STUDENT: {student_name_info['student_name']}**\n"
-        else:
-            formatted_text = "**STUDENT: [Name not detected]**\n"
-        
-        # Add assignment title
-        if assignment_title_info and assignment_title_info.get('assignment_title'):
-            formatted_text += f"**ASSIGNMENT: {assignment_title_info['assignment_title']}**\n\n"
-        else:
-            formatted_text += "**ASSIGNMENT: [Title not detected]**\n\n"
-        
-        formatted_text += "=" * 50 + "\n\n"
-        
-        # Add the extracted text content
-        formatted_text += extracted_text
-        
-        # Add debug information about student name extraction
-        processing_notes = "Text extracted successfully"
-        if student_name_info and student_name_info.get('student_name'):
-            processing_notes += f". Student name found in {student_name_info.get('location', 'unknown location')}"
-        else:
-            processing_notes += ". No student name detected"
-            
-        # Add debug information about corner text extraction
-        if corner_text:
-            corner_summary = {
-                "top_left": corner_text.get('top_left'),
-                "top_right": corner_text.get('top_right')
-            }
-            processing_notes += f". Corner text: {json.dumps(corner_summary)}"
+        return _metadata_result(extracted_text, student_name_info, assignment_title_info, corner_text)
         
+    except Exception as e:
+        return _metadata_error(e)
+
+@span('metadata_extraction')
+async def extract_text_with_metadata_from_image_async(image_data, assignment_type=None):
+    """
+    Async extract_text_with_metadata_from_image(). The student name (with its
+    corner text fallback) and the assignment title only depend on the
+    extracted text, so they are looked up concurrently.
+    """
+    async def find_student_name(extracted_text):
+        student_name_info = await extract_student_name_from_text_async(extracted_text)
+        corner_text = {}
+        if not student_name_info.get('student_name'):
+            corner_text = await extract_corner_text_async(image_data)
+            student_name_info = _name_from_corners(corner_text) or student_name_info
+        return student_name_info, corner_text
+
+    try:
+        extracted_text = await extract_text_from_image_async(image_data, assignment_type)
+        (student_name_info, corner_text), assignment_title_info = await asyncio.gather(
+            find_student_name(extracted_text), extract_assignment_title_from_text_async(extracted_text))
+        return _metadata_result(extracted_text, student_name_info, assignment_title_info, corner_text)
+    except Exception as e:
+        return _metadata_error(e)
+
+def _name_from_corners(corner_text):
+    """Pick a student name out of the top corners, or None."""
+    # Check top corners first (most common location for student names)
+    potential_name = None
+    
+    if corner_text.get('top_right'):
+        top_right = corner_text['top_right']
+        # Look for name patterns in top right
+        if ":" in top_right:
+            # Might be "Name: John Smith" format
+            parts = top_right.split(":", 1)
+            if len(parts) > 1 and ("name" in parts[0].lower() or "student" in parts[0].lower()):
+                potential_name = parts[1].strip()
+                location = "top right corner (labeled)"
+        # If no labeled format, just use the text if it looks like a name (not too long)
+        elif len(top_right.split()) <= 4 and len(top_right) < 30:
+            potential_name = top_right.strip()
+            location = "top right corner (unlabeled)"
+    
+    if not potential_name and corner_text.get('top_left'):
+        top_left = corner_text['top_left']
+        # Look for name patterns in top left
+        if ":" in top_left:
+            # Might be "Name: John Smith" format
+            parts = top_left.split(":", 1)
+            if len(parts) > 1 and ("name" in parts[0].lower() or "student" in parts[0].lower()):
+                potential_name = parts[1].strip()
+                location = "top left corner (labeled)"
+        # If no labeled format, just use the text if it looks like a name (not too long)
+        elif len(top_left.split()) <= 4 and len(top_left) < 30:
+            potential_name = top_left.strip()
+            location = "top left corner (unlabeled)"
+    
+    if potential_name:
+        logger.info("Found student name in corner text", extra={'location': location, 'name': payload(potential_name)})
         return {
-            "extracted_text": formatted_text,
-            "student_name_info": student_name_info,
-            "assignment_title_info": assignment_title_info,
-            "corner_text": corner_text,
-            "processing_notes": processing_notes
+            "student_name": potential_name,
+            "confidence": "medium",
+            "location": location
         }
+    return None
+
+def _metadata_result(extracted_text, student_name_info, assignment_title_info, corner_text):
+    # Format the extracted text with metadata at the top
+    formatted_text = ""
+    
+    # Add student name
+    if student_name_info and student_name_info.get('student_name'):
+        formatted_text = f"**STUDENT: {student_name_info['student_name']}**\n"
+    else:
+        formatted_text = "**STUDENT: [Name not detected]**\n"
+    
+    # Add assignment title
+    if assignment_title_info and assignment_title_info.get('assignment_title'):
+        formatted_text += f"**ASSIGNMENT: {assignment_title_info['assignment_title']}**\n\n"
+    else:
+        formatted_text += "**ASSIGNMENT: [Title not detected]**\n\n"
+    
+    formatted_text += "=" * 50 + "\n\n"
+    
+    # Add the extracted text content
+    formatted_text += extracted_text
+    
+    # Add debug information about student name extraction
+    processing_notes = "Text extracted successfully"
+    if student_name_info and student_name_info.get('student_name'):
+        processing_notes += f". Student name found in {student_name_info.get('location', 'unknown location')}"
+    else:
+        processing_notes += ". No student name detected"
         
-    except Exception as e:
-        print(f"Error in enhanced text extraction: {str(e)}")
-        return {
-            "extracted_text": f"**STUDENT: [Error extracting metadata]**\n\n{'=' * 50}\n\n[Error extracting text: {str(e)}]",
-            "student_name_info": {
-                "student_name": None,
-                "confidence": "low",
-                "location": "Error occurred"
-            },
-            "assignment_title_info": {
-                "assignment_title": None,
-                "confidence": "low",
-                "location": "Error occurred"
-            },
-            "corner_text": {},
-            "processing_notes": f"Error during processing: {str(e)}"
+    # Add debug information about corner text extraction
+    if corner_text:
+        corner_summary = {
+            "top_left": corner_text.get('top_left'),
+            "top_right": corner_text.get('top_right')
         }
+        processing_notes += f". Corner text: {json.dumps(corner_summary)}"
+    
+    return {
+        "extracted_text": formatted_text,
+        "student_name_info": student_name_info,
+        "assignment_title_info": assignment_title_info,
+        "corner_text": corner_text,
+        "processing_notes": processing_notes
+    }
+
+def _metadata_error(e):
+    logger.error("Enhanced text extraction failed", extra={'error': str(e)})
+    return {
+        "extracted_text": f"**STUDENT: [Error extracting metadata]**\n\n{'=' * 50}\n\n[Error extracting text: {str(e)}]",
+        "student_name_info": {
+            "student_name": None,
+            "confidence": "low",
+            "location": "Error occurred"
+        },
+        "assignment_title_info": {
+            "assignment_title": None,
+            "confidence": "low",
+            "location": "Error occurred"
+        },
+        "corner_text": {},
+        "processing_notes": f"Error during processing: {str(e)}"
+    }
 
 # Keep the old function name as an alias for backward compatibility
 def extract_text_and_student_name_from_image(image_data, assignment_type=None):
@@ -639,6 +886,7 @@ def extract_text_and_student_name_from_image(image_data, assignment_type=None):
     return extract_text_with_metadata_from_image(image_data, assignment_type)
 
 
+@span('mcq_first_grading')
 def analyze_and_grade_mcq_diagrams_first(image_data, assignment_type, rubric):
     """
     Enhanced grading function that prioritizes MCQ and diagram detection/grading
@@ -647,12 +895,17 @@ def analyze_and_grade_mcq_diagrams_first(image_data, assignment_type, rubric):
     try:
         from grader.engine import grade_assignment_with_vision
         from grader import grade_assignment
+        from image_processor.omr import grade_bubble_sheet_if_possible
+
+        # Step 0: Bubble sheets with an answer key in the rubric are graded
+        # offline, without any model call
+        omr_result = grade_bubble_sheet_if_possible(image_data, rubric)
+        if omr_result:
+            logger.info("Bubble sheet graded offline", extra={'score': omr_result['score']})
+            omr_result['processing_method'] = 'Offline OMR'
+            return omr_result
         
-        # Initialize OpenAI client
-        client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Convert image data to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
+        backend = get_backend()
         
         # Step 1: Enhanced scan for MCQs with answer detection
         scan_prompt = """Analyze this image comprehensively and detect all content types, with special focus on MCQ answer selections:
@@ -719,48 +972,18 @@ Respond in JSON format:
 }"""
         
         # Call GPT-4 Vision for content analysis
-        analysis_response = client.chat.completions.create(
-            model=Config.OPENAI_VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": scan_prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1500,
-            temperature=0.1
-        )
-        
-        # Parse analysis result
-        analysis_content = analysis_response.choices[0].message.content.strip()
-        if analysis_content.startswith('```json'):
-            analysis_content = analysis_content[7:-3].strip()
-        elif analysis_content.startswith('```'):
-            analysis_content = analysis_content[3:-3].strip()
-            
-        analysis = json.loads(analysis_content)
+        analysis = backend.vision_json(scan_prompt, [image_data], max_tokens=1500, temperature=0.1)
         strategy = analysis.get('strategy', 'ocr_primary')
         mcq_questions = analysis.get('mcq_questions', [])
         
-        print(f"Content analysis complete. Strategy: {strategy}")
-        print(f"MCQ questions found: {len(mcq_questions)}")
-        print(f"Visual content percentage: {analysis.get('visual_percentage', 0)}%")
+        logger.info("Content analysis complete", extra={
+            'strategy': strategy, 'mcq_questions': len(mcq_questions),
+            'visual_percentage': analysis.get('visual_percentage', 0)
+        })
         
         # Step 2: Execute grading strategy with MCQ emphasis
         if strategy == 'vision_primary':
             # Grade everything with GPT Vision, emphasizing MCQ rules
-            print("Using GPT Vision for primary grading (MCQ/diagram dominant)")
             vision_prompt = f"""Grade this assignment using GPT-4 Vision with SPECIAL EMPHASIS on MCQ grading rules.
 
 ASSIGNMENT TYPE: {assignment_type}
@@ -795,43 +1018,12 @@ Respond in JSON format:
     "scoring_breakdown": "points awarded for each question type"
 }}"""
             
-            vision_response = client.chat.completions.create(
-                model=Config.OPENAI_VISION_MODEL,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": vision_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.3
-            )
-            
-            vision_content = vision_response.choices[0].message.content.strip()
-            if vision_content.startswith('```json'):
-                vision_content = vision_content[7:-3].strip()
-            elif vision_content.startswith('```'):
-                vision_content = vision_content[3:-3].strip()
-                
-            result = json.loads(vision_content)
+            result = backend.vision_json(vision_prompt, [image_data], max_tokens=2000, temperature=0.3)
             result['processing_method'] = 'GPT-4 Vision Primary (MCQ-Optimized)'
             result['content_analysis'] = analysis
             
         elif strategy == 'vision_partial':
             # Grade visual elements with Vision (MCQ-optimized), text elements with OCR + Gemini
-            print("Using hybrid approach: Vision for MCQ/diagrams, OCR+Gemini for text")
-            
             # Grade visual elements first with MCQ emphasis
             visual_questions = analysis.get('mcq_questions', []) + analysis.get('diagram_questions', [])
             if visual_questions:
@@ -862,36 +1054,7 @@ Respond in JSON format:
     "questions_graded": ["list of question IDs graded"]
 }}"""
                 
-                vision_response = client.chat.completions.create(
-                    model=Config.OPENAI_VISION_MODEL,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": vision_prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64_image}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=1500,
-                    temperature=0.3
-                )
-                
-                vision_content = vision_response.choices[0].message.content.strip()
-                if vision_content.startswith('```json'):
-                    vision_content = vision_content[7:-3].strip()
-                elif vision_content.startswith('```'):
-                    vision_content = vision_content[3:-3].strip()
-                    
-                vision_result = json.loads(vision_content)
+                vision_result = backend.vision_json(vision_prompt, [image_data], max_tokens=1500, temperature=0.3)
             else:
                 vision_result = {"visual_score": "0", "visual_feedback": "No visual elements found", "questions_graded": []}
             
@@ -912,7 +1075,6 @@ Respond in JSON format:
             
         else:  # ocr_primary
             # Standard OCR + Gemini grading
-            print("Using standard OCR + Gemini (text-dominant content)")
             extracted_text = extract_text_from_image(image_data, assignment_type)
             result = grade_assignment(assignment_type, extracted_text, rubric)
             result['processing_method'] = 'Standard OCR + Gemini (Text Focus)'
@@ -922,7 +1084,7 @@ Respond in JSON format:
         return result
         
     except Exception as e:
-        print(f"Error in MCQ/diagram-first grading: {str(e)}")
+        logger.error("MCQ/diagram-first grading failed, using standard OCR", extra={'error': str(e)})
         # Fallback to standard process
         extracted_text = extract_text_from_image(image_data, assignment_type)
         result = grade_assignment(assignment_type, extracted_text, rubric)
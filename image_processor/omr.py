@@ -0,0 +1,445 @@
+"""
+Offline optical mark recognition (OMR) for SnapGrade
+
+Grades bubble answer sheets against an answer key without any model call:
+
+1. Registration: the four solid corner markers are located and the page is
+   warped into a fixed canonical frame, undoing skew and perspective.
+2. Grid detection: bubbles are found on each registered sheet and ordered
+   into questions and options; the grid shape most sheets agree on wins, and
+   sheets whose own grid disagrees fall back to the consensus positions.
+3. Fill measurement: every bubble of every sheet is measured at once from
+   integral images of the registered stack.
+4. Thresholding: a bubble is marked above FILLED_THRESHOLD; questions with
+   no mark, several marks, or a faint mark are flagged for review.
+"""
+
+import io
+import re
+import numpy as np
+from PIL import Image
+
+from image_processor.diagram_detector import binarize, connected_components
+from scoring import normalize_score
+from metrics import span
+from logs import get_logger
+
+logger = get_logger('image_processor.omr')
+
+# Registered sheets are warped into this frame (8.5x11 at 100 dpi)
+CANONICAL_SIZE = (850, 1100)
+
+# Canonical position of the corner marker centers, inset from the edges
+MARKER_INSET = 40
+
+# Width at which corner markers are searched for
+DETECTION_WIDTH = 1000
+
+# Interior fraction of a bubble above which it counts as marked...
+FILLED_THRESHOLD = 0.55
+
+# ...and above which an unmarked bubble is a faint mark or erasure
+AMBIGUOUS_THRESHOLD = 0.3
+
+# Side of the sampled square, as a fraction of the bubble diameter; keeps the
+# printed outline out of the measurement
+SAMPLE_FRACTION = 0.55
+
+OPTION_LETTERS = "ABCDEFGH"
+
+_KEY_ENTRY = re.compile(
+    r'(?:^|[\s,;])(?:Q(?:uestion)?\s*)?(\d{1,3})\s*[\.\):=\-]\s*\(?([A-Ha-h])\)?(?=\s*(?:[,;]|\(|$))',
+    re.MULTILINE
+)
+
+
+class RegistrationError(Exception):
+    """Raised when a page has no usable corner markers."""
+
+
+def parse_answer_key(rubric):
+    """
+    Parse an MCQ answer key such as "1. B", "Q2: C" or "3-A, 4-D" from a rubric.
+
+    Args:
+        rubric (str): The rubric text
+
+    Returns:
+        dict: Question number (int) -> correct option letter, or {} when the
+        rubric does not contain at least three key entries
+    """
+    key = {}
+    for number, letter in _KEY_ENTRY.findall(rubric or ''):
+        key.setdefault(int(number), letter.upper())
+    return key if len(key) >= 3 else {}
+
+
+def _load(image_data):
+    image = Image.open(io.BytesIO(image_data))
+    image.draft('L', (DETECTION_WIDTH * 2, DETECTION_WIDTH * 3))
+    return image.convert('L')
+
+
+def find_corner_markers(image):
+    """
+    Locate the four solid square corner markers of an answer sheet.
+
+    Args:
+        image (PIL.Image): Grayscale page
+
+    Returns:
+        list: Marker centers [(x, y)] in image coordinates, ordered top-left,
+        top-right, bottom-left, bottom-right
+
+    Raises:
+        RegistrationError: If any corner has no marker
+    """
+    scale = min(1.0, DETECTION_WIDTH / image.width)
+    small = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale)))) if scale < 1 else image
+    gray = np.asarray(small, dtype=np.uint8)
+    height, width = gray.shape
+    components = connected_components(binarize(gray))
+
+    comp_width = components['right'] - components['left']
+    comp_height = components['bottom'] - components['top']
+    fill = components['area'] / np.maximum(comp_width * comp_height, 1)
+    aspect = comp_width / np.maximum(comp_height, 1)
+    solid_squares = np.nonzero(
+        (fill > 0.8) & (aspect > 0.7) & (aspect < 1.4) &
+        (comp_width >= 0.012 * width) & (comp_width <= 0.08 * width)
+    )[0]
+    if len(solid_squares) < 4:
+        raise RegistrationError(f"Found {len(solid_squares)} corner marker candidates, need 4")
+
+    center_x = (components['left'][solid_squares] + components['right'][solid_squares]) / 2
+    center_y = (components['top'][solid_squares] + components['bottom'][solid_squares]) / 2
+
+    markers = []
+    for corner_x, corner_y in ((0, 0), (width, 0), (0, height), (width, height)):
+        distance = np.hypot(center_x - corner_x, center_y - corner_y)
+        best = int(np.argmin(distance))
+        # A marker must sit in its own quarter of the page
+        if distance[best] > 0.5 * np.hypot(width, height) / 2:
+            raise RegistrationError("Corner marker missing")
+        markers.append((center_x[best] / scale, center_y[best] / scale))
+
+    if len({(round(x), round(y)) for x, y in markers}) < 4:
+        raise RegistrationError("Corner markers are not distinct")
+    return markers
+
+
+def _perspective_coefficients(canonical_points, image_points):
+    """
+    Solve the homography mapping canonical coordinates to image coordinates,
+    in the coefficient order Image.transform(PERSPECTIVE) expects.
+    """
+    matrix = []
+    values = []
+    for (u, v), (x, y) in zip(canonical_points, image_points):
+        matrix.append([u, v, 1, 0, 0, 0, -u * x, -v * x])
+        matrix.append([0, 0, 0, u, v, 1, -u * y, -v * y])
+        values.extend([x, y])
+    return np.linalg.solve(np.array(matrix, dtype=np.float64), np.array(values, dtype=np.float64))
+
+
+def register_sheet(image_data):
+    """
+    Warp an answer sheet into the canonical frame using its corner markers.
+
+    Args:
+        image_data (bytes): The page image
+
+    Returns:
+        numpy.ndarray: The registered grayscale sheet, shape (height, width)
+
+    Raises:
+        RegistrationError: If the corner markers cannot be found
+    """
+    image = _load(image_data)
+    markers = find_corner_markers(image)
+    width, height = CANONICAL_SIZE
+    canonical = [
+        (MARKER_INSET, MARKER_INSET), (width - MARKER_INSET, MARKER_INSET),
+        (MARKER_INSET, height - MARKER_INSET), (width - MARKER_INSET, height - MARKER_INSET)
+    ]
+    coefficients = _perspective_coefficients(canonical, markers)
+    registered = image.transform(CANONICAL_SIZE, Image.PERSPECTIVE, tuple(coefficients), Image.BILINEAR, fillcolor=255)
+    return np.asarray(registered, dtype=np.uint8)
+
+
+def _cluster(values, tolerance):
+    """Group sorted positions whose neighbours are within tolerance."""
+    order = np.argsort(values)
+    groups = []
+    for index in order:
+        if groups and values[index] - values[groups[-1][-1]] <= tolerance:
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+    return groups
+
+
+def detect_bubble_layout(reference):
+    """
+    Find the bubble grid on a registered sheet.
+
+    Args:
+        reference (numpy.ndarray): Registered grayscale sheet
+
+    Returns:
+        dict: 'questions' - list of questions in reading order (column by
+        column, top to bottom), each a list of (x, y) option centers - and
+        'bubble_size' in pixels; no questions when no grid is found
+    """
+    components = connected_components(binarize(reference))
+    width = components['right'] - components['left']
+    height = components['bottom'] - components['top']
+    fill = components['area'] / np.maximum(width * height, 1)
+    aspect = width / np.maximum(height, 1)
+
+    # Ignore the corner markers and anything near the edges
+    center_x = (components['left'] + components['right']) / 2
+    center_y = (components['top'] + components['bottom']) / 2
+    inner = ((center_x > 2 * MARKER_INSET) & (center_x < CANONICAL_SIZE[0] - 2 * MARKER_INSET) &
+             (center_y > 2 * MARKER_INSET) & (center_y < CANONICAL_SIZE[1] - 2 * MARKER_INSET))
+    round_shapes = np.nonzero(
+        inner & (height >= 8) & (height <= 60) & (aspect > 0.75) & (aspect < 1.33) &
+        (((fill > 0.15) & (fill < 0.6)) | ((fill > 0.65) & (fill < 0.92)))
+    )[0]
+    if len(round_shapes) < 6:
+        return {"questions": [], "bubble_size": 0}
+
+    # Bubbles share one printed size; keep shapes near the most common height
+    sizes = height[round_shapes]
+    bubble_size = float(np.bincount(sizes).argmax())
+    bubbles = round_shapes[np.abs(sizes - bubble_size) <= max(2, 0.2 * bubble_size)]
+    xs, ys = center_x[bubbles], center_y[bubbles]
+
+    groups = []
+    for row in _cluster(ys, bubble_size * 0.5):
+        row_xs = np.sort(xs[row])
+        row_y = float(np.mean(ys[row]))
+        gaps = np.diff(row_xs)
+        if len(gaps) == 0:
+            continue
+        spacing = float(np.median(gaps[gaps < 4 * bubble_size])) if np.any(gaps < 4 * bubble_size) else 0
+        if spacing <= 0:
+            continue
+        # Split a row into questions where the gap is clearly wider than the
+        # spacing between options
+        splits = np.nonzero(gaps > 1.6 * spacing)[0] + 1
+        for group_xs in np.split(row_xs, splits):
+            groups.append((group_xs, row_y))
+
+    if not groups:
+        return {"questions": [], "bubble_size": bubble_size}
+
+    options = int(np.bincount([len(g) for g, _ in groups]).argmax())
+    if options < 2:
+        return {"questions": [], "bubble_size": bubble_size}
+    groups = [(g, y) for g, y in groups if len(g) == options]
+
+    # Question blocks are columns of groups starting at the same x
+    starts = np.array([g[0] for g, _ in groups])
+    questions = []
+    for column in sorted(_cluster(starts, bubble_size), key=lambda c: starts[c[0]]):
+        for index in sorted(column, key=lambda i: groups[i][1]):
+            group_xs, row_y = groups[index]
+            questions.append([(float(x), row_y) for x in group_xs])
+
+    return {"questions": questions, "bubble_size": bubble_size}
+
+
+def consensus_layout(layouts):
+    """
+    Pick the grid most sheets agree on.
+
+    Args:
+        layouts (list): Per-sheet outputs of detect_bubble_layout
+
+    Returns:
+        dict: The consensus layout (median option centers over the sheets
+        with the winning question/option count), with no questions when no
+        sheet has a grid
+    """
+    shapes = [(len(l['questions']), len(l['questions'][0])) for l in layouts if l['questions']]
+    if not shapes:
+        return {"questions": [], "bubble_size": 0}
+    shape = max(set(shapes), key=shapes.count)
+    agreeing = [l for l in layouts if l['questions'] and
+                (len(l['questions']), len(l['questions'][0])) == shape]
+    centers = np.median(np.array([l['questions'] for l in agreeing], dtype=np.float64), axis=0)
+    return {
+        "questions": [[(float(x), float(y)) for x, y in question] for question in centers],
+        "bubble_size": float(np.median([l['bubble_size'] for l in agreeing]))
+    }
+
+
+def measure_fills(stack, layout, sheet_layouts=None):
+    """
+    Measure the marked fraction of every bubble on every sheet.
+
+    Args:
+        stack (numpy.ndarray): Registered sheets, shape (sheets, height, width)
+        layout (dict): Output of detect_bubble_layout or consensus_layout
+        sheet_layouts (list, optional): Per-sheet layouts; a sheet whose own
+            grid has the same shape as layout is measured at its own centers,
+            absorbing small registration errors
+
+    Returns:
+        numpy.ndarray: Fill fractions, shape (sheets, questions, options)
+    """
+    reference = np.array(layout['questions'], dtype=np.float64)  # (questions, options, 2)
+    centers = np.repeat(reference[np.newaxis], len(stack), axis=0)
+    for i, sheet_layout in enumerate(sheet_layouts or []):
+        own = np.array(sheet_layout['questions'], dtype=np.float64)
+        if own.shape == reference.shape:
+            centers[i] = own
+    half = max(1, int(round(layout['bubble_size'] * SAMPLE_FRACTION / 2)))
+
+    # Dark pixels per sheet, with each sheet's own ink threshold
+    dark = np.stack([binarize(sheet) for sheet in stack]).astype(np.int32)
+    integral = np.zeros((dark.shape[0], dark.shape[1] + 1, dark.shape[2] + 1), dtype=np.int32)
+    integral[:, 1:, 1:] = dark.cumsum(axis=1).cumsum(axis=2)
+
+    x = np.rint(centers[..., 0]).astype(np.int64)
+    y = np.rint(centers[..., 1]).astype(np.int64)
+    x0 = np.clip(x - half, 0, dark.shape[2])
+    x1 = np.clip(x + half + 1, 0, dark.shape[2])
+    y0 = np.clip(y - half, 0, dark.shape[1])
+    y1 = np.clip(y + half + 1, 0, dark.shape[1])
+
+    sheets = np.arange(len(stack))[:, np.newaxis, np.newaxis]
+    sums = (integral[sheets, y1, x1] - integral[sheets, y0, x1]
+            - integral[sheets, y1, x0] + integral[sheets, y0, x0])
+    return sums / np.maximum((x1 - x0) * (y1 - y0), 1)
+
+
+def _grade_fills(fills, answer_key):
+    """Turn one sheet's fill matrix into per-question answers and a score."""
+    questions = []
+    correct = 0
+    for index, question_fills in enumerate(fills):
+        number = index + 1
+        marked = [OPTION_LETTERS[i] for i, f in enumerate(question_fills) if f >= FILLED_THRESHOLD]
+        faint = [OPTION_LETTERS[i] for i, f in enumerate(question_fills)
+                 if AMBIGUOUS_THRESHOLD <= f < FILLED_THRESHOLD]
+
+        if len(marked) > 1:
+            flag = "multiple"
+        elif not marked:
+            flag = "ambiguous" if faint else "blank"
+        else:
+            flag = "ambiguous" if faint else None
+
+        expected = answer_key.get(number)
+        is_correct = expected is not None and marked == [expected]
+        correct += is_correct
+        questions.append({
+            "question": number,
+            "selected": marked,
+            "correct_answer": expected,
+            "is_correct": is_correct,
+            "flag": flag,
+            "fills": [round(float(f), 3) for f in question_fills]
+        })
+
+    total = len(answer_key)
+    return {
+        "registered": True,
+        "questions": questions,
+        "answers": {q['question']: (q['selected'][0] if len(q['selected']) == 1 else None) for q in questions},
+        "correct": correct,
+        "total": total,
+        "score": f"{correct}/{total}",
+        "needs_review": [q['question'] for q in questions if q['flag'] in ("multiple", "ambiguous")]
+    }
+
+
+@span('omr')
+def grade_bubble_sheets(images, answer_key, layout=None):
+    """
+    Grade a stack of bubble sheets against one answer key.
+
+    Args:
+        images (list): Page images as bytes, one sheet each
+        answer_key (dict): Question number -> correct option letter
+        layout (dict, optional): A known bubble layout; detected per sheet
+            and reconciled with consensus_layout when omitted
+
+    Returns:
+        list: One result per image, in order. Registered sheets have
+        'registered': True, 'questions', 'answers', 'correct', 'total',
+        'score' and 'needs_review'; sheets that could not be read have
+        'registered': False and an 'error'
+    """
+    results = [None] * len(images)
+    registered = []
+    for i, image_data in enumerate(images):
+        try:
+            registered.append((i, register_sheet(image_data)))
+        except Exception as e:
+            results[i] = {"registered": False, "error": str(e)}
+
+    if not registered:
+        return results
+
+    stack = np.stack([sheet for _, sheet in registered])
+    sheet_layouts = None
+    if layout is None:
+        sheet_layouts = [detect_bubble_layout(sheet) for sheet in stack]
+        layout = consensus_layout(sheet_layouts)
+    if not layout['questions']:
+        for i, _ in registered:
+            results[i] = {"registered": False, "error": "No bubble grid found on the sheet"}
+        return results
+
+    fills = measure_fills(stack, layout, sheet_layouts)
+    for (i, _), sheet_fills in zip(registered, fills):
+        results[i] = _grade_fills(sheet_fills, answer_key)
+        results[i]['layout_questions'] = len(layout['questions'])
+    return results
+
+
+def omr_grading_result(sheet):
+    """
+    Format an OMR sheet result like the graders' results.
+
+    Returns:
+        dict: 'score', 'feedback', 'grading_method', 'score_normalized' and
+        the raw 'omr' details
+    """
+    lines = [f"**Bubble sheet graded automatically: {sheet['correct']}/{sheet['total']} correct**", ""]
+    for question in sheet['questions']:
+        if question['correct_answer'] is None:
+            continue
+        selected = ", ".join(question['selected']) or "no answer"
+        mark = "correct" if question['is_correct'] else f"incorrect (answer: {question['correct_answer']})"
+        note = f" [{question['flag']} - please review]" if question['flag'] in ("multiple", "ambiguous") else ""
+        lines.append(f"Q{question['question']}: {selected} - {mark}{note}")
+
+    return {
+        "score": sheet['score'],
+        "feedback": "\n".join(lines),
+        "grading_method": "Offline OMR (bubble sheet)",
+        "score_normalized": normalize_score(sheet['score']),
+        "omr": sheet
+    }
+
+
+def grade_bubble_sheet_if_possible(image_data, rubric):
+    """
+    Grade a page locally when it is a bubble sheet and the rubric has a key.
+
+    Returns:
+        dict or None: A grading result (see omr_grading_result), or None when
+        the rubric has no answer key or the page is not a readable sheet
+    """
+    answer_key = parse_answer_key(rubric)
+    if not answer_key:
+        return None
+    sheet = grade_bubble_sheets([image_data], answer_key)[0]
+    if not sheet or not sheet.get('registered'):
+        logger.debug("OMR not applicable", extra={'reason': sheet.get('error') if sheet else 'no result'})
+        return None
+    return omr_grading_result(sheet)
@@ -0,0 +1,200 @@
+"""
+Blank and duplicate page filter for SnapGrade
+
+Scanned submissions often contain blank backs of pages and the same page
+scanned twice. This filter looks at each page locally - ink coverage and a
+perceptual hash - so those pages can be skipped before any vision call.
+
+- Blank: almost no cells of the page contain ink once margins (scanner
+  edges, punch holes) are cropped; bleed-through and sensor noise are too
+  light or too sparse to count.
+- Duplicate: the dHash is close to an earlier kept page and the two ink
+  maps, aligned, agree within a one-cell tolerance, so the same worksheet
+  with different answers is kept.
+"""
+
+import numpy as np
+from PIL import Image
+from metrics import span
+
+# Width at which ink is measured
+ANALYSIS_WIDTH = 600
+
+# Margins cropped before measuring (fractions of width and height)
+MARGIN_X = 0.07
+MARGIN_Y = 0.04
+
+# Pixels darker than this fraction of the paper brightness are ink
+INK_RATIO = 0.6
+
+# Side of the cells ink is counted in, and ink pixels needed to mark a cell
+CELL_SIZE = 6
+MIN_CELL_INK = 3
+
+# Pages with at most this many inked cells are blank
+BLANK_MAX_INK_CELLS = 2
+
+# dHash distance (of 64 bits) below which two pages are duplicate candidates
+DUPLICATE_HASH_DISTANCE = 10
+
+# Fraction of inked cells allowed to differ between duplicates, after the
+# best alignment within this many cells (a rescan is shifted and skewed)
+DUPLICATE_MAX_DIFFERENCE = 0.02
+DUPLICATE_MAX_SHIFT = 2
+
+
+def _grayscale(image):
+    gray = image.convert('L')
+    width, height = gray.size
+    gray = gray.crop((int(width * MARGIN_X), int(height * MARGIN_Y),
+                      int(width * (1 - MARGIN_X)), int(height * (1 - MARGIN_Y))))
+    scale = ANALYSIS_WIDTH / gray.width
+    return gray.resize((ANALYSIS_WIDTH, max(1, round(gray.height * scale))), Image.BOX)
+
+
+def dhash(gray, size=8):
+    """
+    64-bit difference hash of a grayscale page.
+
+    Returns:
+        int: The hash; pages that look alike have a small Hamming distance
+    """
+    small = np.asarray(gray.resize((size + 1, size), Image.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join('1' if b else '0' for b in bits), 2)
+
+
+def page_signature(image):
+    """
+    Measure a page for blank and duplicate detection.
+
+    Args:
+        image (PIL.Image): The page
+
+    Returns:
+        dict: 'hash' (dHash), 'cells' (boolean map of inked cells),
+        'ink_cells' (count) and 'ink_coverage' (fraction of ink pixels)
+    """
+    gray = _grayscale(image)
+    pixels = np.asarray(gray, dtype=np.float32)
+    paper = np.percentile(pixels, 90)
+    ink = pixels < paper * INK_RATIO
+
+    rows, cols = ink.shape[0] // CELL_SIZE, ink.shape[1] // CELL_SIZE
+    counts = ink[:rows * CELL_SIZE, :cols * CELL_SIZE].reshape(rows, CELL_SIZE, cols, CELL_SIZE).sum(axis=(1, 3))
+    cells = counts >= MIN_CELL_INK
+    return {
+        "hash": dhash(gray),
+        "cells": cells,
+        "ink_cells": int(cells.sum()),
+        "ink_coverage": round(float(ink.mean()), 5)
+    }
+
+
+def _dilate(cells):
+    padded = np.pad(cells, 1)
+    out = np.zeros_like(cells)
+    for dy in range(3):
+        for dx in range(3):
+            out |= padded[dy:dy + cells.shape[0], dx:dx + cells.shape[1]]
+    return out
+
+
+def _shift(cells, dy, dx):
+    height, width = cells.shape
+    out = np.zeros_like(cells)
+    out[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+        cells[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+    return out
+
+
+def is_duplicate(signature, other):
+    """
+    Whether two page signatures show the same page.
+
+    Inked cells of either page with no inked cell of the other within one
+    cell count as differences; the best alignment within
+    DUPLICATE_MAX_SHIFT cells is used.
+    """
+    if bin(signature['hash'] ^ other['hash']).count('1') > DUPLICATE_HASH_DISTANCE:
+        return False
+    a, b = signature['cells'], other['cells']
+    if a.shape != b.shape:
+        height, width = min(a.shape[0], b.shape[0]), min(a.shape[1], b.shape[1])
+        a, b = a[:height, :width], b[:height, :width]
+    total = a.sum() + b.sum()
+    if not total:
+        return True
+
+    dilated_b = _dilate(b)
+    best = total
+    for dy in range(-DUPLICATE_MAX_SHIFT, DUPLICATE_MAX_SHIFT + 1):
+        for dx in range(-DUPLICATE_MAX_SHIFT, DUPLICATE_MAX_SHIFT + 1):
+            moved = _shift(a, dy, dx)
+            best = min(best, (moved & ~dilated_b).sum() + (b & ~_dilate(moved)).sum())
+    return best / total <= DUPLICATE_MAX_DIFFERENCE
+
+
+class PageFilter:
+    """
+    Incremental blank/duplicate filter over the pages of one submission.
+    """
+
+    def __init__(self):
+        self._kept = []  # (page_number, signature)
+
+    def check(self, image, page_number):
+        """
+        Check a page against the filter and remember it when kept.
+
+        Args:
+            image (PIL.Image): The page
+            page_number (int): Its 1-based page number
+
+        Returns:
+            dict or None: A skip record ({'page', 'reason': 'blank' or
+            'duplicate', 'duplicate_of', 'ink_coverage'}), or None when the
+            page should be processed
+        """
+        signature = page_signature(image)
+        if signature['ink_cells'] <= BLANK_MAX_INK_CELLS:
+            return {"page": page_number, "reason": "blank", "duplicate_of": None,
+                    "ink_coverage": signature['ink_coverage']}
+        for kept_page, kept_signature in self._kept:
+            if is_duplicate(signature, kept_signature):
+                return {"page": page_number, "reason": "duplicate", "duplicate_of": kept_page,
+                        "ink_coverage": signature['ink_coverage']}
+        self._kept.append((page_number, signature))
+        return None
+
+
+@span('page_filter')
+def filter_pages(images, page_numbers=None):
+    """
+    Drop blank pages and collapse duplicate pages of a submission.
+
+    Args:
+        images (list): PIL images of the pages, in order
+        page_numbers (list, optional): Their page numbers; 1..n by default
+
+    Returns:
+        tuple: (indexes of the pages to keep, skip records for the others)
+    """
+    page_numbers = page_numbers or list(range(1, len(images) + 1))
+    page_filter = PageFilter()
+    kept, skipped = [], []
+    for index, (image, page_number) in enumerate(zip(images, page_numbers)):
+        record = page_filter.check(image, page_number)
+        if record is None:
+            kept.append(index)
+        else:
+            skipped.append(record)
+
+    # Never drop every page: an all-blank upload is still sent on
+    if not kept and images:
+        kept = [0]
+        skipped = skipped[1:]
+    if skipped:
+        details = ", ".join(f"page {s['page']} {s['reason']}" for s in skipped)
+        print(f"Page filter: skipping {len(skipped)} of {len(images)} pages ({details})")
+    return kept, skipped
@@ -0,0 +1,291 @@
+"""
+Tiered OCR for SnapGrade
+
+Runs local Tesseract first and accepts its text for clean, typed pages. Pages
+where Tesseract is unsure (handwriting, photos, bubble sheets) are escalated
+to the vision model - either just the low-confidence regions or, when most of
+the page is unclear, the whole page.
+
+Tesseract is optional: without pytesseract (or the tesseract binary) every
+page goes straight to the vision tier. pytesseract pulls in pandas when it is
+imported, so it is loaded on the first local OCR call.
+"""
+
+import asyncio
+import importlib.util
+import io
+import threading
+import time
+from PIL import Image
+from config import Config
+from logs import get_logger
+
+logger = get_logger('image_processor.tiered_ocr')
+
+TESSERACT_AVAILABLE = importlib.util.find_spec('pytesseract') is not None
+
+# Pages with fewer recognized words than this are not trusted locally
+MIN_LOCAL_WORDS = 15
+
+# Escalate the whole page when more than this fraction of words is unclear
+MAX_REGION_ESCALATION_FRACTION = 0.3
+
+# Pixels of padding around a region cropped for escalation
+REGION_PADDING = 12
+
+# Assignment types whose answers are marks rather than text (bubbles, circles)
+VISION_ONLY_TYPES = {'multiple choice', 'mcq'}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "pages": 0,
+    "pages_local": 0,
+    "pages_region_escalated": 0,
+    "pages_escalated": 0,
+    "regions_escalated": 0,
+    "local_seconds": 0.0,
+    "vision_seconds": 0.0,
+    "local_runs": 0,
+    "vision_runs": 0,
+}
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def get_ocr_stats():
+    """
+    Get tiered OCR counters.
+
+    Returns:
+        dict: Page counts per tier, the escalation rate and the mean latency
+        of the local and vision tiers in seconds
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    pages = stats['pages']
+    stats['escalation_rate'] = round((stats['pages_escalated'] + stats['pages_region_escalated']) / pages, 4) if pages else 0.0
+    stats['local_mean_seconds'] = round(stats['local_seconds'] / stats['local_runs'], 4) if stats['local_runs'] else None
+    stats['vision_mean_seconds'] = round(stats['vision_seconds'] / stats['vision_runs'], 4) if stats['vision_runs'] else None
+    return stats
+
+
+def _group_words(data):
+    """
+    Group Tesseract image_to_data output into blocks of lines.
+
+    Returns:
+        list: Blocks in reading order, each a dict with 'lines' (list of
+        word lists), 'confidences', and 'box' (left, top, right, bottom)
+    """
+    blocks = {}
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        confidence = float(data['conf'][i])
+        if not word or confidence < 0:
+            continue
+        block = blocks.setdefault(data['block_num'][i], {"lines": {}, "confidences": [], "box": None})
+        block['lines'].setdefault((data['par_num'][i], data['line_num'][i]), []).append(word)
+        block['confidences'].append(confidence)
+
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        box = block['box']
+        block['box'] = (left, top, right, bottom) if box is None else (
+            min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom))
+
+    return [
+        {"lines": [block['lines'][key] for key in sorted(block['lines'])],
+         "confidences": block['confidences'],
+         "box": block['box']}
+        for _, block in sorted(blocks.items())
+    ]
+
+
+def _block_text(block):
+    return "\n".join(" ".join(words) for words in block['lines'])
+
+
+def run_local_ocr(image):
+    """
+    Run Tesseract on a PIL image.
+
+    Returns:
+        dict: 'blocks' (see _group_words), 'word_count' and 'mean_confidence'
+        (0-100)
+    """
+    import pytesseract
+    if Config.TESSERACT_PATH:
+        pytesseract.pytesseract.tesseract_cmd = Config.TESSERACT_PATH
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    blocks = _group_words(data)
+    confidences = [c for block in blocks for c in block['confidences']]
+    return {
+        "blocks": blocks,
+        "word_count": len(confidences),
+        "mean_confidence": sum(confidences) / len(confidences) if confidences else 0.0
+    }
+
+
+def plan_escalation(local_result, threshold):
+    """
+    Decide how much of a page to send to the vision tier.
+
+    Args:
+        local_result (dict): Output of run_local_ocr
+        threshold (float): Minimum mean word confidence (0-100) to trust text
+
+    Returns:
+        tuple: ('local' | 'regions' | 'page', indexes of blocks to escalate)
+    """
+    if local_result['word_count'] < MIN_LOCAL_WORDS:
+        return 'page', []
+
+    low_blocks = [
+        i for i, block in enumerate(local_result['blocks'])
+        if sum(block['confidences']) / len(block['confidences']) < threshold
+    ]
+    if not low_blocks:
+        return 'local', []
+
+    low_words = sum(len(local_result['blocks'][i]['confidences']) for i in low_blocks)
+    if low_words / local_result['word_count'] > MAX_REGION_ESCALATION_FRACTION:
+        return 'page', []
+    return 'regions', low_blocks
+
+
+def _crop(image, box):
+    left, top, right, bottom = box
+    region = image.crop((
+        max(left - REGION_PADDING, 0),
+        max(top - REGION_PADDING, 0),
+        min(right + REGION_PADDING, image.width),
+        min(bottom + REGION_PADDING, image.height)
+    ))
+    buffer = io.BytesIO()
+    region.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _timed_vision(call, *args):
+    start = time.perf_counter()
+    try:
+        return call(*args)
+    finally:
+        _count(vision_seconds=time.perf_counter() - start, vision_runs=1)
+
+
+async def _timed_vision_async(call, *args):
+    start = time.perf_counter()
+    try:
+        return await call(*args)
+    finally:
+        _count(vision_seconds=time.perf_counter() - start, vision_runs=1)
+
+
+def _local_pass(image_data, assignment_type, can_transcribe_regions):
+    """
+    Run the local tier on a page and decide what to escalate.
+
+    Returns:
+        tuple: (decision, image, local_result, low_blocks); image and
+        local_result are None when the page skips the local tier
+    """
+    if (not Config.OCR_TIERED or not TESSERACT_AVAILABLE
+            or (assignment_type or '').lower() in VISION_ONLY_TYPES):
+        return 'page', None, None, []
+
+    start = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        image.load()
+        local_result = run_local_ocr(image)
+    except Exception as e:
+        # Missing tesseract binary, unreadable image, etc.
+        logger.warning("Local OCR unavailable, using vision model", extra={'error': str(e)})
+        return 'page', None, None, []
+    finally:
+        _count(local_seconds=time.perf_counter() - start, local_runs=1)
+
+    decision, low_blocks = plan_escalation(local_result, Config.OCR_CONFIDENCE_THRESHOLD)
+    if decision == 'regions' and not can_transcribe_regions:
+        decision = 'page'
+
+    logger.debug("Local OCR", extra={
+        'words': local_result['word_count'], 'mean_confidence': round(local_result['mean_confidence'], 1), 'decision': decision
+    })
+    return decision, image, local_result, low_blocks
+
+
+def extract_text_tiered(image_data, vision_ocr, transcribe_region=None, assignment_type=None):
+    """
+    Extract text from an image, using the vision model only where needed.
+
+    Args:
+        image_data (bytes): The image data as bytes
+        vision_ocr (callable): Whole-page vision OCR, called as
+            vision_ocr(image_data, assignment_type)
+        transcribe_region (callable, optional): Vision transcription of a
+            cropped region, called with the region's PNG bytes; without it
+            pages with unclear regions are escalated whole
+        assignment_type (str, optional): The type of assignment
+
+    Returns:
+        str: The extracted text
+    """
+    _count(pages=1)
+    decision, image, local_result, low_blocks = _local_pass(image_data, assignment_type, transcribe_region is not None)
+
+    if decision == 'page':
+        _count(pages_escalated=1)
+        return _timed_vision(vision_ocr, image_data, assignment_type)
+
+    texts = [_block_text(block) for block in local_result['blocks']]
+    if decision == 'regions':
+        _count(pages_region_escalated=1, regions_escalated=len(low_blocks))
+        for i in low_blocks:
+            try:
+                texts[i] = _timed_vision(transcribe_region, _crop(image, local_result['blocks'][i]['box']))
+            except Exception as e:
+                logger.warning("Region escalation failed, keeping local text", extra={'error': str(e)})
+    else:
+        _count(pages_local=1)
+
+    return "\n\n".join(t for t in texts if t)
+
+
+async def extract_text_tiered_async(image_data, vision_ocr, transcribe_region=None, assignment_type=None):
+    """
+    Async extract_text_tiered(), with coroutine functions for vision_ocr and
+    transcribe_region. Tesseract runs in a worker thread and the unclear
+    regions of a page are transcribed concurrently.
+
+    Returns:
+        str: The extracted text
+    """
+    _count(pages=1)
+    decision, image, local_result, low_blocks = await asyncio.to_thread(
+        _local_pass, image_data, assignment_type, transcribe_region is not None)
+
+    if decision == 'page':
+        _count(pages_escalated=1)
+        return await _timed_vision_async(vision_ocr, image_data, assignment_type)
+
+    texts = [_block_text(block) for block in local_result['blocks']]
+
+    async def escalate(i):
+        try:
+            texts[i] = await _timed_vision_async(transcribe_region, _crop(image, local_result['blocks'][i]['box']))
+        except Exception as e:
+            logger.warning("Region escalation failed, keeping local text", extra={'error': str(e)})
+
+    if decision == 'regions':
+        _count(pages_region_escalated=1, regions_escalated=len(low_blocks))
+        await asyncio.gather(*(escalate(i) for i in low_blocks))
+    else:
+        _count(pages_local=1)
+
+    return "\n\n".join(t for t in texts if t)
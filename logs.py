@@ -0,0 +1,182 @@
+"""
+Structured Logging for SnapGrade
+
+Replaces ad-hoc print() calls on the grading paths with leveled logging:
+
+- Records are JSON objects, one per line (LOG_FORMAT=json), or readable
+  "key=value" lines (LOG_FORMAT=text), with extra fields passed as
+  logger.info("...", extra={...}).
+- Every record carries the request's correlation ID (the X-Request-ID
+  header or a generated one), so all lines of one grade can be grepped.
+- Model responses and student text are only logged through payload(), which
+  redacts e-mail addresses, phone numbers and name lines and truncates to
+  LOG_PAYLOAD_CHARS.
+- DEBUG records are sampled (LOG_DEBUG_SAMPLE_RATE), so verbose output stays
+  bounded when debug logging is on in production.
+"""
+
+import contextvars
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from config import Config
+
+ROOT_LOGGER = 'snapgrade'
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_configure_lock = threading.Lock()
+_configured = False
+
+# Attributes every LogRecord has; anything else on a record is an extra field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_PHONE = re.compile(r'(?<!\w)\+?\d[\d ().-]{7,}\d(?!\w)')
+_NAME_LINE = re.compile(r'(?im)^([^\w\n]*(?:student\s+name|name|student)\s*[:\-]\s*)(.+?)(\**)$')
+
+
+def redact(text):
+    """Mask e-mail addresses, phone numbers and the value of name lines."""
+    text = _EMAIL.sub('[email]', str(text))
+    text = _PHONE.sub('[phone]', text)
+    return _NAME_LINE.sub(r'\1[name]\3', text)
+
+
+def payload(text, limit=None):
+    """
+    Prepare model output or student text for a log record.
+
+    Args:
+        text: The payload
+        limit (int, optional): Characters to keep (default LOG_PAYLOAD_CHARS)
+
+    Returns:
+        str: The redacted (when LOG_REDACT is on) and truncated text
+    """
+    if text is None:
+        return None
+    text = str(text)
+    limit = Config.LOG_PAYLOAD_CHARS if limit is None else limit
+    if Config.LOG_REDACT:
+        text = redact(text)
+    if len(text) > limit:
+        return f"{text[:limit]}... [{len(text) - limit} more chars]"
+    return text
+
+
+def set_request_id(request_id=None):
+    """Set the correlation ID of the current request, generating one if needed."""
+    request_id = (request_id or "").strip()[:64] or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+
+def get_request_id():
+    """The current request's correlation ID, or None outside a request."""
+    return _request_id.get()
+
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS and not key.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for local development."""
+
+    def format(self, record):
+        fields = " ".join(f"{key}={value!r}" for key, value in _extras(record).items())
+        line = (f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} "
+                f"[{getattr(record, 'request_id', None) or '-'}] {record.name}: {record.getMessage()}")
+        if fields:
+            line += f" {fields}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, like print() did."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging(level=None, fmt=None, stream=None, force=False):
+    """
+    Set up the 'snapgrade' logger from Config (once, unless force).
+
+    Args:
+        level (str, optional): Overrides LOG_LEVEL
+        fmt (str, optional): 'json' or 'text', overrides LOG_FORMAT
+        stream (optional): Where to write (default stdout)
+    """
+    global _configured
+    with _configure_lock:
+        if _configured and not force:
+            return
+        logger = logging.getLogger(ROOT_LOGGER)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        handler = logging.StreamHandler(stream) if stream else _StdoutHandler()
+        handler.setFormatter(TextFormatter() if (fmt or Config.LOG_FORMAT) == 'text' else JsonFormatter())
+        handler.addFilter(_ContextFilter())
+        handler.addFilter(SamplingFilter(Config.LOG_DEBUG_SAMPLE_RATE))
+        logger.addHandler(handler)
+        logger.setLevel((level or Config.LOG_LEVEL).upper())
+        logger.propagate = False
+        _configured = True
+
+
+def get_logger(name):
+    """
+    Get a SnapGrade logger, e.g. get_logger('grader.engine').
+
+    Returns:
+        logging.Logger: A child of the 'snapgrade' logger
+    """
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -0,0 +1,217 @@
+"""
+Stage Timing and Prometheus Metrics for SnapGrade
+
+A grade passes through many stages - base64 decode, PDF rasterization, OCR,
+diagram detection, name extraction, model calls, JSON repair, grades.json
+writes - and any of them can be the slow one. Stages are wrapped in spans:
+
+    with span('pdf_rasterize'):
+        images = convert_from_bytes(...)
+
+    @span('text_grade', provider='gemini')
+    def grade_assignment_with_gemini(...):
+        ...
+
+Each span records its duration in a latency histogram and counts calls and
+errors per (stage, provider); HTTP requests are timed per endpoint. The
+module's own stats functions (tiered OCR, local extraction, answer groups,
+the grading backend) are registered as gauges. render_prometheus() returns
+everything in the Prometheus text exposition format for /metrics.
+"""
+
+import bisect
+import contextlib
+import functools
+import inspect
+import re
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds; model calls take seconds to minutes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_stages = {}    # (stage, provider) -> histogram entry
+_requests = {}  # (endpoint, method, status) -> histogram entry
+_collectors = {}
+
+
+def _new_entry():
+    return {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0, 'errors': 0}
+
+
+def _record(table, key, seconds, error):
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = _new_entry()
+        if index < len(BUCKETS):
+            entry['buckets'][index] += 1
+        entry['sum'] += seconds
+        entry['count'] += 1
+        if error:
+            entry['errors'] += 1
+
+
+def observe(stage, seconds, provider='local', error=False):
+    """
+    Record one run of a stage.
+
+    Args:
+        stage (str): The stage name, e.g. 'vision_ocr'
+        seconds (float): How long it took
+        provider (str): 'local', 'openai', 'gemini', 'fake', ...
+        error (bool): Whether the stage failed
+    """
+    _record(_stages, (stage, provider), seconds, error)
+
+
+def observe_request(endpoint, method, status, seconds):
+    """Record one HTTP request."""
+    _record(_requests, (endpoint or 'unknown', method, str(status)), seconds, status >= 500)
+
+
+class span(contextlib.ContextDecorator):
+    """
+    Time a stage, as a context manager or a function decorator (of plain or
+    async functions). An exception leaving the span counts as an error of the
+    stage and is re-raised.
+    """
+
+    def __init__(self, stage, provider='local'):
+        self.stage = stage
+        self.provider = provider
+        self._start = None
+
+    def _recreate_cm(self):
+        # A fresh span per decorated call, so concurrent calls don't share a start time
+        return span(self.stage, self.provider)
+
+    def __call__(self, func):
+        if not inspect.iscoroutinefunction(func):
+            return super().__call__(func)
+
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            with self._recreate_cm():
+                return await func(*args, **kwargs)
+        return timed
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self._start, self.provider, error=exc_type is not None)
+        return False
+
+
+def register_stats(name, stats_fn):
+    """
+    Expose a stats function's numeric values as gauges named
+    snapgrade_<name>_<key>. Nested dicts of numbers become one gauge with a
+    'key' label.
+    """
+    _collectors[name] = stats_fn
+
+
+def get_stage_stats():
+    """
+    Get per-stage timing totals.
+
+    Returns:
+        dict: {"stage/provider": {'calls', 'errors', 'total_seconds', 'mean_seconds'}}
+    """
+    with _lock:
+        entries = {key: dict(entry) for key, entry in _stages.items()}
+    return {
+        f"{stage}/{provider}": {
+            'calls': entry['count'],
+            'errors': entry['errors'],
+            'total_seconds': round(entry['sum'], 4),
+            'mean_seconds': round(entry['sum'] / entry['count'], 4) if entry['count'] else None
+        }
+        for (stage, provider), entry in sorted(entries.items())
+    }
+
+
+def reset():
+    """Clear all recorded stages and requests."""
+    with _lock:
+        _stages.clear()
+        _requests.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _metric_name(text):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', str(text))
+
+
+def _render_histograms(lines, name, help_text, table, label_names, count_name=None, error_name=None):
+    with _lock:
+        entries = {key: {**entry, 'buckets': list(entry['buckets'])} for key, entry in table.items()}
+    if not entries:
+        return
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, entry in sorted(entries.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, entry['buckets']):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(label_names, key, ('le', f'{bound:g}'))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(label_names, key, ('le', '+Inf'))} {entry['count']}")
+        lines.append(f"{name}_sum{_labels(label_names, key)} {entry['sum']:.6f}")
+        lines.append(f"{name}_count{_labels(label_names, key)} {entry['count']}")
+    for metric, field, description in ((count_name, 'count', 'Calls'), (error_name, 'errors', 'Errors')):
+        if not metric:
+            continue
+        lines.append(f"# HELP {metric} {description} per {', '.join(label_names)}")
+        lines.append(f"# TYPE {metric} counter")
+        for key, entry in sorted(entries.items()):
+            lines.append(f"{metric}{_labels(label_names, key)} {entry[field]}")
+
+
+def _render_collectors(lines):
+    for name, stats_fn in sorted(_collectors.items()):
+        try:
+            stats = stats_fn() or {}
+        except Exception as e:
+            print(f"Metrics collector '{name}' failed: {str(e)}")
+            continue
+        for key, value in sorted(stats.items()):
+            metric = f"snapgrade_{_metric_name(name)}_{_metric_name(key)}"
+            if isinstance(value, dict):
+                samples = [(_labels(['key'], [k]), v) for k, v in sorted(value.items())]
+            else:
+                samples = [("", value)]
+            samples = [(labels, float(v)) for labels, v in samples if isinstance(v, (int, float))]
+            if not samples:
+                continue
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f"{metric}{labels} {int(v) if v.is_integer() else v}" for labels, v in samples)
+
+
+def render_prometheus():
+    """
+    Render all metrics in the Prometheus text exposition format (0.0.4).
+
+    Returns:
+        str: The metrics page
+    """
+    lines = []
+    _render_histograms(lines, 'snapgrade_stage_duration_seconds', 'Duration of grading pipeline stages',
+                       _stages, ('stage', 'provider'),
+                       'snapgrade_stage_calls_total', 'snapgrade_stage_errors_total')
+    _render_histograms(lines, 'snapgrade_http_request_duration_seconds', 'Duration of HTTP requests',
+                       _requests, ('endpoint', 'method', 'status'))
+    _render_collectors(lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,3 @@
+from roster.name_index import StudentNameIndex, name_from_filename
+
+__all__ = ['StudentNameIndex', 'name_from_filename']
@@ -0,0 +1,280 @@
+"""
+Indexed fuzzy student-name matching for SnapGrade
+
+Builds a per-class index of student names (normalized tokens, character
+trigrams and Soundex keys) so an OCR-detected name can be matched against a
+roster with ranked, scored candidates instead of a linear substring scan.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+
+# Minimum score for a candidate to be considered a match
+MATCH_THRESHOLD = 0.6
+
+# Best match must beat the runner-up by this much to be unambiguous
+AMBIGUITY_MARGIN = 0.05
+
+_NON_NAME_CHARS = re.compile(r"[^a-z\s]")
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _code
+
+
+def normalize_name(name):
+    """
+    Normalize a name for matching: strip accents and punctuation, lowercase.
+
+    Returns:
+        list: The name's tokens, e.g. "O'Brien, Seán" -> ['obrien', 'sean']
+    """
+    if not name:
+        return []
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace("'", '').replace('-', ' ').replace('_', ' ').replace('.', ' ').replace(',', ' ')
+    return _NON_NAME_CHARS.sub('', text).split()
+
+
+def name_from_filename(filename):
+    """
+    Guess a student name from an uploaded file name.
+
+    "jane_doe-essay2.pdf" -> "jane doe essay"; the matcher's scoring tolerates
+    the extra tokens as long as the name tokens are present.
+    """
+    stem = os.path.splitext(os.path.basename(filename or ''))[0]
+    return ' '.join(normalize_name(re.sub(r'\d+', ' ', stem)))
+
+
+def soundex(token):
+    """Return the four-character Soundex key of a token."""
+    if not token:
+        return ''
+    first = token[0]
+    codes = []
+    previous = _SOUNDEX_CODES.get(first, '')
+    for letter in token[1:]:
+        code = _SOUNDEX_CODES.get(letter, '')
+        if code and code != previous:
+            codes.append(code)
+        if letter not in 'hw':
+            previous = code
+    return (first + ''.join(codes) + '000')[:4]
+
+
+def trigrams(text):
+    """Return the set of character trigrams of a padded string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+class _NameEntry:
+    __slots__ = ('student', 'tokens', 'trigrams', 'phonetic', 'token_trigrams')
+
+    def __init__(self, student):
+        self.student = student
+        self.tokens = normalize_name(student.get('name'))
+        self.trigrams = trigrams(' '.join(self.tokens))
+        self.phonetic = {soundex(t) for t in self.tokens}
+        self.token_trigrams = [trigrams(t) for t in self.tokens]
+
+
+def _token_similarity(query_token, query_trigrams, entry, index):
+    candidate = entry.tokens[index]
+    if query_token == candidate:
+        return 1.0
+    if len(query_token) == 1 and candidate.startswith(query_token):
+        return 0.9  # Initial, e.g. "J. Smith"
+    if soundex(query_token) == soundex(candidate):
+        return 0.8
+    return _dice(query_trigrams, entry.token_trigrams[index])
+
+
+def _score(query_tokens, query_token_trigrams, query_trigrams, entry):
+    """Combine whole-name trigram similarity with best-token alignment."""
+    if not entry.tokens:
+        return 0.0
+    name_similarity = _dice(query_trigrams, entry.trigrams)
+
+    query_to_name = [
+        max(_token_similarity(t, tt, entry, i) for i in range(len(entry.tokens)))
+        for t, tt in zip(query_tokens, query_token_trigrams)
+    ]
+    token_similarity = sum(query_to_name) / len(query_to_name)
+    # Penalize names with extra tokens the query does not account for
+    coverage = min(len(query_tokens), len(entry.tokens)) / max(len(query_tokens), len(entry.tokens))
+
+    return 0.4 * name_similarity + 0.45 * token_similarity + 0.15 * coverage
+
+
+class _ClassIndex:
+    def __init__(self):
+        self.entries = {}
+        self.postings = {}
+
+    def _keys(self, entry):
+        return entry.trigrams | {f"t:{t}" for t in entry.tokens} | {f"p:{p}" for p in entry.phonetic}
+
+    def add(self, student):
+        self.remove(student['id'])
+        entry = _NameEntry(student)
+        self.entries[student['id']] = entry
+        for key in self._keys(entry):
+            self.postings.setdefault(key, set()).add(student['id'])
+
+    def remove(self, student_id):
+        entry = self.entries.pop(student_id, None)
+        if not entry:
+            return
+        for key in self._keys(entry):
+            ids = self.postings.get(key)
+            if ids:
+                ids.discard(student_id)
+                if not ids:
+                    del self.postings[key]
+
+    def candidates(self, query_keys, min_hits):
+        hits = {}
+        for key in query_keys:
+            for student_id in self.postings.get(key, ()):
+                hits[student_id] = hits.get(student_id, 0) + 1
+        return [student_id for student_id, count in hits.items() if count >= min_hits]
+
+
+class StudentNameIndex:
+    """
+    Per-class fuzzy name index over the student roster.
+
+    Built from the full student list once, on first use, then kept up to date
+    via add()/remove()/remove_class() as students are added and deleted. With a
+    signature, matches also rebuild it when the roster changed elsewhere (e.g.
+    another worker process wrote the students file).
+    """
+
+    def __init__(self, load_students, signature=None):
+        """
+        Args:
+            load_students (callable): Returns the current list of student
+                records; only called when the index needs to be (re)built
+            signature (callable, optional): Returns a value that changes when
+                the stored roster changes, e.g. the students file's mtime and size
+        """
+        self._load_students = load_students
+        self._signature = signature or (lambda: None)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_signature = None
+        self._classes = {}
+
+    def _ensure_loaded(self):
+        signature = self._signature()
+        if self._loaded and signature == self._loaded_signature:
+            return
+        self._classes = {}
+        for student in self._load_students():
+            self._classes.setdefault(student.get('class_id'), _ClassIndex()).add(student)
+        self._loaded = True
+        self._loaded_signature = signature
+
+    def _updated(self):
+        # Called after the students file was written; later changes trigger a rebuild
+        self._loaded_signature = self._signature()
+
+    def add(self, student):
+        """Index a newly created student."""
+        with self._lock:
+            if self._loaded:
+                self._classes.setdefault(student.get('class_id'), _ClassIndex()).add(student)
+                self._updated()
+
+    def remove(self, student_id, class_id=None):
+        """Remove a deleted student from the index."""
+        with self._lock:
+            if not self._loaded:
+                return
+            class_indexes = [self._classes.get(class_id)] if class_id else list(self._classes.values())
+            for class_index in class_indexes:
+                if class_index:
+                    class_index.remove(student_id)
+            self._updated()
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on the next match."""
+        with self._lock:
+            self._loaded = False
+            self._classes = {}
+
+    def remove_class(self, class_id):
+        """Drop every student of a deleted class from the index."""
+        with self._lock:
+            self._classes.pop(class_id, None)
+            if self._loaded:
+                self._updated()
+
+    def match(self, name, class_id=None, limit=5, threshold=MATCH_THRESHOLD):
+        """
+        Find the students whose names best match a detected name.
+
+        Args:
+            name (str): The detected (possibly misspelled or partial) name
+            class_id (str, optional): Restrict matching to one class; all
+                classes are searched when omitted
+            limit (int): Maximum number of candidates to return
+            threshold (float): Minimum score for a candidate to be returned
+
+        Returns:
+            list: Candidates sorted by descending score, each a dict with
+            'student' (the student record) and 'score' (0-1)
+        """
+        query_tokens = normalize_name(name)
+        if not query_tokens:
+            return []
+        query_trigrams = trigrams(' '.join(query_tokens))
+        query_token_trigrams = [trigrams(t) for t in query_tokens]
+        query_keys = query_trigrams | {f"t:{t}" for t in query_tokens} | {f"p:{soundex(t)}" for t in query_tokens}
+        # Names sharing only a couple of trigrams cannot reach the threshold
+        min_hits = max(1, len(query_keys) // 4)
+
+        with self._lock:
+            self._ensure_loaded()
+            if class_id is not None:
+                class_indexes = [self._classes[class_id]] if class_id in self._classes else []
+            else:
+                class_indexes = list(self._classes.values())
+
+            scored = []
+            for class_index in class_indexes:
+                for student_id in class_index.candidates(query_keys, min_hits):
+                    entry = class_index.entries[student_id]
+                    score = _score(query_tokens, query_token_trigrams, query_trigrams, entry)
+                    if score >= threshold:
+                        scored.append({"student": entry.student, "score": round(score, 3)})
+
+        scored.sort(key=lambda c: c['score'], reverse=True)
+        return scored[:limit]
+
+    def best_match(self, name, class_id=None, threshold=MATCH_THRESHOLD, margin=AMBIGUITY_MARGIN):
+        """
+        Get the single best student for a detected name, if it is unambiguous.
+
+        Returns:
+            tuple: (student or None, candidates) where student is None when no
+            candidate clears the threshold or the top two are within margin
+        """
+        candidates = self.match(name, class_id, limit=5, threshold=threshold)
+        if not candidates:
+            return None, candidates
+        if len(candidates) > 1 and candidates[0]['score'] - candidates[1]['score'] < margin:
+            return None, candidates
+        return candidates[0]['student'], candidates
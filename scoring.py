@@ -0,0 +1,149 @@
+"""
+Score Normalization Module for SnapGrade
+
+Grading providers return scores in many shapes: floats, numeric strings,
+fractions ("8/10"), percentages ("85%"), "Error"/"N/A", or structured results
+with 'total_score'/'percentage'. This module parses a result once into a
+compact canonical record that is stored next to the raw score, so aggregates,
+exports and sorting can work on plain floats.
+
+A bare number such as 8 does not say what it is out of. It is only scored
+when the caller knows the total (e.g. the rubric's points) and is left
+unscored otherwise, never read as a percentage.
+"""
+
+import math
+
+STATUS_GRADED = 'graded'
+STATUS_ERROR = 'error'
+STATUS_UNSCORED = 'unscored'
+
+
+def _record(earned=None, possible=None, percentage=None, status=STATUS_UNSCORED):
+    return {
+        "earned": earned,
+        "possible": possible,
+        "percentage": round(percentage, 4) if percentage is not None else None,
+        "status": status
+    }
+
+
+def _parse_number(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"Non-finite score: {text}")
+    return value
+
+
+def error_score():
+    """Canonical record for a submission whose grading failed."""
+    return _record(status=STATUS_ERROR)
+
+
+def _points(earned, possible):
+    # Scores below zero or above the total are misreads, not extra credit
+    if not math.isfinite(earned) or not possible or possible <= 0 or not 0 <= earned <= possible:
+        return _record()
+    return _record(earned, float(possible), earned / possible * 100, STATUS_GRADED)
+
+
+def _percentage(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return _record()
+    try:
+        percentage = _parse_number(str(value).strip().rstrip('%'))
+    except ValueError:
+        return _record()
+    return _points(percentage, 100.0)
+
+
+def normalize_score(score, possible=None):
+    """
+    Parse a raw score into the canonical record.
+
+    Args:
+        score: A fraction such as "7/10", a percentage string such as "85%",
+            a number (or numeric string) of points, a structured grading
+            result with 'total_score'/'percentage', or an error marker
+        possible (float, optional): What a bare number of points is out of,
+            e.g. the rubric's total; bare numbers are unscored without it
+
+    Returns:
+        dict: {'earned', 'possible', 'percentage', 'status'} where status is
+        'graded', 'error' or 'unscored' and the numeric fields are floats
+        (or None when the score is not usable)
+    """
+    if isinstance(score, dict):
+        if 'status' in score and 'percentage' in score:
+            return score  # Already normalized
+        if 'total_score' in score:
+            normalized = normalize_score(score['total_score'], possible)
+            if normalized['status'] == STATUS_GRADED:
+                return normalized
+        if 'percentage' in score:
+            return _percentage(score['percentage'])
+        return _record()
+
+    if score is None or isinstance(score, bool):
+        return _record()
+
+    if isinstance(score, (int, float)):
+        return _points(float(score), possible)
+
+    if not isinstance(score, str):
+        return _record()
+
+    text = score.strip()
+    if text.lower().startswith('error'):
+        return error_score()
+
+    try:
+        if '/' in text:
+            earned, possible = text.split('/', 1)
+            return _points(_parse_number(earned), _parse_number(possible))
+        if text.endswith('%'):
+            return _percentage(text)
+        return _points(_parse_number(text), possible)
+    except ValueError:
+        return _record()
+
+
+def normalize_grading_result(result, possible=None):
+    """
+    Normalize the score of a grading result returned by the grader.
+
+    Falls back to the structured feedback's 'total_score'/'percentage' when
+    the top-level score cannot be parsed.
+
+    Args:
+        result (dict): A grading result with 'score' and 'feedback'
+        possible (float, optional): What a bare number of points is out of
+            (see normalize_score)
+
+    Returns:
+        dict: The canonical score record
+    """
+    normalized = normalize_score(result.get('score'), possible)
+    if normalized['status'] == STATUS_UNSCORED and isinstance(result.get('feedback'), dict):
+        from_feedback = normalize_score(result['feedback'], possible)
+        if from_feedback['status'] == STATUS_GRADED:
+            return from_feedback
+    return normalized
+
+
+def score_to_percentage(score):
+    """Convert a raw score to a percentage, or None when it is not usable."""
+    return normalize_score(score)['percentage']
+
+
+def grade_percentage(grade):
+    """
+    Get the percentage of a stored grade record.
+
+    Uses the stored 'score_normalized' record when present and only parses
+    the raw 'score' for records written before normalization existed.
+    """
+    normalized = grade.get('score_normalized')
+    if normalized is None:
+        normalized = normalize_score(grade.get('score'))
+    return normalized.get('percentage')
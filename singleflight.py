@@ -0,0 +1,164 @@
+"""
+Single-flight Request Coalescing for SnapGrade
+
+A double-click or a frontend retry while the first request is still running
+would otherwise send the same image or submission to the model twice. Calls
+made through a SingleFlight group with the same key while one is in flight
+wait for that call and get a copy of its result (or its exception) instead
+of making their own:
+
+    _ocr_flight = SingleFlight('ocr')
+    text = _ocr_flight.do(flight_key(image_data, assignment_type), extract, image_data)
+
+Threads (the WSGI servers) coalesce with do(); coroutines on one event loop
+(the ASGI grading path) with do_async(). Nothing is kept once a call
+finishes - this deduplicates concurrent work only, it is not a result cache.
+"""
+
+import asyncio
+import copy
+import hashlib
+import threading
+from config import Config
+
+_groups_lock = threading.Lock()
+_groups = {}  # name -> SingleFlight
+
+
+def flight_key(*parts):
+    """
+    Hash the parts of a call that determine its result.
+
+    Args:
+        *parts: str, bytes or None (e.g. image bytes, a rubric hash, a model)
+
+    Returns:
+        str: Hex SHA-256 of the parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, (bytes, bytearray)) else str(part).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def normalize_submission(text):
+    """Collapse spacing within lines and drop blank lines, keeping line breaks."""
+    lines = (" ".join(line.split()) for line in (text or '').splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """A named group of coalesced calls, e.g. one per operation."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call, threads
+        self._tasks = {}  # (loop, key) -> asyncio.Task, coroutines
+        self._stats = {"calls": 0, "coalesced": 0}
+        with _groups_lock:
+            _groups[name] = self
+
+    def _count(self, coalesced):
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['coalesced'] += coalesced
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs), or wait for the in-flight call with the same key.
+
+        Returns:
+            The call's result; callers that waited get a deep copy, so they
+            can change it without affecting each other
+        """
+        if not Config.SINGLE_FLIGHT:
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        self._count(coalesced=not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters and call.error is None:
+                # Copied before the caller gets the result and can change it
+                call.result = copy.deepcopy(result)
+            call.done.set()
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs), or the in-flight call with the same key.
+
+        The call runs as its own task, so a cancelled caller (e.g. a client
+        that disconnected) does not cancel it for the others.
+
+        Returns:
+            A deep copy of the call's result, since every caller awaits the
+            same task
+        """
+        if not Config.SINGLE_FLIGHT:
+            return await fn(*args, **kwargs)
+
+        flight = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(flight)
+            leader = task is None
+            if leader:
+                task = self._tasks[flight] = asyncio.ensure_future(fn(*args, **kwargs))
+                task.add_done_callback(lambda _: self._forget(flight))
+        self._count(coalesced=not leader)
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, flight):
+        with self._lock:
+            self._tasks.pop(flight, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls) + len(self._tasks)
+        return stats
+
+
+def get_singleflight_stats():
+    """
+    Get coalescing counters since startup.
+
+    Returns:
+        dict: 'calls', 'coalesced' and 'in_flight', each {group name: value}
+    """
+    with _groups_lock:
+        groups = dict(_groups)
+    stats = {name: group.get_stats() for name, group in groups.items()}
+    return {field: {name: value[field] for name, value in stats.items()}
+            for field in ('calls', 'coalesced', 'in_flight')}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for answer-signature grouping of batch submissions.
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+
+def test_normalize_answers():
+    """Headers, labels, case and spacing are normalized; list markers stay apart from answers."""
+    from grader.answer_groups import normalize_answers
+
+    assert normalize_answers("Name: Ada\nDate: Monday\nQ1: B\nQuestion 2) x = 4") == \
+        normalize_answers("Name: Ben\n1. b\n2. x=4")
+    assert normalize_answers("1. 3/4") != normalize_answers("1 3/4")
+    assert normalize_answers("2) 1.5") != normalize_answers("2 1 5")
+    assert normalize_answers("1. 0.75\n2. C") == normalize_answers("1)  0.75\n2.  c.")
+    print(f"✓ Normalized: {normalize_answers('1. 3/4')!r} vs {normalize_answers('1 3/4')!r}")
+
+
+def test_group_submissions():
+    """Grouping is off by default; 'exact' and 'near' group only matching answers."""
+    from grader.answer_groups import group_submissions
+
+    texts = ["Name: Ada\n1. B\n2. 42", "Name: Ben\n1. b\n2. 42", "1. B\n2. 41", "", "Name: Cy\n1. B\n2. 42"]
+    if not os.getenv('ANSWER_GROUPING'):
+        assert group_submissions(texts) == [[0], [1], [2], [3], [4]], "Grouping is on by default"
+    assert group_submissions(texts, 'off') == [[0], [1], [2], [3], [4]]
+    assert group_submissions(texts, 'exact') == [[0, 1, 4], [2], [3]]
+
+    essays = ["The cell membrane controls what enters and leaves the cell, answer 2",
+              "The cell membrane controls what enters and leaves the cell , answer 2 ",
+              "The cell membrane controls what enters and leaves the cell, answer 3"]
+    assert group_submissions(essays, 'near', 0.8) == [[0, 1], [2]]
+    print("✓ Submissions grouped by strictness")
+
+
+def test_grade_grouped():
+    """One call per group; a failed call is returned to every member as the exception."""
+    from grader.answer_groups import grade_grouped
+
+    calls = []
+
+    def grade_one(text):
+        calls.append(text)
+        if 'FAIL' in text:
+            raise ValueError("provider down")
+        return {"score": "2/2", "feedback": "Correct."}
+
+    texts = ["Name: Ada\n1. B", "Name: Ben\n1. B", "1. FAIL", "1. FAIL", "1. C"]
+    results, stats = grade_grouped(texts, grade_one, 'exact')
+    assert len(calls) == 3 and stats['calls_saved'] == 2, (calls, stats)
+    assert calls[0] == "1. B", "The shared call saw a student's header"
+    assert results[0]['answer_group'] == {"representative": 0, "size": 2}
+    assert results[1]['feedback'].startswith("*Note:") and results[1]['score'] == "2/2"
+    assert isinstance(results[2], ValueError) and results[3] is results[2], results[2:4]
+    assert 'answer_group' not in results[4]
+    print(f"✓ {len(texts)} submissions graded in {len(calls)} calls")
+
+
+def test_batch_assignment_records_errors():
+    """A submission that fails to grade is recorded for its student; the others are graded."""
+    import app as app_module
+
+    previous_folder = os.path.dirname(app_module.CLASSES_FOLDER)
+    grade_assignment = app_module.grade_assignment
+
+    def grade(assignment_type, text, rubric):
+        if 'FAIL' in text:
+            raise ValueError("provider down")
+        return {"score": "2/2", "feedback": "Correct."}
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            app_module.grade_assignment = grade
+            client = app_module.create_app(data_folder=directory).test_client()
+            with open(app_module.CLASSES_FILE, 'w') as f:
+                json.dump([{'id': 'c1', 'teacher_id': 'TEACHER001', 'name': 'Biology'}], f)
+            with open(app_module.STUDENTS_FILE, 'w') as f:
+                json.dump([{'id': f's{i}', 'class_id': 'c1', 'name': name}
+                           for i, name in enumerate(['Ada Lovelace', 'Ben Carter', 'Chloe Nguyen'])], f)
+            client.post('/login', json={'teacher_id': 'TEACHER001'})
+            response = client.post('/classes/c1/assignments', json={
+                'assignment_name': 'Quiz 1', 'assignment_type': 'Quiz', 'rubric_content': '1. B (2 points)',
+                'submissions': ['1. B', '1. FAIL', '1. B']
+            })
+    finally:
+        app_module.grade_assignment = grade_assignment
+        app_module.init_storage(previous_folder)
+    export = (response.get_json().get('excel_export') or {}).get('filename')
+    for folder in ('temp_excel', os.path.join(app_module.app.root_path, 'exports')):
+        if export and os.path.exists(os.path.join(folder, export)):
+            os.remove(os.path.join(folder, export))
+
+    assert response.status_code == 201, response.get_json()
+    records = {record['student_id']: record for record in response.get_json()['results']}
+    assert sorted(records) == ['s0', 's1', 's2'], records
+    assert records['s1']['score'] == 0 and 'provider down' in records['s1']['feedback'], records['s1']
+    assert records['s0']['score'] == records['s2']['score'] == '2/2', records
+    print("✓ Failed submission recorded for its student")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_normalize_answers()
+        test_group_submissions()
+        test_grade_grouped()
+        test_batch_assignment_records_errors()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Answer grouping tests passed")
+    else:
+        print("\n❌ Answer grouping tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the async grading path and the ASGI entrypoint.
+
+Requests are driven through asgi.application in-process, against the fake
+backend, without starting a server.
+"""
+
+import sys
+import os
+import asyncio
+import base64
+import json
+import random
+import threading
+import tempfile
+import time
+
+# Add the current directory and the benchmarks to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+RUBRIC = 'Quiz (4 points total)\n1. Answer B (2 points)\n2. Membrane function (2 points)'
+
+
+async def call(app, method, path, body=None, headers=()):
+    """Send one request to an ASGI app; returns (status, headers, body)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'content-type', b'application/json')] + [(k.encode(), v.encode()) for k, v in headers],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80)
+    }
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b'',
+                 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return (start['status'], {k.decode(): v.decode() for k, v in start['headers']},
+            b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+def test_concurrent_requests():
+    """Hundreds of /grade requests wait on the model together, without a thread each."""
+    from asgi import application
+    from backends import set_backend
+    from backends.fake import FakeBackend
+
+    requests, latency = 200, 0.5
+    previous = set_backend(FakeBackend(latency=f'fixed:{int(latency * 1000)}'))
+    peak_threads = threading.active_count()
+
+    async def run():
+        async def sample_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.02)
+
+        sampler = asyncio.create_task(sample_threads())
+        responses = await asyncio.gather(*(
+            call(application, 'POST', '/grade', {
+                'assignment_type': 'Quiz', 'submission': f'1. B\n2. The membrane controls entry ({i}).',
+                'rubric': RUBRIC
+            }) for i in range(requests)))
+        sampler.cancel()
+        return responses
+
+    try:
+        start = time.perf_counter()
+        responses = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+    finally:
+        set_backend(previous)
+
+    assert all(status == 200 for status, _, _ in responses), [r[2][:200] for r in responses if r[0] != 200][:3]
+    assert all(json.loads(body)['score'].endswith('/4') for _, _, body in responses)
+    assert elapsed < latency * 4, f"{requests} requests took {elapsed:.2f}s at {latency}s model latency"
+    assert peak_threads < 20, f"{peak_threads} threads for {requests} requests"
+    print(f"✓ {requests} concurrent requests in {elapsed:.2f}s, at most {peak_threads} threads")
+
+
+def test_matches_sync_path():
+    """/grade-image answers the same through the async path and the Flask route."""
+    from asgi import application
+    from app import create_app
+    from backends import set_backend
+    from backends.fake import FakeBackend
+    from bench_endpoints import worksheet_image
+
+    image = base64.b64encode(worksheet_image(random.Random(3), 'Ben Carter')).decode('ascii')
+    body = {'assignment_type': 'Quiz', 'image_file': image, 'rubric': RUBRIC}
+    previous = set_backend(FakeBackend())
+    try:
+        expected = create_app().test_client().post('/grade-image', json=body).get_json()
+        status, headers, content = asyncio.run(call(application, 'POST', '/grade-image', body,
+                                                    headers=[('X-Request-ID', 'async-7')]))
+        missing_status, _, missing = asyncio.run(call(application, 'POST', '/grade-image', {'rubric': RUBRIC}))
+    finally:
+        set_backend(previous)
+
+    assert status == 200 and headers['x-request-id'] == 'async-7', (status, headers)
+    assert headers['access-control-allow-origin'] == '*', headers
+    assert json.loads(content) == expected, (json.loads(content), expected)
+    assert missing_status == 400 and json.loads(missing) == {"error": "Missing required field: assignment_type"}
+    print(f"✓ Async /grade-image matches the Flask route: {expected['score']}")
+
+
+def test_delegates_to_flask():
+    """Other routes are served by the Flask app; native routes show up in /metrics."""
+    from asgi import application
+
+    status, headers, content = asyncio.run(call(application, 'GET', '/metrics'))
+    page = content.decode()
+    assert status == 200 and headers.get('x-request-id'), (status, headers)
+    assert 'snapgrade_http_request_duration_seconds_count{endpoint="grade",method="POST",status="200"}' in page
+    assert 'snapgrade_stage_calls_total{stage="grade",provider="fake"}' in page
+    print("✓ GET /metrics served by Flask through the ASGI app")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_concurrent_requests()
+        test_matches_sync_path()
+        test_delegates_to_flask()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Async grading tests passed")
+    else:
+        print("\n❌ Async grading tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
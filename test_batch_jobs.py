@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk grading through provider batch jobs.
+
+Runs the whole batch pipeline offline against batch_stub_server.py: build
+the batch input file, submit it, poll the job and ingest the results.
+"""
+
+import sys
+import os
+import json
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+RUBRIC = """Essay rubric (10 points total)
+1. Thesis is clear (4 points)
+2. Evidence supports the thesis (6 points)"""
+
+
+def test_batch_round_trip():
+    """Submit a batch to the stub server, wait for it and parse the results."""
+    from batch_stub_server import BatchStubServer, FAIL_MARKER
+    from grader.batch_jobs import prepare_batch, OpenAIBatchClient
+
+    print("=== Batch API Round Trip Test ===\n")
+    server = BatchStubServer(delay=0.5, score="7/10").start()
+    try:
+        submissions = [
+            {"custom_id": "student-1", "text": "The industrial revolution changed cities because..."},
+            {"custom_id": "student-2", "text": "Cities grew quickly during the 1800s since..."},
+            {"custom_id": "student-3", "text": f"{FAIL_MARKER} An unreadable scan"},
+        ]
+        batch_requests, local_results = prepare_batch(submissions, "Essay", RUBRIC)
+        assert len(batch_requests) == 3 and not local_results
+        assert batch_requests[0]['url'] == "/v1/chat/completions"
+
+        client = OpenAIBatchClient(api_key="test", base_url=server.base_url)
+        status = client.submit(batch_requests, metadata={"assignment_id": "test"})
+        print(f"✓ Submitted {status['batch_id']} ({status['status']})")
+
+        deadline = time.time() + 10
+        while status['status'] != 'completed' and time.time() < deadline:
+            time.sleep(0.2)
+            status = client.status(status['batch_id'])
+        assert status['status'] == 'completed', status
+        assert status['request_counts'] == {"total": 3, "completed": 2, "failed": 1}, status['request_counts']
+
+        results = client.results(status)
+        assert results['student-1']['score'] == "7/10"
+        assert results['student-1']['score_normalized']['percentage'] == 70.0
+        assert results['student-1']['grading_method'] == "OpenAI Batch API"
+        assert 'error' in results['student-3']
+        print(f"✓ Ingested {len(results)} results: 2 graded, 1 failed request reported")
+    finally:
+        server.stop()
+
+
+def test_gemini_batch_files():
+    """Gemini batch input lines use the key/request format and its output parses."""
+    from grader.batch_jobs import build_batch_request, parse_batch_output
+
+    line = build_batch_request("student-1", "Grade this", provider='gemini')
+    assert line['key'] == "student-1"
+    assert line['request']['contents'][0]['parts'][0]['text'] == "Grade this"
+
+    output = "\n".join(json.dumps(record) for record in [
+        {"key": "student-1", "response": {"candidates": [{"content": {"parts": [
+            {"text": "```json\n{\"score\": \"9/10\", \"feedback\": \"Strong thesis.\"}\n```"}]}}]}},
+        {"key": "student-2", "error": {"code": 8, "message": "Resource exhausted"}},
+    ])
+    results = parse_batch_output(output, provider='gemini')
+    assert results['student-1']['score'] == "9/10"
+    assert results['student-1']['grading_method'] == "Gemini batch prediction"
+    assert 'error' in results['student-2']
+    print("✓ Gemini batch input and output formats")
+
+
+def test_exact_answers_scored_locally():
+    """Correct exact answers are scored locally; the batch grades the rest and the scores are merged."""
+    from grader.batch_jobs import prepare_batch, merge_local_scores, parse_batch_output
+
+    rubric = """Quiz (6 points total)
+1. What is 3 x 4? Answer: 12 (2 points)
+2. Explain why the sky is blue (4 points)"""
+    submissions = {"student-1": "1. 12\n2. Light scatters off air molecules.",
+                   "student-2": "1. 13\n2. The sea reflects onto the sky."}
+    batch_requests, local_results = prepare_batch(
+        [{"custom_id": key, "text": text} for key, text in submissions.items()], "Quiz", rubric)
+    prompts = [r['body']['messages'][1]['content'] for r in batch_requests]
+    assert len(prompts) == 2 and not local_results, local_results
+    assert "Grade only question 2, worth 4 points in total" in prompts[0], prompts[0]
+    assert "Grading note" not in prompts[1], prompts[1]
+
+    output = json.dumps({"custom_id": "student-1", "response": {"status_code": 200, "body": {"choices": [
+        {"message": {"content": "{\"score\": \"3/4\", \"feedback\": \"Mostly right.\"}"}}]}}})
+    results = merge_local_scores(parse_batch_output(output), submissions, rubric)
+    assert results["student-1"]['score'] == "5/6", results["student-1"]
+    assert results["student-1"]['score_normalized']['earned'] == 5.0, results["student-1"]
+    assert results["student-1"]['feedback'].startswith("**Automatically scored questions:**")
+    print(f"✓ Batch result merged with local scores: {results['student-1']['score']}")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_gemini_batch_files()
+        test_batch_round_trip()
+        test_exact_answers_scored_locally()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Batch job tests passed")
+    else:
+        print("\n❌ Batch job tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
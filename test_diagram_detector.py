@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the local diagram/MCQ detector: connected-component labeling,
+the answer-bubble grid finder and the feature classifier, on small arrays.
+"""
+
+import sys
+import os
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ring(canvas, cx, cy, radius, width=2):
+    ys, xs = np.ogrid[:canvas.shape[0], :canvas.shape[1]]
+    distance = np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2)
+    canvas |= (distance <= radius) & (distance > radius - width)
+
+
+def _features(**overrides):
+    features = {"ink_ratio": 0.05, "edge_density": 0.02, "horizontal_lines": 0, "vertical_lines": 0,
+                "components": 400, "text_height": 10.0, "bubbles": 0, "figures": 0, "text_ink_ratio": 0.9}
+    features.update(overrides)
+    return features
+
+
+def test_connected_components():
+    """Components are 8-connected, with their areas and bounding boxes."""
+    from image_processor.diagram_detector import connected_components
+
+    binary = np.array([
+        [1, 1, 0, 0, 0, 0],
+        [0, 1, 0, 0, 1, 1],
+        [0, 0, 1, 0, 1, 1],
+        [0, 0, 0, 0, 0, 0],
+        [1, 0, 1, 0, 1, 0],
+        [1, 1, 1, 0, 0, 1],
+    ], dtype=bool)
+    components = connected_components(binary)
+    found = sorted(zip(components['area'].tolist(), components['left'].tolist(), components['top'].tolist(),
+                       components['right'].tolist(), components['bottom'].tolist()))
+    # The diagonal stroke, the square, the U shape and the diagonal pair
+    assert found == [(2, 4, 4, 6, 6), (4, 0, 0, 3, 3), (4, 4, 1, 6, 3), (5, 0, 4, 3, 6)], found
+
+    empty = connected_components(np.zeros((4, 4), dtype=bool))
+    assert all(len(values) == 0 for values in empty.values()), empty
+    print(f"✓ {len(found)} components labeled with areas and boxes")
+
+
+def test_bubble_grid():
+    """Aligned rows of rings count as bubbles; a lone row or scattered rings do not."""
+    from image_processor.diagram_detector import connected_components, _bubble_grid
+
+    grid = np.zeros((120, 200), dtype=bool)
+    for row in range(3):
+        for column in range(4):
+            _ring(grid, 30 + column * 40, 20 + row * 40, 9)
+    assert _bubble_grid(connected_components(grid), 6.0) == 12
+
+    single_row = np.zeros((120, 200), dtype=bool)
+    for column in range(4):
+        _ring(single_row, 30 + column * 40, 60, 9)
+    assert _bubble_grid(connected_components(single_row), 6.0) == 0
+
+    scattered = np.zeros((120, 200), dtype=bool)
+    for cx, cy in ((20, 15), (150, 30), (70, 55), (180, 80), (40, 100), (110, 105)):
+        _ring(scattered, cx, cy, 9)
+    assert _bubble_grid(connected_components(scattered), 6.0) == 0
+
+    solid = np.zeros((120, 200), dtype=bool)
+    for row in range(3):
+        for column in range(4):
+            solid[12 + row * 40:30 + row * 40, 22 + column * 40:40 + column * 40] = True
+    assert _bubble_grid(connected_components(solid), 6.0) == 0, "Solid squares counted as bubbles"
+    print("✓ Bubble grid found; single rows, scattered rings and squares rejected")
+
+
+def test_classify_features():
+    """Feature thresholds map to diagram types and confidences."""
+    from image_processor.diagram_detector import (
+        classify_features, MCQ_TYPE, TABLE_TYPE, CHART_TYPE, FIGURE_TYPE
+    )
+
+    plain = classify_features(_features())
+    assert not plain['has_diagrams'] and plain['confidence'] == 'high', plain
+    assert classify_features(_features(text_ink_ratio=0.7))['confidence'] == 'medium'
+    assert classify_features(_features(text_ink_ratio=0.5))['confidence'] == 'low'
+
+    bubbles = classify_features(_features(bubbles=12))
+    assert bubbles['diagram_types'] == [MCQ_TYPE] and bubbles['confidence'] == 'high', bubbles
+    assert classify_features(_features(bubbles=6))['confidence'] == 'low'
+    assert classify_features(_features(bubbles=5))['has_diagrams'] is False
+
+    options = "1. Which is prime?\nA) 4\nB) 6\nC) 7\nD) 9"
+    assert classify_features(_features(), options)['diagram_types'] == [MCQ_TYPE]
+
+    table = classify_features(_features(horizontal_lines=4, vertical_lines=5))
+    assert table['diagram_types'] == [TABLE_TYPE] and table['confidence'] == 'high', table
+    chart = classify_features(_features(horizontal_lines=1, vertical_lines=1, figures=1, text_ink_ratio=0.3))
+    assert chart['diagram_types'] == [CHART_TYPE, FIGURE_TYPE] and chart['confidence'] == 'high', chart
+    print("✓ Features classified into MCQ, table, chart and figure results")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_connected_components()
+        test_bubble_grid()
+        test_classify_features()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Diagram detector tests passed")
+    else:
+        print("\n❌ Diagram detector tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
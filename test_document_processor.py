@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for per-page PDF text extraction: pages whose OCR fails are
+left out of the merged text.
+
+Page rasterization is replaced with the source images, so Poppler is not
+needed.
+"""
+
+import sys
+import os
+import io
+
+from PIL import Image, ImageDraw
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _scanned_pdf(pages):
+    """An image-only PDF, like a scan, and its page images."""
+    images = []
+    for number in range(1, pages + 1):
+        image = Image.new('RGB', (850, 1100), 'white')
+        draw = ImageDraw.Draw(image)
+        for line in range(number * 3):
+            draw.line((80, 100 + line * 40, 700 - number * 20, 110 + line * 40), fill='black', width=3)
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', save_all=True, append_images=images[1:])
+    return buffer.getvalue(), images
+
+
+def test_failed_page_left_out():
+    """A page whose OCR raises is reported as failed and kept out of the merged text."""
+    from file_processor import document_processor
+    from image_processor import ocr
+
+    pdf, images = _scanned_pdf(3)
+    read = []
+
+    def extract(image_bytes, assignment_type=None):
+        read.append(image_bytes)
+        if len(read) == 2:
+            raise RuntimeError("vision timeout")
+        return f"Answer on page {len(read)}"
+
+    rasterize, extract_text = document_processor._rasterize_pdf_page, ocr.extract_text_from_image
+    document_processor._rasterize_pdf_page = lambda content, page_number, dpi=300: images[page_number - 1]
+    ocr.extract_text_from_image = extract
+    try:
+        pages = document_processor.extract_pdf_pages(pdf)
+        read.clear()
+        text = document_processor._extract_text_from_pdf(pdf)
+    finally:
+        document_processor._rasterize_pdf_page, ocr.extract_text_from_image = rasterize, extract_text
+
+    assert [page['method'] for page in pages] == ['vision', 'failed', 'vision'], pages
+    assert pages[1]['text'] == '' and pages[1]['error'] == 'vision timeout', pages[1]
+    assert text == "--- Page 1 ---\nAnswer on page 1\n\n--- Page 3 ---\nAnswer on page 3", text
+    print("✓ Failed page 2 reported separately and left out of the text")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_failed_page_left_out()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Document processor tests passed")
+    else:
+        print("\n❌ Document processor tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the running grade statistics: the Welford mean and variance,
+the fixed-bin percentile sketch, and rebuilding when the grades file is
+written by another process.
+"""
+
+import sys
+import os
+import json
+import statistics
+import tempfile
+
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+PERCENTAGES = [72.5, 88.0, 91.25, 64.0, 100.0, 55.5, 79.0, 83.75, 97.0, 68.0, 88.0]
+
+
+def _grade(student_id, percentage, class_id="c1", assignment_id="a1"):
+    return {
+        "student_id": student_id,
+        "class_id": class_id,
+        "assignment_id": assignment_id,
+        "score": f"{percentage}%",
+        "score_normalized": {"earned": percentage, "possible": 100.0, "percentage": percentage,
+                             "status": "graded"}
+    }
+
+
+class _Grades:
+    """A grades file with a loader that counts its reads."""
+
+    def __init__(self, directory, grades):
+        self.path = os.path.join(directory, 'grades.json')
+        self.loads = 0
+        self.write(grades)
+
+    def write(self, grades):
+        with open(self.path, 'w') as f:
+            json.dump(grades, f)
+
+    def read(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def load(self):
+        self.loads += 1
+        return self.read()
+
+    def signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def test_welford_matches_statistics():
+    """Mean, variance, min and max agree with the statistics module."""
+    from analytics import RunningStats
+
+    stats = RunningStats()
+    for percentage in PERCENTAGES + [None]:
+        stats.add(percentage)
+
+    assert stats.count == len(PERCENTAGES) + 1 and stats.scored_count == len(PERCENTAGES)
+    assert abs(stats.mean - statistics.mean(PERCENTAGES)) < 1e-9, stats.mean
+    assert abs(stats.variance - statistics.variance(PERCENTAGES)) < 1e-9, stats.variance
+    summary = stats.to_dict()
+    assert summary['std_dev'] == round(statistics.stdev(PERCENTAGES), 2), summary
+    assert (summary['min'], summary['max']) == (55.5, 100.0), summary
+    assert summary['unscored_count'] == 1
+    print(f"✓ Welford mean {summary['mean']} and variance {summary['variance']} match statistics")
+
+
+def test_sketch_percentiles():
+    """Sketch percentiles are the nearest-rank percentiles to within one bin."""
+    from analytics.stats import ScoreSketch, SKETCH_BIN_WIDTH
+
+    sketch = ScoreSketch()
+    for percentage in PERCENTAGES:
+        sketch.add(percentage)
+
+    for q in (10, 25, 50, 75, 90, 100):
+        expected = np.percentile(PERCENTAGES, q, method='inverted_cdf')
+        assert abs(sketch.percentile(q) - expected) <= SKETCH_BIN_WIDTH, (q, sketch.percentile(q), expected)
+    histogram = sketch.histogram()
+    assert sum(histogram.values()) == len(PERCENTAGES)
+    assert histogram['80-89'] == 3 and histogram['90-100'] == 3, histogram
+    assert ScoreSketch().percentile(50) is None
+    print("✓ Sketch percentiles within one bin of numpy's nearest rank")
+
+
+def test_rebuilds_after_other_writes():
+    """Own writes update the store in place; writes from elsewhere trigger a rebuild."""
+    from analytics import GradeStatsStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        grades_file = _Grades(directory, [_grade(f"s{i}", p) for i, p in enumerate(PERCENTAGES[:5])])
+        store = GradeStatsStore(grades_file.load, grades_file.signature)
+        assert store.graded_count('c1') == 5 and grades_file.loads == 1
+
+        # This process writes a grade: applied in place
+        previous_signature = grades_file.signature()
+        grade = _grade("s5", PERCENTAGES[5])
+        grades_file.write(grades_file.read() + [grade])
+        store.record(grade, previous_signature)
+        assert store.graded_count('c1') == 6 and grades_file.loads == 1, grades_file.loads
+
+        # Another worker writes a grade just before this process writes one
+        grades_file.write(grades_file.read() + [_grade("s6", PERCENTAGES[6])])
+        previous_signature = grades_file.signature()
+        grade = _grade("s7", PERCENTAGES[7])
+        grades_file.write(grades_file.read() + [grade])
+        store.record(grade, previous_signature)
+        assert store.graded_count('c1') == 8, "Other worker's grade absorbed without a rebuild"
+        assert grades_file.loads == 2, grades_file.loads
+
+        stats = store.assignment_stats('a1')
+        assert stats['mean'] == round(statistics.mean(PERCENTAGES[:8]), 2), stats
+    print("✓ Own writes applied in place, other writes rebuilt from the file")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_welford_matches_statistics()
+        test_sketch_percentiles()
+        test_rebuilds_after_other_writes()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Grade statistics tests passed")
+    else:
+        print("\n❌ Grade statistics tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized gradebook analytics: the pandas score
+normalization and per-assignment/per-student aggregates must agree with the
+per-record results of the scoring module.
+"""
+
+import sys
+import os
+import math
+import statistics
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+RAW_SCORES = ["7/10", "85%", " 9/10 ", 8, "8", "Error: timeout", "N/A", "12/10", "-5%", "3.5/4", "100%",
+              {"total_score": "6/10"}, {"percentage": 72.5}, None]
+
+
+def _grades():
+    """Grade records for three assignments: normalized, legacy and unusable scores."""
+    from scoring import normalize_score
+
+    grades = []
+    scores = [("s1", "a1", "8/10"), ("s2", "a1", "55%"), ("s3", "a1", "9/10"), ("s4", "a1", "Error: down"),
+              ("s1", "a2", "6/10"), ("s2", "a2", "70%"), ("s3", "a2", "19/20"), ("s4", "a2", "8"),
+              ("s1", "a3", "9/10"), ("s2", "a3", "60%"), ("s3", "a3", "100%")]
+    for i, (student_id, assignment_id, score) in enumerate(scores):
+        grade = {
+            "id": f"g{i}",
+            "class_id": "c1",
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "score": score,
+            "feedback": "Synthetic feedback",
+            "graded_at": f"2025-09-{int(assignment_id[1:]):02d}T10:00:{i:02d}"
+        }
+        # Every other record predates score normalization
+        if i % 2 == 0:
+            grade["score_normalized"] = normalize_score(score)
+        grades.append(grade)
+    return grades
+
+
+def test_score_column_matches_scoring():
+    """normalize_score_column gives each raw score the same percentage as score_to_percentage."""
+    import pandas as pd
+    from analytics.gradebook import normalize_score_column, _raw_score
+    from scoring import score_to_percentage
+
+    raw_scores = pd.Series([_raw_score({"score": score}) for score in RAW_SCORES], dtype=object)
+    column = normalize_score_column(raw_scores)
+    for score, percentage in zip(RAW_SCORES, column):
+        expected = score_to_percentage(score)
+        if expected is None:
+            assert math.isnan(percentage), (score, percentage)
+        else:
+            assert percentage == expected, (score, percentage, expected)
+    assert column.notna().sum() == 7, column.tolist()
+    print(f"✓ {len(RAW_SCORES)} raw scores normalized like scoring does")
+
+
+def test_frame_matches_records():
+    """The grades frame's percentages are each record's grade_percentage."""
+    from analytics.gradebook import build_grades_frame
+    from scoring import grade_percentage
+
+    grades = _grades()
+    frame = build_grades_frame(grades)
+    for grade, percentage in zip(grades, frame['percentage']):
+        expected = grade_percentage(grade)
+        if expected is None:
+            assert math.isnan(percentage), (grade['score'], percentage)
+        else:
+            assert percentage == expected, (grade['score'], percentage, expected)
+    print("✓ Frame percentages match grade_percentage for normalized and legacy records")
+
+
+def test_aggregates_match_records():
+    """Distributions and trends agree with statistics over the per-record percentages."""
+    from analytics.gradebook import build_grades_frame, assignment_distributions, student_trends
+    from scoring import grade_percentage
+
+    grades = _grades()
+    frame = build_grades_frame(grades)
+
+    by_assignment = {}
+    by_student = {}
+    for grade in grades:
+        percentage = grade_percentage(grade)
+        if percentage is not None:
+            by_assignment.setdefault(grade['assignment_id'], []).append(percentage)
+            by_student.setdefault(grade['student_id'], []).append(percentage)
+
+    distributions = {row['assignment_id']: row for row in assignment_distributions(frame)}
+    assert sorted(distributions) == sorted(by_assignment), distributions
+    for assignment_id, percentages in by_assignment.items():
+        row = distributions[assignment_id]
+        assert row['count'] == len(percentages), row
+        assert row['mean'] == round(statistics.mean(percentages), 2), row
+        assert row['std'] == round(statistics.stdev(percentages), 2), row
+        assert (row['min'], row['max']) == (min(percentages), max(percentages)), row
+        assert row['median'] == round(statistics.median(percentages), 2), row
+
+    trends = {row['student_id']: row for row in student_trends(frame)}
+    assert sorted(trends) == sorted(by_student), trends
+    for student_id, percentages in by_student.items():
+        row = trends[student_id]
+        assert row['assignments_graded'] == len(percentages), row
+        assert row['mean'] == round(statistics.mean(percentages), 2), row
+        assert row['latest'] == percentages[-1], row
+        if len(percentages) > 1:
+            slope = statistics.linear_regression(range(len(percentages)), percentages).slope
+            assert row['slope_per_assignment'] == round(slope, 2), row
+    print(f"✓ Aggregates for {len(by_assignment)} assignments and {len(by_student)} students match")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_score_column_matches_scoring()
+        test_frame_matches_records()
+        test_aggregates_match_records()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Gradebook analytics tests passed")
+    else:
+        print("\n❌ Gradebook analytics tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
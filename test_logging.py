@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for structured logging: redaction, sampling and request IDs.
+"""
+
+import sys
+import os
+import io
+import json
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+
+def _records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines() if line.strip()]
+
+
+def test_payload_redaction():
+    """Payloads are redacted and truncated before they reach a record."""
+    from logs import payload
+
+    text = ("**STUDENT: Jane Doe**\nName: Jane Doe\nContact jane.doe@school.org or 555-123-4567\n"
+            "1. Mitochondria produce ATP.")
+    redacted = payload(text, limit=1000)
+    assert "Jane" not in redacted and "jane.doe" not in redacted and "555" not in redacted, redacted
+    assert "**STUDENT: [name]**" in redacted and "[email]" in redacted and "[phone]" in redacted, redacted
+    assert "Mitochondria produce ATP" in redacted, redacted
+
+    truncated = payload("x" * 500, limit=100)
+    assert truncated.startswith("x" * 100) and truncated.endswith("[400 more chars]"), truncated
+    print(f"✓ Redacted payload: {redacted!r}")
+
+
+def test_sampling_and_fields():
+    """DEBUG records are sampled; other levels always pass with their extra fields."""
+    from logs import configure_logging, get_logger, set_request_id
+    from config import Config
+
+    stream = io.StringIO()
+    previous_rate = Config.LOG_DEBUG_SAMPLE_RATE
+    Config.LOG_DEBUG_SAMPLE_RATE = 0.0
+    try:
+        configure_logging(level='DEBUG', fmt='json', stream=stream, force=True)
+        logger = get_logger('test')
+        set_request_id('req-123')
+        for _ in range(50):
+            logger.debug("noisy detail", extra={'content': 'x'})
+        logger.warning("graded", extra={'pages': 3})
+    finally:
+        Config.LOG_DEBUG_SAMPLE_RATE = previous_rate
+        configure_logging(force=True)
+
+    records = _records(stream)
+    assert len(records) == 1, records
+    record = records[0]
+    assert record['level'] == 'warning' and record['msg'] == 'graded' and record['pages'] == 3, record
+    assert record['request_id'] == 'req-123' and record['logger'] == 'snapgrade.test', record
+    print(f"✓ Sampled DEBUG records, kept: {record}")
+
+
+def test_request_id_header():
+    """Requests get a correlation ID that is echoed back and stamped on their records."""
+    from app import create_app
+    from logs import configure_logging
+    from backends import set_backend
+    from backends.fake import FakeBackend
+
+    app = create_app()
+    stream = io.StringIO()
+    previous = set_backend(FakeBackend())
+    configure_logging(fmt='json', stream=stream, force=True)
+    try:
+        client = app.test_client()
+        response = client.post('/grade', headers={'X-Request-ID': 'trace-42'}, json={
+            'assignment_type': 'Quiz',
+            'submission': '1. B\n2. The cell membrane controls what enters the cell.',
+            'rubric': 'Quiz (4 points total)\n1. Answer B (2 points)\n2. Membrane function (2 points)'
+        })
+        generated = client.post('/grade', json={}).headers.get('X-Request-ID')
+    finally:
+        set_backend(previous)
+        configure_logging(force=True)
+
+    assert response.status_code == 200, response.get_json()
+    assert response.headers.get('X-Request-ID') == 'trace-42'
+    assert generated and generated != 'trace-42', generated
+
+    handled = [r for r in _records(stream) if r['msg'] == 'Request handled']
+    assert [r['request_id'] for r in handled] == ['trace-42', generated], handled
+    assert handled[0]['endpoint'] == 'grade' and handled[0]['status'] == 200, handled
+    print(f"✓ Request IDs: {[r['request_id'] for r in handled]}")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_payload_redaction()
+        test_sampling_and_fields()
+        test_request_id_header()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Logging tests passed")
+    else:
+        print("\n❌ Logging tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for local checking of numeric and algebraic final answers.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_numbers():
+    """Equal values match across fractions, percentages, separators and units."""
+    from grader.math_checker import answers_equivalent
+
+    matching = [('3/4', '0.75'), ('1 1/2', '1.5'), ('45%', '0.45'), ('1,200', '1200'),
+                ('12 cm', '12'), ('x = 5', '5'), ('-2', '-2.0')]
+    different = [('3/4', '0.7'), ('12 cm', '12 m'), ('5', '6'), ('45%', '45')]
+    for expected, given in matching:
+        assert answers_equivalent(expected, given), (expected, given)
+    for expected, given in different:
+        assert not answers_equivalent(expected, given), (expected, given)
+    print(f"✓ {len(matching)} equal and {len(different)} different numbers")
+
+
+def test_rounded_keys():
+    """Only a key with two or more decimals accepts more precise work that rounds to it."""
+    from grader.math_checker import answers_equivalent
+
+    accepted = [('3.14', '3.14159'), ('1.41', '1.414'), ('2.72 m', '2.718 m')]
+    rejected = [('0.5', '0.46'), ('2.5', '2.54'), ('12.5 m', '12.549 m'), ('3.14', '3.1'),
+                ('3.14', '3.146'), ('3.14', '3')]
+    for expected, given in accepted:
+        assert answers_equivalent(expected, given), (expected, given)
+    for expected, given in rejected:
+        assert not answers_equivalent(expected, given), (expected, given)
+    print(f"✓ {len(accepted)} rounded matches accepted, {len(rejected)} wrong answers rejected")
+
+
+def test_expressions():
+    """Expressions match when equal at sample points; equations must solve for the same variable."""
+    from grader.math_checker import answers_equivalent
+
+    assert answers_equivalent('2x + 3', '3 + 2x')
+    assert answers_equivalent('(x+1)^2', 'x^2 + 2x + 1')
+    assert answers_equivalent('y = 2x + 1', 'y=1+2x')
+    assert not answers_equivalent('2x + 3', '2x + 4')
+    assert not answers_equivalent('y = 2x + 1', 'x = 2x + 1')
+    assert not answers_equivalent('x = 5', 'y = 5')
+    print("✓ Expressions and equations compared")
+
+
+def test_unsafe_input():
+    """Large or nested powers and arbitrary code are not evaluated."""
+    from grader.math_checker import parse_answer
+
+    assert parse_answer('2^10')['value'] == 1024
+    assert parse_answer('(x^3)^4')['kind'] == 'expression'
+    for text in ['9^13', '((9**12)**12)**12', '(x^3)^5', '2^2^2^2', '__import__("os")']:
+        assert parse_answer(text) is None, text
+    print("✓ Unsafe input rejected")
+
+
+def test_check_final_answer():
+    """The last line of a student's work is compared with the key."""
+    from grader.math_checker import check_final_answer
+
+    result = check_final_answer('x = 4', 'Step 1: 2x = 8\nx = 4')
+    assert result['is_correct'] and result['parsed'], result
+    result = check_final_answer('x = 4', '2x = 8\nx = 5')
+    assert not result['is_correct'] and result['parsed'], result
+    result = check_final_answer('Photosynthesis', 'light energy')
+    assert not result['parsed'], result
+    print("✓ Final answers checked")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_numbers()
+        test_rounded_keys()
+        test_expressions()
+        test_unsafe_input()
+        test_check_final_answer()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Math checker tests passed")
+    else:
+        print("\n❌ Math checker tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for stage timing and the Prometheus metrics page.
+"""
+
+import sys
+import os
+import threading
+import tempfile
+import time
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+
+def test_spans():
+    """Spans record durations, calls and errors as a decorator and a context manager."""
+    import metrics
+    from metrics import span, get_stage_stats, render_prometheus
+
+    metrics.reset()
+
+    @span('unit_decorated', provider='fake')
+    def slow(seconds):
+        time.sleep(seconds)
+
+    threads = [threading.Thread(target=slow, args=(0.02 * (i + 1),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        with span('unit_block'):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    stats = get_stage_stats()
+    decorated = stats['unit_decorated/fake']
+    assert decorated['calls'] == 4 and decorated['errors'] == 0, decorated
+    assert 0.19 <= decorated['total_seconds'] < 0.4, decorated
+    assert stats['unit_block/local']['errors'] == 1, stats
+    print(f"✓ Spans recorded: {decorated}")
+
+    page = render_prometheus()
+    assert '# TYPE snapgrade_stage_duration_seconds histogram' in page
+    assert 'snapgrade_stage_duration_seconds_bucket{stage="unit_decorated",provider="fake",le="0.05"} 2' in page
+    assert 'snapgrade_stage_duration_seconds_bucket{stage="unit_decorated",provider="fake",le="+Inf"} 4' in page
+    assert 'snapgrade_stage_errors_total{stage="unit_block",provider="local"} 1' in page
+    print("✓ Histogram buckets are cumulative")
+
+
+def test_metrics_endpoint():
+    """/metrics serves stage timings, request timings and module stats."""
+    import metrics
+    from app import create_app
+    from backends import set_backend
+    from backends.fake import FakeBackend
+
+    app = create_app()
+    metrics.reset()
+    previous = set_backend(FakeBackend())
+    try:
+        client = app.test_client()
+        response = client.post('/grade', json={
+            'assignment_type': 'Quiz',
+            'submission': '1. B\n2. The cell membrane controls what enters the cell.',
+            'rubric': 'Quiz (4 points total)\n1. Answer B (2 points)\n2. Membrane function (2 points)'
+        })
+        assert response.status_code == 200, response.get_json()
+
+        page = client.get('/metrics').get_data(as_text=True)
+    finally:
+        set_backend(previous)
+
+    assert 'snapgrade_stage_calls_total{stage="grade",provider="local"} 1' in page, page
+    assert 'snapgrade_stage_calls_total{stage="grade",provider="fake"} 1' in page, page
+    assert 'snapgrade_http_request_duration_seconds_count{endpoint="grade",method="POST",status="200"} 1' in page
+    assert 'snapgrade_backend_calls{key="grade"}' in page
+    assert '# TYPE snapgrade_ocr_pages gauge' in page
+    print("✓ /metrics includes stages, requests and module stats")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_spans()
+        test_metrics_endpoint()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Metrics tests passed")
+    else:
+        print("\n❌ Metrics tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
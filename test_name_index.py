@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the fuzzy student-name index and its reloading when the
+roster file changes.
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+STUDENTS = [
+    {"id": "s1", "class_id": "c1", "name": "Ada Lovelace"},
+    {"id": "s2", "class_id": "c1", "name": "Ben Carter"},
+    {"id": "s3", "class_id": "c2", "name": "Chloe Nguyen"},
+]
+
+
+class _Roster:
+    """A students file with a loader that counts its reads."""
+
+    def __init__(self, directory, students):
+        self.path = os.path.join(directory, 'students.json')
+        self.loads = 0
+        self.write(students)
+
+    def write(self, students):
+        with open(self.path, 'w') as f:
+            json.dump(students, f)
+
+    def load(self):
+        self.loads += 1
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def test_fuzzy_match():
+    """Misspelled and partial names match within a class; ambiguous ones do not."""
+    from roster import StudentNameIndex
+
+    index = StudentNameIndex(lambda: STUDENTS)
+    student, _ = index.best_match("Ada Lovelance", "c1")
+    assert student and student['id'] == 's1', student
+    student, _ = index.best_match("B. Carter", "c1")
+    assert student and student['id'] == 's2', student
+    assert index.best_match("Chloe Nguyen", "c1")[0] is None, "Matched a student of another class"
+    print("✓ Misspelled and partial names matched")
+
+
+def test_reloads_when_roster_changes():
+    """The index is rebuilt when the students file changes, not after its own updates."""
+    from roster import StudentNameIndex
+
+    with tempfile.TemporaryDirectory() as directory:
+        roster = _Roster(directory, STUDENTS)
+        index = StudentNameIndex(roster.load, roster.signature)
+        assert index.best_match("Dev Patel", "c1")[0] is None
+        assert index.best_match("Ada Lovelace", "c1")[0]['id'] == 's1'
+        assert roster.loads == 1, roster.loads
+
+        # Another process adds a student and renames one
+        students = [dict(s, name="Ada Byron") if s['id'] == 's1' else s for s in STUDENTS]
+        students.append({"id": "s4", "class_id": "c1", "name": "Dev Patel"})
+        roster.write(students)
+        assert index.best_match("Dev Patel", "c1")[0]['id'] == 's4'
+        assert index.best_match("Ada Byron", "c1")[0]['id'] == 's1'
+        assert index.best_match("Ada Lovelace", "c1")[0] is None
+        assert roster.loads == 2, roster.loads
+
+        # This process adds a student: the index is updated in place
+        new_student = {"id": "s6", "class_id": "c2", "name": "Farah Khan"}
+        roster.write(students + [new_student])
+        index.add(new_student)
+        assert index.best_match("Farah Kahn", "c2")[0]['id'] == 's6'
+        assert roster.loads == 2, roster.loads
+    print("✓ Roster changes on disk picked up, own updates applied in place")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_fuzzy_match()
+        test_reloads_when_roster_changes()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Name index tests passed")
+    else:
+        print("\n❌ Name index tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline bubble-sheet (OMR) grader: registration from the
+corner markers, scoring against the rubric's answer key, and leaving pages
+that are not bubble sheets to the other graders.
+"""
+
+import sys
+import os
+import io
+
+from PIL import Image, ImageDraw
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE = (1275, 1650)  # Letter at 150 dpi
+MARKER = 40
+RADIUS = 14
+KEY = {1: "A", 2: "C", 3: "B", 4: "D", 5: "A", 6: "B", 7: "C", 8: "D"}
+RUBRIC = "Unit quiz answer key\n" + "\n".join(f"{q}. {letter}" for q, letter in KEY.items())
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _sheet(marks, angle=0):
+    """Render an eight-question, four-option sheet with the given marks ({question: [letters]})."""
+    image = Image.new('L', PAGE, 255)
+    draw = ImageDraw.Draw(image)
+    for x, y in ((50, 50), (PAGE[0] - 50 - MARKER, 50), (50, PAGE[1] - 50 - MARKER),
+                 (PAGE[0] - 50 - MARKER, PAGE[1] - 50 - MARKER)):
+        draw.rectangle((x, y, x + MARKER, y + MARKER), fill=0)
+    # A row of bubble-sized rings printed in the top margin, outside the grid
+    for o in range(4):
+        x = 300 + o * 70
+        draw.ellipse((x - RADIUS, 95 - RADIUS, x + RADIUS, 95 + RADIUS), outline=0, width=2)
+    for q in range(len(KEY)):
+        column, row = divmod(q, 4)
+        base_x, y = 300 + column * 520, 300 + row * 80
+        for o in range(4):
+            x = base_x + o * 70
+            draw.ellipse((x - RADIUS, y - RADIUS, x + RADIUS, y + RADIUS), outline=0, width=2)
+        for letter in marks.get(q + 1, []):
+            x = base_x + "ABCD".index(letter) * 70
+            draw.ellipse((x - RADIUS + 2, y - RADIUS + 2, x + RADIUS - 2, y + RADIUS - 2), fill=20)
+    if angle:
+        image = image.rotate(angle, expand=True, fillcolor=235, resample=Image.BILINEAR)
+    return _png(image)
+
+
+def test_registration():
+    """A rotated sheet is warped back into the canonical frame."""
+    from image_processor.omr import register_sheet, CANONICAL_SIZE, RegistrationError
+
+    registered = register_sheet(_sheet({}, angle=3))
+    assert registered.shape == (CANONICAL_SIZE[1], CANONICAL_SIZE[0]), registered.shape
+    # The top-left marker lands on its canonical inset
+    assert registered[30:50, 30:50].mean() < 100, registered[30:50, 30:50].mean()
+
+    try:
+        register_sheet(_png(Image.new('L', PAGE, 255)))
+        assert False, "Registered a page without corner markers"
+    except RegistrationError:
+        pass
+    print("✓ Rotated sheet registered, blank page rejected")
+
+
+def test_scoring():
+    """Marks are read and scored against the key; double marks are flagged."""
+    from image_processor.omr import grade_bubble_sheets, parse_answer_key
+
+    answer_key = parse_answer_key(RUBRIC)
+    assert answer_key == KEY, answer_key
+
+    marks = {q: [letter] for q, letter in KEY.items()}
+    marks[2] = ["B"]
+    marks[5] = ["A", "B"]
+    del marks[7]
+    sheet = grade_bubble_sheets([_sheet(marks, angle=-2)], answer_key)[0]
+    assert sheet['registered'] and sheet['layout_questions'] == len(KEY), sheet
+    assert sheet['answers'] == {1: "A", 2: "B", 3: "B", 4: "D", 5: None, 6: "B", 7: None, 8: "D"}, sheet['answers']
+    assert sheet['score'] == "5/8", sheet['score']
+    flags = {q['question']: q['flag'] for q in sheet['questions']}
+    assert flags[5] == "multiple" and flags[7] == "blank" and sheet['needs_review'] == [5], flags
+    print(f"✓ Sheet scored {sheet['score']} with the double mark flagged")
+
+
+def test_non_sheet_left_to_graders():
+    """A written page is not graded as a bubble sheet even when the rubric has a key."""
+    from image_processor.omr import grade_bubble_sheet_if_possible
+
+    page = Image.new('L', PAGE, 255)
+    draw = ImageDraw.Draw(page)
+    for row in range(30):
+        draw.text((120, 120 + row * 45), "The answer to question %d is B because the slope is 2." % (row + 1),
+                  fill=0)
+    assert grade_bubble_sheet_if_possible(_png(page), RUBRIC) is None
+    assert grade_bubble_sheet_if_possible(_sheet({}), "Explain photosynthesis (10 points)") is None
+
+    result = grade_bubble_sheet_if_possible(_sheet({q: [letter] for q, letter in KEY.items()}), RUBRIC)
+    assert result and result['score'] == "8/8" and result['score_normalized']['percentage'] == 100.0, result
+    print("✓ Written page and keyless rubric left to the other graders")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_registration()
+        test_scoring()
+        test_non_sheet_left_to_graders()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ OMR tests passed")
+    else:
+        print("\n❌ OMR tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for the blank and duplicate page filter.
+
+Builds a fixture submission of scanned pages - worksheets, blank backs with
+bleed-through, a duplicate rescan, a page with a single short answer - and
+checks which pages would be sent to vision and how many calls are saved.
+"""
+
+import sys
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_SIZE = (1275, 1650)  # Letter at 150 DPI
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _handwriting(draw, x, y, seed, words=3):
+    """Scribble a few words of pen strokes starting at (x, y)."""
+    rng = random.Random(seed)
+    for _ in range(words):
+        points = [(x, y + rng.randint(-12, 12))]
+        for _ in range(rng.randint(6, 12)):
+            x += rng.randint(8, 16)
+            points.append((x, y + rng.randint(-18, 18)))
+        draw.line(points, fill=25, width=3)
+        x += 30
+
+
+def _worksheet(title, answers_seed, questions=(1, 2, 3, 4, 5)):
+    page = Image.new('L', PAGE_SIZE, 250)
+    draw = ImageDraw.Draw(page)
+    draw.text((150, 100), title, fill=0, font=_font(40))
+    draw.text((150, 170), "Name: ____________________", fill=0, font=_font(28))
+    _handwriting(draw, 300, 185, answers_seed)
+    for row, number in enumerate(questions):
+        y = 300 + row * 250
+        draw.text((150, y), f"{number}. Solve for x: {number + 2}x + {number} = {number * 7}", fill=0, font=_font(28))
+        _handwriting(draw, 200, y + 100, answers_seed * 100 + number, words=4)
+    return page
+
+
+def _scanned(page, seed, noise=6):
+    """Add sensor noise and a slight blur, as a scanner would."""
+    rng = np.random.default_rng(seed)
+    pixels = np.asarray(page.filter(ImageFilter.GaussianBlur(0.8)), dtype=np.float32)
+    pixels += rng.normal(0, noise, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert('RGB')
+
+
+def _blank_back(front, seed):
+    """The back of a page: faint mirrored bleed-through and punch holes."""
+    bleed = ImageOps.mirror(front).point(lambda v: 215 + v * 35 // 255)
+    draw = ImageDraw.Draw(bleed)
+    for y in (250, 825, 1400):
+        draw.ellipse((40, y - 18, 76, y + 18), fill=30)
+    return _scanned(bleed, seed)
+
+
+def _rescan(page, seed):
+    """The same page fed through the scanner again: shifted, skewed, brighter."""
+    moved = page.rotate(0.8, translate=(14, -10), fillcolor=250).point(lambda v: min(255, v + 4))
+    return _scanned(moved, seed, noise=8)
+
+
+def build_fixture():
+    """
+    Build the fixture submission.
+
+    Returns:
+        tuple: (page images, expected kept page numbers, expected skips as
+        {page: (reason, duplicate_of)})
+    """
+    page1 = _worksheet("Algebra Quiz - Page 1", answers_seed=1)
+    page3 = _worksheet("Algebra Quiz - Page 2", answers_seed=2, questions=(6, 7, 8, 9, 10))
+    page5 = _worksheet("Algebra Quiz - Page 2", answers_seed=3, questions=(6, 7, 8, 9, 10))
+
+    short_answer = Image.new('L', PAGE_SIZE, 250)
+    draw = ImageDraw.Draw(short_answer)
+    draw.text((600, 800), "42", fill=20, font=_font(60))
+
+    images = [
+        _scanned(page1, 1),                         # 1 worksheet
+        _blank_back(page1, 2),                      # 2 blank back with bleed-through
+        _scanned(page3, 3),                         # 3 worksheet
+        _rescan(page3, 4),                          # 4 duplicate scan of page 3
+        _scanned(page5, 5),                         # 5 same template, different answers
+        _scanned(Image.new('L', PAGE_SIZE, 248), 6, noise=10),  # 6 blank with noise
+        _scanned(short_answer, 7),                  # 7 a single short answer
+    ]
+    expected_kept = [1, 3, 5, 7]
+    expected_skipped = {2: ("blank", None), 4: ("duplicate", 3), 6: ("blank", None)}
+    return images, expected_kept, expected_skipped
+
+
+def test_page_filter_fixture():
+    """Blank and duplicate pages are skipped and every other page is kept."""
+    from image_processor.page_filter import filter_pages
+
+    print("=== Blank and Duplicate Page Filter Test ===\n")
+    images, expected_kept, expected_skipped = build_fixture()
+    kept, skipped = filter_pages(images)
+
+    kept_pages = [i + 1 for i in kept]
+    skipped_pages = {s['page']: (s['reason'], s['duplicate_of']) for s in skipped}
+    for s in skipped:
+        print(f"  page {s['page']}: {s['reason']}"
+              f"{' of page ' + str(s['duplicate_of']) if s['duplicate_of'] else ''} (ink {s['ink_coverage']})")
+
+    assert kept_pages == expected_kept, f"kept {kept_pages}, expected {expected_kept}"
+    assert skipped_pages == expected_skipped, f"skipped {skipped_pages}, expected {expected_skipped}"
+
+    saved = len(images) - len(kept)
+    print(f"\n✓ Vision calls: {len(kept)} instead of {len(images)} ({saved} pages saved, {saved / len(images):.0%})")
+
+
+def test_never_drops_every_page():
+    """An all-blank upload still sends its first page."""
+    from image_processor.page_filter import filter_pages
+
+    blank = _scanned(Image.new('L', PAGE_SIZE, 250), 8)
+    kept, skipped = filter_pages([blank, blank.copy()])
+    assert kept == [0], f"kept {kept}"
+    assert [s['page'] for s in skipped] == [2]
+    print("✓ All-blank upload keeps its first page")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_page_filter_fixture()
+        test_never_drops_every_page()
+        success = True
+    except AssertionError as e:
+        print(f"✗ {e}")
+        success = False
+
+    if success:
+        print("\n✅ Page filter tests passed")
+    else:
+        print("\n❌ Page filter tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for page-group grading of multi-page PDFs, including pages
+graded offline as bubble sheets.
+"""
+
+import sys
+import os
+
+from PIL import Image
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+RUBRIC = """Unit test (6 points total)
+1. B (1 point)
+2. D (1 point)
+3. Explain osmosis (4 points)
+"""
+
+
+def test_omr_page_merged():
+    """A bubble sheet graded offline is merged with the vision-graded pages question by question."""
+    from grader.page_groups import grade_pdf_page_groups, omr_page_result
+
+    sheet = {"feedback": "Bubble sheet: 1 of 2 correct.", "omr": {"questions": [
+        {"question": 1, "correct_answer": "B", "is_correct": True},
+        {"question": 2, "correct_answer": "D", "is_correct": False},
+        {"question": 3, "correct_answer": None, "is_correct": False}
+    ]}}
+    page = omr_page_result(sheet, 1, RUBRIC)
+    assert page['score'] == "1/2" and [q['question_number'] for q in page['questions']] == [1, 2], page
+
+    prompts = []
+
+    def grade_group(prompt, images):
+        prompts.append(prompt)
+        return {"score": "3/4", "feedback": "Good explanation.", "questions": [
+            {"question_number": 3, "page_number": 2, "points_earned": 3, "points_possible": 4}]}
+
+    images = [Image.new('RGB', (850, 1100), 'white')]
+    result = grade_pdf_page_groups(images, 'Quiz', RUBRIC, grade_group=grade_group, page_numbers=[2],
+                                   graded_pages={1: page})
+    assert len(prompts) == 1 and "2-page" in prompts[0], prompts
+    assert result['score'] == "4/6", result['score']
+    assert result['pages_processed'] == 2 and [p['page_number'] for p in result['individual_pages']] == [1, 2]
+    assert [g['pages'] for g in result['page_groups']] == [[1], [2]], result['page_groups']
+    assert result['feedback'].startswith("**Pages 1:**\nBubble sheet"), result['feedback']
+    print(f"✓ Bubble sheet and vision page merged: {result['score']}")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_omr_page_merged()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Page group tests passed")
+    else:
+        print("\n❌ Page group tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for the rubric compiler: question splitting, exact-answer
+scoring and the rubric sent to the model for the remaining questions.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+RUBRIC = """Algebra quiz
+1. What is 2 + 2? Answer: 4 (1 point)
+2. Solve 2x + 4 = 10 (2 points)
+   1. Subtract 4 from both sides
+   2. Divide both sides by 2
+   Answer: x = 3
+3. Which choice is a prime number? (1 point)
+   Answer: C
+4. Explain why the method in question 2 works (3 points)
+- Mentions inverse operations
+- Checks the solution
+"""
+
+
+def test_compile():
+    """Questions, points, answers and criteria are read from the rubric."""
+    from grader.rubric_compiler import compile_rubric
+
+    compiled = compile_rubric(RUBRIC)
+    questions = {q['number']: q for q in compiled['questions']}
+    assert sorted(questions) == [1, 2, 3, 4], sorted(questions)
+    assert questions[1]['answer'] == '4' and questions[1]['answer_type'] == 'numeric'
+    assert questions[2]['answer'] == 'x = 3' and questions[2]['points'] == 2.0, questions[2]
+    assert questions[2]['criteria'] == ['1. Subtract 4 from both sides', '2. Divide both sides by 2']
+    assert questions[3]['answer'] == 'C' and questions[3]['answer_type'] == 'choice'
+    assert questions[4]['answer'] is None and len(questions[4]['criteria']) == 2
+    assert compiled['total_points'] == 7.0 and compiled['exact_answer_count'] == 3, compiled
+    print(f"✓ Compiled {len(questions)} questions, {compiled['exact_answer_count']} with exact answers")
+
+
+def test_default_points():
+    """Only a plain answer key defaults to one point per question."""
+    from grader.rubric_compiler import compile_rubric
+
+    key = compile_rubric("1. B\n2. 42\n3. D")
+    assert [q['points'] for q in key['questions']] == [1.0, 1.0, 1.0], key['questions']
+    assert key['total_points'] == 3.0, key
+
+    essay = compile_rubric("1. Clear thesis statement\n2. Uses evidence from the text\n3. Correct grammar")
+    assert all(q['points'] is None for q in essay['questions']), essay['questions']
+    assert essay['total_points'] is None, essay
+
+    mixed = compile_rubric("1. B\n2. Explain your reasoning")
+    assert mixed['total_points'] is None, mixed
+    print("✓ One point per question only for plain answer keys")
+
+
+def test_numbered_steps_do_not_split():
+    """Numbered working steps stay with their question in rubrics and submissions."""
+    from grader.rubric_compiler import compile_rubric, score_exact_answers, _split_blocks
+
+    _, blocks = _split_blocks("Q1: Factor x^2 - 1\n1. Difference of squares\n2. (x-1)(x+1)\nQ2: Solve x + 1 = 2")
+    assert list(blocks) == [1, 2], list(blocks)
+    assert blocks[1] == ['Factor x^2 - 1', '1. Difference of squares', '2. (x-1)(x+1)'], blocks[1]
+
+    compiled = compile_rubric(RUBRIC)
+    submission = "1. 4\n2. 2x + 4 = 10\n1. 2x = 6\n2. x = 3\n3. C\n4. We undo each operation.\n7. I checked it"
+    _, student_blocks = _split_blocks(submission, [q['number'] for q in compiled['questions']])
+    assert list(student_blocks) == [1, 2, 3, 4], list(student_blocks)
+    assert student_blocks[4] == ['We undo each operation.', '7. I checked it'], student_blocks[4]
+
+    exact = score_exact_answers(compiled, submission)
+    assert [item['number'] for item in exact['scored']] == [1, 2, 3], exact
+    assert all(item['is_correct'] for item in exact['scored']), exact['scored']
+    assert exact['remaining'] == [4] and exact['earned'] == 4.0, exact
+    print("✓ Numbered steps kept within their questions")
+
+
+def test_wrong_answers():
+    """Wrong choices score zero; wrong math is left for the model's partial credit."""
+    from grader.rubric_compiler import compile_rubric, score_exact_answers
+
+    exact = score_exact_answers(compile_rubric(RUBRIC), "1. 5\n2. x = 4\n3. B\n4. Because.")
+    scored = {item['number']: item for item in exact['scored']}
+    assert list(scored) == [3] and not scored[3]['is_correct'] and scored[3]['points_earned'] == 0, scored
+    assert exact['remaining'] == [1, 2, 4], exact['remaining']
+    print("✓ Wrong choice scored zero, wrong math left for the model")
+
+
+def test_model_gets_teacher_rubric():
+    """The model gets the rubric as written, scoped to the questions left to grade."""
+    from grader.engine import _plan_grading
+
+    submission = "1. 4\n2. x = 3\n3. C\n4. We undo each operation."
+    _, exact, model_rubric = _plan_grading(submission, RUBRIC)
+    assert exact['remaining'] == [4], exact
+    assert model_rubric.startswith(RUBRIC.rstrip()), model_rubric
+    assert "questions 1, 2 and 3 were scored automatically" in model_rubric, model_rubric
+    assert "Grade only question 4, worth 3 points in total, and give the score out of 3." in model_rubric
+    print("✓ Remaining questions graded against the teacher's rubric")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_compile()
+        test_default_points()
+        test_numbered_steps_do_not_split()
+        test_wrong_answers()
+        test_model_gets_teacher_rubric()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Rubric compiler tests passed")
+    else:
+        print("\n❌ Rubric compiler tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for score normalization into the canonical score record.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_explicit_scales():
+    """Fractions, percentages and structured results are scored on their own scale."""
+    from scoring import normalize_score
+
+    assert normalize_score("7/10") == {"earned": 7.0, "possible": 10.0, "percentage": 70.0, "status": "graded"}
+    assert normalize_score("85%")['percentage'] == 85.0
+    assert normalize_score({"total_score": "3/4"})['percentage'] == 75.0
+    assert normalize_score({"percentage": 90})['percentage'] == 90.0
+    assert normalize_score({"percentage": "90%"})['percentage'] == 90.0
+    assert normalize_score("Error: provider down")['status'] == "error"
+    assert normalize_score("N/A")['status'] == "unscored"
+    print("✓ Fractions, percentages and errors normalized")
+
+
+def test_bare_numbers_need_a_total():
+    """A bare number is points out of a known total, never a percentage by default."""
+    from scoring import normalize_score, normalize_grading_result
+
+    for score in (8, 8.0, "8", " 8 "):
+        assert normalize_score(score)['status'] == "unscored", score
+        assert normalize_score(score, 10) == {"earned": 8.0, "possible": 10.0, "percentage": 80.0,
+                                              "status": "graded"}, score
+    assert normalize_score(float('nan'), 10)['status'] == "unscored"
+    assert normalize_score(8, 0)['status'] == "unscored"
+    assert normalize_grading_result({"score": "8", "feedback": "Good"}, 10)['percentage'] == 80.0
+    assert normalize_grading_result({"score": 8, "feedback": {"total_score": "8/10"}})['percentage'] == 80.0
+    print("✓ Bare numbers scored only against a known total")
+
+
+def test_out_of_range_scores():
+    """Scores below zero or above their total are left unscored."""
+    from scoring import normalize_score
+
+    for score, possible in ((12, 10), (-1, 10), ("12/10", None), ("-2/10", None), ("150%", None),
+                            ("-5%", None), ({"percentage": 101}, None)):
+        assert normalize_score(score, possible)['status'] == "unscored", score
+    assert normalize_score(10, 10)['percentage'] == 100.0
+    assert normalize_score("0/10")['percentage'] == 0.0
+    assert normalize_score("100%")['percentage'] == 100.0
+    print("✓ Out-of-range scores left unscored")
+
+
+def test_graded_results_use_rubric_total():
+    """Grading results are normalized against the compiled rubric's total points."""
+    from grader.engine import _finish_grading, _plan_grading
+
+    rubric = "Quiz (10 points total)\n1. Explain diffusion (10 points)"
+    compiled, exact, model_rubric = _plan_grading("Particles spread out.", rubric)
+    result = _finish_grading({"score": "8", "feedback": "Good"}, compiled, exact, model_rubric)
+    assert result['score_normalized']['percentage'] == 80.0, result['score_normalized']
+
+    compiled, exact, model_rubric = _plan_grading("Particles spread out.", "Explain diffusion")
+    result = _finish_grading({"score": "8", "feedback": "Good"}, compiled, exact, model_rubric)
+    assert result['score_normalized']['status'] == "unscored", result['score_normalized']
+    print("✓ Model scores normalized against the rubric total")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_explicit_scales()
+        test_bare_numbers_need_a_total()
+        test_out_of_range_scores()
+        test_graded_results_use_rubric_total()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Scoring tests passed")
+    else:
+        print("\n❌ Scoring tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for single-flight coalescing of concurrent identical OCR and
+grading calls.
+"""
+
+import sys
+import os
+import asyncio
+import base64
+import random
+import threading
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory and the benchmarks to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+RUBRIC = 'Quiz (4 points total)\n1. Answer B (2 points)\n2. Membrane function (2 points)'
+
+
+def test_threads_share_one_call():
+    """Concurrent do() calls with one key make one call; each gets its own copy."""
+    from singleflight import SingleFlight
+
+    flight = SingleFlight('unit_threads')
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return {'value': value}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: flight.do('same', slow, 1), range(8)))
+    assert calls == [1], calls
+    assert all(result == {'value': 1} for result in results), results
+    assert len({id(result) for result in results}) == 8, "Callers share one result object"
+
+    def failing():
+        calls.append('failed')
+        time.sleep(0.1)
+        raise ValueError("provider down")
+
+    def attempt(_):
+        try:
+            flight.do('broken', failing)
+        except ValueError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        errors = list(executor.map(attempt, range(4)))
+    assert calls.count('failed') == 1 and errors == ["provider down"] * 4, (calls, errors)
+
+    flight.do('same', slow, 2)
+    assert calls[-1] == 2, "A finished call was reused"
+    stats = flight.get_stats()
+    assert stats == {'calls': 13, 'coalesced': 10, 'in_flight': 0}, stats
+    print(f"✓ Threads coalesced: {stats}")
+
+
+def test_coroutines_share_one_call():
+    """Concurrent do_async() calls make one call, and a cancelled caller does not cancel it."""
+    from singleflight import SingleFlight
+
+    flight = SingleFlight('unit_async')
+    calls = []
+
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.2)
+        return {'value': value}
+
+    async def run():
+        first = asyncio.ensure_future(flight.do_async('same', slow, 1))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await asyncio.gather(*(flight.do_async('same', slow, 1) for _ in range(8)))
+
+    results = asyncio.run(run())
+    assert calls == [1], calls
+    assert all(result == {'value': 1} for result in results), results
+    assert flight.get_stats()['in_flight'] == 0
+    print(f"✓ Coroutines coalesced: {flight.get_stats()}")
+
+
+def test_identical_requests():
+    """Identical /grade and /grade-image requests in flight together make one model call each."""
+    from app import create_app
+    from asgi import application
+    from backends import set_backend
+    from backends.fake import FakeBackend
+    from bench_endpoints import worksheet_image
+    from test_async_grading import call
+
+    submission = '1. B\n2. The cell membrane controls what enters the cell.'
+    retried = '1.  B\n\n2. The cell membrane controls what enters the cell.  '
+    fake = FakeBackend(latency='fixed:300', vision_latency='fixed:300')
+    previous = set_backend(fake)
+    try:
+        client = create_app().test_client()
+        barrier = threading.Barrier(4)
+
+        def post(text):
+            barrier.wait()
+            return client.post('/grade', json={'assignment_type': 'Quiz', 'submission': text, 'rubric': RUBRIC})
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(executor.map(post, [submission, submission, retried, submission]))
+        grade_calls = fake.get_stats()['calls'].get('grade')
+
+        image = base64.b64encode(worksheet_image(random.Random(5), 'Chloe Nguyen')).decode('ascii')
+        body = {'assignment_type': 'Quiz', 'image_file': image, 'rubric': RUBRIC}
+
+        async def post_images():
+            return await asyncio.gather(*(call(application, 'POST', '/grade-image', body) for _ in range(3)))
+
+        image_responses = asyncio.run(post_images())
+        calls = fake.get_stats()['calls']
+    finally:
+        set_backend(previous)
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.get_data() for response in responses}) == 1
+    assert grade_calls == 1, grade_calls
+    assert all(status == 200 for status, _, _ in image_responses), image_responses
+    assert len({content for _, _, content in image_responses}) == 1
+    assert calls.get('vision_extract') == 1 and calls.get('grade') == 2, calls
+    print(f"✓ 4 identical /grade and 3 identical /grade-image requests: backend calls {calls}")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_threads_share_one_call()
+        test_coroutines_share_one_call()
+        test_identical_requests()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Single-flight tests passed")
+    else:
+        print("\n❌ Single-flight tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for cold start: the import-time budget, the background warm-up
+and the app factory's data folder.
+
+The budget is measured with `python -X importtime` in a fresh interpreter.
+IMPORT_BUDGET_MS overrides it on slow machines.
+"""
+
+import sys
+import os
+import json
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+# Add the current directory to the Python path
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(REPO_ROOT)
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+# Milliseconds `import app` may take; it took about 3s before SDKs were lazy
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1500'))
+
+# Loaded on first use, never by importing the app or the CLI scripts
+LAZY_MODULES = ('openai', 'google.generativeai', 'dropbox', 'requests', 'openpyxl', 'flask_mail', 'sympy',
+                'pytesseract')
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        dict: Module name -> cumulative import time in milliseconds
+    """
+    with tempfile.TemporaryDirectory(prefix='snapgrade-import-') as directory:
+        env = dict(os.environ, DATA_FOLDER=directory, PYTHONPATH=REPO_ROOT, PYTHONWARNINGS='ignore')
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                   cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr[-2000:]
+
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def test_import_budget():
+    """Importing the app stays within budget and loads no provider SDK."""
+    times = import_times('app')
+    loaded = [name for name in LAZY_MODULES if name in times]
+    assert not loaded, f"Imported at startup: {loaded}"
+    assert times['app'] <= IMPORT_BUDGET_MS, \
+        f"import app took {times['app']:.0f}ms, budget {IMPORT_BUDGET_MS:.0f}ms; slowest: " + \
+        ", ".join(f"{name} {ms:.0f}ms" for name, ms in sorted(times.items(), key=lambda item: -item[1])[1:6])
+    print(f"✓ import app: {times['app']:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)")
+
+    for script in ('process_assignments', 'train_model'):
+        loaded = [name for name in LAZY_MODULES if name in import_times(script)]
+        assert not loaded, f"{script} imports at startup: {loaded}"
+    print("✓ CLI scripts load no provider SDK at import")
+
+
+def test_warm_up():
+    """The warm-up waits for the server to listen, then loads the SDKs."""
+    import app as app_module
+    import metrics
+    from backends import set_backend
+
+    metrics.reset()
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    previous = set_backend('providers')
+    try:
+        thread = app_module.start_warm_up(wait_for=('127.0.0.1', port))
+        time.sleep(0.3)
+        assert thread.is_alive(), "Warm-up did not wait for the server"
+        listener.listen()
+        threading.Thread(target=lambda: listener.accept()[0].close(), daemon=True).start()
+        thread.join(timeout=60)
+    finally:
+        set_backend(previous)
+        listener.close()
+
+    assert not thread.is_alive(), "Warm-up did not finish"
+    assert 'openai' in sys.modules and 'google.generativeai' in sys.modules
+    stats = metrics.get_stage_stats()['warm_up/local']
+    assert stats['calls'] == 1 and stats['errors'] == 0, stats
+    print(f"✓ Warm-up loaded the SDKs in {stats['total_seconds']:.2f}s")
+
+
+def test_data_folder():
+    """Cached statistics and the roster index follow the data folder and the grades file."""
+    import app as app_module
+
+    previous_folder = os.path.dirname(app_module.CLASSES_FOLDER)
+    grade = {'id': 'g1', 'class_id': 'c1', 'assignment_id': 'a1', 'student_id': 's1', 'score': '8/10'}
+    student = {'id': 's1', 'class_id': 'c1', 'name': 'Ada Lovelace'}
+    try:
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            app_module.create_app(data_folder=first)
+            with open(app_module.GRADES_FILE, 'w') as f:
+                json.dump([grade], f)
+            with open(app_module.STUDENTS_FILE, 'w') as f:
+                json.dump([student], f)
+            assert app_module.grade_stats.graded_count('c1') == 1
+            assert app_module.student_index.best_match('Ada Lovelace', 'c1')[0] == student
+
+            # Another worker process writes the grades file
+            with open(app_module.GRADES_FILE, 'w') as f:
+                json.dump([grade, dict(grade, id='g2', student_id='s2')], f)
+            assert app_module.grade_stats.graded_count('c1') == 2, "Stats not reloaded from the changed file"
+
+            app_module.create_app(data_folder=second)
+            assert app_module.grade_stats.graded_count('c1') == 0, "Stats kept from the old folder"
+            assert app_module.student_index.best_match('Ada Lovelace', 'c1')[0] is None, \
+                "Roster index kept from the old folder"
+    finally:
+        app_module.init_storage(previous_folder)
+    print("✓ create_app(data_folder=...) resets the grade statistics and roster index")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_import_budget()
+        test_warm_up()
+        test_data_folder()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Startup tests passed")
+    else:
+        print("\n❌ Startup tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
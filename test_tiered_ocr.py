@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the tiered OCR escalation plan: when a page's local text is
+kept, when only its low-confidence blocks go to the vision tier, and when the
+whole page does.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+THRESHOLD = 70
+
+
+def _local_result(*blocks):
+    """A run_local_ocr result with one block per list of word confidences."""
+    confidences = [c for block in blocks for c in block]
+    return {
+        "blocks": [{"confidences": list(block), "box": (0, i * 40, 600, i * 40 + 30)}
+                   for i, block in enumerate(blocks)],
+        "word_count": len(confidences),
+        "mean_confidence": sum(confidences) / len(confidences) if confidences else 0.0
+    }
+
+
+def test_word_count_boundary():
+    """Pages with fewer than MIN_LOCAL_WORDS words go to the vision tier whole."""
+    from image_processor.tiered_ocr import plan_escalation, MIN_LOCAL_WORDS
+
+    assert MIN_LOCAL_WORDS == 15
+    assert plan_escalation(_local_result(), THRESHOLD) == ('page', [])
+    assert plan_escalation(_local_result([95] * 14), THRESHOLD) == ('page', [])
+    assert plan_escalation(_local_result([95] * 15), THRESHOLD) == ('local', [])
+    print("✓ 14 words escalate the page, 15 are kept")
+
+
+def test_confidence_boundary():
+    """A block whose mean confidence equals the threshold is trusted; just below is not."""
+    from image_processor.tiered_ocr import plan_escalation
+
+    assert plan_escalation(_local_result([95] * 15, [60, 80]), THRESHOLD) == ('local', [])
+    assert plan_escalation(_local_result([95] * 15, [60, 79]), THRESHOLD) == ('regions', [1])
+    assert plan_escalation(_local_result([95] * 10, [69.9] * 3, [95] * 7), THRESHOLD) == ('regions', [1])
+    print("✓ Blocks at the threshold kept, below it escalated")
+
+
+def test_region_fraction_boundary():
+    """Up to MAX_REGION_ESCALATION_FRACTION of the words go as regions; more sends the page."""
+    from image_processor.tiered_ocr import plan_escalation, MAX_REGION_ESCALATION_FRACTION
+
+    assert MAX_REGION_ESCALATION_FRACTION == 0.3
+    # 6 of 20 low words is exactly 30%
+    assert plan_escalation(_local_result([95] * 14, [40] * 3, [40] * 3), THRESHOLD) == ('regions', [1, 2])
+    # 7 of 20 is 35%
+    assert plan_escalation(_local_result([95] * 13, [40] * 3, [40] * 4), THRESHOLD) == ('page', [])
+    assert plan_escalation(_local_result([40] * 20), THRESHOLD) == ('page', [])
+    print("✓ 30% of words escalated as regions, 35% as the page")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_word_count_boundary()
+        test_confidence_boundary()
+        test_region_fraction_boundary()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Tiered OCR tests passed")
+    else:
+        print("\n❌ Tiered OCR tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the token usage ledger and the /usage rollups.
+"""
+
+import sys
+import os
+import json
+import tempfile
+from types import SimpleNamespace
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the app's data files out of the repository
+os.environ.setdefault('DATA_FOLDER', tempfile.mkdtemp(prefix='snapgrade-test-'))
+
+
+def test_record_and_rollup():
+    """Provider responses are read for tokens, priced, batched and rolled up."""
+    from usage import UsageLedger, set_ledger, set_usage_context, record_usage, rollup
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'usage.jsonl')
+        ledger = UsageLedger(path, flush_records=3, flush_seconds=3600)
+        previous = set_ledger(ledger)
+        try:
+            set_usage_context(endpoint='grade', teacher_id='TEACHER001', class_id='c1')
+            openai_response = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=200))
+            gemini_response = SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=4000,
+                                                                             candidates_token_count=500))
+            entry = record_usage('openai', 'text_grade', 'gpt-4o', openai_response, 1.5)
+            record_usage('gemini', 'text_grade', 'gemini-2.5-flash-lite', gemini_response, 0.5)
+            assert not os.path.exists(path), "Records should be buffered"
+            set_usage_context(endpoint='grade_image', teacher_id='TEACHER002')
+            record_usage('openai', 'vision_ocr', 'unpriced-model', openai_response, 2.0)
+            with open(path) as f:
+                assert len(f.readlines()) == 3, "Third record should flush the batch"
+        finally:
+            set_ledger(previous)
+
+        assert entry['cost_usd'] == 0.0045 and entry['class_id'] == 'c1', entry
+        mine = ledger.entries(teacher_id='TEACHER001')
+        report = rollup(mine, 'model')
+        assert report['totals']['calls'] == 2 and report['totals']['total_tokens'] == 5700, report
+        assert report['totals']['cost_usd'] == round(0.0045 + 0.0006, 6), report
+        assert [row['model'] for row in report['groups']] == ['gpt-4o', 'gemini-2.5-flash-lite'], report
+        unpriced = rollup(ledger.entries(), 'endpoint')['groups']
+        assert any(row['endpoint'] == 'grade_image' and row['unpriced_calls'] == 1 for row in unpriced), unpriced
+    print(f"✓ Rolled up by model: {report['groups']}")
+
+
+def test_usage_endpoint():
+    """Calls made while serving a request are attributed to it and served at /usage."""
+    import app as app_module
+    from backends import set_backend
+    from backends.fake import FakeBackend
+    from usage import record_usage, set_usage_context
+
+    with tempfile.TemporaryDirectory() as directory:
+        previous_folder = os.path.dirname(app_module.CLASSES_FOLDER)
+        # Buffered for the previous folder; must not end up in the new one
+        set_usage_context(endpoint='grade_image')
+        record_usage('fake', 'grade', 'fake', prompt_tokens=1, completion_tokens=1)
+        previous = set_backend(FakeBackend())
+        try:
+            client = app_module.create_app(data_folder=directory).test_client()
+            assert client.get('/usage').status_code == 401
+            client.post('/login', json={'teacher_id': 'TEACHER001'})
+            response = client.post('/grade', headers={'X-Request-ID': 'usage-1'}, json={
+                'assignment_type': 'Quiz',
+                'class_id': 'class-42',
+                'submission': '1. B\n2. The cell membrane controls what enters the cell.',
+                'rubric': 'Quiz (4 points total)\n1. Answer B (2 points)\n2. Membrane function (2 points)'
+            })
+            assert response.status_code == 200, response.get_json()
+
+            report = client.get('/usage?group_by=class_id').get_json()
+            assert client.get('/usage?group_by=teacher_id').status_code == 400
+            app_module.usage_ledger.flush()
+            with open(app_module.USAGE_FILE) as f:
+                records = [json.loads(line) for line in f]
+        finally:
+            set_backend(previous)
+            app_module.init_storage(previous_folder)
+
+    assert report['totals']['calls'] == 1 and report['groups'][0]['class_id'] == 'class-42', report
+    assert report['totals']['prompt_tokens'] > 0, report
+    assert len(records) == 1, records
+    record = records[0]
+    assert record['request_id'] == 'usage-1' and record['endpoint'] == 'grade', record
+    assert record['teacher_id'] == 'TEACHER001' and record['provider'] == 'fake', record
+    print(f"✓ /usage by class: {report['groups']}")
+
+
+def main():
+    """Main test function."""
+    try:
+        test_record_and_rollup()
+        test_usage_endpoint()
+        success = True
+    except AssertionError as e:
+        print(f"✗ Assertion failed: {e}")
+        success = False
+
+    if success:
+        print("\n✅ Usage tests passed")
+    else:
+        print("\n❌ Usage tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
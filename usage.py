@@ -0,0 +1,334 @@
+"""
+Token and Cost Accounting for SnapGrade
+
+Every OpenAI and Gemini call records its usage - prompt, completion and
+estimated image tokens, latency and cost - in a usage ledger:
+
+    start = time.perf_counter()
+    response = client.chat.completions.create(...)
+    record_usage('openai', 'text_grade', Config.OPENAI_MODEL, response,
+                 time.perf_counter() - start)
+
+Records are attributed to the request that made the call (request ID,
+endpoint, teacher, class and assignment; see set_usage_context). The ledger
+buffers records and appends them to a JSON Lines file in batches, so
+recording a call never rewrites a file. rollup() sums records per endpoint,
+class, assignment, model, operation or day for the /usage endpoint, and
+get_usage_stats() exposes per-model totals at /metrics.
+"""
+
+import atexit
+import contextvars
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from config import Config
+from logs import get_request_id
+
+# USD per million (input, output) tokens; MODEL_PRICES overrides or adds models
+DEFAULT_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.0-flash': (0.10, 0.40),
+}
+
+GROUP_BY_FIELDS = ('endpoint', 'teacher_id', 'class_id', 'assignment_id', 'provider', 'model', 'operation', 'day')
+
+_context = contextvars.ContextVar('usage_context', default={})
+_ledger = None
+_totals_lock = threading.Lock()
+_totals = {}  # "provider/model" -> totals since start
+
+
+def _parse_prices(spec):
+    """Parse "model=input/output,model=input/output" (USD per 1M tokens)."""
+    prices = dict(DEFAULT_PRICES)
+    for entry in (spec or '').split(','):
+        if '=' not in entry:
+            continue
+        model, rates = entry.split('=', 1)
+        try:
+            prompt_rate, completion_rate = rates.split('/')
+            prices[model.strip()] = (float(prompt_rate), float(completion_rate))
+        except ValueError:
+            print(f"Ignoring invalid model price entry: {entry}")
+    return prices
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Estimate the cost of a call in USD.
+
+    Returns:
+        float or None: None when the model has no known price
+    """
+    rates = _parse_prices(Config.MODEL_PRICES).get(model)
+    if rates is None:
+        return None
+    return round((prompt_tokens * rates[0] + completion_tokens * rates[1]) / 1_000_000, 6)
+
+
+def set_usage_context(**fields):
+    """Attribute the current request's usage to endpoint, teacher_id, class_id, assignment_id."""
+    _context.set({key: value for key, value in fields.items() if value is not None})
+
+
+def update_usage_context(**fields):
+    """Add fields (e.g. a newly created assignment_id) to the current attribution."""
+    _context.set({**_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+
+
+def _response_tokens(response):
+    """Read (prompt, completion) tokens from an OpenAI or Gemini response."""
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        return getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is not None:
+        return (getattr(metadata, 'prompt_token_count', 0) or 0,
+                getattr(metadata, 'candidates_token_count', 0) or 0)
+    return 0, 0
+
+
+def _image_tokens(images):
+    from PIL import Image
+    from grader.token_budget import estimate_image_tokens
+
+    total = 0
+    for image in images:
+        try:
+            if isinstance(image, (bytes, bytearray)):
+                # Only the header is read to get the size
+                with Image.open(io.BytesIO(image)) as opened:
+                    total += estimate_image_tokens(*opened.size)
+            else:
+                total += estimate_image_tokens(*image.size)
+        except Exception:
+            continue
+    return total
+
+
+def record_usage(provider, operation, model, response=None, seconds=None, images=(),
+                 prompt_tokens=None, completion_tokens=None):
+    """
+    Record the usage of one provider call.
+
+    Args:
+        provider (str): 'openai', 'gemini' or 'fake'
+        operation (str): What the call did, e.g. 'text_grade', 'vision_ocr'
+        model (str): The model name
+        response (optional): The provider response, read for token counts
+        seconds (float, optional): Call latency
+        images (list, optional): Image bytes or PIL images sent with the call
+        prompt_tokens (int, optional): Overrides the response's count
+        completion_tokens (int, optional): Overrides the response's count
+
+    Returns:
+        dict: The ledger record
+    """
+    response_prompt, response_completion = _response_tokens(response)
+    prompt_tokens = response_prompt if prompt_tokens is None else prompt_tokens
+    completion_tokens = response_completion if completion_tokens is None else completion_tokens
+    entry = {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'request_id': get_request_id(),
+        **_context.get(),
+        'provider': provider,
+        'operation': operation,
+        'model': model,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'images': len(images),
+        'image_tokens': _image_tokens(images) if images else 0,
+        'seconds': round(seconds, 3) if seconds is not None else None,
+        'cost_usd': estimate_cost(model, prompt_tokens, completion_tokens)
+    }
+
+    with _totals_lock:
+        totals = _totals.setdefault(f"{provider}/{model}", {
+            'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'image_tokens': 0, 'cost_usd': 0.0})
+        totals['calls'] += 1
+        totals['prompt_tokens'] += prompt_tokens
+        totals['completion_tokens'] += completion_tokens
+        totals['image_tokens'] += entry['image_tokens']
+        totals['cost_usd'] += entry['cost_usd'] or 0.0
+
+    if _ledger is not None:
+        _ledger.append(entry)
+    return entry
+
+
+class UsageLedger:
+    """
+    Buffered JSON Lines store of usage records. Records are appended to the
+    file once USAGE_FLUSH_RECORDS are buffered or the oldest buffered record
+    is USAGE_FLUSH_SECONDS old, before every read, and at exit. Buffered
+    records are written to the path that was current when they were
+    recorded, so repointing the path never moves them to the new file.
+    """
+
+    def __init__(self, path, flush_records=None, flush_seconds=None):
+        """
+        Args:
+            path: File path, or a function returning it (so the app's data
+                directory can be repointed)
+        """
+        self._path = path
+        self.flush_records = flush_records or Config.USAGE_FLUSH_RECORDS
+        self.flush_seconds = Config.USAGE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffer_path = None
+        self._oldest = None
+        atexit.register(self.flush)
+
+    @property
+    def path(self):
+        return self._path() if callable(self._path) else self._path
+
+    def append(self, entry):
+        path = self.path
+        with self._lock:
+            if self._buffer and path != self._buffer_path:
+                if not self._write():
+                    print(f"Dropping {len(self._buffer)} usage records for {self._buffer_path}")
+                    self._buffer = []
+                    self._oldest = None
+            self._buffer_path = path
+            self._buffer.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (len(self._buffer) >= self.flush_records
+                   or time.monotonic() - self._oldest >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Append buffered records to the file in one write."""
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        """Write out the buffer; returns False when the file could not be written."""
+        if not self._buffer:
+            return True
+        lines = "".join(json.dumps(entry) + "\n" for entry in self._buffer)
+        try:
+            with open(self._buffer_path, 'a') as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"Could not write usage ledger: {str(e)}")
+            return False
+        self._buffer = []
+        self._oldest = None
+        return True
+
+    def entries(self, since=None, **filters):
+        """
+        Read records, oldest first.
+
+        Args:
+            since (str, optional): ISO date or timestamp; older records are skipped
+            **filters: Field values records must match, e.g. teacher_id=...
+
+        Returns:
+            list: Matching records
+        """
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        filters = {key: value for key, value in filters.items() if value is not None}
+        matched = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict):
+                    continue
+                if since and entry.get('ts', '') < since:
+                    continue
+                if all(entry.get(key) == value for key, value in filters.items()):
+                    matched.append(entry)
+        return matched
+
+
+def set_ledger(ledger):
+    """
+    Set where usage records are persisted (None keeps only in-memory totals).
+
+    Returns:
+        UsageLedger: The previous ledger
+    """
+    global _ledger
+    previous, _ledger = _ledger, ledger
+    return previous
+
+
+def get_ledger():
+    """The active usage ledger, or None."""
+    return _ledger
+
+
+def _sum(entries):
+    totals = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'images': 0, 'image_tokens': 0,
+              'seconds': 0.0, 'cost_usd': 0.0, 'unpriced_calls': 0}
+    for entry in entries:
+        totals['calls'] += 1
+        for key in ('prompt_tokens', 'completion_tokens', 'images', 'image_tokens'):
+            totals[key] += entry.get(key) or 0
+        totals['seconds'] += entry.get('seconds') or 0.0
+        if entry.get('cost_usd') is None:
+            totals['unpriced_calls'] += 1
+        else:
+            totals['cost_usd'] += entry['cost_usd']
+    totals['total_tokens'] = totals['prompt_tokens'] + totals['completion_tokens']
+    totals['seconds'] = round(totals['seconds'], 3)
+    totals['mean_seconds'] = round(totals['seconds'] / totals['calls'], 3) if totals['calls'] else None
+    totals['cost_usd'] = round(totals['cost_usd'], 6)
+    return totals
+
+
+def rollup(entries, group_by):
+    """
+    Sum usage records per group.
+
+    Args:
+        entries (list): Ledger records
+        group_by (str): One of GROUP_BY_FIELDS
+
+    Returns:
+        dict: 'totals' over all records and 'groups', one per key, most
+        expensive first
+    """
+    if group_by not in GROUP_BY_FIELDS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY_FIELDS)}")
+    groups = {}
+    for entry in entries:
+        key = entry.get('ts', '')[:10] if group_by == 'day' else entry.get(group_by)
+        groups.setdefault(key, []).append(entry)
+    rows = [{group_by: key, **_sum(group)} for key, group in groups.items()]
+    rows.sort(key=lambda row: (row['cost_usd'], row['total_tokens']), reverse=True)
+    return {'totals': _sum(entries), 'groups': rows}
+
+
+def get_usage_stats():
+    """
+    Get usage totals since start, per provider/model.
+
+    Returns:
+        dict: {'calls', 'prompt_tokens', 'completion_tokens', 'image_tokens',
+        'cost_usd'}, each {"provider/model": value}
+    """
+    with _totals_lock:
+        totals = {key: dict(value) for key, value in _totals.items()}
+    fields = ('calls', 'prompt_tokens', 'completion_tokens', 'image_tokens', 'cost_usd')
+    return {field: {key: value[field] for key, value in totals.items()} for field in fields}
@@ -0,0 +1,12 @@
+"""
+WSGI entrypoint for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Worker class, worker and thread counts and timeouts come from the WEB_*
+settings in config.py. `python app.py` still runs the development server.
+"""
+
+from app import create_app
+
+application = create_app()